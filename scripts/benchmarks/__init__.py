@@ -0,0 +1,174 @@
+
+import fnmatch
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "..", "src", "client"))
+
+#------------------------------------------------------------------------------
+
+## @package benchmarks
+#
+# Benchmarks of the client code
+#
+# The benchmarks are defined in the modules of this package by functions
+# decorated with benchmark(). Such a function performs the setup of the
+# benchmark and returns a tuple of a function to measure and the number of
+# operations that function performs in one call. The function is called
+# repeatedly, and the best time of a number of repetitions is used to
+# compute the time of one operation.
+#
+# The results can be written into a JSON file, which can later be used as a
+# baseline to compare the results of another run with, so that performance
+# regressions can be detected (see __main__.py).
+
+#------------------------------------------------------------------------------
+
+## The directory of the shipped device files
+devicesDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "..", "data", "devices")
+
+## The version of the format of the results
+resultsVersion = 1
+
+#------------------------------------------------------------------------------
+
+class Benchmark(object):
+    """A benchmark."""
+    ## The registered benchmarks in the order of their registration
+    _benchmarks = []
+
+    @staticmethod
+    def iterBenchmarks(patterns = None):
+        """Iterate over the registered benchmarks whose names match any of
+        the given shell-style patterns.
+
+        If no patterns are given, all benchmarks are returned."""
+        for benchmark in Benchmark._benchmarks:
+            if not patterns or \
+               any([fnmatch.fnmatchcase(benchmark.name, pattern)
+                    for pattern in patterns]):
+                yield benchmark
+
+    def __init__(self, name, setup):
+        """Construct the benchmark with the given name and setup function."""
+        self._name = name
+        self._setup = setup
+
+    @property
+    def name(self):
+        """Get the name of the benchmark."""
+        return self._name
+
+    @property
+    def description(self):
+        """Get the description of the benchmark, i.e. the first line of the
+        docstring of the setup function."""
+        doc = self._setup.__doc__
+        return doc.strip().splitlines()[0] if doc else ""
+
+    def run(self, repeat, minTime):
+        """Run the benchmark.
+
+        The measured function is called as many times in a repetition as
+        needed to make the repetition last at least the given minimal time
+        in seconds. The repetition is performed the given number of times.
+
+        Returns a dictionary with the time of one operation in the best
+        repetition ("best") and the median of the repetitions ("median") in
+        seconds, the number of operations per call ("operations"), the number
+        of calls per repetition ("calls") and the number of repetitions
+        ("repeat")."""
+        (fun, numOperations) = self._setup()
+
+        numCalls = 1
+        while True:
+            elapsed = Benchmark._time(fun, numCalls)
+            if elapsed>=minTime:
+                break
+            numCalls = numCalls * 10 if elapsed<minTime / 10.0 \
+                else numCalls * 2
+
+        times = [elapsed] + [Benchmark._time(fun, numCalls)
+                             for i in range(1, repeat)]
+        times = sorted([t / (numCalls * numOperations) for t in times])
+
+        return { "best": times[0],
+                 "median": times[len(times)//2],
+                 "operations": numOperations,
+                 "calls": numCalls,
+                 "repeat": repeat }
+
+    @staticmethod
+    def _time(fun, numCalls):
+        """Call the given function the given number of times and return the
+        time it took in seconds."""
+        start = time.perf_counter()
+        for i in range(0, numCalls):
+            fun()
+        return time.perf_counter() - start
+
+#------------------------------------------------------------------------------
+
+def benchmark(name):
+    """Decorator to register a setup function as the benchmark with the given
+    name."""
+    def register(setup):
+        Benchmark._benchmarks.append(Benchmark(name, setup))
+        return setup
+    return register
+
+#------------------------------------------------------------------------------
+
+def runBenchmarks(patterns = None, repeat = 5, minTime = 0.05,
+                  verbose = True):
+    """Run the benchmarks matching the given patterns.
+
+    Returns a dictionary of the results suitable to be dumped as JSON."""
+    results = {}
+    for benchmark in Benchmark.iterBenchmarks(patterns):
+        result = benchmark.run(repeat, minTime)
+        results[benchmark.name] = result
+        if verbose:
+            print("%-32s %12.3f us/op  (%d ops x %d calls)" %
+                  (benchmark.name, result["best"] * 1e6,
+                   result["operations"], result["calls"]))
+
+    return { "version": resultsVersion,
+             "python": platform.python_version(),
+             "implementation": platform.python_implementation(),
+             "benchmarks": results }
+
+#------------------------------------------------------------------------------
+
+def compareResults(results, baseline, threshold):
+    """Compare the given results with the given baseline.
+
+    A benchmark is considered to have regressed if its best time is slower
+    than that of the baseline by more than the given threshold percentage.
+
+    Returns a list of tuples of the name of a benchmark present in both
+    results, the ratio of the times and a boolean indicating if the
+    benchmark has regressed."""
+    comparisons = []
+
+    baselineBenchmarks = baseline.get("benchmarks", {})
+    for (name, result) in sorted(results["benchmarks"].items()):
+        baselineResult = baselineBenchmarks.get(name)
+        if baselineResult is None or baselineResult["best"]<=0:
+            continue
+
+        ratio = result["best"] / baselineResult["best"]
+        comparisons.append((name, ratio, ratio>(1.0 + threshold / 100.0)))
+
+    return comparisons
+
+#------------------------------------------------------------------------------
+
+from . import parsing
+from . import generation
+from . import editing
+from . import names
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# Runner of the benchmarks of the client code
+#
+# Usage: python3 scripts/benchmarks [-k PATTERN] [-o RESULTS] [-b BASELINE]
+#
+# The benchmarks matching the given patterns (all by default) are run and
+# the time of one operation of each of them is printed. The results can be
+# written into a JSON file with sorted keys, so that it can be committed and
+# diffed. If a baseline (i.e. the results of an earlier run) is given, the
+# results are compared with it, and the exit status is 1 if any benchmark is
+# slower than in the baseline by more than the threshold.
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+from benchmarks import Benchmark, runBenchmarks, compareResults
+
+#------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run the benchmarks of the client code")
+    parser.add_argument("-k", "--filter", dest = "patterns",
+                        action = "append", default = [],
+                        help = "run only the benchmarks whose names match the given shell-style pattern (may be given more than once)")
+    parser.add_argument("-l", "--list", dest = "list", action = "store_true",
+                        help = "list the benchmarks instead of running them")
+    parser.add_argument("-r", "--repeat", dest = "repeat", type = int,
+                        default = 5,
+                        help = "the number of times each measurement is repeated")
+    parser.add_argument("-m", "--min-time", dest = "minTime", type = float,
+                        default = 0.05,
+                        help = "the minimal time of a measurement in seconds")
+    parser.add_argument("-o", "--output", dest = "output", default = None,
+                        help = "write the results into the given JSON file")
+    parser.add_argument("-b", "--baseline", dest = "baseline", default = None,
+                        help = "compare the results with those in the given JSON file")
+    parser.add_argument("-t", "--threshold", dest = "threshold", type = float,
+                        default = 10.0,
+                        help = "the percentage of slowdown considered a regression")
+    args = parser.parse_args()
+
+    if args.list:
+        for benchmark in Benchmark.iterBenchmarks(args.patterns):
+            print("%-32s %s" % (benchmark.name, benchmark.description))
+        sys.exit(0)
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "rt") as f:
+                baseline = json.load(f)
+        except Exception as e:
+            print("Could not load the baseline from %s: %s" %
+                  (args.baseline, e), file=sys.stderr)
+            sys.exit(2)
+
+    results = runBenchmarks(args.patterns, repeat = args.repeat,
+                            minTime = args.minTime)
+
+    if args.output:
+        with open(args.output, "wt") as f:
+            json.dump(results, f, indent = 1, sort_keys = True)
+            f.write("\n")
+
+    if baseline is not None:
+        regressed = False
+        print()
+        for (name, ratio, isRegression) in \
+            compareResults(results, baseline, args.threshold):
+            print("%-32s %7.2fx%s" %
+                  (name, ratio, "  REGRESSION" if isRegression else ""))
+            regressed = regressed or isRegression
+
+        if regressed:
+            sys.exit(1)
@@ -0,0 +1,82 @@
+
+from . import devicesDirectory
+from .synthetic import generateProfile
+
+from jsprog.device import JoystickType
+
+import os
+
+#------------------------------------------------------------------------------
+
+## @package benchmarks.common
+#
+# Common data of the benchmarks
+#
+# The joystick types are loaded from the shipped device files only once, and
+# the synthetic profiles (see benchmarks.synthetic) are generated only once
+# for each joystick type, so that the setup of the benchmarks is cheap. The
+# profiles have a shift level and an action for each other key and each axis
+# in both shift states.
+
+#------------------------------------------------------------------------------
+
+## The name of the device directory of the joystick type used by the
+## benchmarks needing a single joystick type
+defaultTypeName = "usbV06a3P0bac"
+
+# The mapping of the names of the device directories to the loaded joystick
+# types
+_joystickTypes = None
+
+# The mapping of the names of the device directories to the synthetic
+# profiles
+_profiles = {}
+
+#------------------------------------------------------------------------------
+
+def getDeviceFiles():
+    """Get a sorted list of tuples of the names of the device directories and
+    the paths of the type.xml files in them."""
+    return [(entry, os.path.join(devicesDirectory, entry, "type.xml"))
+            for entry in sorted(os.listdir(devicesDirectory))
+            if os.path.isfile(os.path.join(devicesDirectory, entry,
+                                           "type.xml"))]
+
+#------------------------------------------------------------------------------
+
+def getJoystickTypes():
+    """Get a mapping of the names of the device directories to the joystick
+    types loaded from them."""
+    global _joystickTypes
+    if _joystickTypes is None:
+        _joystickTypes = {}
+        for (name, path) in getDeviceFiles():
+            joystickType = JoystickType.fromFile(path)
+            if joystickType is not None:
+                _joystickTypes[name] = joystickType
+    return _joystickTypes
+
+#------------------------------------------------------------------------------
+
+def getJoystickType(name = defaultTypeName):
+    """Get the joystick type loaded from the device directory with the given
+    name."""
+    return getJoystickTypes()[name]
+
+#------------------------------------------------------------------------------
+
+def getProfile(name = defaultTypeName):
+    """Get the synthetic profile for the joystick type loaded from the device
+    directory with the given name."""
+    profile = _profiles.get(name)
+    if profile is None:
+        profile = _profiles[name] = \
+            generateProfile(getJoystickType(name), numShiftLevels = 1)
+    return profile
+
+#------------------------------------------------------------------------------
+
+def getProfileXML(name = defaultTypeName):
+    """Get the XML text of the synthetic profile for the joystick type loaded
+    from the device directory with the given name as bytes."""
+    return getProfile(name).getXMLDocument().toxml(encoding = "utf-8")
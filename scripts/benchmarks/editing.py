@@ -0,0 +1,82 @@
+
+from . import benchmark
+from .common import getProfile
+
+from jsprog.profile import HandlerTree
+from jsprog.joystick import Key
+from jsprog.action import SimpleAction
+
+import itertools
+
+#------------------------------------------------------------------------------
+
+## @package benchmarks.editing
+#
+# Benchmarks of the editing operations of profiles
+
+#------------------------------------------------------------------------------
+
+## The numbers of states of the shift levels of the handler trees
+numStatesSequence = [3, 4]
+
+#------------------------------------------------------------------------------
+
+@benchmark("editing.clone")
+def cloneProfile():
+    """Clone a synthetic profile."""
+    profile = getProfile()
+
+    def fun():
+        profile.clone()
+
+    return (fun, 1)
+
+#------------------------------------------------------------------------------
+
+@benchmark("editing.setAction")
+def setActions():
+    """Set the action of each shift state sequence of a handler tree.
+
+    The tree is completed first, and then an action is set for each
+    sequence, splitting the shift handlers one by one."""
+    sequences = [list(sequence) for sequence in
+                 itertools.product(*[range(0, numStates)
+                                     for numStates in numStatesSequence])]
+    keyCode = Key.findCodeFor("KEY_A")
+    actions = []
+    for index in range(0, len(sequences)):
+        action = SimpleAction()
+        action.addKeyCombination(keyCode + index%26)
+        actions.append(action)
+
+    def fun():
+        handlerTree = HandlerTree()
+        handlerTree.complete(numStatesSequence)
+        for (sequence, action) in zip(sequences, actions):
+            handlerTree.setAction(sequence, action)
+
+    return (fun, len(sequences))
+
+#------------------------------------------------------------------------------
+
+@benchmark("editing.simplify")
+def simplifyTree():
+    """Simplify a handler tree with partially identical actions."""
+    sequences = [list(sequence) for sequence in
+                 itertools.product(*[range(0, numStates)
+                                     for numStates in numStatesSequence])]
+    keyCode = Key.findCodeFor("KEY_A")
+    actions = []
+    for index in range(0, len(sequences)):
+        action = SimpleAction()
+        action.addKeyCombination(keyCode + (index//2)%26)
+        actions.append(action)
+
+    def fun():
+        handlerTree = HandlerTree()
+        handlerTree.complete(numStatesSequence)
+        for (sequence, action) in zip(sequences, actions):
+            handlerTree.setAction(sequence, action)
+        handlerTree.simplify()
+
+    return (fun, 1)
@@ -0,0 +1,60 @@
+
+from . import benchmark
+from .common import getProfile
+
+import io
+
+#------------------------------------------------------------------------------
+
+## @package benchmarks.generation
+#
+# Benchmarks of the generation and serialization of the XML documents of a
+# profile
+
+#------------------------------------------------------------------------------
+
+@benchmark("generation.xml")
+def generateXML():
+    """Generate the XML document of a synthetic profile."""
+    profile = getProfile()
+
+    def fun():
+        profile.getXMLDocument()
+
+    return (fun, 1)
+
+#------------------------------------------------------------------------------
+
+@benchmark("generation.daemonXML")
+def generateDaemonXML():
+    """Generate the daemon XML document of a synthetic profile."""
+    profile = getProfile()
+
+    def fun():
+        profile.getDaemonXMLDocument()
+
+    return (fun, 1)
+
+#------------------------------------------------------------------------------
+
+@benchmark("generation.writeXML")
+def writeXML():
+    """Serialize the XML document of a synthetic profile."""
+    document = getProfile().getXMLDocument()
+
+    def fun():
+        document.writexml(io.StringIO(), addindent = "  ", newl = "\n")
+
+    return (fun, 1)
+
+#------------------------------------------------------------------------------
+
+@benchmark("generation.writeDaemonXML")
+def writeDaemonXML():
+    """Serialize the daemon XML document of a synthetic profile."""
+    document = getProfile().getDaemonXMLDocument()
+
+    def fun():
+        document.writexml(io.StringIO())
+
+    return (fun, 1)
@@ -0,0 +1,72 @@
+
+from . import benchmark
+
+from jsprog.joystick import Key, Axis
+
+#------------------------------------------------------------------------------
+
+## @package benchmarks.names
+#
+# Benchmarks of the lookups of the names and codes of keys and axes
+#
+# The lookups are performed for the names of the controls of joystick types
+# (e.g. BTN_TRIGGER, ABS_RZ), which are found at various positions of the
+# name tables.
+
+#------------------------------------------------------------------------------
+
+## The names of the keys looked up
+keyNames = ["BTN_TRIGGER", "BTN_THUMB", "BTN_BASE", "BTN_DEAD",
+            "BTN_TRIGGER_HAPPY1", "KEY_A", "KEY_ESC", "KEY_F12"]
+
+## The names of the axes looked up
+axisNames = ["ABS_X", "ABS_Y", "ABS_Z", "ABS_RX", "ABS_RY", "ABS_RZ",
+             "ABS_THROTTLE", "ABS_HAT0X", "ABS_HAT0Y"]
+
+#------------------------------------------------------------------------------
+
+@benchmark("names.keyCode")
+def findKeyCodes():
+    """Find the codes of key names."""
+    def fun():
+        for name in keyNames:
+            Key.findCodeFor(name)
+
+    return (fun, len(keyNames))
+
+#------------------------------------------------------------------------------
+
+@benchmark("names.keyName")
+def getKeyNames():
+    """Get the names of key codes."""
+    codes = [Key.findCodeFor(name) for name in keyNames]
+
+    def fun():
+        for code in codes:
+            Key.getNameFor(code)
+
+    return (fun, len(codes))
+
+#------------------------------------------------------------------------------
+
+@benchmark("names.axisCode")
+def findAxisCodes():
+    """Find the codes of axis names."""
+    def fun():
+        for name in axisNames:
+            Axis.findCodeFor(name)
+
+    return (fun, len(axisNames))
+
+#------------------------------------------------------------------------------
+
+@benchmark("names.axisName")
+def getAxisNames():
+    """Get the names of axis codes."""
+    codes = [Axis.findCodeFor(name) for name in axisNames]
+
+    def fun():
+        for code in codes:
+            Axis.getNameFor(code)
+
+    return (fun, len(codes))
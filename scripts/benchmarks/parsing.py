@@ -0,0 +1,56 @@
+
+from . import benchmark
+from .common import getDeviceFiles, getJoystickType, getProfileXML
+
+from jsprog.device import DeviceHandler, JoystickType
+from jsprog.profile import ProfileHandler
+
+from xml.sax import make_parser
+
+import io
+
+#------------------------------------------------------------------------------
+
+## @package benchmarks.parsing
+#
+# Benchmarks of the SAX parsing of device files and profiles
+#
+# The files are read into the memory during the setup, so that only the
+# parsing is measured.
+
+#------------------------------------------------------------------------------
+
+@benchmark("parsing.devices")
+def parseDevices():
+    """Parse all shipped device files."""
+    documents = []
+    for (_name, path) in getDeviceFiles():
+        with open(path, "rb") as f:
+            documents.append(f.read())
+
+    parser = make_parser()
+    handler = DeviceHandler(JoystickType)
+    parser.setContentHandler(handler)
+
+    def fun():
+        for document in documents:
+            parser.parse(io.BytesIO(document))
+
+    return (fun, len(documents))
+
+#------------------------------------------------------------------------------
+
+@benchmark("parsing.profile")
+def parseProfile():
+    """Parse a synthetic profile."""
+    joystickType = getJoystickType()
+    document = getProfileXML()
+
+    parser = make_parser()
+    handler = ProfileHandler(joystickType)
+    parser.setContentHandler(handler)
+
+    def fun():
+        parser.parse(io.BytesIO(document))
+
+    return (fun, 1)
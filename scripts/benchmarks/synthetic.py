@@ -0,0 +1,333 @@
+
+from jsprog.device import JoystickType, DisplayVirtualState
+from jsprog.profile import Profile, ShiftLevel, KeyProfile, AxisProfile
+from jsprog.joystick import InputID, JoystickIdentity, Key, Axis
+from jsprog.parser import Control, VirtualState, SingleValueConstraint
+from jsprog.action import SimpleAction, AdvancedAction, MouseMove, \
+    MouseMoveCommand, ScriptAction, ValueRangeAction, KeyPressCommand, \
+    KeyReleaseCommand, DelayCommand
+
+import itertools
+import random
+
+#------------------------------------------------------------------------------
+
+## @package benchmarks.synthetic
+#
+# Generator of synthetic joystick types and profiles
+#
+# The profiles are much larger than the hand-made ones, so that the scaling
+# of the code can be studied, but the generator is also used by the other
+# benchmarks needing a profile of a certain structure. A profile is generated for a synthetic
+# joystick type with a given number of keys and axes, and it has a given
+# number of shift levels with a given number of states each, and a given
+# number of virtual controls. The keys are used as follows:
+# - the first keys define the shift states: each non-default state of a
+#   shift level is selected by pressing a key of its own,
+# - the next keys define the virtual controls, each having two states
+#   depending on whether its key is pressed or not,
+# - the remaining keys, all axes and all states of the virtual controls
+#   have an action in each shift state sequence.
+#
+# The types of the actions are chosen randomly according to the given
+# weights (see parseMix()). Value range actions can be assigned only to
+# axes, so for keys and virtual controls the other types are chosen.
+#
+# The shift levels can also be generated on their own for a list of keys,
+# either with a state selected by each key, like in the profiles, or with a
+# state for each combination of the keys (see generateShiftLevel()).
+
+#------------------------------------------------------------------------------
+
+## The types of the actions that can be generated
+actionTypes = ["simple", "advanced", "mouseMove", "script", "valueRange"]
+
+## The default weights of the types of the actions
+defaultMix = { "simple": 4, "advanced": 1, "mouseMove": 1, "script": 1,
+               "valueRange": 1 }
+
+## The codes of the keys that can be used by a synthetic joystick type. The
+## joystick buttons come first, and only the codes with a name that maps
+## back to the code are used.
+keyCodes = [code for code in list(range(0x120, 0x300)) +
+            list(range(1, 0x120))
+            if Key.findCodeFor(Key.getNameFor(code))==code]
+
+## The codes of the axes that can be used by a synthetic joystick type
+axisCodes = [code for code in range(0, len(Axis._axisNames))
+             if Axis.findCodeFor(Axis.getNameFor(code))==code]
+
+#------------------------------------------------------------------------------
+
+def parseMix(text):
+    """Parse the given textual representation of the weights of the types
+    of the actions.
+
+    The text is a comma-separated list of items of the form type=weight,
+    e.g. "simple=4,script=1". The types not listed get a weight of 0.
+
+    Returns a dictionary of the types to the weights. ValueError is raised
+    if the text is invalid."""
+    mix = {}
+    for item in text.split(","):
+        (actionType, _sep, weight) = item.partition("=")
+        actionType = actionType.strip()
+        if actionType not in actionTypes:
+            raise ValueError("invalid action type: '%s'" % (actionType,))
+        mix[actionType] = float(weight) if weight else 1.0
+        if mix[actionType]<0:
+            raise ValueError("negative weight for action type '%s'" %
+                             (actionType,))
+
+    if not any([weight>0 for weight in mix.values()]):
+        raise ValueError("all weights are zero")
+
+    return mix
+
+#------------------------------------------------------------------------------
+
+def getNumKeysNeeded(numShiftLevels, numShiftStates, numVirtualControls):
+    """Get the number of keys used by the shift levels and the virtual
+    controls of a profile with the given parameters."""
+    return numShiftLevels * (numShiftStates - 1) + numVirtualControls
+
+#------------------------------------------------------------------------------
+
+def generateJoystickType(numKeys, numAxes, minimum = -512, maximum = 511):
+    """Generate a joystick type with the given number of keys and axes.
+
+    The axes have the given range of values. ValueError is raised if there
+    are not enough codes for the keys or the axes."""
+    if numKeys>len(keyCodes):
+        raise ValueError("at most %d keys are supported" % (len(keyCodes),))
+    if numAxes>len(axisCodes):
+        raise ValueError("at most %d axes are supported" % (len(axisCodes),))
+
+    identity = JoystickIdentity(InputID(3, 0x1234, 0x5678, 1),
+                                "Synthetic joystick %d-%d" %
+                                (numKeys, numAxes), None, None)
+    joystickType = JoystickType(identity)
+
+    for code in keyCodes[:numKeys]:
+        joystickType.addKey(code)
+    for code in axisCodes[:numAxes]:
+        joystickType.addAxis(code, minimum = minimum, maximum = maximum)
+
+    return joystickType
+
+#------------------------------------------------------------------------------
+
+def generateShiftLevel(keys, full = False):
+    """Generate a shift level for the given keys.
+
+    If full is True, every combination of the keys is a separate state.
+    Otherwise each key alone selects a state."""
+    shiftLevel = ShiftLevel()
+    shiftLevel.addState(VirtualState())
+
+    if full:
+        for mask in range(1, 1<<len(keys)):
+            state = VirtualState()
+            for (index, key) in enumerate(keys):
+                state.addConstraint(
+                    SingleValueConstraint(Control(Control.TYPE_KEY, key.code),
+                                          (mask>>index)&1))
+            shiftLevel.addState(state)
+    else:
+        for key in keys:
+            state = VirtualState()
+            state.addConstraint(
+                SingleValueConstraint(Control(Control.TYPE_KEY, key.code), 1))
+            shiftLevel.addState(state)
+
+    return shiftLevel
+
+#------------------------------------------------------------------------------
+
+class ActionGenerator(object):
+    """Generator of random actions."""
+    ## The code of the first key used in the actions
+    _firstKeyCode = Key.findCodeFor("KEY_A")
+
+    def __init__(self, mix, seed, numValueRanges = None):
+        """Construct the generator for the given weights of the action types
+        and the given random seed.
+
+        The value range actions have the given number of ranges, or a random
+        number of them, if it is None."""
+        self._random = random.Random(seed)
+        self._numValueRanges = numValueRanges
+
+        self._types = [actionType for actionType in actionTypes
+                       if mix.get(actionType, 0)>0]
+        self._weights = [mix[actionType] for actionType in self._types]
+
+        self._singleTypes = [actionType for actionType in self._types
+                             if actionType!="valueRange"]
+        self._singleWeights = [mix[actionType]
+                               for actionType in self._singleTypes]
+        if not self._singleTypes:
+            self._singleTypes = ["simple"]
+            self._singleWeights = [1]
+
+    def generate(self, control):
+        """Generate an action for the given control (a Key, an Axis or a
+        virtual state)."""
+        if isinstance(control, Axis):
+            actionType = self._choose(self._types, self._weights)
+            if actionType=="valueRange":
+                return self._generateValueRange(control)
+        else:
+            actionType = self._choose(self._singleTypes, self._singleWeights)
+
+        return self._generateSingle(actionType)
+
+    def _choose(self, types, weights):
+        """Choose one of the given types with the given weights."""
+        return self._random.choices(types, weights = weights)[0]
+
+    def _getKeyCode(self):
+        """Get a random key code from the 26 codes starting at KEY_A."""
+        return ActionGenerator._firstKeyCode + self._random.randrange(0, 26)
+
+    def _generateSingle(self, actionType):
+        """Generate an action of the given type other than a value range
+        action."""
+        rnd = self._random
+        if actionType=="simple":
+            action = SimpleAction(repeatDelay = rnd.choice([None, 100]))
+            action.addKeyCombination(self._getKeyCode(),
+                                     leftShift = rnd.random()<0.25,
+                                     leftControl = rnd.random()<0.25)
+        elif actionType=="advanced":
+            action = AdvancedAction()
+            action.setSection(AdvancedAction.SECTION_ENTER)
+            for i in range(0, rnd.randint(1, 3)):
+                code = self._getKeyCode()
+                action.appendCommand(KeyPressCommand(code))
+                action.appendCommand(DelayCommand(rnd.choice([10, 20, 50])))
+                action.appendCommand(KeyReleaseCommand(code))
+            action.clearSection()
+        elif actionType=="mouseMove":
+            action = MouseMove(direction =
+                               rnd.choice([MouseMoveCommand.DIRECTION_HORIZONTAL,
+                                           MouseMoveCommand.DIRECTION_VERTICAL,
+                                           MouseMoveCommand.DIRECTION_WHEEL]),
+                               a = 1.0, b = rnd.choice([0.25, 0.5]),
+                               c = 0.001, repeatDelay = 50)
+        else:
+            action = ScriptAction()
+            action.setSection(ScriptAction.SECTION_ENTER)
+            keyName = Key.getNameFor(self._getKeyCode())
+            action.appendLine("jsprog_presskey(jsprog_%s)" % (keyName,))
+            action.setSection(ScriptAction.SECTION_LEAVE)
+            action.appendLine("jsprog_releasekey(jsprog_%s)" % (keyName,))
+            action.clearSection()
+
+        return action
+
+    def _generateValueRange(self, axis):
+        """Generate a value range action for the given axis.
+
+        The range of the axis is divided into ranges of equal width, each
+        having an action. The number of the ranges is either the one given
+        to the constructor, or a random number from 2 to 8, but at most the
+        number of the values of the axis."""
+        numRanges = self._random.randint(2, 8) \
+            if self._numValueRanges is None else self._numValueRanges
+        numRanges = min(numRanges, axis.maximum - axis.minimum + 1)
+        width = (axis.maximum - axis.minimum + 1) / numRanges
+
+        action = ValueRangeAction()
+        for index in range(0, numRanges):
+            action.addAction(axis.minimum + int(index * width),
+                             axis.minimum + int((index + 1) * width) - 1,
+                             self._generateSingle(
+                                 self._choose(self._singleTypes,
+                                              self._singleWeights)))
+
+        return action
+
+#------------------------------------------------------------------------------
+
+def generateProfile(joystickType, numShiftLevels = 0, numShiftStates = 2,
+                    numVirtualControls = 0, mix = defaultMix, seed = 42,
+                    name = None, numValueRanges = None, shiftActive = False):
+    """Generate a profile for the given joystick type.
+
+    The value range actions have the given number of ranges (see
+    ActionGenerator). If shiftActive is True, the profiles of the keys and
+    the axes are shift-active.
+
+    ValueError is raised if the joystick type does not have enough keys for
+    the shift levels and the virtual controls."""
+    keys = list(joystickType.iterKeys)
+    axes = list(joystickType.iterAxes)
+
+    numKeysNeeded = getNumKeysNeeded(numShiftLevels, numShiftStates,
+                                     numVirtualControls)
+    if numShiftStates<2:
+        raise ValueError("a shift level must have at least 2 states")
+    if numKeysNeeded>len(keys):
+        raise ValueError("%d keys are needed for the shift levels and the virtual controls" %
+                         (numKeysNeeded,))
+
+    if name is None:
+        name = "Synthetic %dk-%da-%dx%ds-%dv" % \
+            (len(keys), len(axes), numShiftLevels, numShiftStates,
+             numVirtualControls)
+    identity = joystickType.identity
+    identity = JoystickIdentity(identity.inputID, identity.name,
+                                "usb-0000:00:14.0-1/input0", None)
+    profile = Profile(joystickType, name, identity)
+    Control.setProfile(profile)
+
+    keyIndex = 0
+    for levelIndex in range(0, numShiftLevels):
+        shiftLevel = \
+            generateShiftLevel(keys[keyIndex:keyIndex + numShiftStates - 1])
+        profile.insertShiftLevel(levelIndex, shiftLevel)
+        keyIndex += numShiftStates - 1
+
+    if shiftActive:
+        numStatesSequence = [numShiftStates] * numShiftLevels
+        for key in keys[keyIndex:]:
+            keyProfile = KeyProfile(key.code, shiftActive = True)
+            keyProfile.completeHandlerTree(numStatesSequence)
+            profile.addControlProfile(keyProfile)
+        for axis in axes:
+            axisProfile = AxisProfile(axis.code, shiftActive = True)
+            axisProfile.completeHandlerTree(numStatesSequence)
+            profile.addControlProfile(axisProfile)
+
+    virtualControls = []
+    for index in range(0, numVirtualControls):
+        virtualControl = profile.addVirtualControl("Virtual %d" % (index + 1,))
+        control = Control(Control.TYPE_KEY, keys[keyIndex].code)
+        for value in [0, 1]:
+            state = DisplayVirtualState("%s %s" %
+                                        (Key.getNameFor(control.code),
+                                         "pressed" if value else "released"))
+            state.addConstraint(SingleValueConstraint(control, value))
+            virtualControl.addState(state)
+        virtualControls.append(virtualControl)
+        keyIndex += 1
+
+    generator = ActionGenerator(mix, seed, numValueRanges = numValueRanges)
+    shiftStateSequences = \
+        [list(sequence) for sequence in
+         itertools.product(*[range(0, numShiftStates)
+                             for level in range(0, numShiftLevels)])]
+    for shiftStateSequence in shiftStateSequences:
+        for key in keys[keyIndex:]:
+            profile.setAction(key, None, shiftStateSequence,
+                              generator.generate(key))
+        for axis in axes:
+            profile.setAction(axis, None, shiftStateSequence,
+                              generator.generate(axis))
+        for virtualControl in virtualControls:
+            for state in virtualControl.states:
+                profile.setAction(virtualControl, state, shiftStateSequence,
+                                  generator.generate(state))
+
+    return profile
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# Benchmark of the offline execution of a profile
+#
+# The given profile of the given joystick type is executed by the profile
+# engine (see jsprog.engine) with a stream of random events of the keys and
+# axes of the joystick type. If no joystick type and profile are given, a
+# synthetic joystick type with 32 keys and 8 axes and a profile for it with
+# a shift level and 2 virtual controls are generated (see
+# benchmarks.synthetic). Its actions are of the types the engine executes,
+# i.e. there are no script actions. The keys are pressed and released alternately,
+# and the axes are moved to random values within their ranges. The events
+# follow each other with random gaps of a few milliseconds. The number of
+# events processed per second and the number of output events produced are
+# printed. If requested, the output events are written to a file, one event
+# per line, so that the outputs of different versions of the code can be
+# compared.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.synthetic import generateJoystickType, generateProfile
+
+from jsprog.device import JoystickType
+from jsprog.profile import Profile
+from jsprog.parser import Control
+from jsprog.engine import ProfileEngine
+
+#------------------------------------------------------------------------------
+
+def generateEvents(joystickType, numEvents, seed):
+    """Generate the given number of random events for the controls of the
+    given joystick type.
+
+    Returns a list of tuples of the time, the type, the code and the value
+    of the events."""
+    rnd = random.Random(seed)
+
+    controls = [(Control.TYPE_KEY, key.code, 0, 1)
+                for key in joystickType.iterKeys] + \
+        [(Control.TYPE_AXIS, axis.code, axis.minimum, axis.maximum)
+         for axis in joystickType.iterAxes]
+    keyValues = {}
+
+    events = []
+    eventTime = 0
+    for i in range(0, numEvents):
+        eventTime += rnd.randint(0, 10)
+        (type, code, minimum, maximum) = rnd.choice(controls)
+        if type==Control.TYPE_KEY:
+            value = 1 - keyValues.get(code, 0)
+            keyValues[code] = value
+        else:
+            value = rnd.randint(minimum, maximum)
+        events.append((eventTime, type, code, value))
+
+    return events
+
+#------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the offline execution of a profile")
+    parser.add_argument(dest = "joystickType", nargs = "?", default = None,
+                        help = "the file containing the joystick type")
+    parser.add_argument(dest = "profile", nargs = "?", default = None,
+                        help = "the file containing the profile")
+    parser.add_argument("-n", "--events", dest = "numEvents", type = int,
+                        default = 1000000,
+                        help = "the number of input events to process")
+    parser.add_argument("-s", "--seed", dest = "seed", type = int,
+                        default = 42,
+                        help = "the seed of the random events")
+    parser.add_argument("-o", "--output", dest = "output", default = None,
+                        help = "write the output events to the given file")
+    args = parser.parse_args()
+
+    if args.joystickType is None:
+        joystickType = generateJoystickType(32, 8)
+        profile = generateProfile(joystickType, numShiftLevels = 1,
+                                  numVirtualControls = 2,
+                                  mix = { "simple": 4, "advanced": 1,
+                                          "mouseMove": 1, "valueRange": 1 },
+                                  seed = args.seed)
+    elif args.profile is None:
+        parser.error("a profile should be given for the joystick type")
+    else:
+        joystickType = JoystickType.fromFile(args.joystickType)
+        profile = Profile.loadFromFile(joystickType, args.profile)
+        if profile is None:
+            print("Failed to load the profile from %s" % (args.profile,),
+                  file=sys.stderr)
+            sys.exit(1)
+
+    events = generateEvents(joystickType, args.numEvents, args.seed)
+
+    engine = ProfileEngine(profile)
+
+    start = time.perf_counter()
+    engine.processEvents(events)
+    elapsed = time.perf_counter() - start
+
+    outputEvents = engine.outputEvents
+    print("%d events in %.3f s: %.0f events/s, %d output events" %
+          (len(events), elapsed, len(events) / elapsed, len(outputEvents)))
+
+    if args.output:
+        with open(args.output, "wt") as f:
+            for (eventTime, type, code, value) in outputEvents:
+                print("%d %d %d %d" % (eventTime, type, code, value), file = f)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Benchmark of loading profiles with and without the profile cache
+#
+# A directory with a number of synthetic profiles (200 by default, see
+# benchmarks.synthetic) is created for a joystick type, each having a shift
+# level and different actions, and the time of loading all of them is
+# measured
+# - by parsing the XML documents,
+# - with an empty cache (i.e. parsing and storing the cache files),
+# - with a valid cache.
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.synthetic import generateProfile
+
+from jsprog.device import JoystickType
+from jsprog.profile import Profile
+from jsprog.profilecache import ProfileCache
+
+#------------------------------------------------------------------------------
+
+def measure(fun, repeat):
+    """Call the given function the given number of times and return the
+    minimal time it took in seconds, and the last result."""
+    best = None
+    for i in range(0, repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return (best, result)
+
+#------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the loading of profiles with the profile cache")
+    parser.add_argument("-t", "--type", dest = "typePath",
+                        default = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                               "..", "data", "devices",
+                                               "usbV06a3P0bac", "type.xml"),
+                        help = "the joystick type descriptor to use")
+    parser.add_argument("-n", "--count", dest = "count", type = int,
+                        default = 200,
+                        help = "the number of profiles to generate")
+    parser.add_argument("-r", "--repeat", dest = "repeat", type = int,
+                        default = 5,
+                        help = "the number of times each measurement is repeated")
+    args = parser.parse_args()
+
+    joystickType = JoystickType.fromFile(args.typePath)
+    if joystickType is None:
+        print("Could not load the joystick type from", args.typePath,
+              file=sys.stderr)
+        sys.exit(1)
+
+    workDirectory = tempfile.mkdtemp(prefix = "jsprog-profilecache-")
+    try:
+        profileDirectory = os.path.join(workDirectory, "profiles")
+        cacheDirectory = os.path.join(workDirectory, "cache")
+        os.makedirs(profileDirectory)
+
+        totalSize = 0
+        for index in range(0, args.count):
+            profile = generateProfile(joystickType, numShiftLevels = 1,
+                                      seed = index,
+                                      name = "Profile %d" % (index,))
+            profile.fileName = "profile%03d" % (index,)
+            path = os.path.join(profileDirectory, profile.fileName + ".profile")
+            with open(path, "wt") as f:
+                profile.getXMLDocument().writexml(f, addindent = "  ",
+                                                  newl = "\n")
+            totalSize += os.path.getsize(path)
+
+        def loadXML():
+            return list(Profile.loadFrom(joystickType, profileDirectory))
+
+        def loadColdCache():
+            shutil.rmtree(cacheDirectory, ignore_errors = True)
+            cache = ProfileCache(cacheDirectory)
+            return list(Profile.loadFrom(joystickType, profileDirectory,
+                                         cache = cache))
+
+        def loadWarmCache():
+            cache = ProfileCache(cacheDirectory)
+            return list(Profile.loadFrom(joystickType, profileDirectory,
+                                         cache = cache))
+
+        (xmlTime, xmlProfiles) = measure(loadXML, args.repeat)
+        (coldTime, _profiles) = measure(loadColdCache, args.repeat)
+        (warmTime, warmProfiles) = measure(loadWarmCache, args.repeat)
+
+        xmlDocuments = sorted([p.getXMLDocument().toxml() for p in xmlProfiles])
+        warmDocuments = sorted([p.getXMLDocument().toxml() for p in warmProfiles])
+        if xmlDocuments!=warmDocuments:
+            print("The profiles loaded from the cache differ from those loaded from XML!",
+                  file=sys.stderr)
+            sys.exit(1)
+
+        cacheSize = sum([os.path.getsize(os.path.join(cacheDirectory, entry))
+                         for entry in os.listdir(cacheDirectory)])
+
+        print("Profiles:        %d (%d bytes of XML, %d bytes of cache)" %
+              (len(xmlProfiles), totalSize, cacheSize))
+        print("XML:             %8.2f ms" % (xmlTime * 1000.0,))
+        print("Cache (cold):    %8.2f ms" % (coldTime * 1000.0,))
+        print("Cache (warm):    %8.2f ms (%.2fx)" %
+              (warmTime * 1000.0, xmlTime / warmTime))
+    finally:
+        shutil.rmtree(workDirectory, ignore_errors = True)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+# Generator of synthetic profiles and the scaling report of their processing
+#
+# The 'generate' command writes a synthetic joystick type (type.xml) and a
+# profile for it into a directory (see benchmarks.synthetic for the
+# structure of the profiles).
+#
+# The 'scale' command generates a series of profiles in which one dimension
+# (the number of keys, axes, shift levels, shift states or virtual controls)
+# takes the given values while the others are fixed, and for each of them it
+# reports:
+# - the size of the profile XML,
+# - the time of parsing the profile XML,
+# - the time of generating the code for the daemon,
+# - the size of the generated Lua code,
+# - the peak memory allocated while parsing the profile, which is roughly
+#   the memory the profile occupies.
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from xml.sax import make_parser
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.synthetic import generateJoystickType, generateProfile, \
+    getNumKeysNeeded, parseMix, defaultMix
+
+from jsprog.profile import ProfileHandler
+
+#------------------------------------------------------------------------------
+
+## The dimensions that can be varied by the scale command mapped to the names
+## of the arguments
+dimensions = { "keys": "numKeys", "axes": "numAxes",
+               "levels": "numShiftLevels", "states": "numShiftStates",
+               "virtual": "numVirtualControls" }
+
+#------------------------------------------------------------------------------
+
+def measure(fun, repeat):
+    """Call the given function the given number of times and return the
+    minimal time it took in seconds, and the last result."""
+    best = None
+    for i in range(0, repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return (best, result)
+
+#------------------------------------------------------------------------------
+
+def generate(numKeys, numAxes, numShiftLevels, numShiftStates,
+             numVirtualControls, mix, seed):
+    """Generate a joystick type and a profile with the given parameters.
+
+    The joystick type has at least as many extra keys as needed by the
+    shift levels and the virtual controls.
+
+    Returns a tuple of the joystick type and the profile."""
+    joystickType = \
+        generateJoystickType(numKeys +
+                             getNumKeysNeeded(numShiftLevels, numShiftStates,
+                                              numVirtualControls),
+                             numAxes)
+    profile = generateProfile(joystickType,
+                              numShiftLevels = numShiftLevels,
+                              numShiftStates = numShiftStates,
+                              numVirtualControls = numVirtualControls,
+                              mix = mix, seed = seed)
+    return (joystickType, profile)
+
+#------------------------------------------------------------------------------
+
+def getLuaSize(daemonCode):
+    """Get the size of the Lua code in the given daemon code in bytes."""
+    lines = daemonCode.getPrologueLines() + daemonCode.epilogueLines
+    for control in daemonCode.handlerControls:
+        lines += daemonCode.handlers[control]
+    return sum([len(line.encode("utf-8")) + 1 for line in lines])
+
+#------------------------------------------------------------------------------
+
+def scale(args, parameters):
+    """Produce the scaling report for the given parameters, one of which is
+    varied.
+
+    Returns a list of dictionaries with the results of the measurements."""
+    results = []
+    for value in args.values:
+        parameters[dimensions[args.dimension]] = value
+        (joystickType, profile) = generate(mix = args.mix, seed = args.seed,
+                                           **parameters)
+        document = profile.getXMLDocument().toxml(encoding = "utf-8")
+
+        parser = make_parser()
+        handler = ProfileHandler(joystickType)
+        parser.setContentHandler(handler)
+
+        def parse():
+            parser.parse(io.BytesIO(document))
+            return handler.profile
+
+        (parseTime, _profile) = measure(parse, args.repeat)
+        (codegenTime, daemonCode) = measure(profile.getDaemonCode,
+                                            args.repeat)
+
+        _profile = None
+        tracemalloc.start()
+        parse()
+        (_current, peakMemory) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result = { args.dimension: value,
+                   "xmlSize": len(document),
+                   "parseTime": parseTime,
+                   "codegenTime": codegenTime,
+                   "luaSize": getLuaSize(daemonCode),
+                   "peakMemory": peakMemory }
+        results.append(result)
+
+        if not args.json:
+            print("%10d %12d %12.2f %12.2f %12d %12d" %
+                  (value, result["xmlSize"], parseTime * 1000.0,
+                   codegenTime * 1000.0, result["luaSize"],
+                   peakMemory // 1024))
+            sys.stdout.flush()
+
+    return results
+
+#------------------------------------------------------------------------------
+
+def mixType(text):
+    """Convert the given text into a mix of action types for argparse."""
+    try:
+        return parseMix(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+#------------------------------------------------------------------------------
+
+def valuesType(text):
+    """Convert the given comma-separated list of integers for argparse."""
+    try:
+        return [int(value) for value in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid list of integers: '%s'" %
+                                         (text,))
+
+#------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Generate synthetic profiles and report the scaling of their processing")
+    parser.add_argument("-k", "--keys", dest = "numKeys", type = int,
+                        default = 32,
+                        help = "the number of keys having actions")
+    parser.add_argument("-a", "--axes", dest = "numAxes", type = int,
+                        default = 8,
+                        help = "the number of axes")
+    parser.add_argument("-l", "--levels", dest = "numShiftLevels", type = int,
+                        default = 1,
+                        help = "the number of shift levels")
+    parser.add_argument("-s", "--states", dest = "numShiftStates", type = int,
+                        default = 2,
+                        help = "the number of states of each shift level")
+    parser.add_argument("-v", "--virtual", dest = "numVirtualControls",
+                        type = int, default = 0,
+                        help = "the number of virtual controls")
+    parser.add_argument("-m", "--mix", dest = "mix", type = mixType,
+                        default = defaultMix,
+                        help = "the weights of the action types, e.g. 'simple=4,advanced=1,mouseMove=1,script=1,valueRange=1'")
+    parser.add_argument("--seed", dest = "seed", type = int, default = 42,
+                        help = "the seed of the random actions")
+
+    subparsers = parser.add_subparsers(title = "commands", dest = "command")
+    subparsers.required = True
+
+    generateParser = subparsers.add_parser("generate",
+                                           help = "write a joystick type and a profile into a directory")
+    generateParser.add_argument(dest = "directory",
+                                help = "the directory to write the files into")
+
+    scaleParser = subparsers.add_parser("scale",
+                                        help = "report the scaling of the processing along a dimension")
+    scaleParser.add_argument(dest = "dimension",
+                             choices = sorted(dimensions.keys()),
+                             help = "the dimension to vary")
+    scaleParser.add_argument(dest = "values", type = valuesType,
+                             help = "the comma-separated values of the dimension")
+    scaleParser.add_argument("-r", "--repeat", dest = "repeat", type = int,
+                             default = 3,
+                             help = "the number of times each measurement is repeated")
+    scaleParser.add_argument("-j", "--json", dest = "json",
+                             action = "store_true",
+                             help = "print the results as JSON")
+
+    args = parser.parse_args()
+
+    parameters = { name: getattr(args, name) for name in dimensions.values() }
+
+    try:
+        if args.command=="generate":
+            (joystickType, profile) = generate(mix = args.mix,
+                                               seed = args.seed, **parameters)
+            os.makedirs(args.directory, exist_ok = True)
+            with open(os.path.join(args.directory, "type.xml"), "wt") as f:
+                joystickType.getXMLDocument().writexml(f, addindent = "  ",
+                                                       newl = "\n")
+            with open(os.path.join(args.directory, "synthetic.profile"),
+                      "wt") as f:
+                profile.getXMLDocument().writexml(f, addindent = "  ",
+                                                  newl = "\n")
+        else:
+            if not args.json:
+                print("%10s %12s %12s %12s %12s %12s" %
+                      (args.dimension, "XML bytes", "parse ms", "codegen ms",
+                       "Lua bytes", "memory KiB"))
+            results = scale(args, parameters)
+            if args.json:
+                json.dump(results, sys.stdout, indent = 1, sort_keys = True)
+                print()
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+# Benchmark of the updaters in the generated Lua code
+#
+# A synthetic joystick type and a profile are generated (see
+# benchmarks.synthetic) with a shift key and a number of shift-active keys
+# (64 by default) having different script actions in the two shift states.
+# Script actions are used, as they need no threads or timers, which are
+# stubbed out here. While such a key is pressed, its update function is
+# registered as an updater, which is called whenever the shift state
+# changes.
+#
+# The daemon code of the profile is run by the given Lua interpreter with
+# stub versions of the daemon's functions. All keys are pressed in a random
+# order, then the shift key is pressed and released a number of times, and
+# finally the keys are released in a random order. The time of each phase
+# is measured with the updater set generated by the profile and with the
+# array-based updater list used previously, which is kept here for
+# reference.
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.synthetic import generateJoystickType, generateProfile
+
+from jsprog.joystick import Key
+from jsprog.util import linesToText
+
+#------------------------------------------------------------------------------
+
+# The array-based updater list generated previously
+legacyUpdaters = """
+_jsprog_updaters = {}
+
+function _jsprog_updaters_add(fn)
+  table.insert(_jsprog_updaters, fn)
+end
+
+function _jsprog_updaters_remove(fn)
+  for i, updater in ipairs(_jsprog_updaters) do
+    if fn == updater then
+      table.remove(_jsprog_updaters, i)
+      break
+    end
+  end
+end
+
+function _jsprog_updaters_call()
+  for i, updater in ipairs(_jsprog_updaters) do
+    updater()
+  end
+end
+"""
+
+# The stubs of the functions and constants provided by the daemon
+daemonStubs = """
+local function _jsprog_stub() end
+setmetatable(_G, {
+  __index = function(t, name)
+    if string.sub(name, 1, 7) == "jsprog_" then return _jsprog_stub end
+  end
+})
+"""
+
+#------------------------------------------------------------------------------
+
+def generateBenchmark(profile, shiftKey, keys, numFlips, legacy):
+    """Generate the Lua code of the benchmark.
+
+    If legacy is True, the array-based updater list is used.
+
+    Returns an array of lines."""
+    document = profile.getDaemonXMLDocument()
+
+    lines = ["do"]
+    lines += daemonStubs.splitlines()
+
+    prologue = document.getElementsByTagName("prologue")[0]
+    lines += prologue.firstChild.data.splitlines()
+
+    if legacy:
+        lines += legacyUpdaters.splitlines()
+
+    handlerNames = {}
+    for element in document.documentElement.childNodes:
+        if element.nodeName in ["key", "axis"]:
+            name = element.getAttribute("name")
+            handlerName = "_benchmark_%s_handler" % (name,)
+            handlerNames[name] = handlerName
+            lines.append("function %s(type, code, value)" % (handlerName,))
+            lines += element.firstChild.data.splitlines()
+            lines.append("end")
+
+    random.seed(42)
+    pressOrder = [Key.getNameFor(key.code) for key in keys]
+    random.shuffle(pressOrder)
+    releaseOrder = pressOrder[:]
+    random.shuffle(releaseOrder)
+
+    shiftHandler = handlerNames[Key.getNameFor(shiftKey.code)]
+
+    lines.append("local pressHandlers = { %s }" %
+                 (", ".join([handlerNames[name] for name in pressOrder]),))
+    lines.append("local releaseHandlers = { %s }" %
+                 (", ".join([handlerNames[name] for name in releaseOrder]),))
+    lines.append("local pressTime, flipTime, releaseTime = 0, 0, 0")
+    lines.append("for round = 1, %d do" % (numFlips // 100,))
+    lines.append("  local start = os.clock()")
+    lines.append("  for _, handler in ipairs(pressHandlers) do")
+    lines.append("    handler(1, 0, 1)")
+    lines.append("  end")
+    lines.append("  pressTime = pressTime + os.clock() - start")
+    lines.append("  start = os.clock()")
+    lines.append("  for flip = 1, 50 do")
+    lines.append("    %s(1, 0, 1)" % (shiftHandler,))
+    lines.append("    %s(1, 0, 0)" % (shiftHandler,))
+    lines.append("  end")
+    lines.append("  flipTime = flipTime + os.clock() - start")
+    lines.append("  start = os.clock()")
+    lines.append("  for _, handler in ipairs(releaseHandlers) do")
+    lines.append("    handler(1, 0, 0)")
+    lines.append("  end")
+    lines.append("  releaseTime = releaseTime + os.clock() - start")
+    lines.append("end")
+
+    numRounds = numFlips // 100
+    lines.append("print(string.format(\"%%-8s press: %%7.2f us/key, shift flip: %%7.2f us, release: %%7.2f us/key\", \"%s\"," %
+                 ("array" if legacy else "set",))
+    lines.append("  pressTime * 1e6 / %d, flipTime * 1e6 / %d, releaseTime * 1e6 / %d))" %
+                 (numRounds * len(keys), numRounds * 100,
+                  numRounds * len(keys)))
+    lines.append("end")
+
+    return lines
+
+#------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the updaters in the generated Lua code")
+    parser.add_argument("-k", "--keys", dest = "numKeys", type = int,
+                        default = 64,
+                        help = "the number of shift-active keys")
+    parser.add_argument("-f", "--flips", dest = "numFlips", type = int,
+                        default = 20000,
+                        help = "the number of shift state changes")
+    parser.add_argument("-l", "--lua", dest = "lua", default = "lua",
+                        help = "the Lua interpreter to run the benchmark with")
+    parser.add_argument("-o", "--output", dest = "output", default = None,
+                        help = "write the Lua program to the given file instead of running it")
+    args = parser.parse_args()
+
+    try:
+        joystickType = generateJoystickType(args.numKeys + 1, 0)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    profile = generateProfile(joystickType, numShiftLevels = 1,
+                              mix = { "script": 1 }, name = "Updaters",
+                              shiftActive = True)
+    keys = list(joystickType.iterKeys)
+    (shiftKey, keys) = (keys[0], keys[1:])
+
+    lines = []
+    for legacy in [True, False]:
+        lines += generateBenchmark(profile, shiftKey, keys, args.numFlips,
+                                   legacy)
+
+    program = linesToText(lines)
+
+    if args.output:
+        with open(args.output, "wt") as f:
+            f.write(program)
+    else:
+        sys.exit(subprocess.run([args.lua, "-"],
+                                input = program.encode()).returncode)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# Benchmark of selecting the state of an axis by its value in Lua
+#
+# An axis profile is generated (see benchmarks.synthetic) with a number of
+# value ranges of equal width covering the range of the axis, and the Lua
+# code computing its shifted state is produced with each value range
+# dispatch mode: the ranges checked one after the other, a binary search
+# over the boundaries of the ranges and a lookup table indexed by the value. A Lua program is then generated, which
+# feeds the same random values to all variants, checks that they compute the
+# same states and measures the time spent per value. The program is run by
+# the given Lua interpreter, or it is written to a file. The output also
+# tells which variant the code generator would choose automatically.
+#
+# Two axes are measured:
+# - a small one with values from 0 to 255,
+# - a wide one with values from -32768 to 32767, for which no lookup table
+#   can be used, so the table variant falls back to the binary search.
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.synthetic import generateJoystickType, generateProfile
+
+from jsprog.profile import Profile, ValueRangeDispatcher
+from jsprog.util import appendLinesIndented, linesToText
+
+#------------------------------------------------------------------------------
+
+# The dispatch modes measured
+dispatches = [("linear", Profile.VALUE_RANGE_DISPATCH_LINEAR),
+              ("binary", Profile.VALUE_RANGE_DISPATCH_BINARY),
+              ("table", Profile.VALUE_RANGE_DISPATCH_TABLE)]
+
+#------------------------------------------------------------------------------
+
+def generateBenchmark(name, minimum, maximum, numRanges, numValues):
+    """Generate the Lua code benchmarking the given axis.
+
+    Returns an array of lines."""
+    joystickType = generateJoystickType(0, 1, minimum = minimum,
+                                        maximum = maximum)
+    profile = generateProfile(joystickType, mix = { "valueRange": 1 },
+                              name = "Value ranges",
+                              numValueRanges = numRanges)
+    axisProfile = profile.findAxisProfile(list(joystickType.iterAxes)[0].code)
+    control = axisProfile.control
+
+    lines = []
+    lines.append("do")
+
+    body = []
+    body.append("%s = 0" % (control.luaValueName,))
+    body.append("")
+
+    for (dispatchName, dispatch) in dispatches:
+        dispatcher = ValueRangeDispatcher(profile, control,
+                                          dispatch = dispatch)
+        stateLines = dispatcher.getStateLuaCode(axisProfile.handlerTree)
+        body += [line.replace("_valueRangeTable",
+                              "_%sValueRangeTable" % (dispatchName,))
+                 for line in dispatcher.tableLines]
+        body.append("local function %sState()" % (dispatchName,))
+        appendLinesIndented(body,
+                            [line.replace("_valueRangeTable",
+                                          "_%sValueRangeTable" % (dispatchName,))
+                             for line in stateLines],
+                            "  ")
+        body.append("end")
+        body.append("")
+
+    random.seed(42)
+    body.append("local values = {")
+    values = [str(random.randint(minimum, maximum))
+              for i in range(0, min(numValues, 4096))]
+    for index in range(0, len(values), 16):
+        body.append("  " + ", ".join(values[index:index+16]) + ",")
+    body.append("}")
+    body.append("local numValues = #values")
+    body.append("")
+
+    body.append("local function noState()")
+    body.append("  return 0")
+    body.append("end")
+    body.append("")
+
+    body.append("local function run(getState)")
+    body.append("  local start = os.clock()")
+    body.append("  for i = 1, %d do" % (numValues,))
+    body.append("    %s = values[(i - 1) %% numValues + 1]" %
+                (control.luaValueName,))
+    body.append("    getState()")
+    body.append("  end")
+    body.append("  return os.clock() - start")
+    body.append("end")
+    body.append("")
+
+    body.append("for i = 1, numValues do")
+    body.append("  %s = values[i]" % (control.luaValueName,))
+    body.append("  local state = linearState()")
+    body.append("  if binaryState() ~= state or tableState() ~= state then")
+    body.append("    error(\"state mismatch for value \" .. values[i])")
+    body.append("  end")
+    body.append("end")
+    body.append("")
+
+    body.append("local baseTime = run(noState)")
+    body.append("local function perValue(getState)")
+    body.append("  return (run(getState) - baseTime) * 1e9 / %d" %
+                (numValues,))
+    body.append("end")
+
+    dispatch = ValueRangeDispatcher.selectDispatch(
+        Profile.VALUE_RANGE_DISPATCH_AUTO, numRanges,
+        ValueRangeDispatcher.getSegments([(minimum, maximum, 1)]))
+    body.append("print(string.format(\"%-6s %3d ranges: linear %7.1f ns/value, binary %7.1f ns/value, table %7.1f ns/value, generated: %s\",")
+    body.append("                    \"%s\", %d, perValue(linearState), perValue(binaryState)," %
+                (name, numRanges))
+    body.append("                    perValue(tableState), \"%s\"))" %
+                (Profile.getValueRangeDispatchNameFor(dispatch),))
+
+    appendLinesIndented(lines, body, "  ")
+    lines.append("end")
+
+    return lines
+
+#------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the selection of axis states by value ranges in Lua")
+    parser.add_argument("-r", "--ranges", dest = "numRanges", type = int,
+                        action = "append", default = None,
+                        help = "the number of value ranges (may be given more than once)")
+    parser.add_argument("-n", "--values", dest = "numValues", type = int,
+                        default = 1000000,
+                        help = "the number of axis values to process")
+    parser.add_argument("-l", "--lua", dest = "lua", default = "lua",
+                        help = "the Lua interpreter to run the benchmark with")
+    parser.add_argument("-o", "--output", dest = "output", default = None,
+                        help = "write the Lua program to the given file instead of running it")
+    args = parser.parse_args()
+
+    lines = []
+    for (name, minimum, maximum) in [("small", 0, 255),
+                                     ("wide", -32768, 32767)]:
+        for numRanges in args.numRanges or [2, 4, 8, 16, 32]:
+            lines += generateBenchmark(name, minimum, maximum, numRanges,
+                                       args.numValues)
+
+    program = linesToText(lines)
+
+    if args.output:
+        with open(args.output, "wt") as f:
+            f.write(program)
+    else:
+        sys.exit(subprocess.run([args.lua, "-"],
+                                input = program.encode()).returncode)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# Benchmark of computing the states of shift levels in Lua
+#
+# A shift level is generated for a number of keys of a joystick type, and the
+# Lua code computing its state is produced both as a chain of conditions and
+# as a lookup table indexed by the packed values of the keys. A Lua program
+# is then generated, which feeds the same random key events to both variants,
+# checks that they compute the same states and measures the time spent per
+# event. The program is run by the given Lua interpreter, or it is written to
+# a file. The output also tells which variant the code generator would choose
+# for the shift level.
+#
+# Two kinds of shift levels are measured (see
+# benchmarks.synthetic.generateShiftLevel()):
+# - a sparse one, where each key alone selects a state,
+# - a full one, where each combination of the keys selects a different state.
+
+import argparse
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.synthetic import generateShiftLevel
+
+from jsprog.device import JoystickType
+from jsprog.profile import Profile
+from jsprog.parser import Control
+from jsprog.util import appendLinesIndented, linesToText
+
+#------------------------------------------------------------------------------
+
+def generateBenchmark(profile, name, shiftLevel, keys, numEvents):
+    """Generate the Lua code benchmarking the given shift level.
+
+    Returns an array of lines."""
+    controls = [Control(Control.TYPE_KEY, key.code) for key in keys]
+
+    lines = []
+    lines.append("do")
+
+    body = []
+    for control in controls:
+        body.append("%s = 0" % (control.luaValueName,))
+    body.append("local names = { %s }" %
+                (", ".join(['"%s"' % (c.luaValueName,) for c in controls]),))
+    body.append("")
+
+    body.append("chainState = 0")
+    body.append("function chainUpdate()")
+    appendLinesIndented(body,
+                        shiftLevel.getValueLuaCode(profile, "chainState"),
+                        "  ")
+    body.append("end")
+    body.append("")
+
+    tableLines = shiftLevel.getValueLuaTableCode(profile, "stateTable",
+                                                 alwaysTable = True)
+    if not tableLines:
+        print("No lookup table can be used for the %s shift level" % (name,),
+              file=sys.stderr)
+        sys.exit(1)
+    body += tableLines
+    body.append("tableState = 0")
+    body.append("function tableUpdate()")
+    appendLinesIndented(body,
+                        shiftLevel.getValueLuaCode(profile, "tableState",
+                                                   tableName = "stateTable",
+                                                   alwaysTable = True),
+                        "  ")
+    body.append("end")
+    body.append("")
+
+    body.append("function noUpdate()")
+    body.append("end")
+    body.append("")
+
+    body.append("math.randomseed(42)")
+    body.append("local eventNames, eventValues = {}, {}")
+    body.append("for i = 1, %d do" % (numEvents,))
+    body.append("  eventNames[i] = names[math.random(#names)]")
+    body.append("  eventValues[i] = math.random(0, 1)")
+    body.append("end")
+    body.append("")
+
+    body.append("local function run(update)")
+    body.append("  for _, name in ipairs(names) do _G[name] = 0 end")
+    body.append("  local start = os.clock()")
+    body.append("  for i = 1, %d do" % (numEvents,))
+    body.append("    _G[eventNames[i]] = eventValues[i]")
+    body.append("    update()")
+    body.append("  end")
+    body.append("  return os.clock() - start")
+    body.append("end")
+    body.append("")
+
+    body.append("for _, name in ipairs(names) do _G[name] = 0 end")
+    body.append("for i = 1, %d do" % (numEvents,))
+    body.append("  _G[eventNames[i]] = eventValues[i]")
+    body.append("  chainUpdate()")
+    body.append("  tableUpdate()")
+    body.append("  if chainState ~= tableState then")
+    body.append("    error(\"state mismatch at event \" .. i)")
+    body.append("  end")
+    body.append("end")
+    body.append("")
+
+    body.append("local baseTime = run(noUpdate)")
+    body.append("local chainTime = run(chainUpdate)")
+    body.append("local tableTime = run(tableUpdate)")
+    body.append("local function perEvent(t)")
+    body.append("  return (t - baseTime) * 1e9 / %d" % (numEvents,))
+    body.append("end")
+    chosen = "chain" if shiftLevel.getLuaTableLayout(profile) is None \
+        else "table"
+    body.append("print(string.format(\"%-8s %2d states: chain %7.1f ns/event, table %7.1f ns/event (%.2fx), generated: %s\",")
+    body.append("                    \"%s\", %d, perEvent(chainTime), perEvent(tableTime)," %
+                (name, shiftLevel.numStates))
+    body.append("                    perEvent(chainTime) / perEvent(tableTime), \"%s\"))" %
+                (chosen,))
+
+    appendLinesIndented(lines, body, "  ")
+    lines.append("end")
+
+    return lines
+
+#------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the computation of shift level states in Lua")
+    parser.add_argument("-t", "--type", dest = "typePath",
+                        default = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                               "..", "data", "devices",
+                                               "usbV06a3P0bac", "type.xml"),
+                        help = "the joystick type descriptor to use")
+    parser.add_argument("-k", "--keys", dest = "numKeys", type = int,
+                        default = 4,
+                        help = "the number of keys the shift levels depend on")
+    parser.add_argument("-n", "--events", dest = "numEvents", type = int,
+                        default = 1000000,
+                        help = "the number of key events to process")
+    parser.add_argument("-l", "--lua", dest = "lua", default = "lua",
+                        help = "the Lua interpreter to run the benchmark with")
+    parser.add_argument("-o", "--output", dest = "output", default = None,
+                        help = "write the Lua program to the given file instead of running it")
+    args = parser.parse_args()
+
+    joystickType = JoystickType.fromFile(args.typePath)
+    if joystickType is None:
+        print("Could not load the joystick type from", args.typePath,
+              file=sys.stderr)
+        sys.exit(1)
+
+    keys = list(joystickType.iterKeys)[:args.numKeys]
+    if len(keys)<args.numKeys:
+        print("The joystick type has only %d keys" % (len(keys),),
+              file=sys.stderr)
+        sys.exit(1)
+
+    profile = Profile(joystickType, "Benchmark", joystickType.identity)
+    Control.setProfile(profile)
+
+    lines = []
+    for (name, full) in [("sparse", False), ("full", True)]:
+        shiftLevel = generateShiftLevel(keys, full)
+        lines += generateBenchmark(profile, name, shiftLevel, keys,
+                                   args.numEvents)
+
+    program = linesToText(lines)
+
+    if args.output:
+        with open(args.output, "wt") as f:
+            f.write(program)
+    else:
+        sys.exit(subprocess.run([args.lua, "-"],
+                                input = program.encode()).returncode)
@@ -1,5 +1,8 @@
 from .joystick import Key
-from .util import appendLinesIndented
+from .util import appendLinesIndented, formatLuaNumber
+
+import hashlib
+import math
 
 #------------------------------------------------------------------------------
 
@@ -98,6 +101,12 @@ class RepeatableAction(Action):
         action (if a thread is required)."""
         return "_jsprog_%s_thread" % (control.name,)
 
+    @staticmethod
+    def getSchedulerKeyLuaCode(control):
+        """Get the Lua expression of the key of the scheduler entry repeating
+        the action of the given control."""
+        return "\"%s\"" % (control.name,)
+
     def __init__(self, displayName = None, repeatDelay = None):
         """Construct the action with the given repeat delay."""
         super().__init__(displayName = displayName)
@@ -121,11 +130,26 @@ class RepeatableAction(Action):
         it contains one or more delays)."""
         return False
 
+    @property
+    def hasDelays(self):
+        """Indicate if the code of the action contains delays."""
+        return False
+
+    @property
+    def useScheduler(self):
+        """Indicate if the action is repeated by the scheduler of the
+        profile.
+
+        This is the case if there is a repeat delay, but no delays in the
+        code, which therefore need not run in a thread of its own."""
+        return self.repeatDelay is not None and not self.hasDelays
+
     @property
     def useThread(self):
         """Indicate if a thread must be used to execute the action."""
-        return self.repeatDelay is not None or self.enterCodeNeedsThread or \
-            self.leaveCodeNeedsThread
+        return not self.useScheduler and \
+            (self.repeatDelay is not None or self.enterCodeNeedsThread or
+             self.leaveCodeNeedsThread)
 
     def getEnterLuaCode(self, control):
         """Get the Lua code that starts the action.
@@ -140,12 +164,27 @@ class RepeatableAction(Action):
         infinite loop with the delay. Calls the child's _getLuaCode()
         function to get the code of the real action.
 
+        If the action is repeated by the scheduler (see useScheduler), the
+        enter code is executed right away, and the function executing the
+        enter or repeat code is registered with the scheduler.
+
         Returns an array of lines."""
         lines = []
 
         indentation = ""
 
-        if self.useThread:
+        if self.useScheduler:
+            lines += self._getEnterLuaCode(control)
+            lines.append("_jsprog_scheduler_add(%s, %d, function ()" %
+                         (RepeatableAction.getSchedulerKeyLuaCode(control),
+                          self.repeatDelay))
+            appendLinesIndented(lines,
+                                self._getRepeatLuaCode(control)
+                                if self.isRepeatDifferent
+                                else self._getEnterLuaCode(control),
+                                "  ")
+            lines.append("end)")
+        elif self.useThread:
             repeatFlagName = RepeatableAction.getRepeatFlagLuaName(control)
             threadName = RepeatableAction.getThreadLuaName(control)
 
@@ -214,10 +253,17 @@ class RepeatableAction(Action):
         If there is a repeat delay, this function generates a call to cancel
         the previous operation. Otherwise no code is generated.
 
+        If the action is repeated by the scheduler, its entry is removed and
+        the leave code is executed right away.
+
         Returns an array of lines."""
         lines = []
 
-        if self.useThread:
+        if self.useScheduler:
+            lines.append("_jsprog_scheduler_remove(%s)" %
+                         (RepeatableAction.getSchedulerKeyLuaCode(control),))
+            appendLinesIndented(lines, self._getLeaveLuaCode(control), "")
+        elif self.useThread:
             repeatFlagName = RepeatableAction.getRepeatFlagLuaName(control)
             threadName = RepeatableAction.getThreadLuaName(control)
 
@@ -331,6 +377,117 @@ class MouseMoveCommand(object):
     ## Direction constant: wheel
     DIRECTION_WHEEL = 3
 
+    ## Curve type: a polynomial of the adjusted value with the coefficients
+    ## a, b and c
+    CURVE_POLYNOMIAL = 1
+
+    ## Curve type: piecewise linear through the points
+    CURVE_LINEAR = 2
+
+    ## Curve type: piecewise cubic through the points (monotone, if the
+    ## points are monotone)
+    CURVE_CUBIC = 3
+
+    ## The mapping of curve types to strings
+    _curveNames = {
+        CURVE_POLYNOMIAL : "polynomial",
+        CURVE_LINEAR : "linear",
+        CURVE_CUBIC : "cubic"
+        }
+
+    ## The maximal number of values of an axis for which the distances are
+    ## precomputed
+    maxTableSize = 4096
+
+    @staticmethod
+    def getCurveNameFor(curve):
+        """Get the name of the given curve type."""
+        return MouseMoveCommand._curveNames[curve]
+
+    @staticmethod
+    def findCurveFor(curveName):
+        """Get the curve type for the given name."""
+        for (curve, name) in MouseMoveCommand._curveNames.items():
+            if name==curveName:
+                return curve
+        return None
+
+    @staticmethod
+    def parsePoints(text):
+        """Parse the given textual representation of the points of a curve.
+
+        The points are separated by whitespace, and each point consists of
+        the adjusted value and the distance separated by a colon. The values
+        should be increasing, and all numbers should be finite.
+
+        Returns the list of tuples of the values and the distances, or None
+        if the text is invalid."""
+        points = []
+        try:
+            for item in text.split():
+                (value, distance) = item.split(":")
+                (value, distance) = (float(value), float(distance))
+                if not math.isfinite(value) or not math.isfinite(distance):
+                    return None
+                points.append((value, distance))
+        except ValueError:
+            return None
+
+        for (point, nextPoint) in zip(points, points[1:]):
+            if point[0]>=nextPoint[0]:
+                return None
+
+        return points if len(points)>=2 else None
+
+    @staticmethod
+    def getPointsText(points):
+        """Get the textual representation of the given points."""
+        return " ".join(["%s:%s" % (formatLuaNumber(value),
+                                    formatLuaNumber(distance))
+                         for (value, distance) in points])
+
+    @staticmethod
+    def getSegments(curve, points):
+        """Get the segments of the curve of the given type through the given
+        points.
+
+        Returns a list of tuples of the first value of the segment and the
+        coefficients of the cubic polynomial of the offset from it."""
+        slopes = [(y1 - y0) / (x1 - x0)
+                  for ((x0, y0), (x1, y1)) in zip(points, points[1:])]
+
+        if curve==MouseMoveCommand.CURVE_LINEAR:
+            return [(x, y, slope, 0.0, 0.0)
+                    for ((x, y), slope) in zip(points, slopes)]
+
+        # Fritsch-Carlson tangents to keep the monotonicity of the points
+        tangents = [slopes[0]]
+        for (slope0, slope1) in zip(slopes, slopes[1:]):
+            tangents.append(0.0 if slope0*slope1<=0 else (slope0 + slope1) / 2)
+        tangents.append(slopes[-1])
+
+        for (index, slope) in enumerate(slopes):
+            if slope==0.0:
+                tangents[index] = tangents[index + 1] = 0.0
+            else:
+                alpha = tangents[index] / slope
+                beta = tangents[index + 1] / slope
+                if alpha*alpha + beta*beta>9:
+                    tau = 3 / math.sqrt(alpha*alpha + beta*beta)
+                    tangents[index] = tau * alpha * slope
+                    tangents[index + 1] = tau * beta * slope
+
+        segments = []
+        for (index, slope) in enumerate(slopes):
+            (x0, y0) = points[index]
+            h = points[index + 1][0] - x0
+            (m0, m1) = (tangents[index], tangents[index + 1])
+            segments.append((x0, y0, m0,
+                             (3 * slope - 2 * m0 - m1) / h,
+                             (m0 + m1 - 2 * slope) / (h * h)))
+
+        return segments
+
     @staticmethod
     def getDirectionNameFor(direction):
         """Get the direction name for the given direction."""
@@ -351,37 +508,146 @@ class MouseMoveCommand(object):
             return None
 
     def __init__(self, direction, a = 0.0, b = 0.0, c = 0.0,
-                 adjust = 0.0):
-        """Construct the mouse move command."""
+                 adjust = 0.0, curve = CURVE_POLYNOMIAL, points = None,
+                 precompute = False):
+        """Construct the mouse move command.
+
+        The distance of the movement is computed from the value of the axis
+        minus the adjustment either as a + b * value + c * value^2, or, if
+        the curve is not polynomial, from the curve through the given points,
+        which is constant beyond the first and last points. The distance is
+        rounded to the nearest integer.
+
+        If precompute is True, the distances are computed in advance for
+        each value of the axis, if its range is known and not too large."""
         self.direction = direction
         self.a = a
         self.b = b
         self.c = c
         self.adjust = adjust
+        self.curve = curve
+        self.points = [] if points is None else points
+        self.precompute = precompute
 
     @property
     def directionName(self):
         """Get the name of the action's direction."""
         return MouseMoveCommand.getDirectionNameFor(self.direction)
 
+    @property
+    def curveName(self):
+        """Get the name of the command's curve type."""
+        return MouseMoveCommand.getCurveNameFor(self.curve)
+
     def clone(self):
         """Clone this mouse move command."""
         return MouseMoveCommand(self.direction, a = self.a, b = self.b,
-                                c = self.c, adjust = self.adjust)
+                                c = self.c, adjust = self.adjust,
+                                curve = self.curve, points = self.points[:],
+                                precompute = self.precompute)
+
+    def getDistances(self, values):
+        """Get the distances of the movement for the given values of the
+        axis.
+
+        The distances are not rounded."""
+        if self.curve==MouseMoveCommand.CURVE_POLYNOMIAL:
+            return [self.a + self.b * avalue + self.c * avalue * avalue
+                    for avalue in [value - self.adjust for value in values]]
+
+        segments = MouseMoveCommand.getSegments(self.curve, self.points)
+        (firstValue, firstDistance) = self.points[0]
+        (lastValue, lastDistance) = self.points[-1]
+
+        distances = []
+        for value in values:
+            avalue = value - self.adjust
+            if avalue<=firstValue:
+                distances.append(firstDistance)
+            elif avalue>=lastValue:
+                distances.append(lastDistance)
+            else:
+                for (x, y, c1, c2, c3) in reversed(segments):
+                    if avalue>=x:
+                        t = avalue - x
+                        distances.append(y + t * (c1 + t * (c2 + t * c3)))
+                        break
+
+        return distances
 
     def getLuaCode(self, control):
         """Get a line vector with the Lua code to produce the mouse
         movement."""
         lines = []
 
-        lines.append("local avalue = _jsprog_%s_value - (%.f)" %
-                     (control.name, self.adjust))
-        lines.append("local dist = %.f + %.f * avalue + %.f * avalue * avalue" %
-                     (self.a, self.b, self.c))
-        lines.append("jsprog_moverel(jsprog_REL_%s, dist)" %
-                     ("X" if self.direction==MouseMoveCommand.DIRECTION_HORIZONTAL
-                      else "Y" if self.direction==MouseMoveCommand.DIRECTION_VERTICAL
-                      else "WHEEL"))
+        relName = "jsprog_REL_%s" % \
+            ("X" if self.direction==MouseMoveCommand.DIRECTION_HORIZONTAL
+             else "Y" if self.direction==MouseMoveCommand.DIRECTION_VERTICAL
+             else "WHEEL",)
+
+        valueRange = control.valueRange if self.precompute else None
+        if valueRange is not None and \
+           (valueRange[1] - valueRange[0] + 1)<=MouseMoveCommand.maxTableSize:
+            (minimum, maximum) = valueRange
+            distances = [str(math.floor(distance + 0.5))
+                         for distance in
+                         self.getDistances(range(minimum, maximum + 1))]
+
+            # Commands with the same curve on the same axis share the table
+            digest = hashlib.md5(",".join(distances).encode()).hexdigest()
+            tableName = "_jsprog_%s_distances_%s" % (control.name, digest[:8])
+
+            lines.append("local distances = %s" % (tableName,))
+            lines.append("if distances == nil then")
+            lines.append("  distances = {")
+            for index in range(0, len(distances), 16):
+                lines.append("    " + ", ".join(distances[index:index+16]) +
+                             ",")
+            lines.append("  }")
+            lines.append("  %s = distances" % (tableName,))
+            lines.append("end")
+            offset = 1 - minimum
+            index = control.luaValueName if offset==0 else \
+                ("%s + %d" % (control.luaValueName, offset)) if offset>0 else \
+                ("%s - %d" % (control.luaValueName, -offset))
+            lines.append("jsprog_moverel(%s, distances[%s] or 0)" %
+                         (relName, index))
+        else:
+            lines.append("local avalue = %s - (%s)" %
+                         (control.luaValueName,
+                          formatLuaNumber(self.adjust)))
+            if self.curve==MouseMoveCommand.CURVE_POLYNOMIAL:
+                lines.append("local dist = %s + %s * avalue + %s * avalue * avalue" %
+                             (formatLuaNumber(self.a), formatLuaNumber(self.b),
+                              formatLuaNumber(self.c)))
+            else:
+                lines.append("local dist")
+                lines.append("if avalue <= %s then" %
+                             (formatLuaNumber(self.points[0][0]),))
+                lines.append("  dist = %s" %
+                             (formatLuaNumber(self.points[0][1]),))
+                segments = MouseMoveCommand.getSegments(self.curve,
+                                                        self.points)
+                for ((x, y, c1, c2, c3), nextPoint) in \
+                    zip(segments, self.points[1:]):
+                    lines.append("elseif avalue < %s then" %
+                                 (formatLuaNumber(nextPoint[0]),))
+                    lines.append("  local t = avalue - (%s)" %
+                                 (formatLuaNumber(x),))
+                    if self.curve==MouseMoveCommand.CURVE_LINEAR:
+                        lines.append("  dist = %s + t * (%s)" %
+                                     (formatLuaNumber(y),
+                                      formatLuaNumber(c1)))
+                    else:
+                        lines.append("  dist = %s + t * (%s + t * (%s + t * (%s)))" %
+                                     (formatLuaNumber(y), formatLuaNumber(c1),
+                                      formatLuaNumber(c2), formatLuaNumber(c3)))
+                lines.append("else")
+                lines.append("  dist = %s" %
+                             (formatLuaNumber(self.points[-1][1]),))
+                lines.append("end")
+            lines.append("jsprog_moverel(%s, math.floor(dist + 0.5))" %
+                         (relName,))
 
         return lines
 
@@ -396,6 +662,12 @@ class MouseMoveCommand(object):
             element.setAttribute("c", str(self.c))
         if self.adjust!=0.0:
             element.setAttribute("adjust", str(self.adjust))
+        if self.curve!=MouseMoveCommand.CURVE_POLYNOMIAL:
+            element.setAttribute("curve", self.curveName)
+            element.setAttribute("points",
+                                 MouseMoveCommand.getPointsText(self.points))
+        if self.precompute:
+            element.setAttribute("precompute", "yes")
 
     def getXML(self, document):
         """Get an XML element describing this command."""
@@ -412,7 +684,11 @@ class MouseMoveCommand(object):
                 if self.direction==MouseMoveCommand.DIRECTION_VERTICAL
                 else "wheel") + \
                (", a=%f, b=%f, c=%f, adjust=%f" %
-                (self.a, self.b, self.c, self.adjust))
+                (self.a, self.b, self.c, self.adjust)) + \
+               ("" if self.curve==MouseMoveCommand.CURVE_POLYNOMIAL else
+                (", %s: %s" % (self.curveName,
+                               MouseMoveCommand.getPointsText(self.points)))) + \
+               (", precompute" if self.precompute else "")
 
     def __eq__(self, other):
         """Determine if this command is equal to the other one"""
@@ -421,7 +697,10 @@ class MouseMoveCommand(object):
             self.a==other.a and \
             self.b==other.b and \
             self.c==other.c and \
-            self.adjust==other.adjust
+            self.adjust==other.adjust and \
+            self.curve==other.curve and \
+            self.points==other.points and \
+            self.precompute==other.precompute
 
     def __repr__(self):
         """Get a string representation of this command."""
@@ -692,11 +971,15 @@ class SimpleAction(RepeatableAction):
 
 class MouseMove(RepeatableAction):
     def __init__(self, direction, a = 0.0, b = 0.0, c = 0.0,
-                 adjust = 0.0, displayName = None, repeatDelay = None):
+                 adjust = 0.0, displayName = None, repeatDelay = None,
+                 curve = MouseMoveCommand.CURVE_POLYNOMIAL, points = None,
+                 precompute = False):
         """Construct the mouse move action with the given repeat delay."""
         super(MouseMove, self).__init__(displayName = None,
                                         repeatDelay = repeatDelay)
-        self.command = MouseMoveCommand(direction, a, b, c, adjust)
+        self.command = MouseMoveCommand(direction, a, b, c, adjust,
+                                        curve = curve, points = points,
+                                        precompute = precompute)
 
     @property
     def type(self):
@@ -719,7 +1002,10 @@ class MouseMove(RepeatableAction):
         return MouseMove(self.command.direction, a = self.command.a,
                          b = self.command.b, c = self.command.c,
                          adjust = self.command.adjust,
-                         repeatDelay = self.repeatDelay)
+                         repeatDelay = self.repeatDelay,
+                         curve = self.command.curve,
+                         points = self.command.points[:],
+                         precompute = self.command.precompute)
 
     def _getEnterLuaCode(self, control):
         """Get the Lua code to produce the mouse movement.
@@ -809,6 +1095,16 @@ class AdvancedAction(RepeatableAction):
 
         return False
 
+    @property
+    def hasDelays(self):
+        """Indicate if the code of the action contains delays."""
+        for command in self._enterCommands + (self._repeatCommands or []) + \
+            self._leaveCommands:
+            if isinstance(command, DelayCommand):
+                return True
+
+        return False
+
     @property
     def valid(self):
         """Determine if the action is valid, i.e. if it has at least one
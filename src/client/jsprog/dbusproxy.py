@@ -0,0 +1,202 @@
+
+from .const import dbusInterfaceName, dbusInterfacePath
+from .joystick import Joystick, Key, Axis
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.dbusproxy
+#
+# The proxy of the JSProg object of the daemon
+#
+# The methods of the daemon's D-Bus interface (see src/jsprog.xml) are called
+# directly on the connection with their static signatures. Unlike with a
+# dbus-python proxy object, there is no introspection and no resolution of
+# the bus name of the daemon, and the types of the arguments need not be
+# guessed, so each call is a single message. The results are converted into
+# the client's own types (Joystick, Key, Axis, etc.).
+#
+# The methods can be called synchronously, or asynchronously by passing the
+# reply_handler and error_handler keyword arguments, like those of
+# dbus-python. The reply handler receives the converted result, if any.
+#
+# The listener side (see src/jsproglistener.xml) is implemented by
+# dbus.service.Object subclasses, which declare the signatures of their
+# methods statically.
+
+#------------------------------------------------------------------------------
+
+def _convertKeyStates(keys):
+    """Convert the given D-Bus array of key codes and values into a list of
+    Key objects."""
+    return [Key(int(code), pressed = int(value)!=0) for (code, value) in keys]
+
+#------------------------------------------------------------------------------
+
+def _convertAxisStates(axes):
+    """Convert the given D-Bus array of axis codes and values into a list of
+    Axis objects.
+
+    The range of the axes is not known, so their minimum and maximum are
+    None."""
+    return [Axis(int(code), None, None, value = int(value))
+            for (code, value) in axes]
+
+#------------------------------------------------------------------------------
+
+class JSProg(object):
+    """Proxy of the JSProg object of the daemon."""
+    ## The proxies created so far by the connections
+    _proxies = {}
+
+    @staticmethod
+    def get(connection):
+        """Get the proxy for the given connection.
+
+        The proxy is created when first requested, and reused afterwards."""
+        proxy = JSProg._proxies.get(connection)
+        if proxy is None:
+            proxy = JSProg._proxies[connection] = JSProg(connection)
+        return proxy
+
+    def __init__(self, connection):
+        """Construct the proxy for the given connection."""
+        self._connection = connection
+
+    def getJoysticks(self, **kwargs):
+        """Get the joysticks known to the daemon as a list of Joystick
+        objects."""
+        return self._call("getJoysticks", "", (),
+                          lambda joysticks: [Joystick.fromArgs(joystick)
+                                             for joystick in joysticks],
+                          **kwargs)
+
+    def getJoystickState(self, id, **kwargs):
+        """Get the state of the joystick with the given ID.
+
+        Returns a tuple of the list of the keys and the list of the axes
+        (see getJoystickStates()). Both lists are empty if the joystick is
+        unknown."""
+        return self._call("getJoystickState", "u", (id,),
+                          lambda state: (_convertKeyStates(state[0]),
+                                         _convertAxisStates(state[1])),
+                          **kwargs)
+
+    def getJoystickStates(self, ids = [], **kwargs):
+        """Get the states of the joysticks with the given IDs, or of all
+        joysticks, if no IDs are given.
+
+        Returns a dictionary mapping the IDs of the joysticks to tuples of the
+        list of the keys (Key objects with their pressed state) and the list
+        of the axes (Axis objects with their value, but without a range). The
+        unknown IDs are missing from the result."""
+        return self._call("getJoystickStates", "au", (ids,),
+                          lambda states:
+                          { int(id): (_convertKeyStates(keys),
+                                      _convertAxisStates(axes))
+                            for (id, keys, axes) in states },
+                          **kwargs)
+
+    def loadProfile(self, id, profileXML, **kwargs):
+        """Load the given profile XML into the joystick with the given ID.
+
+        Returns a boolean indicating success."""
+        return self._call("loadProfile", "us", (id, profileXML), bool,
+                          **kwargs)
+
+    def updateProfile(self, id, profileXML, **kwargs):
+        """Update the profile of the joystick with the given ID with the
+        given profile XML.
+
+        Returns a boolean indicating success."""
+        return self._call("updateProfile", "us", (id, profileXML), bool,
+                          **kwargs)
+
+    def preloadProfile(self, id, slot, profileXML, **kwargs):
+        """Preload the given profile XML into the given slot of the joystick
+        with the given ID.
+
+        Returns a boolean indicating success."""
+        return self._call("preloadProfile", "uus", (id, slot, profileXML),
+                          bool, **kwargs)
+
+    def switchProfile(self, id, slot, **kwargs):
+        """Switch the joystick with the given ID to the profile preloaded
+        into the given slot.
+
+        Returns a boolean indicating success."""
+        return self._call("switchProfile", "uu", (id, slot), bool, **kwargs)
+
+    def getProfileStats(self, id, reset, **kwargs):
+        """Get the invocation counters of the profile of the joystick with
+        the given ID, and reset them, if requested.
+
+        Returns a list of tuples of the name of the function or handler, the
+        number of calls and the total time of the calls."""
+        return self._call("getProfileStats", "ub", (id, reset),
+                          lambda stats: [(str(name), int(numCalls), int(time))
+                                         for (name, numCalls, time) in stats],
+                          **kwargs)
+
+    def startMonitor(self, id, sender, listener, **kwargs):
+        """Start monitoring the joystick with the given ID via the listener
+        object with the given path on the given bus name.
+
+        Returns a boolean indicating success."""
+        return self._call("startMonitor", "uso", (id, sender, listener), bool,
+                          **kwargs)
+
+    def stopMonitor(self, id, listener, **kwargs):
+        """Stop monitoring the joystick with the given ID via the listener
+        object with the given path."""
+        return self._call("stopMonitor", "uo", (id, listener), **kwargs)
+
+    def startMonitors(self, ids, sender, listener, **kwargs):
+        """Start monitoring the joysticks with the given IDs, or all
+        joysticks, if no IDs are given, via the listener object with the
+        given path on the given bus name.
+
+        If no IDs are given, only the joysticks present at the time of the
+        call are monitored. The joysticks added later should be monitored
+        by calling startMonitor() when the joystickAdded signal is received.
+
+        Returns the list of the IDs of the joysticks for which the monitoring
+        has been started."""
+        return self._call("startMonitors", "auso", (ids, sender, listener),
+                          lambda started: [int(id) for id in started],
+                          **kwargs)
+
+    def stopMonitors(self, ids, listener, **kwargs):
+        """Stop monitoring the joysticks with the given IDs, or all
+        joysticks, if no IDs are given, via the listener object with the
+        given path."""
+        return self._call("stopMonitors", "auo", (ids, listener), **kwargs)
+
+    def exit(self, **kwargs):
+        """Make the daemon exit."""
+        return self._call("exit", "", (), **kwargs)
+
+    def _call(self, method, signature, args, convert = None,
+              reply_handler = None, error_handler = None):
+        """Call the given method with the given input signature and
+        arguments.
+
+        If a reply handler is given, the call is asynchronous, and the reply
+        handler is called with the result converted by the given function, if
+        any. Otherwise the converted result is returned."""
+        if reply_handler is None:
+            result = self._connection.call_blocking(dbusInterfaceName,
+                                                    dbusInterfacePath,
+                                                    dbusInterfaceName,
+                                                    method, signature, args)
+            return result if convert is None else convert(result)
+        else:
+            def handleReply(*result):
+                if convert is None:
+                    reply_handler(*result)
+                else:
+                    reply_handler(convert(*result))
+
+            self._connection.call_async(dbusInterfaceName, dbusInterfacePath,
+                                        dbusInterfaceName,
+                                        method, signature, args,
+                                        handleReply, error_handler)
@@ -585,7 +585,9 @@ class JoystickType(Joystick):
         try:
             parser.parse(path)
 
-            return handler.joystickType
+            joystickType = handler.joystickType
+            joystickType.descriptorPath = path
+            return joystickType
         except Exception as e:
             print(e, file=sys.stderr)
 
@@ -636,6 +638,10 @@ class JoystickType(Joystick):
         self._views = []
         self._nextVirtualControlCode = -1
 
+        # The path of the descriptor file the joystick type has been loaded
+        # from or saved into last, if any
+        self.descriptorPath = None
+
     @property
     def indicatorIconName(self):
         """Get the name of the indicator icon."""
@@ -816,6 +822,8 @@ class JoystickType(Joystick):
         with open(path, "wt") as f:
             document.writexml(f, addindent = "  ", newl = "\n")
 
+        self.descriptorPath = path
+
 #------------------------------------------------------------------------------
 
 if __name__ == "__main__":
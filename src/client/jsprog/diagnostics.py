@@ -0,0 +1,146 @@
+
+import cProfile
+import functools
+import sys
+import threading
+import time
+import traceback
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.diagnostics
+#
+# Diagnostics of the performance of the client
+#
+# A command can be run under the deterministic profiler (see runProfiled()),
+# and the callbacks of the GLib main loop can be timed to find the ones
+# stalling the main loop (see SlowCallTracer).
+#
+# The functions to be timed are decorated with slowCallTraced. If no tracer
+# has been created, the decorated functions only check that, so the
+# decoration costs very little. Otherwise, the time spent in a call is
+# measured, and if it exceeds the threshold of the tracer, the call is
+# logged to the standard error with a stack trace. The stack trace is taken
+# by a watchdog thread from the main thread while the call is still running
+# when the threshold is passed, so that it shows where the time is being
+# spent. If the call completes before the watchdog could take the stack
+# trace, the stack trace of the call itself is logged.
+
+#------------------------------------------------------------------------------
+
+def runProfiled(path, fun, *args, **kwargs):
+    """Call the given function with the given arguments under cProfile and
+    dump the statistics into the file with the given path.
+
+    The statistics are dumped even if the function raises an exception
+    (e.g. KeyboardInterrupt). They can be examined by pstats or any tool
+    supporting its format. The result of the function is returned."""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fun, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+        print("Profile statistics written to %s (see 'python3 -m pstats %s')" %
+              (path, path), file=sys.stderr)
+
+#------------------------------------------------------------------------------
+
+class SlowCallTracer(object):
+    """Tracer of the calls taking longer than a threshold."""
+    # The only instance of the tracer, if enabled
+    _instance = None
+
+    @staticmethod
+    def get():
+        """Get the tracer, if the tracing is enabled, otherwise None."""
+        return SlowCallTracer._instance
+
+    def __init__(self, threshold):
+        """Construct the tracer for the given threshold in milliseconds and
+        enable the tracing.
+
+        The tracer should be created in the thread running the main loop."""
+        self._threshold = threshold / 1000.0
+
+        # The ID of the thread whose calls are traced
+        self._threadID = threading.get_ident()
+
+        # The stack of the calls in progress. Each item is a list of the name
+        # of the function, the time of the start of the call and the stack
+        # trace taken by the watchdog (or None).
+        self._calls = []
+
+        self._lock = threading.Lock()
+
+        watchdog = threading.Thread(target = self._watch,
+                                    name = "SlowCallTracer",
+                                    daemon = True)
+        watchdog.start()
+
+        SlowCallTracer._instance = self
+
+    def call(self, name, fun, *args, **kwargs):
+        """Call the given function with the given arguments, and log the
+        call with the given name if it takes too long.
+
+        Only the calls from the thread of the tracer are timed."""
+        if threading.get_ident()!=self._threadID:
+            return fun(*args, **kwargs)
+
+        start = time.perf_counter()
+        call = [name, start, None]
+        with self._lock:
+            self._calls.append(call)
+
+        try:
+            return fun(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._calls.remove(call)
+            if elapsed>=self._threshold:
+                stack = call[2]
+                if stack is None:
+                    stack = traceback.format_stack()[:-1]
+                self._log(name, elapsed, stack)
+
+    def _log(self, name, elapsed, stack):
+        """Log the slow call of the function with the given name."""
+        print("Slow call: %s took %.1f ms" % (name, elapsed * 1000.0),
+              file=sys.stderr)
+        print("".join(stack), end = "", file=sys.stderr)
+        sys.stderr.flush()
+
+    def _watch(self):
+        """Take a stack trace of the thread of the tracer, if the innermost
+        call in progress has been running longer than the threshold."""
+        interval = max(0.001, self._threshold / 2.0)
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if not self._calls:
+                    continue
+                call = self._calls[-1]
+                if call[2] is not None or \
+                   time.perf_counter() - call[1] < self._threshold:
+                    continue
+                frame = sys._current_frames().get(self._threadID)
+                if frame is not None:
+                    call[2] = traceback.format_stack(frame)
+
+#------------------------------------------------------------------------------
+
+def slowCallTraced(fun):
+    """Decorator to trace the calls of the given function, if a
+    SlowCallTracer is enabled."""
+    name = fun.__module__ + "." + fun.__qualname__
+
+    @functools.wraps(fun)
+    def wrapper(*args, **kwargs):
+        tracer = SlowCallTracer._instance
+        if tracer is None:
+            return fun(*args, **kwargs)
+        else:
+            return tracer.call(name, fun, *args, **kwargs)
+
+    return wrapper
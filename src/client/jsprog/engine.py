@@ -0,0 +1,888 @@
+
+from .profile import ValueRangeHandler, ValueRangeDispatcher
+from .profile import KeyProfile, VirtualControlProfile
+from .action import Action, RepeatableAction, SimpleAction, MouseMove
+from .action import AdvancedAction, KeyPressCommand, KeyReleaseCommand
+from .action import DelayCommand, MouseMoveCommand
+from .parser import Control
+from .joystick import Key
+
+import bisect
+import heapq
+import math
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.engine
+#
+# Offline execution of profiles
+#
+# The profile engine interprets the model of a profile directly, without the
+# daemon and without a joystick, so that what a profile does for a stream of
+# key and axis events can be evaluated quickly, e.g. in regression tests or
+# benchmarks.
+#
+# The engine follows the semantics of the Lua code generated for the daemon
+# (see Profile.getDaemonCode()): the values of the controls, the states of
+# the virtual controls and the shift levels, and the shifted states of the
+# control profiles are updated the same way and in the same order, the
+# actions are entered and left when the shifted states change, the updaters
+# of the shift-active controls are called when a shift level changes, and
+# the actions are repeated by a scheduler or by threads with delays. The
+# threads of the daemon are modelled by generators, and the time is
+# virtual: it is given by the timestamps of the input events, and the
+# delays and repeats are executed at their exact due times. The threads and
+# the repeats due at the same time are run in the order they were scheduled;
+# the daemon does not define the order of the repeats in this case.
+#
+# The output consists of tuples of the time, the type, the code and the
+# value of the events the daemon would send to the uinput device, i.e. key
+# presses and releases and relative movements. The scripts of script
+# actions, the prologue and the epilogue are not executed.
+
+#------------------------------------------------------------------------------
+
+class ActionCode(object):
+    """The commands of an action prepared for the execution by the engine.
+
+    The commands of each part of the action (entering, repeating and
+    leaving) are converted into a list of operations, which are tuples
+    starting with one of the OP_XXX constants."""
+    ## Operation: send a key event. The code and the value follow.
+    OP_KEY = 1
+
+    ## Operation: send a relative movement. The code of the movement and the
+    ## function computing the distance from the value of the control follow.
+    OP_MOVE = 2
+
+    ## Operation: delay the execution. The length of the delay in
+    ## milliseconds follows.
+    OP_DELAY = 3
+
+    ## Execution mode: the action does nothing the engine can execute
+    MODE_NONE = 0
+
+    ## Execution mode: the enter and leave operations are executed right
+    ## away
+    MODE_DIRECT = 1
+
+    ## Execution mode: the action is repeated by the scheduler (see
+    ## RepeatableAction.useScheduler)
+    MODE_SCHEDULER = 2
+
+    ## Execution mode: the action is executed by a thread (see
+    ## RepeatableAction.useThread)
+    MODE_THREAD = 3
+
+    ## The codes of the modifier keys of a key combination in the order they
+    ## are pressed
+    _modifierCodes = [("leftShift", Key.findCodeFor("KEY_LEFTSHIFT")),
+                      ("rightShift", Key.findCodeFor("KEY_RIGHTSHIFT")),
+                      ("leftControl", Key.findCodeFor("KEY_LEFTCTRL")),
+                      ("rightControl", Key.findCodeFor("KEY_RIGHTCTRL")),
+                      ("leftAlt", Key.findCodeFor("KEY_LEFTALT")),
+                      ("rightAlt", Key.findCodeFor("KEY_RIGHTALT")),
+                      ("leftSuper", Key.findCodeFor("KEY_LEFTMETA")),
+                      ("rightSuper", Key.findCodeFor("KEY_RIGHTMETA"))]
+
+    ## The codes of the relative movements for the directions of the mouse
+    ## move commands
+    _relativeCodes = {
+        MouseMoveCommand.DIRECTION_HORIZONTAL : 0, # REL_X
+        MouseMoveCommand.DIRECTION_VERTICAL : 1,   # REL_Y
+        MouseMoveCommand.DIRECTION_WHEEL : 8       # REL_WHEEL
+        }
+
+    @staticmethod
+    def getKeyCombinationOperations(keyCombination):
+        """Get the operations issuing the given key combination."""
+        modifiers = [code for (attribute, code) in ActionCode._modifierCodes
+                     if getattr(keyCombination, attribute)]
+
+        operations = [(ActionCode.OP_KEY, code, 1) for code in modifiers]
+        operations.append((ActionCode.OP_KEY, keyCombination.code, 1))
+        operations.append((ActionCode.OP_KEY, keyCombination.code, 0))
+        operations += [(ActionCode.OP_KEY, code, 0)
+                       for code in reversed(modifiers)]
+
+        return operations
+
+    @staticmethod
+    def getDistanceFunction(command, control):
+        """Get a function computing the distance of the given mouse move
+        command from the given value of the given control.
+
+        The distances are rounded the same way as by the Lua code, and they
+        are cached. If the command is precomputed, the distances for the
+        values outside of the range of the axis are 0, just like in the Lua
+        code."""
+        valueRange = control.valueRange if command.precompute else None
+        if valueRange is not None and \
+           (valueRange[1] - valueRange[0] + 1)<=MouseMoveCommand.maxTableSize:
+            values = range(valueRange[0], valueRange[1] + 1)
+            distances = dict(zip(values,
+                                 [math.floor(distance + 0.5) for distance in
+                                  command.getDistances(values)]))
+            return lambda value: distances.get(value, 0)
+
+        distances = {}
+        def getDistance(value):
+            distance = distances.get(value)
+            if distance is None:
+                distance = math.floor(command.getDistances([value])[0] + 0.5)
+                distances[value] = distance
+            return distance
+
+        return getDistance
+
+    @staticmethod
+    def getCommandOperations(commands, control):
+        """Get the operations of the given commands of an advanced
+        action."""
+        operations = []
+        for command in commands:
+            if isinstance(command, KeyPressCommand):
+                operations.append((ActionCode.OP_KEY, command.code, 1))
+            elif isinstance(command, KeyReleaseCommand):
+                operations.append((ActionCode.OP_KEY, command.code, 0))
+            elif isinstance(command, DelayCommand):
+                operations.append((ActionCode.OP_DELAY, command.length))
+            elif isinstance(command, MouseMoveCommand):
+                operations.append(ActionCode.getMoveOperation(command, control))
+        return operations
+
+    @staticmethod
+    def getMoveOperation(command, control):
+        """Get the operation of the given mouse move command."""
+        return (ActionCode.OP_MOVE,
+                ActionCode._relativeCodes[command.direction],
+                ActionCode.getDistanceFunction(command, control))
+
+    def __init__(self, action, control):
+        """Prepare the given action of the given control."""
+        self.mode = ActionCode.MODE_NONE
+        self.repeatDelay = None
+
+        self.enterOperations = []
+        # The operations of the repeats, or None, if they are the same as
+        # the operations of entering
+        self.repeatOperations = None
+        self.leaveOperations = []
+
+        if isinstance(action, SimpleAction):
+            for keyCombination in action.keyCombinations:
+                self.enterOperations += \
+                    ActionCode.getKeyCombinationOperations(keyCombination)
+        elif isinstance(action, MouseMove):
+            self.enterOperations.append(
+                ActionCode.getMoveOperation(action.command, control))
+        elif isinstance(action, AdvancedAction):
+            self.enterOperations = \
+                ActionCode.getCommandOperations(action.enterCommands, control)
+            if action.isRepeatDifferent:
+                self.repeatOperations = \
+                    ActionCode.getCommandOperations(action.repeatCommands,
+                                                    control)
+            self.leaveOperations = \
+                ActionCode.getCommandOperations(action.leaveCommands, control)
+
+        if isinstance(action, RepeatableAction):
+            self.repeatDelay = action.repeatDelay
+            self.mode = ActionCode.MODE_SCHEDULER if action.useScheduler \
+                else ActionCode.MODE_THREAD if action.useThread \
+                else ActionCode.MODE_DIRECT
+
+#------------------------------------------------------------------------------
+
+class StateComputer(object):
+    """The computation of the state of a virtual control or a shift level
+    from the values of the controls it depends on."""
+    def __init__(self, virtualControl, index, getIndex):
+        """Prepare the computation of the state of the given virtual control
+        or shift level, whose state is stored at the given index.
+
+        getIndex is a function returning the index of the value of a
+        control."""
+        self.index = index
+
+        # The set of the indexes of the values the state depends on
+        self.inputIndexes = frozenset([getIndex(control) for control in
+                                       virtualControl.getControls()])
+
+        # The list of tuples of the value of a state and the list of the
+        # index, the first and the last values of its constraints, for the
+        # non-default states
+        self.states = []
+
+        # The value of the default state, or None if there is none
+        self.defaultValue = None
+
+        for state in virtualControl.states:
+            if state.isDefault:
+                self.defaultValue = state.value
+            else:
+                self.states.append((state.value,
+                                    [(getIndex(constraint.control),
+                                      constraint.fromValue,
+                                      constraint.toValue)
+                                     for constraint in state.constraints]))
+
+    def update(self, values):
+        """Update the state in the given list of values.
+
+        Like in the Lua code, the first matching state is selected, or if
+        there is none, the default one. If there is no default state, the
+        state is left unchanged.
+
+        Returns whether the state has changed."""
+        newState = self.defaultValue
+        for (value, constraints) in self.states:
+            for (index, fromValue, toValue) in constraints:
+                v = values[index]
+                if v<fromValue or v>toValue:
+                    break
+            else:
+                newState = value
+                break
+
+        if newState is None or newState==values[self.index]:
+            return False
+
+        values[self.index] = newState
+        return True
+
+#------------------------------------------------------------------------------
+
+class ControlProfileCode(object):
+    """A control profile prepared for the execution by the engine.
+
+    The states of the control profile are numbered the same way as in the
+    Lua code (see HandlerTree.foldStates()). The handler trees are converted
+    into nodes, which are either
+    - None, if there is no state,
+    - the index of a state,
+    - a tuple of 0 and a list of tuples of the first and last shift states
+      and the nodes of the shift handlers, or
+    - a tuple of 1, the list of the first values of the segments of the
+      value ranges (see ValueRangeDispatcher.getSegments()) and the list of
+      the states belonging to the segments."""
+    def __init__(self, profile, controlProfile, getIndex):
+        """Prepare the given control profile of the given profile.
+
+        getIndex is a function returning the index of the value of a
+        control."""
+        control = controlProfile.control
+
+        self.control = control
+        self.index = getIndex(control)
+        self.shiftActive = controlProfile.shiftActive
+
+        # The list of the action codes of the states. The first element
+        # belongs to state 0, so it is always None.
+        self.actionCodes = [None]
+
+        numShiftLevels = profile.numShiftLevels
+        if isinstance(controlProfile, VirtualControlProfile):
+            virtualControl = profile.findVirtualControlByCode(control.code)
+            self.nodes = {}
+            for state in range(0, virtualControl.numStates):
+                handlerTree = controlProfile.findHandlerTree(state)
+                if handlerTree is not None:
+                    self.nodes[state] = self._getNode(handlerTree,
+                                                      numShiftLevels)
+        else:
+            self.node = self._getNode(controlProfile.handlerTree,
+                                      numShiftLevels)
+
+        self.isKey = isinstance(controlProfile, KeyProfile)
+        self.isVirtual = isinstance(controlProfile, VirtualControlProfile)
+
+        # The current shifted state
+        self.state = 0
+
+        # A mapping of the shift state sequences (and the states of the
+        # virtual control) to the nodes selected by them
+        self._selectedNodes = {}
+
+    def getShiftedState(self, values, shiftStates):
+        """Get the shifted state for the given values and shift state
+        sequence (which is a tuple)."""
+        value = values[self.index]
+        if self.isVirtual:
+            key = (value, shiftStates)
+            node = self._selectedNodes.get(key, -1)
+            if node==-1:
+                node = self._selectNode(self.nodes.get(value), shiftStates)
+                self._selectedNodes[key] = node
+        else:
+            if self.isKey and value==0:
+                return 0
+            node = self._selectedNodes.get(shiftStates, -1)
+            if node==-1:
+                node = self._selectNode(self.node, shiftStates)
+                self._selectedNodes[shiftStates] = node
+
+        if node is None:
+            return 0
+        elif isinstance(node, int):
+            return node
+        else:
+            (_, firstValues, states) = node
+            return states[bisect.bisect_right(firstValues, value)]
+
+    def _getNode(self, handlerTree, numShiftLevels):
+        """Get the node for the given handler tree with the given number of
+        shift levels below it."""
+        children = handlerTree.children
+        if not children:
+            return None
+        elif numShiftLevels<=0 and isinstance(children[0], Action):
+            node = len(self.actionCodes)
+            for action in children:
+                self.actionCodes.append(ActionCode(action, self.control))
+            return node
+        elif isinstance(children[0], ValueRangeHandler):
+            ranges = []
+            for child in children:
+                ranges.append((child.fromValue, child.toValue,
+                               self._getNode(child, numShiftLevels - 1)))
+            segments = ValueRangeDispatcher.getSegments(ranges)
+            firstValues = [segments[0][0]] + \
+                [segment[1] + 1 for segment in segments]
+            states = [0] + [segment[2] for segment in segments] + [0]
+            return (1, firstValues, states)
+        else:
+            return (0, [(child.fromState, child.toState,
+                         self._getNode(child, numShiftLevels - 1))
+                        for child in children])
+
+    def _selectNode(self, node, shiftStates):
+        """Select the node belonging to the given shift state sequence
+        starting at the given node."""
+        level = 0
+        while isinstance(node, tuple) and node[0]==0:
+            shiftState = shiftStates[level]
+            for (fromState, toState, child) in node[1]:
+                if fromState<=shiftState and shiftState<=toState:
+                    node = child
+                    break
+            else:
+                return None
+            level += 1
+        return node
+
+#------------------------------------------------------------------------------
+
+class EngineThread(object):
+    """A thread of the engine.
+
+    It models a Lua thread of the daemon executing an action. Its body is a
+    generator, which yields tuples of one of the WAIT_XXX constants and the
+    length of the delay or the thread to join."""
+    ## Waiting: the thread is running or it has not started yet
+    WAIT_NONE = 0
+
+    ## Waiting: a delay that cannot be cancelled
+    WAIT_DELAY = 1
+
+    ## Waiting: a delay that can be cancelled
+    WAIT_CANCELLABLE_DELAY = 2
+
+    ## Waiting: the thread waits for another one to finish
+    WAIT_JOIN = 3
+
+    def __init__(self, time):
+        """Construct the thread started at the given time."""
+        self.body = None
+        self.time = time
+        self.waiting = EngineThread.WAIT_NONE
+        self.finished = False
+        self.joiner = None
+
+        # The sequence number of the entry of the thread in the queue of the
+        # engine, so that outdated entries are ignored
+        self.sequence = None
+
+#------------------------------------------------------------------------------
+
+class SchedulerEntry(object):
+    """An action repeated by the scheduler of the engine."""
+    def __init__(self, controlProfileCode, operations, period, due):
+        """Construct the entry repeating the given operations of the given
+        control profile code with the given period."""
+        self.controlProfileCode = controlProfileCode
+        self.operations = operations
+        self.period = period
+        self.due = due
+        self.active = True
+
+#------------------------------------------------------------------------------
+
+class ProfileEngine(object):
+    """Offline interpreter of a profile.
+
+    The input events are given to processEvent() with their timestamps in
+    milliseconds. The timestamps should not decrease. The output events
+    produced are collected and can be queried by outputEvents or
+    takeOutputEvents()."""
+    ## Output event type: a key press or release (EV_KEY)
+    EVENT_KEY = 1
+
+    ## Output event type: a relative movement (EV_REL)
+    EVENT_REL = 2
+
+    def __init__(self, profile):
+        """Prepare the execution of the given profile."""
+        Control.setProfile(profile)
+
+        self._profile = profile
+
+        # A mapping of the controls to the indexes of their values
+        self._indexes = {}
+
+        # The number of values, i.e. of the controls and the shift levels
+        self._numValues = 0
+
+        virtualControls = {}
+        for virtualControl in profile.allVirtualControls:
+            virtualControls[virtualControl.control] = virtualControl
+        orderedVirtualControls = \
+            profile._getVirtualControlsInDependencyOrder(virtualControls.values())
+
+        self._virtualStates = [StateComputer(virtualControl,
+                                             self._getIndex(virtualControl.control),
+                                             self._getIndex)
+                               for virtualControl in orderedVirtualControls]
+
+        self._shiftLevelStates = []
+        for index in range(0, profile.numShiftLevels):
+            shiftLevel = profile.getShiftLevel(index)
+            self._shiftLevelStates.append(
+                StateComputer(shiftLevel, self._allocateIndex(),
+                              self._getIndex))
+
+        self._controlProfileCodes = {}
+        for controlProfile in profile.controlProfiles:
+            control = controlProfile.control
+            if control.isVirtual and control not in virtualControls:
+                continue
+            self._controlProfileCodes[control] = \
+                ControlProfileCode(profile, controlProfile, self._getIndex)
+
+        # A mapping of the tuples of the type and code of the physical
+        # controls to the tuples of:
+        # - the index of the value of the control,
+        # - the list of the state computers of the virtual controls and the
+        #   shift levels depending on the control, directly or indirectly,
+        # - the code of the control profile of the control, if any.
+        self._handlers = {}
+        controls = set()
+        for stateComputer in self._virtualStates + self._shiftLevelStates:
+            controls |= stateComputer.inputIndexes
+        for (control, index) in self._indexes.items():
+            if not control.isVirtual and \
+               (index in controls or control in self._controlProfileCodes):
+                self._handlers[(control.type, control.code)] = \
+                    (index, self._getDependentStates(index),
+                     self._controlProfileCodes.get(control))
+
+        # The codes of the control profiles of the virtual controls by the
+        # indexes of the values of the virtual controls
+        self._virtualProfileCodes = {}
+        for code in self._controlProfileCodes.values():
+            if code.isVirtual:
+                self._virtualProfileCodes[code.index] = code
+
+        self._shiftLevelIndexes = [stateComputer.index for stateComputer
+                                   in self._shiftLevelStates]
+
+        self.reset()
+
+    @property
+    def profile(self):
+        """Get the profile executed by the engine."""
+        return self._profile
+
+    @property
+    def time(self):
+        """Get the current time of the engine."""
+        return self._now
+
+    @property
+    def outputEvents(self):
+        """Get the list of the output events produced so far.
+
+        Each event is a tuple of the time, the type (EVENT_KEY or
+        EVENT_REL), the code and the value of the event."""
+        return self._outputEvents
+
+    def takeOutputEvents(self):
+        """Get the list of the output events produced so far and start a new
+        one."""
+        outputEvents = self._outputEvents
+        self._outputEvents = []
+        return outputEvents
+
+    def reset(self):
+        """Reset the engine into its initial state, i.e. into the state of
+        the daemon after the profile is loaded.
+
+        All values and states are 0 and no actions are running."""
+        self._now = 0
+        self._values = [0] * self._numValues
+        self._shiftStates = tuple(0 for index in self._shiftLevelIndexes)
+        self._outputEvents = []
+
+        for code in self._controlProfileCodes.values():
+            code.state = 0
+
+        # The updaters, i.e. the codes of the shift-active control profiles
+        # not in their neutral state, and their indexes in the list
+        self._updaters = []
+        self._updaterSlots = {}
+
+        # The queue of the threads and the scheduler entries to run. It is a
+        # heap of tuples of the time, a sequence number and the thread or
+        # entry.
+        self._queue = []
+        self._sequence = 0
+
+        # The repeat flags, the threads and the scheduler entries of the
+        # control profiles
+        self._repeatFlags = {}
+        self._threads = {}
+        self._schedulerEntries = {}
+
+    def processEvent(self, time, type, code, value):
+        """Process an input event of the control of the given type
+        (Control.TYPE_KEY or Control.TYPE_AXIS) and code with the given
+        value at the given time.
+
+        Like in the daemon, the handler of the event is executed before the
+        threads and the repeats due at the same time."""
+        self._run(time, False)
+
+        handler = self._handlers.get((type, code))
+        if handler is not None:
+            self._handleEvent(handler, value)
+
+        self._run(time, True)
+
+    def processEvents(self, events):
+        """Process the given iterable of input events.
+
+        Each event is a tuple of the time, the type, the code and the value
+        as expected by processEvent()."""
+        processEvent = self.processEvent
+        for (time, type, code, value) in events:
+            processEvent(time, type, code, value)
+
+    def advance(self, time):
+        """Advance the time to the given one, executing the threads and the
+        repeats due until then."""
+        self._run(time, True)
+
+    def getValue(self, control):
+        """Get the value of the given control, or the state of the given
+        virtual control."""
+        index = self._indexes.get(control)
+        return 0 if index is None else self._values[index]
+
+    def getShiftLevelState(self, index):
+        """Get the state of the shift level with the given index."""
+        return self._shiftStates[index]
+
+    def _getIndex(self, control):
+        """Get the index of the value of the given control.
+
+        If the control has no index yet, a new one is allocated."""
+        index = self._indexes.get(control)
+        if index is None:
+            index = self._indexes[control] = self._allocateIndex()
+        return index
+
+    def _allocateIndex(self):
+        """Allocate a new index for a value."""
+        index = self._numValues
+        self._numValues += 1
+        return index
+
+    def _getDependentStates(self, index):
+        """Get the list of the state computers depending on the value with
+        the given index directly or indirectly, in the order of their
+        updates."""
+        indexes = set([index])
+        stateComputers = []
+        for stateComputer in self._virtualStates + self._shiftLevelStates:
+            if stateComputer.inputIndexes & indexes:
+                stateComputers.append(stateComputer)
+                indexes.add(stateComputer.index)
+        return stateComputers
+
+    def _handleEvent(self, handler, value):
+        """Handle the change of a control to the given value.
+
+        This is the equivalent of the Lua handler of the control (see
+        Profile._getPropagationLuaCode())."""
+        (index, stateComputers, controlProfileCode) = handler
+
+        values = self._values
+        values[index] = value
+
+        changedProfileCodes = []
+        shiftLevelChanged = False
+        if stateComputers:
+            changed = set([index])
+            for stateComputer in stateComputers:
+                if stateComputer.inputIndexes.isdisjoint(changed) or \
+                   not stateComputer.update(values):
+                    continue
+                stateIndex = stateComputer.index
+                changed.add(stateIndex)
+                code = self._virtualProfileCodes.get(stateIndex)
+                if code is not None:
+                    changedProfileCodes.append(code)
+                elif stateIndex in self._shiftLevelIndexes:
+                    shiftLevelChanged = True
+
+            if shiftLevelChanged:
+                self._shiftStates = tuple(values[index] for index
+                                          in self._shiftLevelIndexes)
+
+        if controlProfileCode is not None:
+            self._update(controlProfileCode)
+
+        for code in changedProfileCodes:
+            self._update(code)
+
+        if shiftLevelChanged:
+            self._callUpdaters()
+
+    def _update(self, code):
+        """Update the shifted state of the given control profile code.
+
+        This is the equivalent of the update function of the control in the
+        Lua code (see ControlProfile._getUpdateLuaFunction())."""
+        oldState = code.state
+        newState = code.getShiftedState(self._values, self._shiftStates)
+        if newState==oldState:
+            return
+
+        code.state = newState
+
+        if code.shiftActive:
+            if newState==0:
+                self._removeUpdater(code)
+            elif oldState==0:
+                self._addUpdater(code)
+
+        if oldState>0:
+            self._leave(code, code.actionCodes[oldState])
+        if newState>0:
+            self._enter(code, code.actionCodes[newState])
+
+    def _addUpdater(self, code):
+        """Add the given control profile code to the updaters."""
+        if code not in self._updaterSlots:
+            self._updaterSlots[code] = len(self._updaters)
+            self._updaters.append(code)
+
+    def _removeUpdater(self, code):
+        """Remove the given control profile code from the updaters.
+
+        The last updater is moved into its place."""
+        slot = self._updaterSlots.get(code)
+        if slot is not None:
+            last = self._updaters[-1]
+            self._updaters[slot] = last
+            self._updaterSlots[last] = slot
+            self._updaters.pop()
+            del self._updaterSlots[code]
+
+    def _callUpdaters(self):
+        """Call the updaters from the last one."""
+        updaters = self._updaters
+        for index in range(len(updaters) - 1, -1, -1):
+            if index<len(updaters):
+                self._update(updaters[index])
+
+    def _enter(self, code, actionCode):
+        """Enter the action of the given action code of the given control
+        profile code."""
+        mode = actionCode.mode
+        if mode==ActionCode.MODE_DIRECT:
+            self._execute(code, actionCode.enterOperations)
+        elif mode==ActionCode.MODE_SCHEDULER:
+            self._execute(code, actionCode.enterOperations)
+
+            operations = actionCode.enterOperations \
+                if actionCode.repeatOperations is None \
+                else actionCode.repeatOperations
+            self._removeSchedulerEntry(code)
+            entry = SchedulerEntry(code, operations, actionCode.repeatDelay,
+                                   self._now + actionCode.repeatDelay)
+            self._schedulerEntries[code] = entry
+            self._schedule(entry.due, entry)
+        elif mode==ActionCode.MODE_THREAD:
+            repeatFlag = [True]
+            self._repeatFlags[code] = repeatFlag
+            lastThread = self._threads.get(code)
+
+            thread = EngineThread(self._now)
+            thread.body = self._runThread(thread, code, actionCode,
+                                          repeatFlag, lastThread)
+            self._threads[code] = thread
+            self._schedule(self._now, thread)
+
+    def _leave(self, code, actionCode):
+        """Leave the action of the given action code of the given control
+        profile code."""
+        mode = actionCode.mode
+        if mode==ActionCode.MODE_DIRECT:
+            self._execute(code, actionCode.leaveOperations)
+        elif mode==ActionCode.MODE_SCHEDULER:
+            self._removeSchedulerEntry(code)
+            self._execute(code, actionCode.leaveOperations)
+        elif mode==ActionCode.MODE_THREAD:
+            repeatFlag = self._repeatFlags.get(code)
+            if repeatFlag is not None:
+                repeatFlag[0] = False
+            thread = self._threads.get(code)
+            if thread is not None and \
+               thread.waiting==EngineThread.WAIT_CANCELLABLE_DELAY:
+                thread.waiting = EngineThread.WAIT_NONE
+                thread.time = self._now
+                self._schedule(self._now, thread)
+
+    def _execute(self, code, operations):
+        """Execute the given operations of the given control profile code,
+        except for the delays."""
+        now = self._now
+        outputEvents = self._outputEvents
+        for operation in operations:
+            if operation[0]==ActionCode.OP_KEY:
+                outputEvents.append((now, ProfileEngine.EVENT_KEY,
+                                     operation[1], operation[2]))
+            elif operation[0]==ActionCode.OP_MOVE:
+                outputEvents.append((now, ProfileEngine.EVENT_REL,
+                                     operation[1],
+                                     operation[2](self._values[code.index])))
+
+    def _executeInThread(self, code, operations):
+        """Execute the given operations of the given control profile code
+        in a thread.
+
+        This is a generator yielding the delays."""
+        start = 0
+        for (index, operation) in enumerate(operations):
+            if operation[0]==ActionCode.OP_DELAY:
+                self._execute(code, operations[start:index])
+                yield (EngineThread.WAIT_DELAY, operation[1])
+                start = index + 1
+        self._execute(code, operations[start:])
+
+    def _runThread(self, thread, code, actionCode, repeatFlag, lastThread):
+        """The body of the given thread executing the given action code of
+        the given control profile code.
+
+        This is the equivalent of the thread function in the Lua code (see
+        RepeatableAction.getEnterLuaCode())."""
+        if lastThread is not None:
+            yield (EngineThread.WAIT_JOIN, lastThread)
+
+        repeatDelay = actionCode.repeatDelay
+        isRepeatDifferent = actionCode.repeatOperations is not None
+
+        if repeatDelay is None:
+            yield from self._executeInThread(code, actionCode.enterOperations)
+
+        repeating = False
+        while repeatFlag[0] or (isRepeatDifferent and not repeating):
+            if repeatDelay is None:
+                yield (EngineThread.WAIT_CANCELLABLE_DELAY, 10000)
+            else:
+                if isRepeatDifferent and repeating:
+                    yield from \
+                        self._executeInThread(code,
+                                              actionCode.repeatOperations)
+                else:
+                    yield from \
+                        self._executeInThread(code,
+                                              actionCode.enterOperations)
+                repeating = True
+                if repeatFlag[0]:
+                    yield (EngineThread.WAIT_CANCELLABLE_DELAY, repeatDelay)
+
+        yield from self._executeInThread(code, actionCode.leaveOperations)
+
+        if self._threads.get(code) is thread:
+            del self._threads[code]
+
+    def _removeSchedulerEntry(self, code):
+        """Remove the scheduler entry of the given control profile code, if
+        any."""
+        entry = self._schedulerEntries.pop(code, None)
+        if entry is not None:
+            entry.active = False
+
+    def _schedule(self, time, item):
+        """Schedule the given thread or scheduler entry to be run at the
+        given time."""
+        self._sequence += 1
+        if isinstance(item, EngineThread):
+            item.sequence = self._sequence
+        heapq.heappush(self._queue, (time, self._sequence, item))
+
+    def _run(self, time, inclusive):
+        """Run the threads and the scheduler entries due before the given
+        time, or at the given time as well, if inclusive is True.
+
+        The time of the engine is set to the given one afterwards."""
+        queue = self._queue
+        while queue and (queue[0][0]<time or
+                         (inclusive and queue[0][0]==time)):
+            (due, sequence, item) = heapq.heappop(queue)
+            self._now = due
+            if isinstance(item, EngineThread):
+                if item.sequence==sequence:
+                    self._resumeThread(item)
+            elif item.active:
+                item.due += item.period
+                self._schedule(item.due, item)
+                self._execute(item.controlProfileCode, item.operations)
+
+        if time>self._now:
+            self._now = time
+
+    def _resumeThread(self, thread):
+        """Resume the given thread until it waits or finishes."""
+        thread.waiting = EngineThread.WAIT_NONE
+        while True:
+            try:
+                (waiting, argument) = next(thread.body)
+            except StopIteration:
+                thread.finished = True
+                joiner = thread.joiner
+                if joiner is not None:
+                    joiner.waiting = EngineThread.WAIT_NONE
+                    joiner.time = self._now
+                    self._schedule(self._now, joiner)
+                return
+
+            if waiting==EngineThread.WAIT_JOIN:
+                if argument.finished:
+                    continue
+                elif argument.joiner is not None:
+                    thread.body.close()
+                    thread.finished = True
+                    return
+                argument.joiner = thread
+                thread.waiting = waiting
+                return
+            else:
+                thread.waiting = waiting
+                thread.time += argument
+                self._schedule(thread.time, thread)
+                return
+
+#------------------------------------------------------------------------------
@@ -0,0 +1,254 @@
+
+from .joystick import Key, Axis
+from .parser import Control
+
+from gi.repository import GLib
+
+import json
+import sys
+import time
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.eventstream
+#
+# Outputs of the streams of control events
+#
+# The control events received by 'jsprog monitorjs' are passed to an output
+# object having a write() function with the same arguments as that of
+# jsprog.eventtrace.EventTraceWriter: the timestamp in nanoseconds, the ID
+# of the joystick, the type and the code of the control and the value. Such
+# an output can be:
+# - an EventTraceWriter recording the events into a binary trace file,
+# - an EventPrinter printing them in a human-readable form,
+# - an EventJSONLinesWriter writing them as newline-delimited JSON objects,
+#   for processing by other programs.
+# An AxisDecimator can be put in front of any of them to limit the rate of
+# the axis events.
+#
+# The textual outputs also report the addition and removal of joysticks.
+
+#------------------------------------------------------------------------------
+
+class EventPrinter(object):
+    """An output printing the events in a human-readable form."""
+    def __init__(self, showJoystickID = False):
+        """Construct the printer.
+
+        If showJoystickID is True, the ID of the joystick is printed with each
+        event."""
+        self._showJoystickID = showJoystickID
+
+    def write(self, timestamp, joystickID, type, code, value):
+        """Print the given event."""
+        prefix = ("%2d: " % (joystickID,)) if self._showJoystickID else ""
+        if type==Control.TYPE_KEY:
+            print("%s%s key %d (0x%03x, %s)" % \
+                  (prefix, "Pressed" if value else "Released",
+                   code, code, Key.getNameFor(code)))
+        else:
+            print("%sAxis %d (0x%03x, %s) changed to %d" % \
+                  (prefix, code, code, Axis.getNameFor(code), value))
+
+    def writeJoystickAdded(self, timestamp, joystickID, name):
+        """Print that the joystick with the given ID and name has been
+        added."""
+        print("Added joystick %d: %s" % (joystickID, name))
+
+    def writeJoystickRemoved(self, timestamp, joystickID):
+        """Print that the joystick with the given ID has been removed."""
+        print("Removed joystick %d" % (joystickID,))
+
+    def flush(self):
+        """Flush the output."""
+        sys.stdout.flush()
+
+    def close(self):
+        """Close the output."""
+        self.flush()
+
+#------------------------------------------------------------------------------
+
+class EventJSONLinesWriter(object):
+    """An output writing the events as newline-delimited JSON objects.
+
+    Each control event is written as an object like:
+    {"time": 123456789, "joystick": 1, "type": "axis", "code": 0,
+     "name": "ABS_X", "value": 127}
+    where the time is the monotonic time of the arrival of the event in
+    nanoseconds and the value of a key is 1 if pressed, 0 if released. The
+    addition and removal of a joystick is written as an object like:
+    {"time": 123456789, "joystick": 1, "type": "added", "name": "Joystick"}
+    or
+    {"time": 123456789, "joystick": 1, "type": "removed"}
+
+    The lines are written into a binary file, which should be buffered, so
+    that the events are written in blocks. To avoid formatting the same
+    data repeatedly, the lines of the events are produced from templates
+    made for each control when its first event is written."""
+    def __init__(self, file, closedCallback = None):
+        """Construct the writer for the given binary file.
+
+        If the file is closed by its reader (e.g. the other end of a pipe
+        exits), the given callback is called, if any, and the writing
+        stops."""
+        self._file = file
+        self._closedCallback = closedCallback
+
+        # A mapping of the tuples of control types and codes to the
+        # templates of the lines
+        self._templates = {}
+
+    @property
+    def closed(self):
+        """Determine if the writer is closed."""
+        return self._file is None
+
+    def write(self, timestamp, joystickID, type, code, value):
+        """Write the given event."""
+        template = self._templates.get((type, code))
+        if template is None:
+            template = self._templates[(type, code)] = \
+                self._makeTemplate(type, code)
+        self._write(template % (timestamp, joystickID, value))
+
+    def writeJoystickAdded(self, timestamp, joystickID, name):
+        """Write that the joystick with the given ID and name has been
+        added."""
+        self._writeObject({"time": timestamp, "joystick": joystickID,
+                           "type": "added", "name": name})
+
+    def writeJoystickRemoved(self, timestamp, joystickID):
+        """Write that the joystick with the given ID has been removed."""
+        self._writeObject({"time": timestamp, "joystick": joystickID,
+                           "type": "removed"})
+
+    def flush(self):
+        """Flush the buffer of the file."""
+        if self._file is not None:
+            try:
+                self._file.flush()
+            except BrokenPipeError:
+                self._handleClosed()
+
+    def close(self):
+        """Flush and close the file."""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _makeTemplate(self, type, code):
+        """Make the template of the lines of the events of the control with
+        the given type and code.
+
+        The template is a bytes object to be formatted with the timestamp,
+        the joystick ID and the value."""
+        (typeName, name) = ("key", Key.getNameFor(code)) \
+            if type==Control.TYPE_KEY \
+            else ("axis", Axis.getNameFor(code))
+        return ('{"time": %%d, "joystick": %%d, "type": "%s", "code": %d, '
+                '"name": %s, "value": %%d}\n' %
+                (typeName, code, json.dumps(name))).encode("ascii")
+
+    def _writeObject(self, obj):
+        """Write the given object as a line of JSON."""
+        self._write((json.dumps(obj) + "\n").encode("utf-8"))
+
+    def _write(self, data):
+        """Write the given data into the file."""
+        if self._file is not None:
+            try:
+                self._file.write(data)
+            except BrokenPipeError:
+                self._handleClosed()
+
+    def _handleClosed(self):
+        """Handle the closing of the file by its reader."""
+        file = self._file
+        self._file = None
+        try:
+            file.close()
+        except BrokenPipeError:
+            pass
+        if self._closedCallback is not None:
+            self._closedCallback()
+
+#------------------------------------------------------------------------------
+
+class AxisDecimator(object):
+    """An output passing the events to another output while limiting the
+    rate of the events of each axis.
+
+    An event of an axis is passed on only if at least the given interval
+    has elapsed since the last event passed on for the same axis of the same
+    joystick. Otherwise the event is held back, replacing any earlier event
+    held back for the axis, and the latest one is passed on when the
+    interval has elapsed, so the last value of an axis is never lost. Events
+    of keys are always passed on immediately. The events keep their original
+    timestamps. A GLib main loop is needed for passing on the events held
+    back."""
+    def __init__(self, output, interval):
+        """Construct the decimator for the given output and the given minimal
+        interval in milliseconds."""
+        self._output = output
+        self._interval = interval
+        self._intervalNS = interval * 1000000
+
+        # A mapping of the tuples of joystick IDs and axis codes to the
+        # timestamps of the last events passed on
+        self._lastTimestamps = {}
+
+        # A mapping of the tuples of joystick IDs and axis codes to the
+        # tuples of the timestamps and the values of the events held back
+        self._pending = {}
+
+    def write(self, timestamp, joystickID, type, code, value):
+        """Process the given event."""
+        if type!=Control.TYPE_AXIS:
+            self._output.write(timestamp, joystickID, type, code, value)
+            return
+
+        key = (joystickID, code)
+        lastTimestamp = self._lastTimestamps.get(key)
+        if key in self._pending:
+            self._pending[key] = (timestamp, value)
+        elif lastTimestamp is None or \
+             timestamp - lastTimestamp>=self._intervalNS:
+            self._lastTimestamps[key] = timestamp
+            self._output.write(timestamp, joystickID, type, code, value)
+        else:
+            self._pending[key] = (timestamp, value)
+            delay = (lastTimestamp + self._intervalNS - timestamp) // 1000000
+            GLib.timeout_add(max(1, delay), self._releasePending, key)
+
+    def writeJoystickAdded(self, timestamp, joystickID, name):
+        """Pass on that the joystick with the given ID and name has been
+        added."""
+        self._output.writeJoystickAdded(timestamp, joystickID, name)
+
+    def writeJoystickRemoved(self, timestamp, joystickID):
+        """Pass on that the joystick with the given ID has been removed."""
+        self._output.writeJoystickRemoved(timestamp, joystickID)
+
+    def flush(self):
+        """Pass on the events held back and flush the output."""
+        for key in list(self._pending.keys()):
+            self._releasePending(key)
+        self._output.flush()
+
+    def close(self):
+        """Pass on the events held back and close the output."""
+        self.flush()
+        self._output.close()
+
+    def _releasePending(self, key):
+        """Pass on the event held back for the given key, if any."""
+        item = self._pending.pop(key, None)
+        if item is not None:
+            (timestamp, value) = item
+            (joystickID, code) = key
+            self._lastTimestamps[key] = time.monotonic_ns()
+            self._output.write(timestamp, joystickID, Control.TYPE_AXIS,
+                               code, value)
+        return False
@@ -0,0 +1,240 @@
+
+from array import array
+
+import mmap
+import os
+import struct
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.eventtrace
+#
+# Binary traces of control events
+#
+# A trace file records the events of the controls of joysticks, e.g. as
+# monitored by 'jsprog monitorjs --record'. It starts with a header of 16
+# bytes containing a magic string, the version of the format and the size
+# of a record. The header is followed by records of a fixed size, each
+# consisting of:
+# - the monotonic timestamp of the event in nanoseconds (64-bit signed),
+# - the ID of the joystick (32-bit unsigned),
+# - the type of the control (16-bit unsigned, Control.TYPE_KEY or
+#   Control.TYPE_AXIS),
+# - the code of the control (16-bit unsigned),
+# - the value (32-bit signed), which is 1 or 0 for a key pressed or
+#   released.
+# All numbers are little-endian.
+#
+# Since the records have a fixed size, a trace can be read by mapping the
+# file into the memory and unpacking the records directly from there, or by
+# interpreting the mapping as a structured NumPy array. If the writing of a
+# trace is interrupted, an incomplete last record is ignored.
+
+#------------------------------------------------------------------------------
+
+class EventTrace(object):
+    """The format of the trace files."""
+    ## The magic string at the beginning of the file
+    magic = b"JSPTRACE"
+
+    ## The version of the format
+    version = 1
+
+    ## The header of the file: the magic string, the version, the size of a
+    ## record and 4 reserved bytes
+    headerStruct = struct.Struct("<8sHHI")
+
+    ## A record of an event
+    recordStruct = struct.Struct("<qIHHi")
+
+    ## The names of the fields of a record with their struct formats, which
+    ## can be used as the description of a NumPy dtype
+    fields = [("timestamp", "<i8"), ("joystickID", "<u4"),
+              ("type", "<u2"), ("code", "<u2"), ("value", "<i4")]
+
+    ## The type codes of the arrays of the fields (see
+    ## EventTraceReader.getColumns())
+    _columnTypeCodes = ["q", "I", "H", "H", "i"]
+
+#------------------------------------------------------------------------------
+
+class EventTraceWriter(object):
+    """A writer of a trace file.
+
+    The records are collected in a buffer, which is written to the file when
+    it is full, when flush() is called and when the writer is closed. The
+    writer can be used as a context manager."""
+    ## The number of records in the buffer
+    numBufferedRecords = 4096
+
+    def __init__(self, path):
+        """Create the trace file with the given path and write its
+        header."""
+        self._file = open(path, "wb")
+        self._file.write(EventTrace.headerStruct.pack(EventTrace.magic,
+                                                      EventTrace.version,
+                                                      EventTrace.recordStruct.size,
+                                                      0))
+
+        self._buffer = bytearray(EventTraceWriter.numBufferedRecords *
+                                 EventTrace.recordStruct.size)
+        self._offset = 0
+
+        self._numRecords = 0
+
+    @property
+    def numRecords(self):
+        """Get the number of records written so far."""
+        return self._numRecords
+
+    def write(self, timestamp, joystickID, type, code, value):
+        """Write a record of an event with the given data."""
+        EventTrace.recordStruct.pack_into(self._buffer, self._offset,
+                                          timestamp, joystickID, type, code,
+                                          value)
+        self._offset += EventTrace.recordStruct.size
+        self._numRecords += 1
+
+        if self._offset==len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records to the file."""
+        if self._offset>0:
+            self._file.write(memoryview(self._buffer)[:self._offset])
+            self._offset = 0
+        self._file.flush()
+
+    def close(self):
+        """Write the buffered records and close the file."""
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        """Enter the writer as a context manager."""
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        """Close the writer when leaving the context."""
+        self.close()
+        return False
+
+#------------------------------------------------------------------------------
+
+class EventTraceReader(object):
+    """A reader of a trace file.
+
+    The file is mapped into the memory. The reader can be used as a context
+    manager, and it should be closed when no longer needed, after the
+    arrays returned by getNumPyArray() are released."""
+    def __init__(self, path):
+        """Open the trace file with the given path.
+
+        ValueError is raised if the file is not a trace file of a supported
+        version."""
+        headerSize = EventTrace.headerStruct.size
+
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size<headerSize:
+                raise ValueError("%s is not an event trace file" % (path,))
+            self._mmap = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        (magic, version, recordSize, _reserved) = \
+            EventTrace.headerStruct.unpack_from(self._mmap, 0)
+        if magic!=EventTrace.magic or version!=EventTrace.version or \
+           recordSize!=EventTrace.recordStruct.size:
+            self._mmap.close()
+            raise ValueError("%s is not an event trace file of version %d" %
+                             (path, EventTrace.version))
+
+        self._numRecords = (len(self._mmap) - headerSize) // recordSize
+
+    @property
+    def numRecords(self):
+        """Get the number of records in the trace."""
+        return self._numRecords
+
+    def __len__(self):
+        """Get the number of records in the trace."""
+        return self._numRecords
+
+    def __getitem__(self, index):
+        """Get the record with the given index as a tuple of the timestamp,
+        the joystick ID, the type, the code and the value."""
+        if index<0:
+            index += self._numRecords
+        if index<0 or index>=self._numRecords:
+            raise IndexError("record index out of range")
+
+        return EventTrace.recordStruct.unpack_from(
+            self._mmap,
+            EventTrace.headerStruct.size + index * EventTrace.recordStruct.size)
+
+    def __iter__(self):
+        """Iterate over all records."""
+        return self.iterRecords()
+
+    def iterRecords(self, start = 0, stop = None):
+        """Iterate over the records from the given start index until the given
+        stop index (exclusive).
+
+        The records are tuples of the timestamp, the joystick ID, the type,
+        the code and the value."""
+        stop = self._numRecords if stop is None \
+            else min(stop, self._numRecords)
+        if start>=stop:
+            return iter(())
+
+        recordSize = EventTrace.recordStruct.size
+        offset = EventTrace.headerStruct.size
+        data = memoryview(self._mmap)[offset + start * recordSize:
+                                      offset + stop * recordSize]
+        return EventTrace.recordStruct.iter_unpack(data)
+
+    def getColumns(self):
+        """Get the fields of the records as arrays.
+
+        Returns a dictionary of the names of the fields (see
+        EventTrace.fields) to array.array objects containing the values of
+        the fields of all records. These support the buffer protocol, so
+        they can be converted into NumPy arrays without copying."""
+        columns = [array(typeCode) for typeCode in EventTrace._columnTypeCodes]
+        appends = [column.append for column in columns]
+        for record in self.iterRecords():
+            for (append, value) in zip(appends, record):
+                append(value)
+
+        return dict(zip([name for (name, _format) in EventTrace.fields],
+                        columns))
+
+    def getNumPyArray(self):
+        """Get the records as a structured NumPy array with the fields in
+        EventTrace.fields.
+
+        The array refers to the mapped file directly, without copying it.
+        NumPy is needed for this function only, and ImportError is raised
+        if it is not available."""
+        import numpy
+
+        return numpy.frombuffer(self._mmap, dtype = numpy.dtype(EventTrace.fields),
+                                count = self._numRecords,
+                                offset = EventTrace.headerStruct.size)
+
+    def close(self):
+        """Close the mapping of the file."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        """Enter the reader as a context manager."""
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        """Close the reader when leaving the context."""
+        self.close()
+        return False
+
+#------------------------------------------------------------------------------
@@ -0,0 +1,220 @@
+
+from .common import *
+
+from jsprog.inotify import INotify
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.gui.devicewatcher
+#
+# Watching the device directories for changes made outside of the program
+#
+# The device directories of the joystick types (i.e. the devices/<device>
+# subdirectories of the data directories) are watched using inotify. When a
+# profile or a joystick type descriptor is changed, only that file is
+# reloaded by the joystick type, which emits the appropriate signals.
+#
+# The devices directories themselves are also watched, so that device
+# directories created later (e.g. when a system-wide configuration is
+# installed) are noticed as well.
+
+#------------------------------------------------------------------------------
+
+class DeviceWatcher(object):
+    """Watcher of the device directories of the joystick types."""
+    # The events watched for in the device directories
+    _deviceDirectoryMask = INotify.IN_CLOSE_WRITE | INotify.IN_MOVED_TO | \
+        INotify.IN_MOVED_FROM | INotify.IN_DELETE | INotify.IN_MOVE_SELF | \
+        INotify.IN_ONLYDIR
+
+    # The events watched for in the devices directories
+    _devicesDirectoryMask = INotify.IN_CREATE | INotify.IN_MOVED_TO | \
+        INotify.IN_ONLYDIR
+
+    # The delay in milliseconds between the first reported change and
+    # processing the changes. Programs often write a file in several steps,
+    # so it is worth waiting for them to finish.
+    _settleDelay = 250
+
+    def __init__(self, gui):
+        """Construct the watcher for the given GUI."""
+        self._gui = gui
+
+        self._joystickTypes = []
+
+        # A mapping of watch descriptors to tuples of the path, the directory
+        # type and the joystick type (None for the devices directories)
+        self._watches = {}
+        self._watchedPaths = {}
+
+        # A mapping of tuples of a joystick type and a file path to the
+        # directory type
+        self._changedFiles = {}
+
+        # A mapping of tuples of a joystick type and a directory path to the
+        # directory type
+        self._changedDirectories = {}
+
+        self._settleSourceID = None
+
+        try:
+            self._inotify = INotify()
+            self._inputSourceID = \
+                GLib.io_add_watch(self._inotify.fileno(),
+                                  GLib.PRIORITY_DEFAULT, GLib.IO_IN,
+                                  self._handleInput)
+        except OSError as e:
+            print("Cannot watch the device directories:", e, file=sys.stderr)
+            self._inotify = None
+            self._inputSourceID = None
+
+    def addJoystickType(self, joystickType):
+        """Start watching the device directories of the given joystick
+        type."""
+        if self._inotify is None or joystickType in self._joystickTypes:
+            return
+
+        self._joystickTypes.append(joystickType)
+
+        for (path, directoryType) in joystickType.deviceDirectories:
+            devicesPath = os.path.dirname(path)
+            if directoryType=="user":
+                try:
+                    os.makedirs(devicesPath, exist_ok = True)
+                except Exception as e:
+                    print("Cannot create directory %s: %s" % (devicesPath, e),
+                          file=sys.stderr)
+            self._addWatch(devicesPath, directoryType, None)
+            self._addWatch(path, directoryType, joystickType)
+
+    def close(self):
+        """Stop watching the directories."""
+        if self._settleSourceID is not None:
+            GLib.source_remove(self._settleSourceID)
+            self._settleSourceID = None
+        if self._inputSourceID is not None:
+            GLib.source_remove(self._inputSourceID)
+            self._inputSourceID = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _addWatch(self, path, directoryType, joystickType):
+        """Add a watch for the directory with the given path, if it exists
+        and is not watched yet."""
+        if path in self._watchedPaths or not os.path.isdir(path):
+            return False
+
+        mask = DeviceWatcher._devicesDirectoryMask if joystickType is None \
+            else DeviceWatcher._deviceDirectoryMask
+        try:
+            wd = self._inotify.addWatch(path, mask)
+        except OSError as e:
+            print("Cannot watch directory %s: %s" % (path, e), file=sys.stderr)
+            return False
+
+        self._watches[wd] = (path, directoryType, joystickType)
+        self._watchedPaths[path] = wd
+
+        return True
+
+    def _removeWatch(self, wd):
+        """Forget about the watch with the given descriptor.
+
+        The watch itself should have been removed by the kernel."""
+        watch = self._watches.pop(wd, None)
+        if watch is not None:
+            del self._watchedPaths[watch[0]]
+
+    def _handleInput(self, source, condition):
+        """Called when there are events to read."""
+        for event in self._inotify.readEvents():
+            if event.mask&INotify.IN_Q_OVERFLOW:
+                self._handleOverflow()
+                continue
+
+            watch = self._watches.get(event.wd)
+            if watch is None:
+                continue
+
+            (path, directoryType, joystickType) = watch
+
+            if event.mask&INotify.IN_IGNORED:
+                self._removeWatch(event.wd)
+            elif event.mask&INotify.IN_MOVE_SELF:
+                try:
+                    self._inotify.removeWatch(event.wd)
+                except OSError:
+                    pass
+                self._removeWatch(event.wd)
+                if joystickType is not None:
+                    self._changedDirectories[(joystickType, path)] = \
+                        directoryType
+            elif joystickType is None:
+                if event.isDirectory:
+                    self._handleDeviceDirectoryCreated(os.path.join(path,
+                                                                    event.name))
+            else:
+                self._changedFiles[(joystickType,
+                                    os.path.join(path, event.name))] = \
+                    directoryType
+
+        if (self._changedFiles or self._changedDirectories) and \
+           self._settleSourceID is None:
+            self._settleSourceID = \
+                GLib.timeout_add(DeviceWatcher._settleDelay,
+                                 self._processChanges)
+
+        return True
+
+    def _handleDeviceDirectoryCreated(self, path):
+        """Handle the creation of a directory with the given path in one of
+        the devices directories.
+
+        If it is a device directory of one of the joystick types, it will be
+        watched and its contents will be loaded."""
+        for joystickType in self._joystickTypes:
+            for (devicePath, directoryType) in joystickType.deviceDirectories:
+                if devicePath==path and \
+                   self._addWatch(path, directoryType, joystickType):
+                    self._changedDirectories[(joystickType, path)] = \
+                        directoryType
+
+    def _handleOverflow(self):
+        """Handle the overflow of the event queue.
+
+        All watched device directories are reloaded."""
+        print("Too many changes in the device directories, reloading all of them",
+              file=sys.stderr)
+        for (path, directoryType, joystickType) in self._watches.values():
+            if joystickType is not None:
+                self._changedDirectories[(joystickType, path)] = directoryType
+
+    def _processChanges(self):
+        """Process the changes collected so far."""
+        self._settleSourceID = None
+
+        changedDirectories = self._changedDirectories
+        self._changedDirectories = {}
+
+        changedFiles = self._changedFiles
+        self._changedFiles = {}
+
+        for ((joystickType, path), directoryType) in changedDirectories.items():
+            try:
+                joystickType.reloadDirectory(path, directoryType)
+            except Exception as e:
+                print("Failed to reload directory %s: %s" % (path, e),
+                      file=sys.stderr)
+
+        for ((joystickType, path), directoryType) in changedFiles.items():
+            if (joystickType, os.path.dirname(path)) in changedDirectories:
+                continue
+            try:
+                joystickType.reloadFile(path, directoryType)
+            except Exception as e:
+                print("Failed to reload %s: %s" % (path, e), file=sys.stderr)
+
+        return False
+
+#------------------------------------------------------------------------------
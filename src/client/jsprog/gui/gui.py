@@ -3,12 +3,17 @@ from .joystick import JoystickType, Joystick
 from .jswindow import JSWindow
 from .typeeditor import TypeEditorWindow
 from .profileseditor import ProfilesEditorWindow
+from .devicewatcher import DeviceWatcher
+from .profileslots import ProfileUsage, ProfileSlots
+from .latency import LatencyRecorder, LatencyWindow
 from .common import *
 from .common import _
 
 from jsprog.const import dbusInterfaceName, dbusInterfacePath, VERSION
 from jsprog.const import dbusListenerInterfaceName
-from jsprog.util import getJSProg
+from jsprog.dbusproxy import JSProg
+from jsprog.profilecache import ProfileCache
+from jsprog.diagnostics import slowCallTraced
 import jsprog.joystick
 
 import dbus.service
@@ -27,40 +32,75 @@ class JoystickListener(dbus.service.Object):
     def __init__(self, gui, connection, path):
         """Construct the listener with the given path."""
         self._gui = gui
+        self._latencyRecorder = gui.latencyRecorder
         super(JoystickListener, self).__init__(connection, path)
 
     @dbus.service.method(dbus_interface = dbusListenerInterfaceName,
                          in_signature = "uq", out_signature = "")
     def keyPressed(self, joystickID, code):
         """Called when a key is pressed."""
-        self._gui._keyPressed(joystickID, code)
+        self._dispatch(self._gui._keyPressed, joystickID, code)
 
     @dbus.service.method(dbus_interface = dbusListenerInterfaceName,
                          in_signature = "uq", out_signature = "")
     def keyReleased(self, joystickID, code):
         """Called when a key is released."""
-        self._gui._keyReleased(joystickID, code)
+        self._dispatch(self._gui._keyReleased, joystickID, code)
 
     @dbus.service.method(dbus_interface = dbusListenerInterfaceName,
                          in_signature = "uqi", out_signature = "")
     def axisChanged(self, joystickID, code, value):
         """Called when the value of an axis has changed."""
-        self._gui._axisChanged(joystickID, code, value)
+        self._dispatch(self._gui._axisChanged, joystickID, code, value)
+
+    def _dispatch(self, fun, *args):
+        """Call the given function of the GUI with the given arguments.
+
+        If the latency instrumentation is enabled, the arrival of the event
+        is recorded."""
+        recorder = self._latencyRecorder
+        if recorder is None:
+            fun(*args)
+        else:
+            recorder.arrived()
+            try:
+                fun(*args)
+            finally:
+                recorder.finished()
 
 #--------------------------------------------------------------------------------
 
 class GUI(Gtk.Application):
     """The main object."""
-    def __init__(self, connection, extraDataDirectory, debug = False):
-        """Construct the GUI."""
+    def __init__(self, connection, extraDataDirectory, debug = False,
+                 useProfileCache = True, luaProfiling = False,
+                 latencyDumpPath = None):
+        """Construct the GUI.
+
+        If luaProfiling is True, the code of the profiles loaded into the
+        daemon is instrumented with counters of the invocations and the
+        time spent in its functions (see DaemonCode.instrument()).
+
+        If debugging is enabled or a latency dump path is given, the
+        latencies of the control events are recorded (see LatencyRecorder).
+        The latencies are dumped into the file with the given path, if any,
+        when the GUI quits."""
         super().__init__(application_id = "hu.varadiistvan.JSProgGUI",
                          flags = Gio.ApplicationFlags.FLAGS_NONE)
         self._connection = connection
         self._extraDataDirectory = extraDataDirectory
         self._debug = debug
+        self._profileCache = \
+            ProfileCache(os.path.join(self.userCacheDirectory, "profiles")) \
+            if useProfileCache else None
         self._jsprog = None
         self._jsWindow = None
         self._aboutDialog = None
+        self._luaProfiling = luaProfiling
+        self._latencyDumpPath = latencyDumpPath
+        self._latencyRecorder = LatencyRecorder() \
+            if debug or latencyDumpPath else None
+        self._latencyWindow = None
 
         resourcePath = os.path.join(pkgdatadir, "jsprog.gresource")
         if os.path.exists(resourcePath):
@@ -71,7 +111,23 @@ class GUI(Gtk.Application):
             iconTheme.add_resource_path("/hu/varadiistvan/JSProgGUI")
 
         self._addingJoystick = False
-        self._activatingProfile = False
+        # A mapping of the IDs of the joysticks with a profile activation in
+        # progress to the joysticks themselves
+        self._activatingProfiles = {}
+        # A mapping of the IDs of the joysticks with a profile activation in
+        # progress to the profiles requested last while it was in progress
+        self._activationRequests = {}
+        # The IDs of the joysticks whose menus are being updated to reflect
+        # the result of a profile activation. The activations triggered by
+        # these updates are ignored.
+        self._updatingActiveProfiles = set()
+        # A mapping of the IDs of the joysticks to the daemon code (see
+        # DaemonCode) last loaded into them successfully
+        self._daemonCodes = {}
+        self._profileSlots = \
+            ProfileSlots(self,
+                         ProfileUsage(os.path.join(self.userDataDirectory,
+                                                   "usage.json")))
         self._nextNotificationID = 1
         self._pendingNotifications = []
 
@@ -86,6 +142,22 @@ class GUI(Gtk.Application):
         """Indicate if debugging is enabled."""
         return self._debug
 
+    @property
+    def luaProfiling(self):
+        """Indicate if the code of the profiles is instrumented."""
+        return self._luaProfiling
+
+    @property
+    def latencyRecorder(self):
+        """Get the recorder of the latencies of the control events, if
+        enabled."""
+        return self._latencyRecorder
+
+    @property
+    def jsprog(self):
+        """Get the D-Bus proxy of the daemon."""
+        return self._jsprog
+
     @property
     def joysticksWindow(self):
         """Get the window containing the joysticks."""
@@ -97,6 +169,16 @@ class GUI(Gtk.Application):
         return os.path.join(str(pathlib.Path.home()), ".local",
                             "share", "jsprog")
 
+    @property
+    def userCacheDirectory(self):
+        """Get the cache directory of the user."""
+        return os.path.join(str(pathlib.Path.home()), ".cache", "jsprog")
+
+    @property
+    def profileCache(self):
+        """Get the cache of the parsed profiles, if it is used."""
+        return self._profileCache
+
     @property
     def dataDirectories(self):
         """Get an iterator over the data directory path to be used for profiles
@@ -133,6 +215,11 @@ class GUI(Gtk.Application):
         aboutAction.connect("activate", self._handleAbout)
         self.add_action(aboutAction)
 
+        if self._latencyRecorder is not None:
+            latencyAction = Gio.SimpleAction.new("latency", None)
+            latencyAction.connect("activate", self._handleLatency)
+            self.add_action(latencyAction)
+
         quitAction = Gio.SimpleAction.new("quit", None)
         quitAction.connect("activate", self._handleQuit)
         self.add_action(quitAction)
@@ -147,7 +234,7 @@ class GUI(Gtk.Application):
             connection.add_match_string("interface='%s'" % (dbusInterfaceName,))
             connection.add_message_filter(self._filterMessage)
 
-            self._jsprog = getJSProg(connection)
+            self._jsprog = JSProg.get(connection)
 
             self._addingJoystick = False
             self._joysticks = {}
@@ -157,8 +244,10 @@ class GUI(Gtk.Application):
 
             self._graphicsFontDescription = self._getGraphicsFontDescription()
 
-            for joystickArgs in self._jsprog.getJoysticks():
-                self._addJoystick(joystickArgs)
+            self._deviceWatcher = DeviceWatcher(self)
+
+            for joystick in self._jsprog.getJoysticks():
+                self._addJoystick(joystick)
 
             pid = os.getpid()
 
@@ -173,20 +262,76 @@ class GUI(Gtk.Application):
 
         self._jsWindow.present()
 
-    def _loadProfile(self, id, profile):
-        """Load the given profile to the given joystick."""
-        daemonXMLDocument = profile.getDaemonXMLDocument()
-        daemonXML = io.StringIO()
-        daemonXMLDocument.writexml(daemonXML)
+    def _loadProfile(self, id, profile, replyHandler, errorHandler):
+        """Start loading the given profile to the given joystick.
+
+        The D-Bus call is asynchronous. When the daemon has loaded the
+        profile, replyHandler is called without arguments. If the loading
+        fails, errorHandler is called with the exception.
+
+        If the profile has been preloaded into a slot of the joystick (see
+        ProfileSlots), the daemon is only told to switch to that slot.
 
+        If the code of the profile differs from the code loaded previously
+        into the joystick only in the control profiles, only the changes are
+        sent to the daemon, and the runtime state of the other controls is
+        preserved (see DaemonCode.getUpdateXMLDocument())."""
         joystick = self._joysticks[id]
 
-        print("Loading profile '%s' for joystick %s (%d)" %
-              (profile.name, joystick.identity, id))
+        # The state of the daemon is not known until the call completes
+        previousDaemonCode = self._daemonCodes.pop(id, None)
+
+        preloaded = self._profileSlots.find(id, profile)
+        if preloaded is not None:
+            (slot, daemonCode) = preloaded
+
+            print("Switching to profile '%s' in slot %d for joystick %s (%d)" %
+                  (profile.name, slot, joystick.identity, id))
+
+            def handleSwitchReply(result):
+                if result:
+                    self._daemonCodes[id] = daemonCode
+                    replyHandler()
+                else:
+                    errorHandler(Exception("The daemon failed to switch to the profile."))
+
+            self._jsprog.switchProfile(id, slot,
+                                       reply_handler = handleSwitchReply,
+                                       error_handler = errorHandler)
+            return
+
+        daemonCode = profile.getDaemonCode(profiling = self._luaProfiling)
+        daemonXMLDocument = \
+            daemonCode.getUpdateXMLDocument(previousDaemonCode)
+        update = daemonXMLDocument is not None
+        if not update:
+            daemonXMLDocument = daemonCode.getXMLDocument()
+
+        daemonXML = io.StringIO()
+        daemonXMLDocument.writexml(daemonXML)
+
+        print("%s profile '%s' for joystick %s (%d)" %
+              ("Updating" if update else "Loading",
+               profile.name, joystick.identity, id))
+        if self._debug:
+            print(profile.getDaemonCodeReport())
         #print(daemonXML.getvalue())
 
-        if not self._jsprog.loadProfile(id, daemonXML.getvalue()):
-            raise Exception("The daemon failed to process the profile.")
+        def handleReply(result):
+            if result:
+                self._daemonCodes[id] = daemonCode
+                replyHandler()
+            else:
+                errorHandler(Exception("The daemon failed to process the profile."))
+
+        if update:
+            self._jsprog.updateProfile(id, daemonXML.getvalue(),
+                                       reply_handler = handleReply,
+                                       error_handler = errorHandler)
+        else:
+            self._jsprog.loadProfile(id, daemonXML.getvalue(),
+                                     reply_handler = handleReply,
+                                     error_handler = errorHandler)
 
     def showProfilesEditor(self, id):
         """Show the profiles editor window for the type of the given joystick."""
@@ -241,6 +386,13 @@ class GUI(Gtk.Application):
         if profileEditorWindow is not None:
             profileEditorWindow.copyUniq(uniq)
 
+    def profileReloaded(self, joystickType, profile):
+        """Called when the given profile of the given joystick type has been
+        reloaded, because it was changed outside of the program."""
+        profileEditorWindow = self._profilesEditorWindows.get(joystickType)
+        if profileEditorWindow is not None:
+            profileEditorWindow.profileReloaded(profile)
+
     def showTypeEditor(self, id):
         """Show the type editor window for the type of the given joystick."""
         joystick = self._joysticks[id]
@@ -285,11 +437,11 @@ class GUI(Gtk.Application):
             return False
 
         if not listeners:
-            for joystick in self._joysticks.values():
-                if joystick.type is joystickType:
-                    self._jsprog.startMonitor(joystick.id,
-                                              self._jsListenerBusName.get_name(),
-                                              self._jsListenerPath)
+            ids = self._getJoystickIDsFor(joystickType)
+            if ids:
+                self._jsprog.startMonitors(ids,
+                                           self._jsListenerBusName.get_name(),
+                                           self._jsListenerPath)
 
         if listeners is None:
             self._joystickMonitorListeners[joystickType] = [listener]
@@ -299,15 +451,15 @@ class GUI(Gtk.Application):
         return True
 
     def getJoystickStatesFor(self, joystickType):
-        """Get the state of the joysticks of the given type."""
-
-        states = []
+        """Get the state of the joysticks of the given type.
 
-        for joystick in self._joysticks.values():
-            if joystick.type is joystickType:
-                states.append(self._jsprog.getJoystickState(joystick.id))
+        The states are queried from the daemon in one call."""
+        ids = self._getJoystickIDsFor(joystickType)
+        if not ids:
+            return []
 
-        return states
+        states = self._jsprog.getJoystickStates(ids)
+        return [states[id] for id in ids if id in states]
 
     def stopMonitorJoysticksFor(self, joystickType, listener):
         """Stop monitoring the joystick(s) of the given type for the given
@@ -322,10 +474,9 @@ class GUI(Gtk.Application):
         listeners.remove(listener)
 
         if not listeners:
-            for joystick in self._joysticks.values():
-                if joystick.type is joystickType:
-                    self._jsprog.stopMonitor(joystick.id,
-                                             self._jsListenerPath)
+            ids = self._getJoystickIDsFor(joystickType)
+            if ids:
+                self._jsprog.stopMonitors(ids, self._jsListenerPath)
             del self._joystickMonitorListeners[joystickType]
 
         return True
@@ -333,25 +484,84 @@ class GUI(Gtk.Application):
     def activateProfile(self, id, profile):
         """Active the given profile on the joystick with the given ID.
 
-        If no activation is in progress, the activation request is propagated
-        to the various menus, and the profile is downloaded to the joystick."""
-        if id not in self._joysticks:
-            return
+        If no activation is in progress for the joystick, the profile is
+        downloaded to it asynchronously. When the download has finished, the
+        activation is propagated to the various menus. Activations for
+        different joysticks may be in progress at the same time.
 
-        if self._activatingProfile:
+        If an activation is in progress for the joystick, the profile is
+        remembered, and it is activated when the activation in progress has
+        finished, unless it is the same profile. So the profile requested
+        last wins.
+
+        The calls made while the menus are being updated after an activation
+        are ignored, since they only echo the result of the activation."""
+        if id not in self._joysticks or id in self._updatingActiveProfiles:
             return
 
-        self._activatingProfile = True
+        if id in self._activatingProfiles:
+            self._activationRequests[id] = profile
+            return
 
         joystick = self._joysticks[id]
+        self._activatingProfiles[id] = joystick
+        self._activationRequests.pop(id, None)
+
+        notify = not self._addingJoystick
 
         try:
-            self._loadProfile(id, profile)
-            joystick.setActiveProfile(profile, notify = not self._addingJoystick)
+            self._loadProfile(id, profile,
+                              lambda: self._profileLoaded(id, joystick,
+                                                          profile, notify),
+                              lambda e: self._profileLoadFailed(id, joystick,
+                                                                profile, e))
         except Exception as e:
-            joystick.profileDownloadFailed(profile, e)
+            self._profileLoadFailed(id, joystick, profile, e)
+
+    def _profileLoaded(self, id, joystick, profile, notify):
+        """Called when the daemon has loaded the given profile to the given
+        joystick with the given ID.
 
-        self._activatingProfile = False
+        If the joystick still exists, the activation is propagated to the
+        menus. The changes of the menus do not trigger another activation,
+        and then the profile requested while the activation was in progress,
+        if any, is activated."""
+        if self._activatingProfiles.get(id) is not joystick:
+            return
+
+        self._profileSlots.recordUsage(joystick, profile)
+
+        self._updatingActiveProfiles.add(id)
+        try:
+            joystick.setActiveProfile(profile, notify = notify)
+        finally:
+            self._updatingActiveProfiles.discard(id)
+            del self._activatingProfiles[id]
+
+        self._activateRequestedProfile(id, profile)
+
+    def _profileLoadFailed(self, id, joystick, profile, exc):
+        """Called when loading the given profile to the given joystick with
+        the given ID has failed with the given exception."""
+        if self._activatingProfiles.get(id) is not joystick:
+            return
+
+        self._updatingActiveProfiles.add(id)
+        try:
+            joystick.profileDownloadFailed(profile, exc)
+        finally:
+            self._updatingActiveProfiles.discard(id)
+            del self._activatingProfiles[id]
+
+        self._activateRequestedProfile(id, profile)
+
+    def _activateRequestedProfile(self, id, profile):
+        """Activate the profile requested for the joystick with the given ID
+        while the activation of the given profile was in progress, if it is a
+        different profile."""
+        requestedProfile = self._activationRequests.pop(id, None)
+        if requestedProfile is not None and requestedProfile is not profile:
+            self.activateProfile(id, requestedProfile)
 
     def sendNotify(self, summary, body = None, timeout = 30,
                    priority = None, icon = None):
@@ -388,16 +598,30 @@ class GUI(Gtk.Application):
             for joystick in self._joysticks.values():
                 joystick.destroy(notify = False)
 
+            self._deviceWatcher.close()
+
         for notificationID in self._pendingNotifications:
             self.withdraw_notification(notificationID)
 
+        if self._latencyDumpPath:
+            try:
+                self._latencyRecorder.dump(self._latencyDumpPath)
+            except Exception as e:
+                print("Failed to dump the latencies to %s: %s" %
+                      (self._latencyDumpPath, e), file=sys.stderr)
+
         Gtk.Application.do_shutdown(self)
 
-    def _addJoystick(self, args):
-        """Add a joystick from the given arguments."""
-        (id, identity, keys, axes) = jsprog.joystick.Joystick.extractArgs(args)
+    def _addJoystick(self, daemonJoystick):
+        """Add a joystick from the given joystick object received from the
+        daemon."""
+        id = daemonJoystick.id
+        identity = daemonJoystick.identity
+        keys = daemonJoystick.keys
+        axes = daemonJoystick.axes
 
         joystickType = JoystickType.get(self, identity, keys, axes)
+        self._deviceWatcher.addJoystickType(joystickType)
 
         joystick = self._joysticks[id] = Joystick(id, identity,
                                                   joystickType, self)
@@ -419,6 +643,8 @@ class GUI(Gtk.Application):
             self.activateProfile(id, autoLoadProfile)
             self._addingJoystick = False
 
+        self._profileSlots.preload(joystick)
+
         if joystickType in self._joystickMonitorListeners:
             self._jsprog.startMonitor(id,
                                       self._jsListenerBusName.get_name(),
@@ -440,7 +666,18 @@ class GUI(Gtk.Application):
 
         joystick.destroy()
         del self._joysticks[id]
-
+        self._activatingProfiles.pop(id, None)
+        self._activationRequests.pop(id, None)
+        self._updatingActiveProfiles.discard(id)
+        self._daemonCodes.pop(id, None)
+        self._profileSlots.remove(id)
+
+    def _getJoystickIDsFor(self, joystickType):
+        """Get the IDs of the joysticks of the given type."""
+        return [joystick.id for joystick in self._joysticks.values()
+                if joystick.type is joystickType]
+
+    @slowCallTraced
     def _filterMessage(self, connection, message):
         """Handle notifications."""
         if message.get_interface()==dbusInterfaceName:
@@ -448,7 +685,7 @@ class GUI(Gtk.Application):
             if message.get_member()=="joystickAdded":
                 id = args[0]
                 if id not in self._joysticks:
-                    self._addJoystick(args);
+                    self._addJoystick(jsprog.joystick.Joystick.fromArgs(args));
             elif message.get_member()=="joystickRemoved":
                 id = args[0]
                 if id in self._joysticks:
@@ -462,24 +699,39 @@ class GUI(Gtk.Application):
             print(message)
             return True
 
+    @slowCallTraced
     def _keyPressed(self, joystickID, code):
         """Called when a key has been pressed on the given joystick."""
         joystick = self._joysticks.get(joystickID)
         if joystick is not None:
             listeners = self._joystickMonitorListeners[joystick.type]
             if listeners is not None:
+                recorder = self._latencyRecorder
+                if recorder is not None:
+                    recorder.mark(LatencyRecorder.STAGE_DISPATCHED)
                 for listener in listeners:
                     listener.keyPressed(code)
+                    if recorder is not None:
+                        recorder.mark(type(listener).__name__)
+                        recorder.waitForPaint(listener)
 
+    @slowCallTraced
     def _keyReleased(self, joystickID, code):
         """Called when a key has been released on the given joystick."""
         joystick = self._joysticks.get(joystickID)
         if joystick is not None:
             listeners = self._joystickMonitorListeners[joystick.type]
             if listeners is not None:
+                recorder = self._latencyRecorder
+                if recorder is not None:
+                    recorder.mark(LatencyRecorder.STAGE_DISPATCHED)
                 for listener in listeners:
                     listener.keyReleased(code)
+                    if recorder is not None:
+                        recorder.mark(type(listener).__name__)
+                        recorder.waitForPaint(listener)
 
+    @slowCallTraced
     def _axisChanged(self, joystickID, code, value):
         """Called when the value of an axis on the given joystick has
         changed."""
@@ -487,8 +739,14 @@ class GUI(Gtk.Application):
         if joystick is not None:
             listeners = self._joystickMonitorListeners[joystick.type]
             if listeners is not None:
+                recorder = self._latencyRecorder
+                if recorder is not None:
+                    recorder.mark(LatencyRecorder.STAGE_DISPATCHED)
                 for listener in listeners:
                     listener.axisChanged(code, value)
+                    if recorder is not None:
+                        recorder.mark(type(listener).__name__)
+                        recorder.waitForPaint(listener)
 
     def _handleAbout(self, action, parameter):
         """Quit the application."""
@@ -510,6 +768,15 @@ License, or (at your option) any later version.""").format(PROGRAM_TITLE))
         self._aboutDialog.run()
         self._aboutDialog.hide()
 
+    def _handleLatency(self, action, parameter):
+        """Show the window of the latencies."""
+        if self._latencyWindow is None:
+            self._latencyWindow = LatencyWindow(self._latencyRecorder)
+            self._latencyWindow.set_transient_for(self._jsWindow)
+
+        self._latencyWindow.show_all()
+        self._latencyWindow.present()
+
     def _handleQuit(self, action, parameter):
         """Quit the application."""
         self.quit()
@@ -11,8 +11,16 @@ from jsprog.joystick import Key, Axis
 import jsprog.device
 import jsprog.parser
 from jsprog.parser import Control, VirtualControl
-from jsprog.profile import Profile
+from jsprog.profile import Profile, ProfileIndex
+from jsprog.journal import ProfileJournal, SetActionEntry
+from jsprog.journal import InsertShiftLevelEntry, RemoveShiftLevelEntry
+from jsprog.journal import NewVirtualStateEntry, RemoveVirtualStateEntry
+from jsprog.journal import SetCodeEntry, ProfileCompaction
+from jsprog.diagnostics import slowCallTraced
 
+from xml.dom.minidom import getDOMImplementation
+
+import io
 import pathlib
 
 #------------------------------------------------------------------------------
@@ -49,6 +57,17 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
     # A mapping of input IDs to joystick type instances
     _instances = {}
 
+    # The delay in seconds after the last journalled edit of a profile, when
+    # the profile is compacted, i.e. written out fully
+    _compactionDelay = 10
+
+    # The number of journal entries above which a profile is compacted
+    # without waiting for the delay
+    _maxJournalEntries = 256
+
+    # The maximal number of edits that can be undone for a profile
+    _maxUndoEntries = 100
+
     @staticmethod
     def get(gui, identity, keys, axes):
         """Get the joystick type for the given identity."""
@@ -128,8 +147,16 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         self.userDefined = False
 
         self._profiles = []
+        self._profileIndex = ProfileIndex()
         self._changed = False
 
+        self._journals = {}
+        self._compactionSources = {}
+        self._compactions = {}
+        self._editHistories = {}
+
+        self._writtenFiles = {}
+
         self._icon = None
         self._indicatorIconPath = None
         self._indicatorIcon = None
@@ -161,6 +188,11 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         """Get an iterator over the profiles."""
         return iter(self._profiles)
 
+    @property
+    def profileIndex(self):
+        """Get the index of the profiles by their identities."""
+        return self._profileIndex
+
     @property
     def iconDirectories(self):
         """Get an iterator over the icon directories.
@@ -587,7 +619,9 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         pathlib.Path(directoryPath).mkdir(parents = True, exist_ok = True)
 
         try:
-            self.saveInto(os.path.join(directoryPath, self._typeDescriptorName))
+            path = os.path.join(directoryPath, self._typeDescriptorName)
+            self.saveInto(path)
+            self._recordWrite(path)
             self._changed = False
         except Exception as e:
             self.emit("save-failed", e)
@@ -678,15 +712,20 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
     def _loadProfiles(self):
         """Load the profiles for this joystick type."""
         self._profiles = []
+        self._profileIndex.clear()
 
         for (path, directoryType) in self.getDeviceDirectories(self._gui,
                                                                self.identity):
             if os.path.isdir(path):
-                for profile in Profile.loadFrom(self, path):
+                for profile in Profile.loadFrom(self, path,
+                                                cache = self._gui.profileCache):
                     score = profile.match(self.identity)
                     if score>0:
                         profile.directoryType = directoryType
+                        if profile.userDefined:
+                            self._replayJournal(profile)
                         self._profiles.append(profile)
+                        self._profileIndex.add(profile)
 
     def findProfiles(self, name, excludeProfile = None, directoryType = None):
         """Find the profiles with the given name."""
@@ -727,6 +766,7 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         self._saveProfile(profile)
 
         self._profiles.append(profile)
+        self._profileIndex.add(profile)
 
         self.emit("profile-added", profile)
 
@@ -759,6 +799,8 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
 
         if newFilePath!=oldFilePath:
             os.unlink(oldFilePath)
+            self._removeJournal(oldFilePath)
+            self._removeProfileCache(oldFilePath)
 
         if oldName!=newName:
             self.emit("profile-renamed", profile, oldName)
@@ -771,7 +813,8 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         Only the version, the physical location or the unique ID might have
         changed when this function is called.
 
-        The profile is saved."""
+        The profile is saved and the profile index is updated."""
+        self._profileIndex.update(profile)
         self._saveProfile(profile)
 
     def newProfileVirtualControl(self, profile, displayName,
@@ -819,16 +862,9 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         It is checked if another virtual state has the given display name. If
         so, False is returned. Otherwise the change is performed and the
         profile-virtualState-added signal is emitted."""
-        if self._newVirtualState(virtualControl, virtualState):
-            profile.virtualStateAdded(virtualControl, virtualState)
-            self._saveProfile(profile)
-
-            self.emit("profile-virtualState-added",
-                      profile, virtualControl, virtualState)
-
-            return True
-        else:
-            return False
+        return self._performProfileEdit(profile,
+                                        NewVirtualStateEntry(virtualControl,
+                                                             virtualState))
 
     def setProfileVirtualStateDisplayName(self, profile, virtualControl,
                                           virtualState, newName):
@@ -897,12 +933,9 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         the give profile.
 
         The profile-virtualState-removed signal is emitted."""
-        virtualControl.removeState(virtualState)
-        profile.virtualStateRemoved(virtualControl, virtualState)
-
-        self._saveProfile(profile)
-        self.emit("profile-virtualState-removed",
-                  profile, virtualControl, virtualState.displayName)
+        self._performProfileEdit(profile,
+                                 RemoveVirtualStateEntry(virtualControl,
+                                                         virtualState))
 
     def deleteProfileVirtualControl(self, profile, virtualControl):
         """Remove the given virtual control of the given profile.
@@ -919,14 +952,9 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
 
         The shift-level-inserted signal is emitted and the profile is saved, if
         the insertion is successful."""
-        if profile.insertShiftLevel(beforeIndex, shiftLevel):
-            self._saveProfile(profile)
-
-            self.emit("shift-level-inserted", profile, beforeIndex, shiftLevel)
-
-            return True
-        else:
-            return False
+        return self._performProfileEdit(profile,
+                                        InsertShiftLevelEntry(beforeIndex,
+                                                              shiftLevel))
 
     def modifyShiftLevel(self, profile, index, modifiedShiftLevel,
                          removedStates, addedStates, existingStates):
@@ -957,14 +985,9 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
 
         The shift-level-removed signals is emitted and the profile is saved, if
         the removal is successful."""
-        if profile.removeShiftLevel(index, keepStateIndex):
-            self._saveProfile(profile)
-
-            self.emit("shift-level-removed", profile, index)
-
-            return True
-        else:
-            return False
+        return self._performProfileEdit(profile,
+                                        RemoveShiftLevelEntry(index,
+                                                              keepStateIndex))
 
     def setAction(self, profile, control, state, shiftStateSequence, action):
         """Set the action belonging to the given shift state sequence and the
@@ -972,27 +995,65 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
 
         If successful, an action-set signal is emitted and the profile is
         saved."""
-        if profile.setAction(control, state, shiftStateSequence, action):
-            self._saveProfile(profile)
+        return self._performProfileEdit(profile,
+                                        SetActionEntry(control, state,
+                                                       shiftStateSequence,
+                                                       action))
+
+    def setPrologue(self, profile, codeLines):
+        """Set the prologue for the given profile."""
+        return self._performProfileEdit(profile,
+                                        SetCodeEntry(SetCodeEntry.TARGET_PROLOGUE,
+                                                     codeLines))
 
-            self.emit("action-set", profile, control, state,
-                      shiftStateSequence, action)
+    def setEpilogue(self, profile, codeLines):
+        """Set the epilogue for the given profile."""
+        return self._performProfileEdit(profile,
+                                        SetCodeEntry(SetCodeEntry.TARGET_EPILOGUE,
+                                                     codeLines))
+
+    def canUndoProfileEdit(self, profile):
+        """Determine if there is an edit of the given profile that can be
+        undone."""
+        return bool(self._getEditHistory(profile)[0])
+
+    def canRedoProfileEdit(self, profile):
+        """Determine if there is an undone edit of the given profile that can
+        be redone."""
+        return bool(self._getEditHistory(profile)[1])
+
+    def undoProfileEdit(self, profile):
+        """Undo the last edit of the given profile.
+
+        The same signals are emitted as if the reverting edit were performed
+        by the user. Returns whether an edit has been undone."""
+        (undoEntries, redoEntries) = self._getEditHistory(profile)
+        if not undoEntries:
+            return False
 
+        entry = undoEntries.pop()
+        redoEntry = entry.getUndoEntry(profile)
+        if self._editProfile(profile, entry):
+            redoEntries.append(redoEntry)
             return True
         else:
             return False
 
-    def setPrologue(self, profile, codeLines):
-        """Set the prologue for the given profile."""
-        profile.prologue = codeLines
-        self._saveProfile(profile)
-        return True
+    def redoProfileEdit(self, profile):
+        """Redo the last undone edit of the given profile.
 
-    def setEpilogue(self, profile, codeLines):
-        """Set the epilogue for the given profile."""
-        profile.epilogue = codeLines
-        self._saveProfile(profile)
-        return True
+        Returns whether an edit has been redone."""
+        (undoEntries, redoEntries) = self._getEditHistory(profile)
+        if not redoEntries:
+            return False
+
+        entry = redoEntries.pop()
+        undoEntry = entry.getUndoEntry(profile)
+        if self._editProfile(profile, entry):
+            undoEntries.append(undoEntry)
+            return True
+        else:
+            return False
 
     def deleteProfile(self, profile):
         """Delete the given profile.
@@ -1005,8 +1066,15 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
             return False
 
         self._profiles.remove(profile)
+        self._profileIndex.remove(profile)
+        self._cancelCompaction(profile)
+        self._waitForCompaction(profile)
+        self._editHistories.pop(profile, None)
+
         filePath = self._getUserProfilePath(profile)
         os.unlink(filePath)
+        self._removeJournal(filePath)
+        self._removeProfileCache(filePath)
 
         self.emit("profile-removed", profile)
 
@@ -1059,16 +1127,284 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         The type will be saved and the indicator icon-changed signal will be emitted."""
         return self.setIndicatorIconName(None)
 
+    def reloadFile(self, path, directoryType):
+        """Reload the file with the given path in one of our device
+        directories of the given type after it has changed on disk.
+
+        If the file is a profile, it is parsed and compared to the profile
+        loaded from it earlier, if any. Then the profile-added,
+        profile-modified (possibly preceded by profile-renamed) or
+        profile-removed signal is emitted as appropriate.
+
+        If the file is the type descriptor, the changes in it are applied (see
+        _reloadTypeDescriptor()).
+
+        Files written by us are ignored."""
+        if self._isOwnWrite(path):
+            return
+
+        name = os.path.basename(path)
+        if name==self._typeDescriptorName:
+            self._reloadTypeDescriptor()
+        elif name.endswith(".profile"):
+            self._reloadProfile(path, directoryType)
+
+    def reloadDirectory(self, path, directoryType):
+        """Reload all files in the device directory with the given path and
+        type.
+
+        This is used when the individual changes are not known, e.g. when the
+        directory has been created or moved."""
+        paths = set()
+        for profile in self._profiles:
+            if profile.directoryType==directoryType:
+                paths.add(os.path.join(path, profile.fileName + ".profile"))
+
+        if os.path.isdir(path):
+            for entry in os.listdir(path):
+                if entry.endswith(".profile") or \
+                   entry==self._typeDescriptorName:
+                    paths.add(os.path.join(path, entry))
+
+        for filePath in paths:
+            self.reloadFile(filePath, directoryType)
+
+    def _findProfileByFile(self, directoryType, fileName):
+        """Find the profile loaded from the file with the given name in the
+        directory of the given type."""
+        for profile in self._profiles:
+            if profile.directoryType==directoryType and \
+               profile.fileName==fileName:
+                return profile
+
+    def _reloadProfile(self, path, directoryType):
+        """Reload the profile file with the given path in the directory of
+        the given type."""
+        fileName = os.path.basename(path)[:-8]
+        profile = self._findProfileByFile(directoryType, fileName)
+
+        newProfile = None
+        if os.path.isfile(path):
+            newProfile = Profile.loadFromFile(self, path,
+                                              cache = self._gui.profileCache)
+            if newProfile is None:
+                print("Keeping the current version of profile", path,
+                      file=sys.stderr)
+                return
+            if newProfile.match(self.identity)<=0:
+                newProfile = None
+
+        if newProfile is None:
+            if profile is not None:
+                print("Profile %s has been removed" % (path,))
+                self._profiles.remove(profile)
+                self._profileIndex.remove(profile)
+                self._forgetProfileEdits(profile, path)
+                self._removeProfileCache(path)
+                self.emit("profile-removed", profile)
+            return
+
+        newProfile.directoryType = directoryType
+
+        if profile is None:
+            print("Profile %s has been added" % (path,))
+            if newProfile.userDefined:
+                self._replayJournal(newProfile)
+            self._profiles.append(newProfile)
+            self._profileIndex.add(newProfile)
+            self.emit("profile-added", newProfile)
+        elif newProfile.getXMLDocument().toxml()!=\
+             profile.getXMLDocument().toxml():
+            print("Profile %s has been modified" % (path,))
+            self._forgetProfileEdits(profile, path)
+
+            oldName = profile.name
+            profile.updateFrom(newProfile)
+            self._profileIndex.update(profile)
+            if profile.name!=oldName:
+                self.emit("profile-renamed", profile, oldName)
+            self.emit("profile-modified", profile)
+
+            self._gui.profileReloaded(self, profile)
+
+    def _forgetProfileEdits(self, profile, path):
+        """Forget the edits made to the given profile loaded from the given
+        path, because the file has been changed by someone else.
+
+        The pending compaction is cancelled, the journal is removed and the
+        edit history is cleared."""
+        self._cancelCompaction(profile)
+        self._waitForCompaction(profile)
+        self._editHistories.pop(profile, None)
+        if profile.userDefined:
+            self._removeJournal(path)
+
+    def _reloadTypeDescriptor(self):
+        """Reload the type descriptor after it has changed on disk.
+
+        The descriptor with the highest priority is parsed and compared to
+        the current state. Changes of the display names of the controls, of
+        the icons, of the views and of the display names of the virtual
+        controls and their states are applied and the corresponding signals
+        are emitted. Other changes (e.g. to the states of the virtual
+        controls) take effect only after the program is restarted, since the
+        profiles depend on them."""
+        for (directory, directoryType) in self.deviceDirectories:
+            path = os.path.join(directory, self._typeDescriptorName)
+            if os.path.isfile(path):
+                break
+        else:
+            return
+
+        newType = jsprog.device.JoystickType.fromFile(path)
+        if newType is None:
+            print("Keeping the current version of joystick type", path,
+                  file=sys.stderr)
+            return
+
+        self.userDefined = directoryType=="user"
+        self.descriptorPath = path
+
+        if newType.getXMLDocument().toxml()==self.getXMLDocument().toxml():
+            return
+
+        print("Joystick type %s has been modified" % (path,))
+
+        restartNeeded = False
+
+        for key in self.iterKeys:
+            newKey = newType.findKey(key.code)
+            if newKey is None:
+                restartNeeded = True
+            elif newKey.displayName!=key.displayName:
+                key.displayName = newKey.displayName
+                self.emit("key-display-name-changed", key.code, key.displayName)
+
+        for axis in self.iterAxes:
+            newAxis = newType.findAxis(axis.code)
+            if newAxis is None:
+                restartNeeded = True
+            elif newAxis.displayName!=axis.displayName:
+                axis.displayName = newAxis.displayName
+                self.emit("axis-display-name-changed", axis.code,
+                          axis.displayName)
+
+        if newType.iconName!=self._iconName:
+            self._iconName = newType.iconName
+            self._icon = None
+            self.emit("icon-changed", self._iconName)
+
+        if newType.indicatorIconName!=self._indicatorIconName:
+            self._indicatorIconName = newType.indicatorIconName
+            self._indicatorIconPath = None
+            self._indicatorIcon = None
+            self.emit("indicator-icon-changed", self._indicatorIconName)
+
+        self._reloadViews(newType)
+
+        for virtualControl in self.virtualControls:
+            newVirtualControl = newType.findVirtualControl(virtualControl.name)
+            if newVirtualControl is None:
+                restartNeeded = True
+                continue
+
+            states = list(virtualControl.states)
+            newStates = list(newVirtualControl.states)
+            if states!=newStates:
+                restartNeeded = True
+                continue
+
+            if newVirtualControl.displayName!=virtualControl.displayName:
+                virtualControl.displayName = newVirtualControl.displayName
+                self.emit("virtualControl-display-name-changed",
+                          virtualControl, virtualControl.displayName)
+
+            for (state, newState) in zip(states, newStates):
+                if newState.displayName!=state.displayName:
+                    state.displayName = newState.displayName
+                    self.emit("virtualState-display-name-changed",
+                              virtualControl, state, state.displayName)
+
+        if newType.numVirtualControls!=self.numVirtualControls or \
+           len(newType.keys)!=len(self.keys) or \
+           len(newType.axes)!=len(self.axes):
+            restartNeeded = True
+
+        if restartNeeded:
+            print("Some changes to joystick type %s take effect only after a restart" %
+                  (path,), file=sys.stderr)
+
+    def _reloadViews(self, newType):
+        """Update the views from the given, reloaded joystick type.
+
+        Views with a different image are replaced. If the hotspots of a view
+        have changed, they are all replaced."""
+        document = getDOMImplementation().createDocument(None, "view", None)
+        getHotspotsXML = lambda view: \
+            [hotspot.getXML(document).toxml() for hotspot in view.hotspots]
+
+        for view in list(self.views):
+            newView = newType.findView(view.name)
+            if newView is None or newView.imageFileName!=view.imageFileName:
+                super().removeView(view)
+                self.emit("view-removed", view.name)
+
+        for newView in newType.views:
+            view = self.findView(newView.name)
+            if view is None:
+                super().addView(newView)
+                self.emit("view-added", newView.name)
+            elif getHotspotsXML(view)!=getHotspotsXML(newView):
+                for hotspot in list(view.hotspots):
+                    view.removeHotspot(hotspot)
+                    self.emit("hotspot-removed", view, hotspot)
+                for hotspot in newView.hotspots:
+                    view.addHotspot(hotspot)
+                    self.emit("hotspot-added", view, hotspot)
+
+    def _recordWrite(self, path):
+        """Record that we have written the file with the given path, so that
+        the change is ignored when it is reported."""
+        s = os.stat(path)
+        self._writtenFiles[path] = (s.st_mtime_ns, s.st_size)
+
+    def _isOwnWrite(self, path):
+        """Determine if the current version of the file with the given path
+        was written by us."""
+        try:
+            s = os.stat(path)
+        except OSError:
+            return False
+        return self._writtenFiles.get(path)==(s.st_mtime_ns, s.st_size)
+
     def _getUserProfilePath(self, profile):
         """Get the path of the given user profile."""
         return os.path.join(JoystickType.getUserDeviceDirectory(self._gui,
                                                                 self._identity),
                             profile.fileName + ".profile")
 
+    @slowCallTraced
     def _saveProfile(self, profile):
-        """Save the given (user-defined) profile.
+        """Save the given (user-defined) profile fully.
+
+        This is used for the edits that are not journalled. Since the
+        journalled edits may not be revertible after such an edit, the edit
+        history of the profile is cleared.
 
         The signal profile-modified is emitted."""
+        self._cancelCompaction(profile)
+        self._writeProfile(profile)
+        self._editHistories.pop(profile, None)
+        self.emit("profile-modified", profile)
+
+    def _writeProfile(self, profile):
+        """Write the XML document of the given (user-defined) profile into its
+        file and reset its journal.
+
+        A compaction in progress is waited for first, so that it does not
+        overwrite the file with an older version of the profile."""
+        self._waitForCompaction(profile)
+
         path = self._getUserProfilePath(profile)
 
         try:
@@ -1081,8 +1417,219 @@ class JoystickType(jsprog.device.JoystickType, GObject.Object):
         with open(newPath, "wt") as f:
             document.writexml(f, addindent = "  ", newl = "\n")
         os.rename(newPath, path)
+        self._recordWrite(path)
+
+        self._getJournal(path).reset()
+
+    def _performProfileEdit(self, profile, entry):
+        """Perform the edit described by the given journal entry on the given
+        profile on behalf of the user.
+
+        If successful, the edit is recorded in the undo history, and any
+        previously undone edits are forgotten.
+
+        Returns whether the edit was successful."""
+        undoEntry = entry.getUndoEntry(profile)
+        if self._editProfile(profile, entry):
+            (undoEntries, redoEntries) = self._getEditHistory(profile)
+            undoEntries.append(undoEntry)
+            del undoEntries[:-JoystickType._maxUndoEntries]
+            del redoEntries[:]
+            return True
+        else:
+            return False
+
+    def _editProfile(self, profile, entry):
+        """Apply the given journal entry to the given profile.
+
+        If successful, the entry is appended to the profile's journal,
+        profile-modified and the signal specific to the edit are emitted.
+
+        Returns whether the edit was successful."""
+        if not entry.apply(profile):
+            return False
+
+        self._journalProfileEdit(profile, entry)
+
+        if isinstance(entry, SetActionEntry):
+            self.emit("action-set", profile, entry.control, entry.state,
+                      entry.shiftStateSequence, entry.action)
+        elif isinstance(entry, InsertShiftLevelEntry):
+            self.emit("shift-level-inserted", profile, entry.beforeIndex,
+                      entry.shiftLevel)
+        elif isinstance(entry, RemoveShiftLevelEntry):
+            self.emit("shift-level-removed", profile, entry.index)
+        elif isinstance(entry, NewVirtualStateEntry):
+            self.emit("profile-virtualState-added",
+                      profile, entry.virtualControl, entry.virtualState)
+        elif isinstance(entry, RemoveVirtualStateEntry):
+            self.emit("profile-virtualState-removed",
+                      profile, entry.virtualControl,
+                      entry.virtualState.displayName)
+
+        return True
+
+    def _journalProfileEdit(self, profile, entry):
+        """Append the given entry to the journal of the given profile.
+
+        If the profile has not been written yet, or the journal cannot be
+        appended to, the profile is written fully. Otherwise a compaction is
+        scheduled.
+
+        The signal profile-modified is emitted."""
+        path = self._getUserProfilePath(profile)
+        if os.path.isfile(path):
+            journal = self._getJournal(path)
+            try:
+                journal.append(profile, entry)
+                self._scheduleCompaction(profile, journal)
+            except Exception as e:
+                print("Failed to append to the journal of %s: %s" % (path, e),
+                      file=sys.stderr)
+                self._cancelCompaction(profile)
+                self._writeProfile(profile)
+        else:
+            self._writeProfile(profile)
+
         self.emit("profile-modified", profile)
 
+    def _replayJournal(self, profile):
+        """Replay the journal of the given, just loaded user profile.
+
+        If any entries have been replayed, a compaction is scheduled, unless
+        the replay has failed. In that case the journal is kept, since
+        compacting would lose the entries not replayed."""
+        path = self._getUserProfilePath(profile)
+        journal = self._getJournal(path)
+        if journal.replay(profile)>0 and not journal.replayFailed:
+            print("Replayed %d journal entries for %s" %
+                  (journal.numEntries, path), file=sys.stderr)
+            self._scheduleCompaction(profile, journal)
+
+    def _getJournal(self, path):
+        """Get the journal for the profile file with the given path."""
+        journal = self._journals.get(path)
+        if journal is None:
+            journal = self._journals[path] = ProfileJournal(path)
+        return journal
+
+    def _removeJournal(self, path):
+        """Remove the journal of the profile file with the given path."""
+        self._journals.pop(path, None)
+        ProfileJournal.remove(path)
+
+    def _removeProfileCache(self, path):
+        """Remove the cache of the profile file with the given path, if the
+        profile cache is used."""
+        profileCache = self._gui.profileCache
+        if profileCache is not None:
+            profileCache.remove(path)
+
+    def _getEditHistory(self, profile):
+        """Get the edit history of the given profile.
+
+        It is a tuple of the list of the entries to undo and the list of the
+        entries to redo the edits."""
+        history = self._editHistories.get(profile)
+        if history is None:
+            history = self._editHistories[profile] = ([], [])
+        return history
+
+    def _scheduleCompaction(self, profile, journal):
+        """Schedule the compaction of the given profile having the given
+        journal.
+
+        The compaction is delayed until no edits are made for a while, unless
+        the journal has grown too long."""
+        self._cancelCompaction(profile)
+        if journal.numEntries>JoystickType._maxJournalEntries and \
+           profile not in self._compactions:
+            self._startCompaction(profile)
+        else:
+            self._compactionSources[profile] = \
+                GLib.timeout_add_seconds(JoystickType._compactionDelay,
+                                         self._handleCompactionTimeout,
+                                         profile)
+
+    def _cancelCompaction(self, profile):
+        """Cancel the scheduled compaction of the given profile, if any."""
+        sourceID = self._compactionSources.pop(profile, None)
+        if sourceID is not None:
+            GLib.source_remove(sourceID)
+
+    def _handleCompactionTimeout(self, profile):
+        """Called when the profile should be compacted.
+
+        If a compaction of the profile is still in progress, the timeout is
+        kept and the compaction is tried again later."""
+        if profile in self._compactions:
+            return True
+
+        del self._compactionSources[profile]
+        self._startCompaction(profile)
+        return False
+
+    def _startCompaction(self, profile):
+        """Start compacting the given profile.
+
+        The XML text of the profile is produced here, but it is written into
+        the file by a background thread."""
+        path = self._getUserProfilePath(profile)
+
+        text = io.StringIO()
+        try:
+            profile.getXMLDocument().writexml(text, addindent = "  ",
+                                              newl = "\n")
+        except Exception as e:
+            print("Failed to compact profile %s: %s" % (profile.fileName, e),
+                  file=sys.stderr)
+            return
+
+        compaction = \
+            ProfileCompaction(path, text.getvalue(),
+                              self._getJournal(path).numEntries,
+                              lambda compaction:
+                              GLib.idle_add(self._finishCompaction,
+                                            profile, compaction))
+        self._compactions[profile] = compaction
+        compaction.start()
+
+    def _waitForCompaction(self, profile):
+        """Wait for the compaction of the given profile to finish, if one is
+        in progress."""
+        compaction = self._compactions.get(profile)
+        if compaction is not None:
+            compaction.join()
+            self._finishCompaction(profile, compaction)
+
+    def _finishCompaction(self, profile, compaction):
+        """Finish the given compaction of the given profile after its thread
+        has completed.
+
+        The written file is recorded as our own, and the journal is reset,
+        keeping the entries appended while the file was being written. If
+        the compaction has already been finished, nothing is done."""
+        if self._compactions.get(profile) is not compaction:
+            return False
+
+        del self._compactions[profile]
+
+        if compaction.error is not None:
+            print("Failed to compact profile %s: %s" %
+                  (profile.fileName, compaction.error), file=sys.stderr)
+            return False
+
+        path = compaction.path
+        try:
+            self._recordWrite(path)
+            journal = self._getJournal(path)
+            journal.reset(journal.numEntries - compaction.numEntries)
+        except Exception as e:
+            print("Failed to reset the journal of %s: %s" % (path, e),
+                  file=sys.stderr)
+
+        return False
+
     def _newVirtualState(self, virtualControl, virtualState):
         """Add the given virtual state to the given virtual control.
 
@@ -1341,28 +1888,29 @@ class ProfileList(GObject.Object):
         joystickType.connect("profile-renamed", self._profileRenamed)
         joystickType.connect("profile-removed", self._profileRemoved)
 
+    @property
+    def profiles(self):
+        """Get an iterator over the profiles in the list in their order."""
+        return (profile for (_name, profile) in self._profiles)
+
     def setup(self):
         """Setup the profiles from the joystick type.
 
         Returns the best matching auto-load profile."""
-        autoLoadProfile = None
-        autoLoadCandidateScore = 0
+        matches = self._joystickType.profileIndex.match(self._identity)
+        for (profile, _score) in matches:
+            self._addMatchingProfile(profile)
 
-        for profile in self._joystickType.profiles:
-            score = profile.match(self._identity)
-            if score>0:
-                self._addProfile(profile)
-                if profile.autoLoad and score>autoLoadCandidateScore:
-                    autoLoadProfile = profile
-                    autoLoadCandidateScore = score
-
-        return autoLoadProfile
+        return ProfileIndex.selectAutoLoadProfile(matches)
 
     def _addProfile(self, profile):
-        """Add the given profile to the list."""
-        if profile.match(self._identity)<=0:
-            return
+        """Add the given profile to the list, if it matches our identity."""
+        if profile.match(self._identity)>0:
+            self._addMatchingProfile(profile)
 
+    def _addMatchingProfile(self, profile):
+        """Add the given profile, which is known to match our identity, to the
+        list."""
         name = profile.name
         if name in self._profilesByName:
             self._profilesByName[name].append(profile)
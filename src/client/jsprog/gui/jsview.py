@@ -6,6 +6,8 @@ from .common import *
 from .common import _
 
 from jsprog.device import Hotspot
+from jsprog.diagnostics import slowCallTraced
+from .latency import LatencyRecorder
 
 import math
 
@@ -461,6 +463,7 @@ class HotspotWidget(Gtk.DrawingArea):
         self._recalculateImageBoundingBox()
         return self.setMagnification(self._magnification)
 
+    @slowCallTraced
     def do_draw(self, cr):
         """Draw the hotspot."""
         cr.push_group()
@@ -1390,13 +1393,11 @@ class JSViewer(Gtk.Overlay):
 
             self._monitoringJoystick = True
             for state in self._gui.getJoystickStatesFor(self._joystickType):
-                for keyData in state[0]:
-                    code = keyData[0]
-                    value = keyData[1]
-                    if value>0:
-                        self._highlightedKeys.add(code)
+                for key in state[0]:
+                    if key.pressed:
+                        self._highlightedKeys.add(key.code)
                         if self._joystickEventListener is not None:
-                            self._joystickEventListener.setKeyHighlight(code, 100)
+                            self._joystickEventListener.setKeyHighlight(key.code, 100)
 
             self.setupHotspotHighlights()
             return True
@@ -1428,6 +1429,13 @@ class JSViewer(Gtk.Overlay):
         else:
             return False
 
+    def _markLatency(self):
+        """Record the latency of the current event for the joystick event
+        listener, if the latency instrumentation is enabled."""
+        recorder = LatencyRecorder.get()
+        if recorder is not None:
+            recorder.mark(type(self._joystickEventListener).__name__)
+
     def keyPressed(self, code):
         """Called when a key has been pressed on a joystick whose type is
         handled by this widget."""
@@ -1439,6 +1447,7 @@ class JSViewer(Gtk.Overlay):
         if self._joystickEventListener is not None:
             self._joystickEventListener.keyPressed(code)
             self._joystickEventListener.setKeyHighlight(code, 100)
+            self._markLatency()
 
     def keyReleased(self, code):
         """Called when a key has been released on a joystick whose type is
@@ -1451,6 +1460,7 @@ class JSViewer(Gtk.Overlay):
         if self._joystickEventListener is not None:
             self._joystickEventListener.keyReleased(code)
             self._joystickEventListener.setKeyHighlight(code, 0)
+            self._markLatency()
 
     def axisChanged(self, code, value):
         """Called when the value of an axis had changed on a joystick whose
@@ -1472,6 +1482,7 @@ class JSViewer(Gtk.Overlay):
         if self._joystickEventListener is not None:
             self._joystickEventListener.setAxisHighlight(code, 100)
             self._joystickEventListener.axisChanged(code, value)
+            self._markLatency()
 
     def _setKeyHotspotHighlight(self, code, enabled):
         """Enable or disable the highlight of the hotspot(s) for the key with
@@ -45,6 +45,8 @@ class JSWindow(Gtk.ApplicationWindow):
         primaryMenuButton.set_direction(Gtk.ArrowType.NONE)
 
         menu = Gio.Menu.new()
+        if self.get_application().latencyRecorder is not None:
+            menu.append(_("_Latencies"), "app.latency")
         menu.append(_("_About"), "app.about")
         popover = Gtk.Popover.new_from_model(primaryMenuButton, menu)
         primaryMenuButton.set_popover(popover)
@@ -0,0 +1,271 @@
+# Latency instrumentation of the control events
+
+#------------------------------------------------------------------------------
+
+from .common import *
+from .common import _
+
+from jsprog.histogram import LatencyHistogram
+
+import json
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.gui.latency
+#
+# Latency instrumentation of the control events
+#
+# When enabled, each control event received by the GUI from the daemon is
+# stamped with GLib.get_monotonic_time() on its arrival in the listener
+# object. As the event travels through the GUI, the time elapsed since the
+# arrival is recorded into a histogram for each stage:
+# - "dispatched": when the GUI dispatches the event to the listeners,
+# - the name of the class of a listener (e.g. "JSViewer", "ControlsWidget"
+#   or "TypeEditorWindow"): when the listener has finished handling the
+#   event,
+# - "painted": when the next frame of the window of a listener has been
+#   painted.
+# The histograms can be viewed in the latency window in debug mode, and
+# they can be dumped into a JSON file.
+
+#------------------------------------------------------------------------------
+
+class LatencyRecorder(object):
+    """The recorder of the latencies of the control events."""
+
+    ## The name of the stage of dispatching
+    STAGE_DISPATCHED = "dispatched"
+
+    ## The name of the stage of painting
+    STAGE_PAINTED = "painted"
+
+    # The only instance of the recorder, if enabled
+    _instance = None
+
+    @staticmethod
+    def get():
+        """Get the recorder, if the instrumentation is enabled, otherwise
+        None."""
+        return LatencyRecorder._instance
+
+    def __init__(self):
+        """Construct the recorder and enable the instrumentation."""
+        # A mapping of the names of the stages to the histograms in the
+        # order of their first occurence
+        self._histograms = {}
+
+        # The arrival time of the event being handled, or None if no event
+        # is being handled
+        self._arrival = None
+
+        # The sequence number of the event being handled
+        self._sequence = 0
+
+        # A mapping of the frame clocks to mappings of the sequence numbers
+        # of the events waiting for the next frame to their arrival times
+        self._pendingPaints = {}
+
+        LatencyRecorder._instance = self
+
+    @property
+    def histograms(self):
+        """Get a list of tuples of the stage names and the histograms."""
+        return list(self._histograms.items())
+
+    def arrived(self):
+        """Called when an event has arrived."""
+        self._arrival = GLib.get_monotonic_time()
+        self._sequence += 1
+
+    def finished(self):
+        """Called when the handling of the event has finished."""
+        self._arrival = None
+
+    def mark(self, stage):
+        """Record the time elapsed since the arrival of the current event for
+        the given stage.
+
+        If no event is being handled, nothing is recorded."""
+        if self._arrival is not None:
+            self._record(stage, GLib.get_monotonic_time() - self._arrival)
+
+    def waitForPaint(self, widget):
+        """Record the time elapsed since the arrival of the current event
+        when the next frame of the window of the given widget has been
+        painted.
+
+        A frame is requested, so that the time is recorded even if the
+        widget has not changed."""
+        if self._arrival is None or not isinstance(widget, Gtk.Widget):
+            return
+
+        frameClock = widget.get_frame_clock()
+        if frameClock is None:
+            return
+
+        pending = self._pendingPaints.get(frameClock)
+        if pending is None:
+            pending = self._pendingPaints[frameClock] = {}
+            frameClock.connect("after-paint", self._afterPaint)
+
+        pending[self._sequence] = self._arrival
+        frameClock.request_phase(Gdk.FrameClockPhase.AFTER_PAINT)
+
+    def reset(self):
+        """Reset the histograms."""
+        for histogram in self._histograms.values():
+            histogram.reset()
+
+    def dump(self, path):
+        """Dump the histograms into the file with the given path as a JSON
+        object.
+
+        The times are in microseconds."""
+        with open(path, "wt") as f:
+            json.dump({ stage: histogram.toDict()
+                        for (stage, histogram) in self._histograms.items() },
+                      f, indent = 1)
+
+    def _record(self, stage, latency):
+        """Record the given latency for the given stage."""
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = LatencyHistogram()
+        histogram.record(latency)
+
+    def _afterPaint(self, frameClock):
+        """Called when a frame has been painted by the given clock."""
+        pending = self._pendingPaints.get(frameClock)
+        if pending:
+            now = GLib.get_monotonic_time()
+            for arrival in pending.values():
+                self._record(LatencyRecorder.STAGE_PAINTED, now - arrival)
+            pending.clear()
+
+#------------------------------------------------------------------------------
+
+class LatencyWindow(Gtk.Window):
+    """A window displaying the latency histograms."""
+
+    ## The percentiles displayed
+    percentiles = [50.0, 90.0, 99.0, 99.9]
+
+    def __init__(self, recorder):
+        """Construct the window for the given recorder."""
+        super().__init__()
+
+        self._recorder = recorder
+
+        self.set_title(_("Event latencies"))
+        self.set_border_width(4)
+        self.set_default_size(640, 240)
+
+        vbox = Gtk.VBox()
+
+        self._stages = Gtk.ListStore(str, int, str, str, str, str, str, str)
+        view = Gtk.TreeView(model = self._stages)
+
+        titles = [_("Stage"), _("Count"), _("Min")] + \
+            ["P%g" % (percentile,) for percentile in LatencyWindow.percentiles] + \
+            [_("Max")]
+        for (index, title) in enumerate(titles):
+            renderer = Gtk.CellRendererText()
+            if index>0:
+                renderer.set_alignment(1.0, 0.5)
+            column = Gtk.TreeViewColumn(title, renderer, text = index)
+            column.set_expand(index==0)
+            view.append_column(column)
+
+        scrolledWindow = Gtk.ScrolledWindow()
+        scrolledWindow.set_policy(Gtk.PolicyType.AUTOMATIC,
+                                  Gtk.PolicyType.AUTOMATIC)
+        scrolledWindow.add(view)
+        vbox.pack_start(scrolledWindow, True, True, 0)
+
+        label = Gtk.Label(_("The latencies are in milliseconds since the arrival of the events."))
+        label.set_xalign(0.0)
+        vbox.pack_start(label, False, False, 4)
+
+        buttonBox = Gtk.ButtonBox(orientation = Gtk.Orientation.HORIZONTAL)
+        buttonBox.set_layout(Gtk.ButtonBoxStyle.END)
+        buttonBox.set_spacing(4)
+
+        resetButton = Gtk.Button.new_with_mnemonic(_("_Reset"))
+        resetButton.connect("clicked", self._resetClicked)
+        buttonBox.add(resetButton)
+
+        saveButton = Gtk.Button.new_with_mnemonic(_("_Save"))
+        saveButton.connect("clicked", self._saveClicked)
+        buttonBox.add(saveButton)
+
+        vbox.pack_start(buttonBox, False, False, 0)
+
+        self.add(vbox)
+
+        self._timeoutID = None
+        self.connect("map", self._mapped)
+        self.connect("unmap", self._unmapped)
+        self.connect("delete-event", lambda window, event: window.hide_on_delete())
+
+    def _refresh(self):
+        """Refresh the contents of the window."""
+        def formatLatency(value):
+            return "-" if value is None else ("%.3f" % (value / 1000.0,))
+
+        self._stages.clear()
+        for (stage, histogram) in self._recorder.histograms:
+            self._stages.append([stage, histogram.count,
+                                 formatLatency(histogram.minimum)] +
+                                [formatLatency(histogram.getValueAtPercentile(percentile))
+                                 for percentile in LatencyWindow.percentiles] +
+                                [formatLatency(histogram.maximum)])
+
+        return True
+
+    def _mapped(self, window):
+        """Called when the window has been mapped.
+
+        The contents are refreshed every second while the window is
+        visible."""
+        self._refresh()
+        if self._timeoutID is None:
+            self._timeoutID = GLib.timeout_add(1000, self._refresh)
+
+    def _unmapped(self, window):
+        """Called when the window has been unmapped."""
+        if self._timeoutID is not None:
+            GLib.source_remove(self._timeoutID)
+            self._timeoutID = None
+
+    def _resetClicked(self, button):
+        """Called when the Reset button has been clicked."""
+        self._recorder.reset()
+        self._refresh()
+
+    def _saveClicked(self, button):
+        """Called when the Save button has been clicked."""
+        dialog = Gtk.FileChooserDialog(_("Save latencies"),
+                                       self,
+                                       Gtk.FileChooserAction.SAVE,
+                                       (_("_Cancel"),
+                                        Gtk.ResponseType.CANCEL,
+                                        _("_Save"),
+                                        Gtk.ResponseType.OK))
+        dialog.set_do_overwrite_confirmation(True)
+        dialog.set_current_name("latency.json")
+
+        response = dialog.run()
+
+        filePath = dialog.get_filename() if response==Gtk.ResponseType.OK \
+            else None
+
+        dialog.destroy()
+
+        if filePath is not None:
+            try:
+                self._recorder.dump(filePath)
+            except Exception as e:
+                errorDialog(self, _("Failed to save the latencies"),
+                            secondaryText = str(e))
+
+#------------------------------------------------------------------------------
@@ -8,6 +8,7 @@ from .common import _
 from .vceditor import VirtualControlEditor, NewVirtualControlDialog
 from .vceditor import VirtualControlSetEditor
 from .jsview import JSViewer
+from .latency import LatencyRecorder
 
 from jsprog.profile import Profile, ShiftLevel
 from jsprog.parser import SingleValueConstraint, Control, VirtualState
@@ -18,6 +19,7 @@ from jsprog.action import KeyPressCommand, KeyReleaseCommand, DelayCommand
 from jsprog.action import ScriptAction
 from .joystick import ProfileList, findCodeForGdkKey
 from jsprog.joystick import Key, Axis
+from jsprog.diagnostics import slowCallTraced
 
 import traceback
 import math
@@ -623,6 +625,7 @@ class ShiftStatesWidget(Gtk.DrawingArea, Gtk.Scrollable):
         """Get the preferred height of the widget."""
         return (self.minHeight, self.minHeight)
 
+    @slowCallTraced
     def do_draw(self, cr):
         """Draw the widget."""
         if not self._levels:
@@ -882,10 +885,19 @@ class ControlsWidget(Gtk.DrawingArea, Gtk.Scrollable):
     def keyPressed(self, code):
         """Called when the key with the given code has been pressed."""
         self._showControl(Control(Control.TYPE_KEY, code))
+        self._markLatency()
 
     def axisChanged(self, code, value):
         """Called when the value of the axis with the given code has changed."""
         self._showControl(Control(Control.TYPE_AXIS, code))
+        self._markLatency()
+
+    def _markLatency(self):
+        """Record the latency of the current event for this widget, if the
+        latency instrumentation is enabled."""
+        recorder = LatencyRecorder.get()
+        if recorder is not None:
+            recorder.mark("ControlsWidget")
 
     def setKeyHighlight(self, code, value):
         """Set the highlighing of the key with the given code."""
@@ -919,6 +931,7 @@ class ControlsWidget(Gtk.DrawingArea, Gtk.Scrollable):
     def do_get_preferred_height(self, *args):
         return (0, 0)
 
+    @slowCallTraced
     def do_draw(self, cr):
         """Draw the widget."""
 
@@ -1276,6 +1289,7 @@ class KeyCombinationEntry(Gtk.EventBox):
 
         return (height, height)
 
+    @slowCallTraced
     def do_draw(self, cr):
         """Draw the widget."""
         styleContext = entryStyle.styleContext
@@ -1748,6 +1762,11 @@ class MouseMoveCommandWidget(Gtk.Box):
         super().__init__()
         self.set_property("orientation", Gtk.Orientation.VERTICAL)
 
+        # The curve of the command cannot be edited yet, but it is kept
+        self._curve = MouseMoveCommand.CURVE_POLYNOMIAL
+        self._points = []
+        self._precompute = False
+
         directionBox = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, 4)
 
         label = Gtk.Label.new(_("Direction:"))
@@ -1866,7 +1885,8 @@ class MouseMoveCommandWidget(Gtk.Box):
 
         It is valid if there is at least one key combination and the repeat is
         either disabled or has a positive delay."""
-        return (abs(self._a.get_value())>1e-3 or abs(self._b.get_value())>1e-3 or
+        return (self._curve!=MouseMoveCommand.CURVE_POLYNOMIAL or
+                abs(self._a.get_value())>1e-3 or abs(self._b.get_value())>1e-3 or
                 abs(self._c.get_value())>1e-3)
 
     @property
@@ -1885,7 +1905,9 @@ class MouseMoveCommandWidget(Gtk.Box):
         c = self._c.get_value()
 
         return MouseMoveCommand(direction, a = a, b = b, c = c,
-                                adjust = adjust)
+                                adjust = adjust, curve = self._curve,
+                                points = self._points[:],
+                                precompute = self._precompute)
 
     @command.setter
     def command(self, command):
@@ -1898,6 +1920,9 @@ class MouseMoveCommandWidget(Gtk.Box):
             self._a.set_value(0.0)
             self._b.set_value(0.0)
             self._c.set_value(0.0)
+            self._curve = MouseMoveCommand.CURVE_POLYNOMIAL
+            self._points = []
+            self._precompute = False
         else:
             direction = command.direction
             self._horizontalButton.set_active(
@@ -1910,6 +1935,9 @@ class MouseMoveCommandWidget(Gtk.Box):
             self._a.set_value(command.a)
             self._b.set_value(command.b)
             self._c.set_value(command.c)
+            self._curve = command.curve
+            self._points = command.points[:]
+            self._precompute = command.precompute
 
     def _modified(self, *args):
         """Called when something is modified."""
@@ -1957,20 +1985,13 @@ class MouseMoveEditor(MouseMoveCommandWidget):
     @property
     def action(self):
         """Get the action being edited."""
-        if self._horizontalButton.get_active():
-            direction = MouseMoveCommand.DIRECTION_HORIZONTAL
-        elif self._verticalButton.get_active():
-            direction = MouseMoveCommand.DIRECTION_VERTICAL
-        else:
-            direction = MouseMoveCommand.DIRECTION_WHEEL
-
-        adjust = self._adjust.get_value()
-        a = self._a.get_value()
-        b = self._b.get_value()
-        c = self._c.get_value()
+        command = self.command
 
-        return MouseMove(direction, a = a, b = b, c = c, adjust = adjust,
-                         repeatDelay = self._repeatDelayEditor.repeatDelay)
+        return MouseMove(command.direction, a = command.a, b = command.b,
+                         c = command.c, adjust = command.adjust,
+                         repeatDelay = self._repeatDelayEditor.repeatDelay,
+                         curve = command.curve, points = command.points,
+                         precompute = command.precompute)
 
     @action.setter
     def action(self, action):
@@ -2650,7 +2671,10 @@ class ScriptActionEditor(Gtk.Box):
         "cancellable delay, cancel that delay."
         "\n\n"
         "* jsprog_jointhread(thread): join the given Lua thread and wait for "
-        "it exiting.")
+        "it exiting."
+        "\n\n"
+        "* jsprog_millis(): get the current time in milliseconds (int) on "
+        "the clock the delays are measured on.")
 
 
     def __init__(self, window, edit = True, subtitle = None):
@@ -2892,6 +2916,7 @@ class ValueRangeWidget(Gtk.EventBox):
 
         return (minHeight, minHeight)
 
+    @slowCallTraced
     def do_draw(self, cr):
         """Draw the widget."""
         allocation = self.get_allocation()
@@ -4085,6 +4110,7 @@ class ActionsWidget(Gtk.DrawingArea):
         height = self._controls.minHeight
         return (height, height)
 
+    @slowCallTraced
     def do_draw(self, cr):
         """Draw the widget."""
 
@@ -5192,6 +5218,14 @@ class ProfilesEditorWindow(Gtk.ApplicationWindow):
         if i is not None:
             return self._profiles.get_value(i, 1)
 
+    def profileReloaded(self, profile):
+        """Called when the given profile has been reloaded, because it was
+        changed outside of the program.
+
+        If it is the profile being edited, the editor is set up again."""
+        if profile is self.activeProfile:
+            self._profileSelectionChanged(self._profileSelector)
+
     def copyVersion(self, version):
         """Copy the given version into the current profile being edited."""
         if self.activeProfile is not None:
@@ -0,0 +1,307 @@
+
+from .common import *
+
+from .joystick import JoystickType
+
+import io
+import json
+import os
+import sys
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.gui.profileslots
+#
+# Preloading the most used profiles into the daemon
+#
+# The daemon can hold a number of compiled profiles for each joystick in
+# numbered slots besides the active one, and it can switch to the profile in
+# a slot without receiving, parsing and compiling it again. The GUI counts
+# how many times each profile has been activated, and after a joystick has
+# been added, it preloads the most used profiles of the joystick into the
+# slots in the background. When such a profile is activated later, only the
+# slot is switched.
+#
+# When a profile is modified or removed, its preloaded copies are dropped,
+# and a modified profile is preloaded again into the same slots, once it has
+# not been modified for a while, so that a series of edits does not produce
+# a preload request for each of them.
+
+#------------------------------------------------------------------------------
+
+class ProfileUsage(object):
+    """The numbers of the activations of the profiles.
+
+    The counts are stored in a JSON file, keyed by the device subdirectory of
+    the joystick type and the file name of the profile."""
+    def __init__(self, path):
+        """Construct the usage statistics stored in the file with the given
+        path."""
+        self._path = path
+        self._counts = {}
+
+        try:
+            with open(path, "rt") as f:
+                counts = json.load(f)
+            if isinstance(counts, dict):
+                self._counts = counts
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("Failed to read the profile usage from %s: %s" % (path, e),
+                  file=sys.stderr)
+
+    def record(self, joystickType, profile):
+        """Record an activation of the given profile of the given joystick
+        type."""
+        if profile.fileName is None:
+            return
+
+        counts = self._counts.setdefault(
+            JoystickType.getDeviceSubdirectoryName(joystickType.identity), {})
+        counts[profile.fileName] = counts.get(profile.fileName, 0) + 1
+
+        self._save()
+
+    def getCount(self, joystickType, profile):
+        """Get the number of activations of the given profile of the given
+        joystick type."""
+        counts = self._counts.get(
+            JoystickType.getDeviceSubdirectoryName(joystickType.identity), {})
+        return counts.get(profile.fileName, 0)
+
+    def getMostUsed(self, joystickType, profiles, maxCount):
+        """Get a list of at most the given number of the most used ones of
+        the given profiles of the given joystick type.
+
+        Profiles that have never been activated are not returned."""
+        profiles = [(self.getCount(joystickType, profile), index, profile)
+                    for (index, profile) in enumerate(profiles)]
+        profiles = [entry for entry in profiles if entry[0]>0]
+        profiles.sort(key = lambda entry: (-entry[0], entry[1]))
+        return [profile for (_count, _index, profile) in profiles[:maxCount]]
+
+    def _save(self):
+        """Save the usage statistics."""
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok = True)
+            tmpPath = self._path + ".tmp"
+            with open(tmpPath, "wt") as f:
+                json.dump(self._counts, f, indent = 1, sort_keys = True)
+            os.replace(tmpPath, self._path)
+        except Exception as e:
+            print("Failed to write the profile usage to %s: %s" %
+                  (self._path, e), file=sys.stderr)
+
+#------------------------------------------------------------------------------
+
+class ProfileSlots(object):
+    """The profiles preloaded into the slots of the joysticks in the
+    daemon."""
+    # The number of profiles preloaded for a joystick
+    numSlots = 4
+
+    # The delay in seconds after the last modification of a profile, when
+    # the profile is preloaded again
+    _reloadDelay = 2
+
+    def __init__(self, gui, usage):
+        """Construct the slots for the given GUI using the given usage
+        statistics."""
+        self._gui = gui
+        self._usage = usage
+
+        # A mapping of the joystick IDs to mappings of the preloaded
+        # profiles to tuples of the slot number and the daemon code (see
+        # DaemonCode) of the profile
+        self._slots = {}
+
+        # A mapping of the joystick IDs to the lists of tuples of the slot
+        # number and the profile still to be preloaded
+        self._pending = {}
+
+        # A mapping of the joystick IDs to mappings of the profiles being
+        # preloaded to tuples of the slot number and the daemon code being
+        # preloaded. The replies to the preloading of profiles no longer
+        # found here are ignored, as the profiles have been modified or
+        # removed since.
+        self._preloading = {}
+
+        # A mapping of the modified profiles to mappings of the joystick IDs
+        # to the numbers of the slots the profiles should be preloaded into
+        # again
+        self._staleSlots = {}
+
+        # A mapping of the modified profiles to the IDs of the timeout
+        # sources preloading them again
+        self._reloadSources = {}
+
+        self._joystickTypes = set()
+
+    def find(self, id, profile):
+        """Find the given profile preloaded for the joystick with the given
+        ID.
+
+        Returns a tuple of the slot number and the daemon code of the
+        profile, or None if it is not preloaded."""
+        return self._slots.get(id, {}).get(profile)
+
+    def recordUsage(self, joystick, profile):
+        """Record that the given profile has been activated on the given
+        joystick."""
+        self._usage.record(joystick.type, profile)
+
+    def preload(self, joystick):
+        """Start preloading the most used profiles of the given joystick in
+        the background."""
+        joystickType = joystick.type
+        if joystickType not in self._joystickTypes:
+            joystickType.connect("profile-modified", self._profileModified)
+            joystickType.connect("profile-removed", self._profileRemoved)
+            self._joystickTypes.add(joystickType)
+
+        profiles = self._usage.getMostUsed(joystickType,
+                                           joystick.profileList.profiles,
+                                           ProfileSlots.numSlots)
+
+        id = joystick.id
+        self._slots[id] = {}
+        self._schedule(id, list(enumerate(profiles)))
+
+    def remove(self, id):
+        """Forget the slots of the joystick with the given ID."""
+        self._slots.pop(id, None)
+        self._pending.pop(id, None)
+        self._preloading.pop(id, None)
+        for staleSlots in self._staleSlots.values():
+            staleSlots.pop(id, None)
+
+    def _schedule(self, id, entries):
+        """Schedule the preloading of the given slot number and profile
+        tuples for the joystick with the given ID."""
+        if not entries:
+            return
+
+        if id in self._pending:
+            self._pending[id] += entries
+        else:
+            self._pending[id] = entries
+            GLib.idle_add(self._preloadNext, id)
+
+    def _preloadNext(self, id):
+        """Preload the next pending profile of the joystick with the given
+        ID.
+
+        Returns whether there are more profiles to preload."""
+        entries = self._pending.get(id)
+        if not entries:
+            self._pending.pop(id, None)
+            return False
+
+        (slot, profile) = entries.pop(0)
+
+        daemonCode = \
+            profile.getDaemonCode(profiling = self._gui.luaProfiling)
+        daemonXML = io.StringIO()
+        daemonCode.getXMLDocument().writexml(daemonXML)
+
+        self._preloading.setdefault(id, {})[profile] = (slot, daemonCode)
+
+        def handleReply(result):
+            slots = self._slots.get(id)
+            if not self._preloadDone(id, profile, daemonCode) or \
+               slots is None:
+                return
+            if result:
+                slots[profile] = (slot, daemonCode)
+            else:
+                print("The daemon failed to preload profile '%s' for joystick %d" %
+                      (profile.name, id), file=sys.stderr)
+
+        def handleError(exc):
+            self._preloadDone(id, profile, daemonCode)
+            print("Failed to preload profile '%s' for joystick %d: %s" %
+                  (profile.name, id, exc), file=sys.stderr)
+
+        self._gui.jsprog.preloadProfile(id, slot, daemonXML.getvalue(),
+                                        reply_handler = handleReply,
+                                        error_handler = handleError)
+
+        if entries:
+            return True
+        else:
+            del self._pending[id]
+            return False
+
+    def _preloadDone(self, id, profile, daemonCode):
+        """Called when the preloading of the given daemon code of the given
+        profile for the joystick with the given ID has completed.
+
+        Returns whether the preloading is still current, i.e. the profile
+        has been neither modified nor removed since."""
+        preloading = self._preloading.get(id)
+        if preloading is not None and profile in preloading and \
+           preloading[profile][1] is daemonCode:
+            del preloading[profile]
+            return True
+        else:
+            return False
+
+    def _profileModified(self, joystickType, profile):
+        """Called when the given profile has been modified.
+
+        Its preloaded copies are dropped, and so are the replies to its
+        preloading in progress and its pending preloading. It is preloaded
+        again into the same slots, when it has not been modified for a
+        while."""
+        staleSlots = self._staleSlots.setdefault(profile, {})
+        for (id, slots) in self._slots.items():
+            entry = slots.pop(profile, None)
+            if entry is not None:
+                staleSlots[id] = entry[0]
+        for (id, preloading) in self._preloading.items():
+            entry = preloading.pop(profile, None)
+            if entry is not None:
+                staleSlots[id] = entry[0]
+        for (id, entries) in self._pending.items():
+            for (slot, pendingProfile) in entries:
+                if pendingProfile is profile:
+                    staleSlots[id] = slot
+            entries[:] = [entry for entry in entries if entry[1] is not profile]
+
+        self._cancelReload(profile)
+        if staleSlots:
+            self._reloadSources[profile] = \
+                GLib.timeout_add_seconds(ProfileSlots._reloadDelay,
+                                         self._handleReloadTimeout, profile)
+        else:
+            del self._staleSlots[profile]
+
+    def _cancelReload(self, profile):
+        """Cancel the scheduled preloading of the given modified profile, if
+        any."""
+        sourceID = self._reloadSources.pop(profile, None)
+        if sourceID is not None:
+            GLib.source_remove(sourceID)
+
+    def _handleReloadTimeout(self, profile):
+        """Called when the given modified profile should be preloaded again
+        into its slots."""
+        del self._reloadSources[profile]
+        for (id, slot) in self._staleSlots.pop(profile, {}).items():
+            if id in self._slots:
+                self._schedule(id, [(slot, profile)])
+        return False
+
+    def _profileRemoved(self, joystickType, profile):
+        """Called when the given profile has been removed.
+
+        Its preloaded copies are dropped."""
+        self._cancelReload(profile)
+        self._staleSlots.pop(profile, None)
+        for slots in self._slots.values():
+            slots.pop(profile, None)
+        for preloading in self._preloading.values():
+            preloading.pop(profile, None)
+        for entries in self._pending.values():
+            entries[:] = [entry for entry in entries if entry[1] is not profile]
@@ -0,0 +1,175 @@
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.histogram
+#
+# Histograms of latencies
+#
+# The histograms are similar to HDR histograms: the values are non-negative
+# integers (e.g. microseconds), and they are counted in buckets whose width
+# grows with the magnitude of the values, so that the relative error of the
+# percentiles is bounded (about 1.5%) over the whole range of the values,
+# while recording a value costs only a few integer operations. Values below
+# the number of sub-buckets are counted exactly. Above that each power of 2
+# is divided into half as many buckets of equal width.
+
+#------------------------------------------------------------------------------
+
+class LatencyHistogram(object):
+    """A histogram of latencies."""
+    ## The number of bits of the sub-bucket index
+    subBucketBits = 7
+
+    ## The number of sub-buckets, i.e. the number of values counted exactly
+    subBucketCount = 1 << subBucketBits
+
+    ## Half of the number of sub-buckets
+    subBucketHalfCount = subBucketCount // 2
+
+    @staticmethod
+    def getIndex(value):
+        """Get the index of the bucket of the given value."""
+        if value<LatencyHistogram.subBucketCount:
+            return value
+
+        shift = value.bit_length() - LatencyHistogram.subBucketBits
+        return LatencyHistogram.subBucketCount + \
+            (shift - 1) * LatencyHistogram.subBucketHalfCount + \
+            (value >> shift) - LatencyHistogram.subBucketHalfCount
+
+    @staticmethod
+    def getRange(index):
+        """Get a tuple of the lowest and the highest value counted in the
+        bucket with the given index."""
+        if index<LatencyHistogram.subBucketCount:
+            return (index, index)
+
+        (shift, subIndex) = \
+            divmod(index - LatencyHistogram.subBucketCount,
+                   LatencyHistogram.subBucketHalfCount)
+        shift += 1
+        lowest = (subIndex + LatencyHistogram.subBucketHalfCount) << shift
+        return (lowest, lowest + (1 << shift) - 1)
+
+    def __init__(self):
+        """Construct an empty histogram."""
+        self.reset()
+
+    @property
+    def count(self):
+        """Get the number of values recorded."""
+        return self._count
+
+    @property
+    def minimum(self):
+        """Get the smallest value recorded, or None if the histogram is
+        empty."""
+        return self._minimum
+
+    @property
+    def maximum(self):
+        """Get the largest value recorded, or None if the histogram is
+        empty."""
+        return self._maximum
+
+    @property
+    def mean(self):
+        """Get the mean of the values recorded, or None if the histogram is
+        empty."""
+        return self._sum / self._count if self._count>0 else None
+
+    def reset(self):
+        """Remove all values from the histogram."""
+        self._counts = []
+        self._count = 0
+        self._sum = 0
+        self._minimum = None
+        self._maximum = None
+
+    def record(self, value):
+        """Record the given value.
+
+        Negative values are recorded as 0."""
+        if value<0:
+            value = 0
+
+        index = LatencyHistogram.getIndex(value)
+        counts = self._counts
+        if index>=len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+
+        self._count += 1
+        self._sum += value
+        if self._minimum is None or value<self._minimum:
+            self._minimum = value
+        if self._maximum is None or value>self._maximum:
+            self._maximum = value
+
+    def getValueAtPercentile(self, percentile):
+        """Get the value below or at which the given percentage of the
+        recorded values are.
+
+        The highest value of the bucket containing the percentile is
+        returned, but not more than the largest value recorded. If the
+        histogram is empty, None is returned."""
+        if self._count==0:
+            return None
+
+        target = max(1, min(self._count,
+                            int(percentile * self._count / 100.0 + 0.5)))
+        total = 0
+        for (index, count) in enumerate(self._counts):
+            total += count
+            if total>=target:
+                return min(LatencyHistogram.getRange(index)[1],
+                           self._maximum)
+
+        return self._maximum
+
+    def iterBuckets(self):
+        """Get an iterator over the non-empty buckets.
+
+        Each item is a tuple of the lowest and the highest value of the
+        bucket and the number of values in it."""
+        for (index, count) in enumerate(self._counts):
+            if count>0:
+                (lowest, highest) = LatencyHistogram.getRange(index)
+                yield (lowest, highest, count)
+
+    def merge(self, other):
+        """Add the values recorded in the given other histogram to this
+        one."""
+        if other._count==0:
+            return
+
+        counts = self._counts
+        if len(other._counts)>len(counts):
+            counts.extend([0] * (len(other._counts) - len(counts)))
+        for (index, count) in enumerate(other._counts):
+            counts[index] += count
+
+        self._count += other._count
+        self._sum += other._sum
+        self._minimum = other._minimum if self._minimum is None \
+            else min(self._minimum, other._minimum)
+        self._maximum = other._maximum if self._maximum is None \
+            else max(self._maximum, other._maximum)
+
+    def toDict(self, percentiles = (50.0, 90.0, 99.0, 99.9)):
+        """Convert the histogram into a dictionary suitable for JSON.
+
+        It contains the count, the minimum, the mean and the maximum, the
+        values at the given percentiles and the non-empty buckets."""
+        return {
+            "count": self._count,
+            "min": self._minimum,
+            "mean": self.mean,
+            "max": self._maximum,
+            "percentiles": { ("%g" % (percentile,)):
+                             self.getValueAtPercentile(percentile)
+                             for percentile in percentiles },
+            "buckets": [list(bucket) for bucket in self.iterBuckets()]
+        }
+
+#------------------------------------------------------------------------------
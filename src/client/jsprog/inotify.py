@@ -0,0 +1,179 @@
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.inotify
+#
+# A minimal interface to the inotify facility of the Linux kernel
+#
+# The system calls are accessed via ctypes, so no extra modules or services
+# are needed. The file descriptor of an INotify object can be watched by a
+# main loop (e.g. GLib.io_add_watch), and the events can be read when it
+# becomes readable.
+
+#------------------------------------------------------------------------------
+
+class INotifyEvent(object):
+    """An event read from an inotify file descriptor."""
+    def __init__(self, wd, mask, cookie, name):
+        """Construct the event."""
+        self.wd = wd
+        self.mask = mask
+        self.cookie = cookie
+        self.name = name
+
+    @property
+    def isDirectory(self):
+        """Indicate if the subject of the event is a directory."""
+        return (self.mask&INotify.IN_ISDIR)!=0
+
+    def __repr__(self):
+        """Get a string representation of the event."""
+        return "INotifyEvent<wd=%d, mask=0x%08x, cookie=%d, name=%r>" % \
+            (self.wd, self.mask, self.cookie, self.name)
+
+#------------------------------------------------------------------------------
+
+class INotify(object):
+    """An inotify instance.
+
+    The file descriptor is non-blocking, so readEvents() can be called any
+    time, and it returns an empty list if there are no events."""
+    ## Event: a file was modified
+    IN_MODIFY = 0x00000002
+
+    ## Event: a file opened for writing was closed
+    IN_CLOSE_WRITE = 0x00000008
+
+    ## Event: a file was moved from the watched directory
+    IN_MOVED_FROM = 0x00000040
+
+    ## Event: a file was moved into the watched directory
+    IN_MOVED_TO = 0x00000080
+
+    ## Event: a file was created in the watched directory
+    IN_CREATE = 0x00000100
+
+    ## Event: a file was deleted from the watched directory
+    IN_DELETE = 0x00000200
+
+    ## Event: the watched directory itself was deleted
+    IN_DELETE_SELF = 0x00000400
+
+    ## Event: the watched directory itself was moved
+    IN_MOVE_SELF = 0x00000800
+
+    ## Event: the event queue has overflown
+    IN_Q_OVERFLOW = 0x00004000
+
+    ## Event: the watch was removed
+    IN_IGNORED = 0x00008000
+
+    ## Flag: watch the path only if it is a directory
+    IN_ONLYDIR = 0x01000000
+
+    ## Flag: the subject of the event is a directory
+    IN_ISDIR = 0x40000000
+
+    ## Flag for inotify_init1: non-blocking file descriptor
+    IN_NONBLOCK = os.O_NONBLOCK
+
+    ## Flag for inotify_init1: close the file descriptor on exec
+    IN_CLOEXEC = os.O_CLOEXEC
+
+    ## The format of the fixed part of an event
+    _eventFormat = "iIII"
+
+    ## The size of the fixed part of an event
+    _eventSize = struct.calcsize(_eventFormat)
+
+    ## The C library, once loaded
+    _libc = None
+
+    @staticmethod
+    def _getLibC():
+        """Get the C library with the inotify functions."""
+        if INotify._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                               use_errno = True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                               ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            INotify._libc = libc
+        return INotify._libc
+
+    def __init__(self):
+        """Construct the inotify instance.
+
+        OSError is raised if inotify is not available."""
+        try:
+            libc = INotify._getLibC()
+            fd = libc.inotify_init1(INotify.IN_NONBLOCK | INotify.IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            raise OSError(errno.ENOSYS, "inotify is not available: %s" % (e,))
+
+        if fd<0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+        self._fd = fd
+
+    def fileno(self):
+        """Get the file descriptor of the instance."""
+        return self._fd
+
+    def addWatch(self, path, mask):
+        """Add a watch for the given path with the given event mask.
+
+        Returns the watch descriptor."""
+        wd = INotify._getLibC().inotify_add_watch(self._fd, os.fsencode(path),
+                                                  mask)
+        if wd<0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        return wd
+
+    def removeWatch(self, wd):
+        """Remove the watch with the given descriptor."""
+        if INotify._getLibC().inotify_rm_watch(self._fd, wd)<0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def readEvents(self):
+        """Read the events available currently.
+
+        Returns a list of INotifyEvent objects."""
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+
+            offset = 0
+            while offset + INotify._eventSize<=len(data):
+                (wd, mask, cookie, length) = \
+                    struct.unpack_from(INotify._eventFormat, data, offset)
+                offset += INotify._eventSize
+                name = data[offset:offset+length].rstrip(b"\0")
+                offset += length
+                events.append(INotifyEvent(wd, mask, cookie,
+                                           os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        """Close the instance."""
+        if self._fd>=0:
+            os.close(self._fd)
+            self._fd = -1
+
+#------------------------------------------------------------------------------
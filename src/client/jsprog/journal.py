@@ -0,0 +1,748 @@
+
+from .profile import ProfileHandler, HandlerTree
+from .parser import Control
+from .joystick import Key, Axis
+from .device import DisplayVirtualState
+
+from xml.sax import make_parser
+from xml.dom.minidom import getDOMImplementation
+
+import io
+import os
+import sys
+import threading
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.journal
+#
+# Append-only journal of the edits of a profile
+#
+# Saving a profile after each edit means writing the complete XML document,
+# the cost of which grows with the size of the profile. Instead, the
+# individual edits can be appended to a journal file next to the profile
+# file. When the profile is loaded, the journal is replayed on it, and from
+# time to time the profile is written out fully and the journal is reset
+# (compaction).
+#
+# The journal file consists of lines, each containing a complete XML
+# element. The first line is a header identifying the version of the profile
+# file the journal belongs to (by its modification time and size). If the
+# profile file is rewritten, the header will not match anymore, and so a
+# stale journal will not be replayed on a profile already containing its
+# edits. A partially written last line (e.g. due to a crash) is ignored.
+#
+# If an entry of a journal cannot be replayed, the journal is kept as it is,
+# so that the edits are not lost. When the journal is to be reset or
+# appended to afterwards, it is moved aside first (see
+# ProfileJournal.FAILED_SUFFIX).
+#
+# The profile can be written out by a ProfileCompaction thread, so that the
+# main loop is not blocked by the writing.
+
+#------------------------------------------------------------------------------
+
+class JournalEntry(object):
+    """Base class for the entries of a profile journal.
+
+    Each entry corresponds to an edit operation on a profile. It can be
+    applied to a profile, converted into XML, and it can provide the entry
+    reverting its effect."""
+    def apply(self, profile):
+        """Apply the entry to the given profile.
+
+        Returns a boolean indicating if the application was successful."""
+        raise NotImplementedError()
+
+    def getUndoEntry(self, profile):
+        """Get the entry that reverts the effect of this entry.
+
+        It should be called before the entry is applied to the given
+        profile."""
+        raise NotImplementedError()
+
+    def getXML(self, document):
+        """Get the XML element describing this entry."""
+        raise NotImplementedError()
+
+    def getLine(self, profile):
+        """Get the journal line describing this entry for the given
+        profile."""
+        Control.setProfile(profile)
+        document = getDOMImplementation().createDocument(None,
+                                                         "profileJournal",
+                                                         None)
+        return ProfileJournal.escapeLine(self.getXML(document).toxml())
+
+#------------------------------------------------------------------------------
+
+class SetActionEntry(JournalEntry):
+    """A journal entry for setting the action of a control."""
+    def __init__(self, control, state, shiftStateSequence, action):
+        """Construct the entry.
+
+        The arguments are the same as those of Profile.setAction()."""
+        self._control = control
+        self._state = state
+        self._shiftStateSequence = shiftStateSequence
+        self._action = action
+
+    @property
+    def control(self):
+        """Get the control (key, axis or virtual control) of the entry."""
+        return self._control
+
+    @property
+    def state(self):
+        """Get the state of the control, if it is a virtual control."""
+        return self._state
+
+    @property
+    def shiftStateSequence(self):
+        """Get the shift state sequence."""
+        return self._shiftStateSequence
+
+    @property
+    def action(self):
+        """Get the action to set."""
+        return self._action
+
+    def apply(self, profile):
+        """Set the action in the given profile."""
+        return profile.setAction(self._control, self._state,
+                                 self._shiftStateSequence, self._action)
+
+    def getUndoEntry(self, profile):
+        """Get the entry restoring the current action."""
+        return SetActionEntry(self._control, self._state,
+                              self._shiftStateSequence,
+                              profile.findAction(self._control, self._state,
+                                                 self._shiftStateSequence))
+
+    def getXML(self, document):
+        """Get the XML element describing this entry.
+
+        The action is stored in the same form as in the handler tree of a
+        profile file, i.e. either as a single action or a sequence of value
+        ranges."""
+        control = Control.fromJoystickControl(self._control)
+
+        element = document.createElement("setAction")
+        element.setAttribute("controlType",
+                             "key" if control.isKey else
+                             "axis" if control.isAxis else "virtual")
+        element.setAttribute("name", control.xmlName)
+        if self._state is not None:
+            element.setAttribute("state", str(self._state))
+        element.setAttribute("shiftStates",
+                             ",".join([str(s) for s in
+                                       self._shiftStateSequence]))
+
+        if self._action is not None:
+            handlerTree = HandlerTree()
+            handlerTree.setAction([], self._action)
+            for child in handlerTree.children:
+                element.appendChild(child.getXML(document))
+
+        return element
+
+#------------------------------------------------------------------------------
+
+class InsertShiftLevelEntry(JournalEntry):
+    """A journal entry for inserting a shift level."""
+    def __init__(self, beforeIndex, shiftLevel):
+        """Construct the entry."""
+        self._beforeIndex = beforeIndex
+        self._shiftLevel = shiftLevel
+
+    @property
+    def beforeIndex(self):
+        """Get the index before which the shift level is inserted."""
+        return self._beforeIndex
+
+    @property
+    def shiftLevel(self):
+        """Get the shift level to insert."""
+        return self._shiftLevel
+
+    def apply(self, profile):
+        """Insert the shift level into the given profile."""
+        return profile.insertShiftLevel(self._beforeIndex, self._shiftLevel)
+
+    def getUndoEntry(self, profile):
+        """Get the entry removing the shift level.
+
+        Since all states of a newly inserted shift level have the same
+        actions, any of them can be kept."""
+        return RemoveShiftLevelEntry(self._beforeIndex, 0)
+
+    def getXML(self, document):
+        """Get the XML element describing this entry."""
+        element = document.createElement("insertShiftLevel")
+        element.setAttribute("beforeIndex", str(self._beforeIndex))
+        element.appendChild(self._shiftLevel.getXML(document))
+        return element
+
+#------------------------------------------------------------------------------
+
+class RemoveShiftLevelEntry(JournalEntry):
+    """A journal entry for removing a shift level."""
+    def __init__(self, index, keepStateIndex):
+        """Construct the entry."""
+        self._index = index
+        self._keepStateIndex = keepStateIndex
+
+    @property
+    def index(self):
+        """Get the index of the shift level to remove."""
+        return self._index
+
+    def apply(self, profile):
+        """Remove the shift level from the given profile."""
+        return profile.removeShiftLevel(self._index, self._keepStateIndex)
+
+    def getUndoEntry(self, profile):
+        """Get the entry re-inserting the shift level.
+
+        Only the shift level itself can be restored, the actions of the
+        states not kept are lost."""
+        return InsertShiftLevelEntry(self._index,
+                                     profile.getShiftLevel(self._index))
+
+    def getXML(self, document):
+        """Get the XML element describing this entry."""
+        element = document.createElement("removeShiftLevel")
+        element.setAttribute("index", str(self._index))
+        element.setAttribute("keepStateIndex", str(self._keepStateIndex))
+        return element
+
+#------------------------------------------------------------------------------
+
+class NewVirtualStateEntry(JournalEntry):
+    """A journal entry for adding a virtual state to a virtual control of the
+    profile."""
+    def __init__(self, virtualControl, virtualState):
+        """Construct the entry."""
+        self._virtualControl = virtualControl
+        self._virtualState = virtualState
+
+    @property
+    def virtualControl(self):
+        """Get the virtual control."""
+        return self._virtualControl
+
+    @property
+    def virtualState(self):
+        """Get the virtual state."""
+        return self._virtualState
+
+    def apply(self, profile):
+        """Add the virtual state to the virtual control."""
+        virtualControl = self._virtualControl
+        virtualState = self._virtualState
+
+        if virtualControl.findStateByDisplayName(virtualState.displayName) \
+           is not None or not virtualControl.addState(virtualState):
+            return False
+
+        profile.virtualStateAdded(virtualControl, virtualState)
+        return True
+
+    def getUndoEntry(self, profile):
+        """Get the entry removing the virtual state."""
+        return RemoveVirtualStateEntry(self._virtualControl,
+                                       self._virtualState)
+
+    def getXML(self, document):
+        """Get the XML element describing this entry."""
+        element = document.createElement("newVirtualState")
+        element.setAttribute("name", self._virtualControl.name)
+        element.appendChild(self._virtualState.getXML(document))
+        return element
+
+#------------------------------------------------------------------------------
+
+class RemoveVirtualStateEntry(JournalEntry):
+    """A journal entry for removing a virtual state of a virtual control of
+    the profile."""
+    def __init__(self, virtualControl, virtualState):
+        """Construct the entry."""
+        self._virtualControl = virtualControl
+        self._virtualState = virtualState
+
+    @property
+    def virtualControl(self):
+        """Get the virtual control."""
+        return self._virtualControl
+
+    @property
+    def virtualState(self):
+        """Get the virtual state."""
+        return self._virtualState
+
+    def apply(self, profile):
+        """Remove the virtual state from the virtual control."""
+        self._virtualControl.removeState(self._virtualState)
+        profile.virtualStateRemoved(self._virtualControl, self._virtualState)
+        return True
+
+    def getUndoEntry(self, profile):
+        """Get the entry re-adding the virtual state.
+
+        The actions belonging to the state are lost."""
+        return NewVirtualStateEntry(self._virtualControl,
+                                    self._virtualState)
+
+    def getXML(self, document):
+        """Get the XML element describing this entry."""
+        element = document.createElement("removeVirtualState")
+        element.setAttribute("name", self._virtualControl.name)
+        element.setAttribute("displayName", self._virtualState.displayName)
+        return element
+
+#------------------------------------------------------------------------------
+
+class SetCodeEntry(JournalEntry):
+    """A journal entry for setting the prologue or the epilogue."""
+    ## Code target: the prologue
+    TARGET_PROLOGUE = 1
+
+    ## Code target: the epilogue
+    TARGET_EPILOGUE = 2
+
+    def __init__(self, target, codeLines):
+        """Construct the entry."""
+        self._target = target
+        self._codeLines = codeLines
+
+    @property
+    def isPrologue(self):
+        """Determine if the entry is for the prologue."""
+        return self._target==SetCodeEntry.TARGET_PROLOGUE
+
+    def apply(self, profile):
+        """Set the code lines in the profile."""
+        if self.isPrologue:
+            profile.prologue = self._codeLines
+        else:
+            profile.epilogue = self._codeLines
+        return True
+
+    def getUndoEntry(self, profile):
+        """Get the entry restoring the current code lines."""
+        return SetCodeEntry(self._target,
+                            profile.prologue if self.isPrologue
+                            else profile.epilogue)
+
+    def getXML(self, document):
+        """Get the XML element describing this entry."""
+        element = document.createElement("setPrologue" if self.isPrologue
+                                         else "setEpilogue")
+        for line in self._codeLines:
+            lineElement = document.createElement("line")
+            lineElement.appendChild(document.createTextNode(line))
+            element.appendChild(lineElement)
+        return element
+
+#------------------------------------------------------------------------------
+#------------------------------------------------------------------------------
+
+class JournalHandler(ProfileHandler):
+    """XML content handler for a profile journal.
+
+    The entries are applied to the profile as soon as they are parsed, since
+    later entries may depend on the effects of the earlier ones. The actions
+    and shift levels are parsed by the profile handler's code."""
+    def __init__(self, profile):
+        """Construct the parser for the given profile."""
+        super(JournalHandler, self).__init__(profile.joystickType)
+
+        self._journalProfile = profile
+
+        self._entryControl = None
+        self._entryState = None
+        self._entryShiftStateSequence = None
+        self._entryTree = None
+        self._entryBeforeIndex = None
+        self._entryShiftLevel = None
+        self._entryVirtualControl = None
+        self._entryLines = None
+
+        self._numEntries = 0
+
+    @property
+    def numEntries(self):
+        """Get the number of entries applied."""
+        return self._numEntries
+
+    @property
+    def _shiftLevelIndex(self):
+        """Determine the shift level index.
+
+        The actions in a journal always belong to a complete shift state
+        sequence."""
+        return self._profile.numShiftLevels
+
+    @property
+    def _handlerTree(self):
+        """Get the current handler tree."""
+        return self._valueRangeHandler if self._valueRangeHandler \
+            else self._entryTree
+
+    def startDocument(self):
+        """Called at the beginning of the document."""
+        super(JournalHandler, self).startDocument()
+        self._profile = self._journalProfile
+        self._numEntries = 0
+
+    def doStartElement(self, name, attrs):
+        """Called for each start tag."""
+        if name=="profileJournal":
+            if self._context:
+                self._fatal("'profileJournal' should be the top-level element")
+        elif name=="base":
+            self._checkParent(name, "profileJournal")
+        elif name=="setAction":
+            self._checkParent(name, "profileJournal")
+            self._startSetAction(attrs)
+        elif name=="insertShiftLevel":
+            self._checkParent(name, "profileJournal")
+            self._entryBeforeIndex = self._getIntAttribute(attrs, "beforeIndex")
+        elif name=="removeShiftLevel":
+            self._checkParent(name, "profileJournal")
+            self._startRemoveShiftLevel(attrs)
+        elif name=="newVirtualState":
+            self._checkParent(name, "profileJournal")
+            self._entryVirtualControl = self._getProfileVirtualControl(attrs)
+        elif name=="removeVirtualState":
+            self._checkParent(name, "profileJournal")
+            self._startRemoveVirtualState(attrs)
+        elif name=="setPrologue" or name=="setEpilogue":
+            self._checkParent(name, "profileJournal")
+            self._entryLines = []
+        elif name=="shiftLevel":
+            self._checkParent(name, "insertShiftLevel")
+            self._startShiftLevel(attrs)
+        elif name=="virtualState" and self._parent=="newVirtualState":
+            self._virtualState = \
+                DisplayVirtualState(self._getAttribute(attrs, "displayName"))
+        elif name=="line" and self._parent in ["setPrologue", "setEpilogue"]:
+            self._startCollectingCharacters(keepFormatting = True)
+        elif name=="action" and self._parent=="setAction":
+            self._startAction(attrs)
+        elif name=="valueRange" and self._parent=="setAction":
+            self._startValueRange(attrs)
+        else:
+            super(JournalHandler, self).doStartElement(name, attrs)
+
+    def doEndElement(self, name):
+        """Called for each end tag."""
+        if name=="profileJournal" or name=="base":
+            pass
+        elif name=="setAction":
+            self._applyEntry(SetActionEntry(self._entryControl,
+                                            self._entryState,
+                                            self._entryShiftStateSequence,
+                                            self._entryTree.findAction([])))
+            self._entryTree = None
+        elif name=="insertShiftLevel":
+            if self._entryShiftLevel is None:
+                self._fatal("the shift level is missing")
+            self._applyEntry(InsertShiftLevelEntry(self._entryBeforeIndex,
+                                                   self._entryShiftLevel))
+            self._entryShiftLevel = None
+        elif name=="shiftLevel":
+            if self._shiftLevel.numStates<2:
+                self._fatal("a shift level should have at least two states")
+            self._entryShiftLevel = self._shiftLevel
+            self._shiftLevel = None
+        elif name=="newVirtualState":
+            if self._virtualState is None:
+                self._fatal("the virtual state is missing")
+            self._applyEntry(NewVirtualStateEntry(self._entryVirtualControl,
+                                                  self._virtualState))
+            self._virtualState = None
+        elif name=="virtualState" and self._parent=="newVirtualState":
+            if not self._virtualState.isValid:
+                self._fatal("the virtual state has conflicting controls")
+        elif name=="setPrologue":
+            self._applyEntry(SetCodeEntry(SetCodeEntry.TARGET_PROLOGUE,
+                                          self._entryLines))
+            self._entryLines = None
+        elif name=="setEpilogue":
+            self._applyEntry(SetCodeEntry(SetCodeEntry.TARGET_EPILOGUE,
+                                          self._entryLines))
+            self._entryLines = None
+        elif name=="line" and self._parent in ["setPrologue", "setEpilogue"]:
+            self._entryLines.append(self._getCollectedCharacters())
+        elif name=="removeShiftLevel" or name=="removeVirtualState":
+            pass
+        else:
+            super(JournalHandler, self).doEndElement(name)
+
+    def _startSetAction(self, attrs):
+        """Handle the setAction start tag."""
+        controlType = self._getAttribute(attrs, "controlType")
+        joystickType = self._profile.joystickType
+        if controlType=="key":
+            control = joystickType.findKey(self._getControlCode(attrs,
+                                                                Key.findCodeFor))
+        elif controlType=="axis":
+            control = joystickType.findAxis(self._getControlCode(attrs,
+                                                                 Axis.findCodeFor))
+        elif controlType=="virtual":
+            control = self._getVirtualControl(attrs)
+        else:
+            self._fatal("invalid control type '%s'" % (controlType,))
+
+        if control is None:
+            self._fatal("the control is not part of the joystick type")
+
+        shiftStates = self._getAttribute(attrs, "shiftStates")
+        try:
+            shiftStateSequence = [int(s) for s in shiftStates.split(",") if s]
+        except:
+            self._fatal("invalid shift state sequence")
+
+        if len(shiftStateSequence)!=self._profile.numShiftLevels:
+            self._fatal("the shift state sequence does not match the shift levels")
+
+        self._entryControl = control
+        self._entryState = self._findIntAttribute(attrs, "state")
+        self._entryShiftStateSequence = shiftStateSequence
+        self._entryTree = HandlerTree()
+
+    def _startRemoveShiftLevel(self, attrs):
+        """Handle the removeShiftLevel start tag."""
+        index = self._getIntAttribute(attrs, "index")
+        if index<0 or index>=self._profile.numShiftLevels:
+            self._fatal("invalid shift level index")
+
+        self._applyEntry(RemoveShiftLevelEntry(index,
+                                               self._getIntAttribute(attrs,
+                                                                     "keepStateIndex")))
+
+    def _startRemoveVirtualState(self, attrs):
+        """Handle the removeVirtualState start tag."""
+        virtualControl = self._getProfileVirtualControl(attrs)
+        virtualState = \
+            virtualControl.findStateByDisplayName(self._getAttribute(attrs,
+                                                                     "displayName"))
+        if virtualState is None:
+            self._fatal("no virtual state with the given display name")
+
+        self._applyEntry(RemoveVirtualStateEntry(virtualControl, virtualState))
+
+    def _getProfileVirtualControl(self, attrs):
+        """Get the virtual control of the profile with the name given in the
+        attributes."""
+        virtualControl = \
+            self._profile.findVirtualControl(self._getAttribute(attrs, "name"))
+        if virtualControl is None:
+            self._fatal("the profile has no virtual control with the given name")
+        return virtualControl
+
+    def _applyEntry(self, entry):
+        """Apply the given entry to the profile."""
+        if not entry.apply(self._profile):
+            self._fatal("the journal entry could not be applied")
+        self._numEntries += 1
+
+#------------------------------------------------------------------------------
+#------------------------------------------------------------------------------
+
+class ProfileJournal(object):
+    """The journal of a profile file."""
+    ## The suffix of the journal files appended to the profile's path
+    SUFFIX = ".journal"
+
+    ## The suffix appended to the path of a journal that could not be
+    ## replayed, when it is moved aside
+    FAILED_SUFFIX = ".failed"
+
+    @staticmethod
+    def getPathFor(profilePath):
+        """Get the path of the journal belonging to the given profile
+        file."""
+        return profilePath + ProfileJournal.SUFFIX
+
+    @staticmethod
+    def remove(profilePath):
+        """Remove the journal of the given profile file, if it exists."""
+        path = ProfileJournal.getPathFor(profilePath)
+        if os.path.exists(path):
+            os.unlink(path)
+
+    @staticmethod
+    def escapeLine(text):
+        """Escape the line breaks in the given XML text, so that it can be
+        stored as a single line."""
+        return text.replace("\r", "&#13;").replace("\n", "&#10;")
+
+    def __init__(self, profilePath):
+        """Construct the journal for the profile file with the given path."""
+        self._profilePath = profilePath
+        self._path = ProfileJournal.getPathFor(profilePath)
+        self._numEntries = 0
+        self._replayFailed = False
+
+    @property
+    def numEntries(self):
+        """Get the number of entries in the journal."""
+        return self._numEntries
+
+    @property
+    def replayFailed(self):
+        """Determine if the last replay of the journal has failed, and the
+        journal has not been moved aside since then."""
+        return self._replayFailed
+
+    def replay(self, profile):
+        """Replay the journal on the given profile just loaded from the
+        profile file.
+
+        A stale journal (one belonging to an earlier version of the profile
+        file) is removed.
+
+        Returns the number of entries applied. If an entry could not be
+        applied, the replay stops and replayFailed becomes True."""
+        self._numEntries = 0
+        self._replayFailed = False
+
+        if not os.path.isfile(self._path):
+            return 0
+
+        with open(self._path, "rt") as f:
+            lines = f.readlines()
+
+        if not lines or lines[0].rstrip("\n")!=self._getHeader():
+            print("Removing stale journal", self._path, file=sys.stderr)
+            os.unlink(self._path)
+            return 0
+
+        if not lines[-1].endswith("\n"):
+            lines = lines[:-1]
+
+        parser = make_parser()
+        handler = JournalHandler(profile)
+        parser.setContentHandler(handler)
+
+        text = "<profileJournal>" + "".join(lines) + "</profileJournal>"
+        try:
+            parser.parse(io.StringIO(text))
+        except Exception as e:
+            print("Failed to replay journal %s: %s" % (self._path, e),
+                  file=sys.stderr)
+            self._replayFailed = True
+
+        self._numEntries = handler.numEntries
+
+        return self._numEntries
+
+    def append(self, profile, entry):
+        """Append the given entry made to the given profile to the journal.
+
+        The profile file must exist. The data is synchronized to the disk
+        before returning."""
+        if self._replayFailed or not os.path.isfile(self._path):
+            self.reset()
+
+        line = entry.getLine(profile)
+        with open(self._path, "at") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._numEntries += 1
+
+    def reset(self, numKeptEntries = 0):
+        """Reset the journal for the current version of the profile file.
+
+        It should be called after the profile file has been (re)written. The
+        given number of the last entries are kept, as they have been appended
+        after the profile was turned into the XML document written."""
+        if self._replayFailed:
+            self._moveAside()
+
+        keptLines = []
+        if numKeptEntries>0 and os.path.isfile(self._path):
+            with open(self._path, "rt") as f:
+                lines = [line for line in f.readlines()[1:]
+                         if line.endswith("\n")]
+            keptLines = lines[-numKeptEntries:]
+
+        newPath = self._path + ".new"
+        with open(newPath, "wt") as f:
+            f.write(self._getHeader() + "\n")
+            f.writelines(keptLines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(newPath, self._path)
+
+        self._numEntries = len(keptLines)
+
+    def _moveAside(self):
+        """Move the journal that could not be replayed aside."""
+        failedPath = self._path + ProfileJournal.FAILED_SUFFIX
+        if os.path.isfile(self._path):
+            os.replace(self._path, failedPath)
+            print("The journal that could not be replayed is kept as %s" %
+                  (failedPath,), file=sys.stderr)
+        self._replayFailed = False
+
+    def _getHeader(self):
+        """Get the header line for the current version of the profile
+        file."""
+        s = os.stat(self._profilePath)
+        return "<base mtime=\"%d\" size=\"%d\"/>" % (s.st_mtime_ns, s.st_size)
+
+#------------------------------------------------------------------------------
+
+#------------------------------------------------------------------------------
+
+class ProfileCompaction(threading.Thread):
+    """A thread writing the XML text of a profile into the profile file in
+    the background.
+
+    The text should be produced from the profile in the main thread, since
+    the profile may be modified while the thread is running. When the
+    writing has finished (or failed), the given callback is called from the
+    thread with the compaction object. Then the journal should be reset in
+    the main thread, keeping the entries appended after the text was
+    produced (see numEntries)."""
+    def __init__(self, path, text, numEntries, doneCallback):
+        """Construct the compaction of the profile file with the given path
+        to the given text, which contains the edits of the given number of
+        journal entries."""
+        super(ProfileCompaction, self).__init__(name = "ProfileCompaction")
+        self._path = path
+        self._text = text
+        self._numEntries = numEntries
+        self._doneCallback = doneCallback
+
+        # The exception that occurred while writing the file, if any
+        self.error = None
+
+    @property
+    def path(self):
+        """Get the path of the profile file."""
+        return self._path
+
+    @property
+    def numEntries(self):
+        """Get the number of journal entries contained in the text."""
+        return self._numEntries
+
+    def run(self):
+        """Write the text into the profile file."""
+        try:
+            newPath = self._path + ".new"
+            with open(newPath, "wt") as f:
+                f.write(self._text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(newPath, self._path)
+        except Exception as e:
+            self.error = e
+
+        self._doneCallback(self)
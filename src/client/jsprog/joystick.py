@@ -176,6 +176,16 @@ class JoystickIdentity(object):
         """Get the name of the joystick."""
         return self._name
 
+    @property
+    def indexKey(self):
+        """Get the key of the identity for indexing.
+
+        It consists of the bus type, vendor and product of the input ID and
+        the name, i.e. the attributes that must be equal for two identities to
+        match."""
+        return (self._inputID._busType, self._inputID._vendor,
+                self._inputID._product, self._name)
+
     @property
     def generic(self):
         """Get a generic version of this joystick identity.
@@ -1928,6 +1938,9 @@ class Axis(object):
 
     def __repr__(self):
         """Get the string representation of the axis"""
+        if self._minimum is None:
+            return "Axis(0x%03x (%s), %s)" % \
+                (self._code, Axis.getNameFor(self._code), self.value)
         return "Axis(0x%03x (%s), %d..%d, %d)" % \
             (self._code, Axis.getNameFor(self._code),
              self._minimum, self._maximum,
@@ -1936,6 +1949,9 @@ class Axis(object):
 
     def __str__(self):
         """Convert the axis to a string."""
+        if self._minimum is None:
+            return "%s (0x%03x): %s" % \
+                (Axis.getNameFor(self._code), self._code, self.value)
         return "%s (0x%03x, %d..%d): %d" % \
             (Axis.getNameFor(self._code), self._code,
              self._minimum, self._maximum,
@@ -2,19 +2,26 @@
 
 from .gui import gui as gui
 
-from .joystick import Joystick, Key, Axis
+from .joystick import Joystick
+from .parser import Control
+from .eventtrace import EventTraceWriter
+from .eventstream import EventPrinter, EventJSONLinesWriter, AxisDecimator
 from .const import dbusInterfaceName, dbusInterfacePath
-from .util import getJSProg
+from .dbusproxy import JSProg
+from .diagnostics import runProfiled, SlowCallTracer
 from .common import *
 
 from dbus import SessionBus
 from dbus.mainloop.glib import DBusGMainLoop
 
+from gi.repository import GLib
+
 import dbus.service
 
 import argparse
 import sys
 import os
+import time
 
 #------------------------------------------------------------------------------
 
@@ -33,7 +40,7 @@ class GetJoysticks(object):
     @staticmethod
     def execute(connection, args):
         """Perform the operation"""
-        jsprog = getJSProg(connection)
+        jsprog = JSProg.get(connection)
         joysticks = jsprog.getJoysticks()
 
         if not joysticks:
@@ -43,9 +50,8 @@ class GetJoysticks(object):
             GetJoysticks.printJoystick(joystick, args.verbose)
 
     @staticmethod
-    def printJoystick(joystickArgs, verbose):
+    def printJoystick(joystick, verbose):
         """Print information about the given joystick."""
-        joystick = Joystick.fromArgs(joystickArgs)
         identity = joystick.identity
 
         print("%2d: %s" % (joystick.id, identity))
@@ -64,45 +70,52 @@ class GetJoysticks(object):
 #------------------------------------------------------------------------------
 
 class GetJoystickState(object):
-    """Command to get state of one of the joysticks known to the."""
+    """Command to get state of some or all of the joysticks known to the
+    daemon."""
 
     @staticmethod
     def addParser(parsers):
         """Add the parser for this command."""
         parser = parsers.add_parser("getstate",
-                                    help = "get the state of a jotstick")
-        parser.add_argument(dest = "id",
-                            help = "the identifier of the joystick")
+                                    help = "get the state of one or more joysticks (all, if none is given)")
+        parser.add_argument(dest = "ids", nargs = "*", type = int,
+                            metavar = "id",
+                            help = "the identifier of a joystick")
         return parser
 
     @staticmethod
     def execute(connection, args):
         """Perform the operation"""
-        jsprog = getJSProg(connection)
-        joystickState = jsprog.getJoystickState(args.id)
+        jsprog = JSProg.get(connection)
+        joystickStates = jsprog.getJoystickStates(args.ids)
 
-        if not joystickState:
-            print("The given joystick is unknown.")
+        ids = args.ids if args.ids else sorted(joystickStates.keys())
+        if not ids:
+            print("There are no joysticks.")
 
-        keys = joystickState[0]
-        axes = joystickState[1]
+        for id in ids:
+            if len(ids)>1:
+                print("Joystick %d:" % (id,))
+            GetJoystickState._printState(id, joystickStates.get(id),
+                                         "    " if len(ids)>1 else "")
+
+    @staticmethod
+    def _printState(id, joystickState, indentation):
+        """Print the given state of the joystick with the given ID."""
+        (keys, axes) = ([], []) if joystickState is None else joystickState
 
         if len(keys)==0 and len(axes)==0:
-            print("No joystick with ID %s" % (args.id,))
+            print("%sNo joystick with ID %s" % (indentation, id))
         else:
             if len(keys)>0:
-                print("Keys:")
-                for keyData in keys:
-                    code = keyData[0]
-                    value = keyData[1]
-                    print("    %s: %s" % (Key.getNameFor(code),
-                                          "released" if value==0 else "pressed"))
+                print("%sKeys:" % (indentation,))
+                for key in keys:
+                    print("%s    %s: %s" % (indentation, key.name,
+                                            "pressed" if key.pressed else "released"))
             if len(axes)>0:
-                print("Axes:")
-                for axisData in axes:
-                    code = axisData[0]
-                    value = axisData[1]
-                    print("    %s: %d" % (Axis.getNameFor(code), value))
+                print("%sAxes:" % (indentation,))
+                for axis in axes:
+                    print("%s    %s: %d" % (indentation, axis.name, axis.value))
 
 #------------------------------------------------------------------------------
 
@@ -122,7 +135,7 @@ class LoadProfile(object):
     @staticmethod
     def execute(connection, args):
         """Load the profile."""
-        jsprog = getJSProg(connection)
+        jsprog = JSProg.get(connection)
 
         id = int(args.id)
         with open(args.profile, "rt") as f:
@@ -136,6 +149,62 @@ class LoadProfile(object):
 
 #------------------------------------------------------------------------------
 
+class GetProfileStats(object):
+    """Command to display the counters of the functions and the handlers of
+    the profile loaded into a joystick."""
+    ## The keys to sort the entries by
+    sortKeys = {
+        "time": lambda entry: entry[2],
+        "calls": lambda entry: entry[1],
+        "mean": lambda entry: entry[2] / entry[1] if entry[1]>0 else 0.0
+    }
+
+    @staticmethod
+    def addParser(parsers):
+        """Add the parser for this command."""
+        parser = parsers.add_parser("stats",
+                                    help = "display the invocation counts and times of the functions and handlers of the profile loaded into the joystick with the given ID, if it has been instrumented (see 'gui --lua-profiling'). The times include those of the functions called.")
+        parser.add_argument(dest = "id",
+                            help = "the identifier of the joystick")
+        parser.add_argument("-s", "--sort", dest = "sort",
+                            choices = sorted(GetProfileStats.sortKeys.keys()),
+                            default = "time",
+                            help = "the order of the entries (default: time)")
+        parser.add_argument("-n", "--limit", dest = "limit", type = int,
+                            default = None,
+                            help = "display at most the given number of entries")
+        parser.add_argument("-r", "--reset", action = "store_true",
+                            dest = "reset",
+                            help = "reset the counters after retrieving them")
+        return parser
+
+    @staticmethod
+    def execute(connection, args):
+        """Perform the operation"""
+        jsprog = JSProg.get(connection)
+
+        entries = jsprog.getProfileStats(int(args.id), args.reset)
+
+        if not entries:
+            print("No statistics for joystick %s. Perhaps the ID is wrong or the profile is not instrumented." %
+                  (args.id,), file=sys.stderr)
+            return
+
+        entries.sort(key = GetProfileStats.sortKeys[args.sort],
+                     reverse = True)
+        if args.limit is not None:
+            entries = entries[:args.limit]
+
+        nameWidth = max([len(entry[0]) for entry in entries] + [4])
+        print("%-*s %10s %12s %10s" %
+              (nameWidth, "Name", "Calls", "Total (ms)", "Mean (us)"))
+        for (name, numCalls, totalMicros) in entries:
+            print("%-*s %10d %12.3f %10.1f" %
+                  (nameWidth, name, numCalls, totalMicros / 1000.0,
+                   totalMicros / numCalls if numCalls>0 else 0.0))
+
+#------------------------------------------------------------------------------
+
 class Monitor(object):
     """Command to monitor the addition and removal of joysticks."""
 
@@ -167,7 +236,7 @@ class Monitor(object):
             args = message.get_args_list()
             if message.get_member()=="joystickAdded":
                 print("Added joystick:")
-                GetJoysticks.printJoystick(args, verbose)
+                GetJoysticks.printJoystick(Joystick.fromArgs(args), verbose)
             elif message.get_member()=="joystickRemoved":
                 print("Removed joystick with ID: %d" % (args[0],))
 
@@ -177,64 +246,183 @@ class JSProgListener(dbus.service.Object):
     """A listener for the control events.
 
     It implements interface 'hu.varadiistvan.JSProgListener', defined
-    in jsproglistener.xml."""
-    def __init__(self, connection, path):
+    in jsproglistener.xml.
+
+    The events are passed with the time they are received to the given
+    output (see jsprog.eventstream)."""
+    def __init__(self, connection, path, output):
         """Construct the listener with the given path."""
         super(JSProgListener, self).__init__(connection, path)
+        self._output = output
 
     @dbus.service.method(dbus_interface = "hu.varadiistvan.JSProgListener",
                          in_signature = "uq", out_signature = "")
     def keyPressed(self, joystickID, code):
         """Called when a key is pressed."""
-        print("Pressed key %d (0x%03x, %s)" % \
-              (code, code, Key.getNameFor(code)))
+        self._output.write(time.monotonic_ns(), joystickID,
+                           Control.TYPE_KEY, code, 1)
 
     @dbus.service.method(dbus_interface = "hu.varadiistvan.JSProgListener",
                          in_signature = "uq", out_signature = "")
     def keyReleased(self, joystickID, code):
         """Called when a key is released."""
-        print("Released key %d (0x%03x, %s)" % \
-              (code, code, Key.getNameFor(code)))
+        self._output.write(time.monotonic_ns(), joystickID,
+                           Control.TYPE_KEY, code, 0)
 
     @dbus.service.method(dbus_interface = "hu.varadiistvan.JSProgListener",
                          in_signature = "uqi", out_signature = "")
     def axisChanged(self, joystickID, code, value):
         """Called when the value of an axis has changed."""
-        print("Axis %d (0x%03x, %s) changed to %d" % \
-              (code, code, Axis.getNameFor(code), value))
+        self._output.write(time.monotonic_ns(), joystickID,
+                           Control.TYPE_AXIS, code, value)
 
 #------------------------------------------------------------------------------
 
 class MonitorControls(object):
     """Command to monitor the various control (key or axis) events of a
-    joystick."""
+    joystick or all joysticks."""
     @staticmethod
     def addParser(parsers):
         """Add the parser for this command."""
         parser = parsers.add_parser("monitorjs",
                                     help = "Monitor the control events of a joystick")
-        parser.add_argument(dest = "id",
+        parser.add_argument(dest = "id", nargs = "?", default = None,
                             help = "the identifier of the joystick")
+        parser.add_argument("-a", "--all", dest = "all", action = "store_true",
+                            help = "monitor all joysticks, including the ones added later")
+        outputGroup = parser.add_mutually_exclusive_group()
+        outputGroup.add_argument("-r", "--record", dest = "record", default = None,
+                                 help = "record the events into the given binary trace file instead of printing them")
+        outputGroup.add_argument("-j", "--jsonl", dest = "jsonl",
+                                 action = "store_true",
+                                 help = "write the events to the standard output as newline-delimited JSON objects")
+        parser.add_argument("-d", "--decimate", dest = "decimate", type = int,
+                            default = 0, metavar = "MS",
+                            help = "pass on at most one event per the given number of milliseconds for each axis, keeping the latest value")
+        parser.add_argument("--flush-interval", dest = "flushInterval",
+                            type = int, default = 1000, metavar = "MS",
+                            help = "flush the JSON output at least this often (0: only when the buffer is full)")
         return parser
 
     @staticmethod
     def execute(connection, args):
         """Perform the monitoring of the events."""
+        if (args.id is None)==(not args.all):
+            print("Either the ID of a joystick or --all should be given.",
+                  file=sys.stderr)
+            sys.exit(1)
+
         pid = os.getpid()
 
         name = dbus.service.BusName("hu.varadiistvan.JSProgListener-%d" % (pid,),
                                     connection)
 
-        jsprog = getJSProg(connection)
+        jsprog = JSProg.get(connection)
 
-        path = "%s/%d" % (dbusInterfacePath, pid)
-        listener = JSProgListener(connection, path)
+        mainloop = MainLoop()
 
-        if jsprog.startMonitor(int(args.id), name.get_name(), path):
-            mainloop = MainLoop()
-            mainloop.run()
+        recorder = None
+        if args.record is not None:
+            output = recorder = EventTraceWriter(args.record)
+        elif args.jsonl:
+            sys.stdout.flush()
+            writer = EventJSONLinesWriter(open(sys.stdout.fileno(), "wb",
+                                               buffering = 65536,
+                                               closefd = False),
+                                          closedCallback = mainloop.quit)
+            if args.flushInterval>0:
+                GLib.timeout_add(args.flushInterval,
+                                 lambda: writer.flush() or not writer.closed)
+            output = writer
         else:
-            print("Could not start monitoring the joystick, perhaps the ID is wrong.", file=sys.stderr)
+            output = EventPrinter(showJoystickID = args.all)
+
+        # The joystick additions and removals are reported only by the
+        # textual outputs
+        notifier = None if recorder is not None else output
+
+        if args.decimate>0:
+            output = AxisDecimator(output, args.decimate)
+            if notifier is not None:
+                notifier = output
+
+        path = "%s/%d" % (dbusInterfacePath, pid)
+        listener = JSProgListener(connection, path, output)
+
+        # The IDs of the joysticks being monitored. A joystick added while
+        # the initial list is being processed may be reported both by the
+        # joystickAdded signal and in the list, but the daemon would send
+        # its events to the listener as many times as it is registered.
+        monitoredIDs = set()
+
+        def startMonitor(id):
+            if id in monitoredIDs:
+                return False
+            started = jsprog.startMonitor(id, name.get_name(), path)
+            if started:
+                monitoredIDs.add(id)
+            return started
+
+        try:
+            if args.all:
+                connection.add_match_string("interface='%s'" % (dbusInterfaceName,))
+                connection.add_message_filter(lambda connection, message:
+                                              MonitorControls.filterMessage(message,
+                                                                            startMonitor,
+                                                                            monitoredIDs,
+                                                                            notifier))
+                joysticks = [joystick for joystick in jsprog.getJoysticks()
+                             if joystick.id not in monitoredIDs]
+                # An empty list of IDs would mean all joysticks
+                if joysticks:
+                    monitoredIDs.update(
+                        jsprog.startMonitors([joystick.id
+                                              for joystick in joysticks],
+                                             name.get_name(), path))
+                if notifier is not None:
+                    for joystick in joysticks:
+                        if joystick.id in monitoredIDs:
+                            notifier.writeJoystickAdded(time.monotonic_ns(),
+                                                        joystick.id,
+                                                        joystick.identity.name)
+                started = True
+            else:
+                started = startMonitor(int(args.id))
+
+            if started:
+                try:
+                    mainloop.run()
+                except KeyboardInterrupt:
+                    pass
+            else:
+                print("Could not start monitoring the joystick, perhaps the ID is wrong.", file=sys.stderr)
+        finally:
+            output.close()
+            if recorder is not None:
+                print("Recorded %d events into %s" %
+                      (recorder.numRecords, args.record))
+
+    @staticmethod
+    def filterMessage(message, startMonitor, monitoredIDs, notifier):
+        """Handle the addition and the removal of joysticks when monitoring
+        all of them.
+
+        The joysticks already monitored (i.e. whose IDs are in the given
+        set) are not monitored again."""
+        if message.get_interface()==dbusInterfaceName:
+            args = message.get_args_list()
+            if message.get_member()=="joystickAdded":
+                joystick = Joystick.fromArgs(args)
+                if startMonitor(joystick.id) and notifier is not None:
+                    notifier.writeJoystickAdded(time.monotonic_ns(),
+                                                joystick.id,
+                                                joystick.identity.name)
+            elif message.get_member()=="joystickRemoved":
+                id = int(args[0])
+                if id in monitoredIDs:
+                    monitoredIDs.remove(id)
+                    if notifier is not None:
+                        notifier.writeJoystickRemoved(time.monotonic_ns(), id)
 
 #------------------------------------------------------------------------------
 
@@ -249,7 +437,7 @@ class Stop(object):
     @staticmethod
     def execute(connection, args):
         """Perform the operation"""
-        jsprog = getJSProg(connection)
+        jsprog = JSProg.get(connection)
         jsprog.exit()
 
 #------------------------------------------------------------------------------
@@ -266,12 +454,24 @@ class GUI(object):
         parser.add_argument("-d", "--debug", action="store_true",
                             dest = "debug",
                             help = "enable some debugging features")
+        parser.add_argument("--no-profile-cache", action="store_false",
+                            dest = "useProfileCache",
+                            help = "do not use the cache of the parsed profiles")
+        parser.add_argument("--lua-profiling", action="store_true",
+                            dest = "luaProfiling",
+                            help = "instrument the code of the profiles loaded into the daemon with counters (see the stats command)")
+        parser.add_argument("--latency-dump", action="store",
+                            dest = "latencyDumpPath", default = None,
+                            help = "record the latencies of the control events in the GUI and dump them into the given JSON file when quitting")
         return parser
 
     @staticmethod
     def execute(connection, args):
         """Perform the operation"""
-        gui.GUI(connection, args.extraDataDirectory, args.debug).run([])
+        gui.GUI(connection, args.extraDataDirectory, args.debug,
+                useProfileCache = args.useProfileCache,
+                luaProfiling = args.luaProfiling,
+                latencyDumpPath = args.latencyDumpPath).run([])
 
 #------------------------------------------------------------------------------
 
@@ -284,11 +484,19 @@ if __name__ == "__main__":
     mainParser = argparse.ArgumentParser(prog = "jsprog",
                                      description = "Command-line interface for the JSProg daemon")
 
+    mainParser.add_argument("--profile-out", action = "store",
+                            dest = "profileOutPath", default = None,
+                            help = "run the command under cProfile and write the statistics into the given file")
+    mainParser.add_argument("--trace-slow", action = "store",
+                            dest = "traceSlowThreshold", type = float,
+                            default = None, metavar = "MS",
+                            help = "log the main loop callbacks of the GUI (message filter, control events, drawing, profile saving) taking longer than the given number of milliseconds with their stack traces")
+
     subParsers = mainParser.add_subparsers(title = "commands",
                                            description = "the commands the program accepts")
 
     for clazz in [GetJoysticks,
-                  GetJoystickState, LoadProfile,
+                  GetJoystickState, LoadProfile, GetProfileStats,
                   Monitor, MonitorControls,
                   Stop, GUI]:
         parser = clazz.addParser(subParsers)
@@ -296,8 +504,15 @@ if __name__ == "__main__":
 
     args = mainParser.parse_args(sys.argv[1:])
 
+    if args.traceSlowThreshold is not None:
+        SlowCallTracer(args.traceSlowThreshold)
+
     #try:
     connection = SessionBus(mainloop = DBusGMainLoop())
-    args.func(args).execute(connection, args)
+    if args.profileOutPath:
+        runProfiled(args.profileOutPath, args.func(args).execute,
+                    connection, args)
+    else:
+        args.func(args).execute(connection, args)
     #except Exception, e:
     #    print str(e)
@@ -37,6 +37,10 @@ class VirtualControlBase(object):
     A virtual control has a number of states each corresponding to a certain
     discrete, integer value startin from 0. Values of other controls determine
     which state a virtual control is in."""
+    ## The maximal number of entries in a Lua lookup table computing the
+    ## value of the control
+    maxLuaTableSize = 256
+
     def __init__(self):
         """Construct the object with no states."""
         self._states = []
@@ -234,13 +238,133 @@ class VirtualControlBase(object):
                 return True
         return False
 
-    def getValueLuaCode(self, profile, valueVariableName):
+    def getLuaTableLayout(self, profile, always = False):
+        """Get the layout of the Lua lookup table computing the value of this
+        virtual control.
+
+        Such a table can be used if all constraints of the states are single
+        value constraints on keys or virtual controls, since then the value
+        is a function of a few small integers. These are packed into an index
+        of the table as the digits of a mixed radix number, where the radix
+        of a key is 3 (it is released (0), pressed (1) or repeated (2), the
+        latter reported by the kernel for keys held down) and that of a
+        virtual control is its number of states. The entries of a repeated
+        key are computed like those of any other value, so they match only
+        the states not constraining the key, just like the conditions.
+
+        Packing the index needs the values of all controls, while the
+        conditions of the states may be decided after checking only a few of
+        them. Therefore, unless always is True, a table is used only if the
+        states have more constraints than there are controls.
+
+        Returns a list of tuples of the controls and their radices in the
+        order of the digits, starting with the least significant one. If a
+        table cannot or should not be used, None is returned."""
+        size = 1
+        layout = []
+        for control in sorted(self.getControls()):
+            if control.isKey:
+                radix = 3
+            elif control.isVirtual:
+                virtualControl = profile.findVirtualControlByCode(control.code)
+                if virtualControl is None:
+                    return None
+                radix = virtualControl.numStates
+            else:
+                return None
+
+            size *= radix
+            if size>VirtualControlBase.maxLuaTableSize:
+                return None
+
+            layout.append((control, radix))
+
+        numConstraints = 0
+        for state in self._states:
+            for constraint in state.constraints:
+                if constraint.type!=ControlConstraint.TYPE_SINGLE_VALUE:
+                    return None
+                numConstraints += 1
+
+        if not layout or (not always and numConstraints<=len(layout)):
+            return None
+
+        return layout
+
+    def getLuaTable(self, layout):
+        """Get the entries of the Lua lookup table of the given layout.
+
+        Returns a list of the values of the control for each index of the
+        table. An entry is None if no state matches the controls' values
+        belonging to the index and there is no default state."""
+        defaultValue = self._getDefaultValue()
+
+        size = 1
+        for (_control, radix) in layout:
+            size *= radix
+
+        entries = []
+        for index in range(0, size):
+            values = {}
+            remainder = index
+            for (control, radix) in layout:
+                values[control] = remainder % radix
+                remainder //= radix
+
+            value = defaultValue
+            for state in self._states:
+                if not state.isDefault and \
+                   all(constraint.isValueMatched(values[constraint.control])
+                       for constraint in state.constraints):
+                    value = state.value
+                    break
+
+            entries.append(value)
+
+        return entries
+
+    def getValueLuaTableCode(self, profile, tableName, alwaysTable = False):
+        """Get the Lua code defining the lookup table computing the value of
+        this virtual control.
+
+        tableName is the name of the variable that should contain the table.
+
+        Returns an array of lines, which is empty if no table is used (see
+        getLuaTableLayout())."""
+        layout = self.getLuaTableLayout(profile, always = alwaysTable)
+        if layout is None:
+            return []
+
+        entries = ["nil" if value is None else str(value)
+                   for value in self.getLuaTable(layout)]
+
+        lines = ["%s = {" % (tableName,)]
+        for index in range(0, len(entries), 16):
+            lines.append("  " + ", ".join(entries[index:index+16]) + ",")
+        lines.append("}")
+
+        return lines
+
+    def getValueLuaCode(self, profile, valueVariableName, tableName = None,
+                        alwaysTable = False):
         """Get the Lua code to compute the value of this virtual control.
 
         valueVariableName is the name of the variable that should contain the
         computed value.
 
+        If tableName is given and a lookup table is used (see
+        getLuaTableLayout()), the code indexes the table with that name
+        (defined by the code returned by getValueLuaTableCode()). Otherwise
+        the conditions of the states are evaluated one after the other.
+
         Returns an array of lines."""
+        if tableName is not None:
+            layout = self.getLuaTableLayout(profile, always = alwaysTable)
+            if layout is not None:
+                return self._getValueLuaTableLookupCode(layout,
+                                                        valueVariableName,
+                                                        tableName)
+
         lines = []
 
         defaultValue = None
@@ -301,6 +425,45 @@ class VirtualControlBase(object):
                 return index
         return -1
 
+    def _getDefaultValue(self):
+        """Get the value of the default state, if any.
+
+        If there is no default state, None is returned."""
+        for state in self._states:
+            if state.isDefault:
+                return state.value
+        return None
+
+    def _getValueLuaTableLookupCode(self, layout, valueVariableName,
+                                    tableName):
+        """Get the Lua code to compute the value of this virtual control by
+        indexing the lookup table with the given layout and name.
+
+        Lua tables are indexed from 1, so 1 is added to the packed values.
+        If the table has no entry for the index (because there is no default
+        state, or a control has an unexpected value), the default value is
+        used, or if there is no default state, the value is left unchanged,
+        just like with the conditions of the states."""
+        terms = ["1"]
+        weight = 1
+        for (control, radix) in layout:
+            if weight==1:
+                terms.append(control.luaValueName)
+            else:
+                terms.append("%s * %d" % (control.luaValueName, weight))
+            weight *= radix
+        index = " + ".join(terms)
+
+        defaultValue = self._getDefaultValue()
+        if defaultValue is None:
+            return ["local value = %s[%s]" % (tableName, index),
+                    "if value ~= nil then",
+                    "  %s = value" % (valueVariableName,),
+                    "end"]
+        else:
+            return ["%s = %s[%s] or %d" % (valueVariableName, tableName,
+                                            index, defaultValue)]
+
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
 
@@ -361,10 +524,23 @@ class VirtualControl(VirtualControlBase):
         """Get the name of the function updating the state of this control."""
         return "_jsprog_virtual_%s_updateState" % (self._name,)
 
+    @property
+    def stateLuaTableName(self):
+        """Get the name of the variable containing the lookup table of the
+        states of this control."""
+        return "_jsprog_virtual_%s_stateTable" % (self._name,)
+
+    def getStateLuaTableCode(self, profile):
+        """Get the code defining the lookup table of the states of this
+        virtual control, if it can be used."""
+        return super(VirtualControl, self).getValueLuaTableCode(
+            profile, self.stateLuaTableName)
+
     def getStateLuaCode(self, profile):
         """Get the code computing the state of this virtual control."""
         stateName = self.stateLuaVariableName
-        return super(VirtualControl, self).getValueLuaCode(profile, stateName)
+        return super(VirtualControl, self).getValueLuaCode(
+            profile, stateName, tableName = self.stateLuaTableName)
 
     def _createXMLElement(self, document):
         """Create the XML element corresponding to this virtual control."""
@@ -650,6 +826,18 @@ class Control(object):
         return "_jsprog_%s_%s" % (control.name,
                                   "state" if control.isVirtual else "value")
 
+    @property
+    def valueRange(self):
+        """Get the range of the values of the control.
+
+        It is known only for the axes of the joystick type of the current
+        profile, for which a tuple of the minimum and the maximum values is
+        returned. Otherwise it is None."""
+        if self.isAxis and Control._currentProfile is not None:
+            axis = Control._currentProfile.joystickType.findAxis(self._code)
+            if axis is not None:
+                return (axis.minimum, axis.maximum)
+
     def getConstraintXML(self, document):
         """Get the XML element for a constraint involving this control."""
         element = document.createElement("key" if self._type==Control.TYPE_KEY
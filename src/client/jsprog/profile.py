@@ -13,7 +13,9 @@ from .common import _
 from xml.sax import make_parser
 from xml.dom.minidom import getDOMImplementation
 
+import bisect
 import os
+import re
 import sys
 import copy
 
@@ -34,6 +36,13 @@ def getShiftLevelStateName(index):
 
 #------------------------------------------------------------------------------
 
+def getShiftLevelStateTableName(index):
+    """Get the name of the variable containing the lookup table of the states
+    of a certain shift level."""
+    return "_jsprog_shiftLevel_%d_stateTable" % (index,)
+
+#------------------------------------------------------------------------------
+
 class ProfileHandler(BaseHandler):
     """XML content handler for a profile file."""
     # Line target: action
@@ -53,6 +62,7 @@ class ProfileHandler(BaseHandler):
 
         self._profileName = None
         self._autoLoad = False
+        self._valueRangeDispatch = Profile.VALUE_RANGE_DISPATCH_AUTO
 
         self._profile = None
 
@@ -209,12 +219,22 @@ class ProfileHandler(BaseHandler):
 
         self._autoLoad = self._findBoolAttribute(attrs, "autoLoad")
 
+        valueRangeDispatchName = self._findAttribute(attrs,
+                                                     "valueRangeDispatch",
+                                                     "auto")
+        self._valueRangeDispatch = \
+            Profile.findValueRangeDispatchFor(valueRangeDispatchName)
+        if self._valueRangeDispatch is None:
+            self._fatal("invalid value range dispatch: " +
+                        valueRangeDispatchName)
+
     def _endIdentity(self):
         """Handle the identity end tag."""
         super(ProfileHandler, self)._endIdentity()
         self._profile = Profile(self._joystickType,
                                 self._profileName, self._identity,
-                                autoLoad = self._autoLoad)
+                                autoLoad = self._autoLoad,
+                                valueRangeDispatch = self._valueRangeDispatch)
 
     def _startVirtualControls(self, attrs):
         """Handle the virtualControls start tag."""
@@ -394,6 +414,7 @@ class ProfileHandler(BaseHandler):
                 MouseMoveCommand.findDirectionFor(self._getAttribute(attrs, "direction"))
             if direction is None:
                 self._fatal("invalid direction")
+            (curve, points, precompute) = self._getMouseMoveCurve(attrs)
             self._action = MouseMove(direction = direction,
                                      a = self._findFloatAttribute(attrs, "a"),
                                      b = self._findFloatAttribute(attrs, "b"),
@@ -403,7 +424,9 @@ class ProfileHandler(BaseHandler):
                                      displayName =
                                      self._findAttribute(attrs, "displayName"),
                                      repeatDelay =
-                                     self._findIntAttribute(attrs, "repeatDelay"))
+                                     self._findIntAttribute(attrs, "repeatDelay"),
+                                     curve = curve, points = points,
+                                     precompute = precompute)
         elif type==Action.TYPE_ADVANCED:
             self._action = AdvancedAction(displayName =
                                           self._findAttribute(attrs, "displayName"),
@@ -530,14 +553,38 @@ class ProfileHandler(BaseHandler):
                                                                  "direction"))
         if direction is None:
             self._fatal("invalid direction")
+        (curve, points, precompute) = self._getMouseMoveCurve(attrs)
         command = MouseMoveCommand(direction = direction,
                                    a = self._findFloatAttribute(attrs, "a"),
                                    b = self._findFloatAttribute(attrs, "b"),
                                    c = self._findFloatAttribute(attrs, "c"),
                                    adjust =
-                                   self._findFloatAttribute(attrs, "adjust"))
+                                   self._findFloatAttribute(attrs, "adjust"),
+                                   curve = curve, points = points,
+                                   precompute = precompute)
         self._action.appendCommand(command)
 
+    def _getMouseMoveCurve(self, attrs):
+        """Get the curve of a mouse move action or command.
+
+        Returns a tuple of the curve type, the points and the indication if
+        the distances should be precomputed."""
+        curve = MouseMoveCommand.findCurveFor(self._findAttribute(attrs,
+                                                                  "curve",
+                                                                  "polynomial"))
+        if curve is None:
+            self._fatal("invalid curve")
+
+        points = None
+        if curve!=MouseMoveCommand.CURVE_POLYNOMIAL:
+            points = MouseMoveCommand.parsePoints(self._getAttribute(attrs,
+                                                                     "points"))
+            if points is None:
+                self._fatal("the points should be at least two value:distance pairs with increasing values")
+
+        return (curve, points,
+                self._findBoolAttribute(attrs, "precompute"))
+
     def _startLine(self, attrs):
         """Handle the line start tag."""
         if self._parent == "prologue":
@@ -676,12 +723,22 @@ class ShiftLevel(VirtualControlBase):
         sl._states = [s.clone() for s in self._states]
         return sl
 
+    def getStateLuaTableCode(self, profile, levelIndex):
+        """Get the Lua code defining the lookup table of the states of this
+        shift level, if it can be used.
+
+        Returns an array of lines."""
+        tableName = getShiftLevelStateTableName(levelIndex)
+        return super(ShiftLevel, self).getValueLuaTableCode(profile, tableName)
+
     def getStateLuaCode(self, profile, levelIndex):
         """Get the Lua code to compute the state of this shift level.
 
         Returns an array of lines."""
         stateName = getShiftLevelStateName(levelIndex)
-        return super(ShiftLevel, self).getValueLuaCode(profile, stateName)
+        tableName = getShiftLevelStateTableName(levelIndex)
+        return super(ShiftLevel, self).getValueLuaCode(profile, stateName,
+                                                       tableName = tableName)
 
     def _createXMLElement(self, document):
         """Get an XML element describing this shift level."""
@@ -886,6 +943,19 @@ class HandlerTree(object):
             for child in self._children:
                 child.modifyShiftHandler(index - 1, stateMap)
 
+    def hasActions(self):
+        """Determine if there are any actions other than NOP ones in the
+        tree."""
+        for child in self._children:
+            if isinstance(child, HandlerTree):
+                if child.hasActions():
+                    return True
+            elif isinstance(child, Action) and \
+                 child.type!=Action.TYPE_NOP:
+                return True
+
+        return False
+
     def hasActionsForShiftState(self, index, stateValue):
         """Check if there are any actions at the shift level with the given
         index for the given state value."""
@@ -1200,19 +1270,6 @@ class ShiftHandler(HandlerTree):
         assert(other._fromState==(self._toState+1))
         self._toState = other._toState
 
-    def hasActions(self):
-        """Determine if there are any actions below this shift handler."""
-        for child in self._children:
-            if isinstance(child, ShiftHandler) or \
-               isinstance(child, ValueRangeHandler):
-                if child.hasActions():
-                    return True
-            elif isinstance(child, Action) and \
-                 child.type!=Action.TYPE_NOP:
-                return True
-
-        return False
-
     def __eq__(self, other):
         """Determine if the two handler trees are equal.
 
@@ -1302,6 +1359,224 @@ class ValueRangeHandler(HandlerTree):
         return ("ValueRangeHandler<%d, %d, " % (self._fromValue, self._toValue)) + \
             repr(self._children) + ">"
 
+#------------------------------------------------------------------------------
+
+class ValueRangeDispatcher(object):
+    """Generator of the Lua code selecting the shifted state of an axis by
+    its value.
+
+    The value range handlers having the same parent form a group. By default
+    the ranges of a group are checked one after the other, but depending on
+    the value range dispatch mode of the profile, a balanced binary search
+    over the boundaries of the ranges or a lookup table indexed by the value
+    may be generated instead. For the latter two, the ranges are converted
+    into disjoint segments, in which the earlier ranges take precedence over
+    the later ones, so the result is the same as that of the checks."""
+    ## The maximal number of entries of a lookup table
+    maxTableSize = 256
+
+    ## The minimal number of value ranges in a group for which the automatic
+    ## mode does not check the ranges one after the other
+    minDispatchedRanges = 2
+
+    @staticmethod
+    def getTableName(control, index):
+        """Get the name of the lookup table with the given index for the
+        given control."""
+        return "_jsprog_%s_valueRangeTable%d" % (control.name, index)
+
+    @staticmethod
+    def getSegments(ranges):
+        """Get the disjoint segments of the given value ranges.
+
+        ranges is a list of tuples of the first and last values of a range
+        and the state belonging to it.
+
+        Returns a list of tuples of the first and last values and the state
+        of the segments. The segments cover all values between the smallest
+        and the largest ones of the ranges. The state of a segment not
+        covered by any range is 0. Neighbouring segments have different
+        states."""
+        boundaries = set()
+        for (fromValue, toValue, state) in ranges:
+            boundaries.add(fromValue)
+            boundaries.add(toValue + 1)
+        boundaries = sorted(boundaries)
+
+        segments = []
+        for (fromValue, nextValue) in zip(boundaries, boundaries[1:]):
+            segmentState = 0
+            for (rangeFromValue, rangeToValue, state) in ranges:
+                if rangeFromValue<=fromValue and fromValue<=rangeToValue:
+                    segmentState = state
+                    break
+            if segments and segments[-1][2]==segmentState:
+                segments[-1] = (segments[-1][0], nextValue - 1, segmentState)
+            else:
+                segments.append((fromValue, nextValue - 1, segmentState))
+
+        return segments
+
+    @staticmethod
+    def selectDispatch(dispatch, numRanges, segments):
+        """Select the dispatch actually used for a group of ranges.
+
+        dispatch is the value range dispatch mode of the profile.
+
+        numRanges is the number of the ranges in the group and segments are
+        their segments as returned by getSegments().
+
+        Returns one of Profile.VALUE_RANGE_DISPATCH_LINEAR,
+        Profile.VALUE_RANGE_DISPATCH_BINARY or
+        Profile.VALUE_RANGE_DISPATCH_TABLE."""
+        tableSize = segments[-1][1] - segments[0][0] + 1
+        if dispatch==Profile.VALUE_RANGE_DISPATCH_AUTO:
+            if numRanges<ValueRangeDispatcher.minDispatchedRanges:
+                return Profile.VALUE_RANGE_DISPATCH_LINEAR
+            dispatch = Profile.VALUE_RANGE_DISPATCH_TABLE
+
+        if dispatch==Profile.VALUE_RANGE_DISPATCH_TABLE and \
+           tableSize>ValueRangeDispatcher.maxTableSize:
+            return Profile.VALUE_RANGE_DISPATCH_BINARY
+
+        return dispatch
+
+    def __init__(self, profile, control, dispatch = None):
+        """Construct the dispatcher for the given axis control.
+
+        If dispatch is not given, the value range dispatch mode of the
+        profile is used."""
+        self._profile = profile
+        self._control = control
+        self._dispatch = profile.valueRangeDispatch if dispatch is None \
+            else dispatch
+
+        self._tableLines = []
+        self._numTables = 0
+
+        self._ranges = []
+
+    @property
+    def tableLines(self):
+        """Get the Lua code defining the lookup tables generated so far."""
+        return self._tableLines
+
+    def getStateLuaCode(self, handlerTree, indentation = ""):
+        """Get the Lua code computing the shifted state according to the
+        given handler tree.
+
+        Returns an array of lines."""
+        lines = []
+        indentation = [indentation]
+        handlerTree.foldStates(self._control, 0, self._profile.numShiftLevels,
+                               self._appendStateReturnLuaCode,
+                               acc = (lines, indentation),
+                               branchFun = self._addIfStatementFor,
+                               branchAcc = (self._profile, lines, 0,
+                                            indentation))
+        return lines
+
+    def _appendStateReturnLuaCode(self, control, stateIndex, action, acc):
+        """Append the Lua code returning the state index, or record it, if
+        within a group of value ranges."""
+        if self._ranges and self._ranges[-1][2] is None:
+            (fromValue, toValue, _) = self._ranges[-1]
+            self._ranges[-1] = (fromValue, toValue, stateIndex)
+            return acc
+        else:
+            return ControlProfile._appendStateReturnLuaCode(control,
+                                                            stateIndex,
+                                                            action, acc)
+
+    def _addIfStatementFor(self, control, handler, before, context):
+        """Handle the given shift or value range handler.
+
+        The value range handlers are collected and the code for a group is
+        generated after its last handler."""
+        if not isinstance(handler, ValueRangeHandler):
+            return ShiftHandler._addIfStatementFor(control, handler, before,
+                                                   context)
+
+        if before:
+            self._ranges.append((handler.fromValue, handler.toValue, None))
+        elif handler.isLastChild:
+            (_, lines, _, indentation) = context
+            appendLinesIndented(lines, self._getGroupLuaCode(self._ranges),
+                                indentation[0])
+            self._ranges = []
+
+        return context
+
+    def _getGroupLuaCode(self, ranges):
+        """Get the Lua code returning the state of the given group of
+        ranges."""
+        segments = ValueRangeDispatcher.getSegments(ranges)
+        dispatch = ValueRangeDispatcher.selectDispatch(self._dispatch,
+                                                       len(ranges), segments)
+
+        valueName = self._control.luaValueName
+        lines = []
+        if dispatch==Profile.VALUE_RANGE_DISPATCH_LINEAR:
+            for (fromValue, toValue, state) in ranges:
+                constraint = ValueRangeConstraint(self._control,
+                                                  fromValue, toValue)
+                lines.append("if %s then" %
+                             (constraint.getLuaExpression(self._profile),))
+                lines.append("  return %d" % (state,))
+                lines.append("end")
+            lines.append("return 0")
+        elif dispatch==Profile.VALUE_RANGE_DISPATCH_BINARY:
+            lines.append("local value = %s" % (valueName,))
+            segments = [(None, segments[0][0] - 1, 0)] + segments + \
+                [(segments[-1][1] + 1, None, 0)]
+            self._appendSearchLuaCode(lines, segments, "")
+        else:
+            self._numTables += 1
+            tableName = ValueRangeDispatcher.getTableName(self._control,
+                                                          self._numTables)
+            firstValue = segments[0][0]
+            entries = []
+            for (fromValue, toValue, state) in segments:
+                entries += [str(state)] * (toValue - fromValue + 1)
+
+            if self._tableLines: self._tableLines.append("")
+            self._tableLines.append("%s = {" % (tableName,))
+            for index in range(0, len(entries), 16):
+                self._tableLines.append("  " +
+                                        ", ".join(entries[index:index+16]) +
+                                        ",")
+            self._tableLines.append("}")
+
+            offset = 1 - firstValue
+            if offset==0:
+                index = valueName
+            elif offset>0:
+                index = "%s + %d" % (valueName, offset)
+            else:
+                index = "%s - %d" % (valueName, -offset)
+            lines.append("return %s[%s] or 0" % (tableName, index))
+
+        return lines
+
+    def _appendSearchLuaCode(self, lines, segments, indentation):
+        """Append the Lua code of a binary search among the given segments.
+
+        The value is in the local variable 'value'. The first value of the
+        first segment and the last value of the last segment may be None
+        meaning no limit."""
+        if len(segments)==1:
+            lines.append(indentation + "return %d" % (segments[0][2],))
+        else:
+            middle = len(segments) // 2
+            lines.append(indentation + "if value < %d then" %
+                         (segments[middle][0],))
+            self._appendSearchLuaCode(lines, segments[:middle],
+                                      indentation + "  ")
+            lines.append(indentation + "else")
+            self._appendSearchLuaCode(lines, segments[middle:],
+                                      indentation + "  ")
+            lines.append(indentation + "end")
+
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
 
@@ -1469,6 +1744,13 @@ class ControlProfile(object):
         This function should be implemented by the children."""
         raise NotImplementedError()
 
+    def hasActions(self):
+        """Check if there are any actions other than NOP ones in this
+        control profile.
+
+        This function should be implemented by the children."""
+        raise NotImplementedError()
+
     def hasActionsForShiftState(self, index, stateValue):
         """Check if there are any actions in this control profile for the given
         shift level index and state value.
@@ -1681,20 +1963,6 @@ class KeyProfile(ControlProfile):
 
         return element
 
-    def getDaemonXML(self, document, profile):
-        """Get the XML element for the XML document to be sent to the
-        daemon."""
-        element = document.createElement("key")
-
-        element.setAttribute("name", Key.getNameFor(self.code))
-
-        luaCode = self.getLuaCode(profile)
-        luaText = "\n" + linesToText(luaCode, indentation = "    ")
-
-        element.appendChild(document.createTextNode(luaText))
-
-        return element
-
     def getLuaCode(self, profile):
         """Get the Lua code for the key."""
         lines = []
@@ -1714,6 +1982,11 @@ class KeyProfile(ControlProfile):
         state map."""
         self._handlerTree.modifyShiftHandler(index, stateMap)
 
+    def hasActions(self):
+        """Check if there are any actions other than NOP ones in this
+        control profile."""
+        return self._handlerTree.hasActions()
+
     def hasActionsForShiftState(self, index, stateValue):
         """Check if there are any actions in this control profile for the given
         shift level index and state value."""
@@ -1809,6 +2082,12 @@ class VirtualControlProfile(ControlProfile):
 
         return self._handlerTrees[state]
 
+    @property
+    def handlerTrees(self):
+        """Get an iterator over the tuples of the states and the handler
+        trees belonging to them."""
+        return iter(self._handlerTrees.items())
+
     def getXML(self, document):
         """Get the XML element describing the key profile."""
         element = document.createElement("virtualControl")
@@ -1828,11 +2107,6 @@ class VirtualControlProfile(ControlProfile):
 
         return element
 
-    def getDaemonXML(self, document, profile):
-        """Get the XML element for the XML document to be sent to the
-        daemon."""
-        return None
-
     def insertShiftLevel(self, beforeIndex, fromState, toState):
         """Insert a new shift level before the given index spanning the given
         states."""
@@ -1849,6 +2123,14 @@ class VirtualControlProfile(ControlProfile):
         for handlerTree in self._handlerTrees.values():
             handlerTree.modifyShiftHandler(index, stateMap)
 
+    def hasActions(self):
+        """Check if there are any actions other than NOP ones in this
+        control profile."""
+        for handlerTree in self._handlerTrees.values():
+            if handlerTree.hasActions():
+                return True
+        return False
+
     def hasActionsForShiftState(self, index, stateValue):
         """Check if there are any actions in this control profile for the given
         shift level index and state value."""
@@ -2043,20 +2325,6 @@ class AxisProfile(ControlProfile):
 
         return element
 
-    def getDaemonXML(self, document, profile):
-        """Get the XML element for the XML document to be sent to the
-        daemon."""
-        element = document.createElement("axis")
-
-        element.setAttribute("name", Axis.getNameFor(self.code))
-
-        luaCode = self.getLuaCode(profile)
-        luaText = "\n" + linesToText(luaCode, indentation = "    ")
-
-        element.appendChild(document.createTextNode(luaText))
-
-        return element
-
     def getLuaCode(self, profile):
         """Get the Lua code for the key."""
         lines = []
@@ -2077,6 +2345,11 @@ class AxisProfile(ControlProfile):
         state map."""
         self._handlerTree.modifyShiftHandler(index, stateMap)
 
+    def hasActions(self):
+        """Check if there are any actions other than NOP ones in this
+        control profile."""
+        return self._handlerTree.hasActions()
+
     def hasActionsForShiftState(self, index, stateValue):
         """Check if there are any actions in this control profile for the given
         shift level index and state value."""
@@ -2120,17 +2393,517 @@ class AxisProfile(ControlProfile):
 
         return (lines, hasCode)
 
-    def _getShiftedStateLuaFunctionBody(self, profile):
+    def _getShiftedStateLuaFunction(self, profile):
         """Get the code of the Lua function to compute the shifted state of the
-        key."""
+        axis.
+
+        The function is preceded by the lookup tables used by it, if any (see
+        ValueRangeDispatcher)."""
+        dispatcher = ValueRangeDispatcher(profile, self._control)
+        body = dispatcher.getStateLuaCode(self._handlerTree)
+
+        lines = dispatcher.tableLines
+        if lines: lines.append("")
+
+        lines.append("%s = 0" % (self._control.luaValueName,))
+        lines.append("")
+
+        lines.append("function %s()" %
+                     (ControlProfile._getShiftedStateLuaFunctionName(self._control)))
+        appendLinesIndented(lines, body)
+        lines.append("end")
+
+        return lines
+
+#------------------------------------------------------------------------------
+#------------------------------------------------------------------------------
+
+class DaemonCodePruner(object):
+    """Selector of the parts of a profile the code sent to the daemon
+    consists of.
+
+    A control profile is needed if it has any actions other than NOP ones.
+    The states of the shift levels, the virtual controls and the values of
+    the physical controls may be referred to by the code of the needed
+    control profiles (including the scripts of their actions), and by the
+    prologue and the epilogue of the profile. These are searched for the
+    names of the Lua variables to find the ones referred to. A shift level
+    is needed if its state is referred to. A virtual control is needed if it
+    has a needed control profile, if its state is referred to, or if a
+    needed shift level or virtual control depends on it. A physical control
+    having a handler in the unpruned code keeps it if it has a needed
+    control profile, if its value is referred to, or if a needed shift
+    level or virtual control depends on it.
+
+    If pruning is turned off, all parts of the profile are needed."""
+    ## The regular expression matching the names in the Lua code
+    _nameExpression = re.compile("[A-Za-z_][A-Za-z0-9_]*")
+
+    def __init__(self, profile, prune = True):
+        """Select the needed parts of the given profile."""
+        Control.setProfile(profile)
+
+        # The needed control profiles in the order of the profile
+        self.controlProfiles = []
+
+        # A mapping of the needed control profiles to the lines of their
+        # prologue code
+        self.controlProfileLines = {}
+
+        # The needed virtual controls in the order of the profile
+        self.virtualControls = []
+
+        # The set of the indexes of the needed shift levels
+        self.shiftLevels = set()
+
+        # The set of the physical controls to be handled
+        self.controls = set()
+
+        handledControls = set()
+
+        textLines = profile.prologue + profile.epilogue
+        for controlProfile in profile.controlProfiles:
+            handledControls.add(controlProfile.control)
+            if prune and not controlProfile.hasActions():
+                continue
+            lines = controlProfile.getPrologueLuaCode(profile)
+            self.controlProfiles.append(controlProfile)
+            self.controlProfileLines[controlProfile] = lines
+            textLines += lines
+
+        names = set(DaemonCodePruner._nameExpression.findall("\n".join(textLines)))
+        profileControls = set([cp.control for cp in self.controlProfiles])
+
+        for index in range(0, profile.numShiftLevels):
+            if not prune or getShiftLevelStateName(index) in names:
+                self.shiftLevels.add(index)
+
+        virtualControls = {}
+        for virtualControl in profile.allVirtualControls:
+            virtualControls[virtualControl.control] = virtualControl
+
+        controls = set()
+        for index in self.shiftLevels:
+            controls |= profile.getShiftLevel(index).getControls()
+        for (control, virtualControl) in virtualControls.items():
+            if not prune or control in profileControls or \
+               control.luaValueName in names or \
+               virtualControl.stateLuaVariableName in names:
+                controls.add(control)
+
+        neededControls = set()
+        while controls:
+            control = controls.pop()
+            if control in neededControls:
+                continue
+            neededControls.add(control)
+            if control in virtualControls:
+                controls |= virtualControls[control].getControls()
+
+        self.virtualControls = [vc for vc in profile.allVirtualControls
+                                if vc.control in neededControls]
+
+        for virtualControl in virtualControls.values():
+            handledControls |= virtualControl.getControls()
+        for index in range(0, profile.numShiftLevels):
+            handledControls |= profile.getShiftLevel(index).getControls()
+
+        for control in handledControls:
+            if control.isVirtual:
+                continue
+            if not prune or control in neededControls or \
+               control in profileControls or control.luaValueName in names:
+                self.controls.add(control)
+
+#------------------------------------------------------------------------------
+
+class DaemonCodeReport(object):
+    """A report of the savings achieved by pruning the code sent to the
+    daemon (see DaemonCodePruner)."""
+    @staticmethod
+    def _getPrologueText(document):
+        """Get the text of the prologue of the given daemon XML document."""
+        prologue = document.getElementsByTagName("prologue")[0]
+        return prologue.firstChild.data if prologue.firstChild else ""
+
+    @staticmethod
+    def _getNumHandlers(document):
+        """Get the number of control handlers in the given daemon XML
+        document."""
+        return len(document.getElementsByTagName("key")) + \
+            len(document.getElementsByTagName("axis"))
+
+    def __init__(self, profile):
+        """Construct the report for the given profile by generating the
+        daemon code both with and without pruning."""
+        fullDocument = profile.getDaemonXMLDocument(prune = False)
+        prunedDocument = profile.getDaemonXMLDocument()
+
+        fullPrologue = DaemonCodeReport._getPrologueText(fullDocument)
+        prunedPrologue = DaemonCodeReport._getPrologueText(prunedDocument)
+
+        # The number of lines of the prologue without and with pruning
+        self.prologueLines = (len(fullPrologue.splitlines()),
+                              len(prunedPrologue.splitlines()))
+
+        # The size of the prologue in characters without and with pruning
+        self.prologueSize = (len(fullPrologue), len(prunedPrologue))
+
+        # The number of control handlers without and with pruning
+        self.numHandlers = (DaemonCodeReport._getNumHandlers(fullDocument),
+                            DaemonCodeReport._getNumHandlers(prunedDocument))
+
+        full = DaemonCodePruner(profile, prune = False)
+        pruned = DaemonCodePruner(profile)
+
+        # The names of the controls whose profiles were removed
+        self.removedControlProfiles = \
+            [cp.control.name for cp in full.controlProfiles
+             if cp not in pruned.controlProfileLines]
+
+        # The names of the virtual controls removed
+        self.removedVirtualControls = \
+            [vc.name for vc in full.virtualControls
+             if vc not in pruned.virtualControls]
+
+        # The indexes of the shift levels whose states are not computed
+        self.removedShiftLevels = sorted(full.shiftLevels - pruned.shiftLevels)
+
+        # The names of the physical controls whose handlers were removed
+        self.removedControls = sorted([c.name for c in
+                                       full.controls - pruned.controls])
+
+    def __str__(self):
+        """Get the text of the report."""
+        (fullSize, prunedSize) = self.prologueSize
         lines = []
+        lines.append("Prologue: %d -> %d lines, %d -> %d characters (%.1f%% removed)" %
+                     (self.prologueLines + self.prologueSize +
+                      (0.0 if fullSize==0 else
+                       (fullSize - prunedSize) * 100.0 / fullSize,)))
+        lines.append("Handlers: %d -> %d" % self.numHandlers)
+        for (title, names) in \
+            [("Removed control profiles",  self.removedControlProfiles),
+             ("Removed virtual controls", self.removedVirtualControls),
+             ("Removed shift levels",
+              [str(index) for index in self.removedShiftLevels]),
+             ("Removed handlers", self.removedControls)]:
+            if names:
+                lines.append("%s: %s" % (title, ", ".join(names)))
+        return "\n".join(lines)
 
-        (numStates, lines) = \
-            self._getShiftedStateLuaCodeFor(self._handlerTree, profile,
-                                            0, lines, [""])
+#------------------------------------------------------------------------------
+#------------------------------------------------------------------------------
+
+class DaemonCode(object):
+    """The code of a profile to be sent to the daemon broken up into its
+    parts.
+
+    The prologue consists of the following parts in this order:
+    - the runtime code (the updaters and the scheduler),
+    - the initialization of the values of the controls that are referred
+      to without having a control profile,
+    - the code of the states of the virtual controls and the shift levels,
+    - the sections of the control profiles,
+    - the user-defined prologue.
+
+    Besides the prologue, there is a handler for each physical control that
+    has to be handled, and the user-defined epilogue.
+
+    The parts are kept separately, so that the code can be compared to the
+    code of another version of the profile, and if only the control
+    profiles have changed, a partial update can be produced (see
+    getUpdateXMLDocument())."""
+    ## The regular expression matching the beginning of the definitions of
+    ## the functions instrumented by instrument()
+    _instrumentedFunctionExpression = \
+        re.compile("^function (_jsprog_([A-Za-z0-9_]+_(update|updateState|enter[0-9]+|leave[0-9]+)))\\(")
+
+    def __init__(self):
+        """Construct an empty daemon code object."""
+        # The lines of the runtime code
+        self.runtimeLines = []
+
+        # The names of the Lua variables of the values of the controls
+        # initialized in the prologue
+        self.valueNames = []
+
+        # The lines of the code of the virtual controls and the shift levels
+        self.stateLines = []
+
+        # The controls having a section in the prologue in the order of
+        # the sections
+        self.sectionControls = []
+
+        # A mapping of the controls to the lines of their sections
+        self.sections = {}
+
+        # The lines of the user-defined prologue
+        self.prologueLines = []
+
+        # The controls having handlers in the order of the handlers
+        self.handlerControls = []
+
+        # A mapping of the controls to the lines of their handlers
+        self.handlers = {}
+
+        # The lines of the user-defined epilogue
+        self.epilogueLines = []
+
+    def instrument(self):
+        """Instrument the code with counters of the invocations and the time
+        spent in the update, enter and leave functions and in the handlers
+        of the controls.
+
+        The counters are kept in the global table _jsprog_stats, which maps
+        the names of the functions and handlers (e.g. BTN_TRIGGER_update or
+        "BTN_TRIGGER handler") to arrays of the number of invocations and
+        the cumulative time in microseconds measured by jsprog_micros(). The
+        time of a function includes the time of the functions it calls. The
+        daemon returns the counters via its getProfileStats() call.
+
+        The functions are replaced by wrappers right after their definition,
+        so the tables of the enter and leave functions refer to the
+        wrappers. The body of a handler is enclosed between reading the
+        clock and recording the time."""
+        lines = self.runtimeLines
+        lines.append("_jsprog_stats = {}")
+        lines.append("")
+        lines.append("function _jsprog_stats_get(name)")
+        lines.append("  local entry = _jsprog_stats[name]")
+        lines.append("  if entry == nil then")
+        lines.append("    entry = { 0, 0 }")
+        lines.append("    _jsprog_stats[name] = entry")
+        lines.append("  end")
+        lines.append("  return entry")
+        lines.append("end")
+        lines.append("")
+        lines.append("function _jsprog_stats_record(name, start)")
+        lines.append("  local entry = _jsprog_stats_get(name)")
+        lines.append("  entry[1] = entry[1] + 1")
+        lines.append("  entry[2] = entry[2] + (jsprog_micros() - start)")
+        lines.append("end")
+        lines.append("")
+        lines.append("function _jsprog_stats_wrap(name, fn)")
+        lines.append("  local entry = _jsprog_stats_get(name)")
+        lines.append("  return function(...)")
+        lines.append("    local start = jsprog_micros()")
+        lines.append("    local result = fn(...)")
+        lines.append("    entry[1] = entry[1] + 1")
+        lines.append("    entry[2] = entry[2] + (jsprog_micros() - start)")
+        lines.append("    return result")
+        lines.append("  end")
+        lines.append("end")
+        lines.append("")
+
+        self.stateLines = DaemonCode._getInstrumentedLines(self.stateLines)
+        for control in self.sectionControls:
+            self.sections[control] = \
+                DaemonCode._getInstrumentedLines(self.sections[control])
+
+        for control in self.handlerControls:
+            lines = ["local _jsprog_stats_start = jsprog_micros()", "do"]
+            appendLinesIndented(lines, self.handlers[control], "  ")
+            lines.append("end")
+            lines.append("_jsprog_stats_record(\"%s handler\", _jsprog_stats_start)" %
+                         (control.name,))
+            self.handlers[control] = lines
+
+    def addControlLines(self, control, lines):
+        """Add the section of the prologue for the given control."""
+        self.sectionControls.append(control)
+        self.sections[control] = lines
+
+    def addHandler(self, control, lines):
+        """Add the handler of the given physical control."""
+        self.handlerControls.append(control)
+        self.handlers[control] = lines
+
+    def getPrologueLines(self):
+        """Get the lines of the complete prologue."""
+        lines = self.runtimeLines[:]
+
+        for valueName in self.valueNames:
+            lines.append("%s = 0" % (valueName,))
+        lines.append("")
+
+        lines += self.stateLines
+
+        for control in self.sectionControls:
+            lines += self.sections[control]
+            lines.append("")
+
+        lines += self.prologueLines
+
+        if not lines[-1]: lines = lines[:-1]
+
+        return lines
+
+    def getXMLDocument(self):
+        """Get the XML document containing the complete code, which can be
+        loaded by the daemon as a profile."""
+        document = getDOMImplementation().createDocument(None,
+                                                         "jsprogProfile",
+                                                         None)
+        topElement = document.documentElement
+
+        topElement.appendChild(
+            DaemonCode._getCodeXML(document, "prologue",
+                                   self.getPrologueLines()))
+
+        for control in self.handlerControls:
+            topElement.appendChild(
+                DaemonCode._getHandlerXML(document, control,
+                                          self.handlers[control]))
+
+        topElement.appendChild(
+            DaemonCode._getCodeXML(document, "epilogue", self.epilogueLines))
+
+        return document
+
+    def canUpdate(self, previous):
+        """Determine if the code of the given previous version of the
+        profile can be updated to this code by a partial update.
+
+        It is possible only if the parts other than the sections of the
+        control profiles, the handlers and the initialized values are the
+        same."""
+        return previous is not None and \
+            self.runtimeLines==previous.runtimeLines and \
+            self.stateLines==previous.stateLines and \
+            self.prologueLines==previous.prologueLines and \
+            self.epilogueLines==previous.epilogueLines
+
+    def getUpdateXMLDocument(self, previous):
+        """Get the XML document to update the code of the given previous
+        version of the profile loaded into the daemon to this code.
+
+        The document contains only the sections of the control profiles and
+        the handlers that have changed. The runtime state of the unchanged
+        controls is preserved. A control whose section has changed leaves
+        its current shifted state, i.e. the keys pressed by it are released
+        and its repeats are stopped, but its value is kept. It enters its new
+        shifted state when its value or a shift level changes next time.
+
+        Returns None, if no partial update is possible (see canUpdate())."""
+        if not self.canUpdate(previous):
+            return None
+
+        changedControls = \
+            [control for control in self.sectionControls
+             if self.sections[control]!=previous.sections.get(control)]
+        removedControls = [control for control in previous.sectionControls
+                           if control not in self.sections]
+
+        lines = []
+        if changedControls or removedControls:
+            lines.append("local values = {}")
+            for (index, control) in enumerate(changedControls):
+                lines.append("values[%d] = %s" %
+                             (index + 1, control.luaValueName))
+            lines.append("")
+
+            for control in changedControls + removedControls:
+                if control in previous.sections:
+                    lines += DaemonCode._getLeaveLuaCode(control)
+                    lines.append("")
+
+        previousValueNames = set(previous.valueNames)
+        for valueName in self.valueNames:
+            if valueName not in previousValueNames:
+                lines.append("%s = %s or 0" % (valueName, valueName))
+        if lines and lines[-1]: lines.append("")
+
+        for control in changedControls:
+            lines += self.sections[control]
+            lines.append("")
+
+        for (index, control) in enumerate(changedControls):
+            lines.append("if values[%d] ~= nil then %s = values[%d] end" %
+                         (index + 1, control.luaValueName, index + 1))
 
+        if lines and not lines[-1]: lines = lines[:-1]
+
+        document = getDOMImplementation().createDocument(None,
+                                                         "jsprogProfile",
+                                                         None)
+        topElement = document.documentElement
+
+        topElement.appendChild(DaemonCode._getCodeXML(document, "prologue",
+                                                      lines))
+
+        for control in self.handlerControls:
+            handlerLines = self.handlers[control]
+            if handlerLines!=previous.handlers.get(control):
+                topElement.appendChild(
+                    DaemonCode._getHandlerXML(document, control, handlerLines))
+
+        for control in previous.handlerControls:
+            if control not in self.handlers:
+                element = document.createElement("key" if control.isKey
+                                                 else "axis")
+                element.setAttribute("name", control.name)
+                element.setAttribute("remove", "yes")
+                topElement.appendChild(element)
+
+        return document
+
+    @staticmethod
+    def _getInstrumentedLines(lines):
+        """Get a copy of the given lines with the functions to be
+        instrumented replaced by their wrappers (see instrument())."""
+        instrumentedLines = []
+        wrapperLine = None
+        for line in lines:
+            instrumentedLines.append(line)
+            match = DaemonCode._instrumentedFunctionExpression.match(line)
+            if match is not None:
+                wrapperLine = "%s = _jsprog_stats_wrap(\"%s\", %s)" % \
+                    (match.group(1), match.group(2), match.group(1))
+            elif line=="end" and wrapperLine is not None:
+                instrumentedLines.append(wrapperLine)
+                wrapperLine = None
+        return instrumentedLines
+
+    @staticmethod
+    def _getLeaveLuaCode(control):
+        """Get the Lua code to make the given control leave its current
+        shifted state and to remove its update function from the
+        updaters."""
+        stateName = ControlProfile._getLuaShiftedStateName(control)
+        (_, leaveFunctionsName) = \
+            ControlProfile._getLeaveLuaFunctionName(control, 0)
+
+        lines = []
+        lines.append("if %s > 0 then" % (stateName,))
+        lines.append("  local fn = %s[%s]" % (leaveFunctionsName, stateName))
+        lines.append("  if fn then fn() end")
+        lines.append("  %s = 0" % (stateName,))
+        lines.append("end")
+        lines.append("_jsprog_updaters_remove(%s)" %
+                     (ControlProfile.getUpdateLuaFunctionName(control),))
         return lines
 
+    @staticmethod
+    def _getCodeXML(document, name, lines):
+        """Get the XML element with the given name containing the given
+        lines of code, if any."""
+        element = document.createElement(name)
+        if lines:
+            text = "\n" + linesToText(lines, indentation = "    ")
+            element.appendChild(document.createTextNode(text))
+        return element
+
+    @staticmethod
+    def _getHandlerXML(document, control, lines):
+        """Get the XML element of the handler of the given control with the
+        given lines of code."""
+        element = document.createElement("key" if control.isKey else "axis")
+        element.setAttribute("name", control.name)
+        element.appendChild(document.createTextNode(
+            "\n" + linesToText(lines, indentation = "    ")))
+        return element
+
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
 
@@ -2144,10 +2917,54 @@ class Profile(object):
     joystick type have negative integers as codes, while those of a profile
     have positive integers. Since codes are used only internally, a new code is
     generated for a virtual control whenever one is created. """
+    ## Value range dispatch: selected automatically according to the number
+    ## and the extent of the value ranges
+    VALUE_RANGE_DISPATCH_AUTO = 0
+
+    ## Value range dispatch: the value ranges are checked one after the other
+    VALUE_RANGE_DISPATCH_LINEAR = 1
+
+    ## Value range dispatch: binary search over the boundaries of the ranges
+    VALUE_RANGE_DISPATCH_BINARY = 2
+
+    ## Value range dispatch: lookup table indexed by the value, if the ranges
+    ## span a small enough interval, binary search otherwise
+    VALUE_RANGE_DISPATCH_TABLE = 3
+
+    ## The length of a slot of the scheduler's timer wheel in milliseconds
+    schedulerSlotLength = 8
+
+    ## The number of slots of the scheduler's timer wheel
+    schedulerNumSlots = 64
+
+    ## The mapping of value range dispatch modes to strings
+    _valueRangeDispatchNames = {
+        VALUE_RANGE_DISPATCH_AUTO : "auto",
+        VALUE_RANGE_DISPATCH_LINEAR : "linear",
+        VALUE_RANGE_DISPATCH_BINARY : "binary",
+        VALUE_RANGE_DISPATCH_TABLE : "table"
+        }
+
+    @staticmethod
+    def getValueRangeDispatchNameFor(dispatch):
+        """Get the name of the given value range dispatch mode."""
+        return Profile._valueRangeDispatchNames[dispatch]
+
+    @staticmethod
+    def findValueRangeDispatchFor(name):
+        """Get the value range dispatch mode for the given name."""
+        for (dispatch, dispatchName) in Profile._valueRangeDispatchNames.items():
+            if dispatchName==name:
+                return dispatch
+        return None
+
     @staticmethod
-    def loadFrom(joystickType, directory):
+    def loadFrom(joystickType, directory, cache = None):
         """Load the profiles in the given directory for the given joystick type.
 
+        If a profile cache (jsprog.profilecache.ProfileCache) is given, the
+        profiles are loaded from it, if possible.
+
         Returns an iterator over the loaded profiles."""
         parser = make_parser()
 
@@ -2158,14 +2975,47 @@ class Profile(object):
             path = os.path.join(directory, entry)
             if entry.endswith(".profile") and os.path.isfile(path):
                 try:
-                    parser.parse(path)
-                    profile = handler.profile
+                    profile = Profile._loadFile(joystickType, parser, handler,
+                                                path, cache)
                     profile.fileName = entry[:-8]
 
                     yield profile
                 except Exception as e:
                     print(e, file=sys.stderr)
 
+    @staticmethod
+    def loadFromFile(joystickType, path, cache = None):
+        """Load the profile in the file with the given path for the given
+        joystick type.
+
+        If a profile cache (jsprog.profilecache.ProfileCache) is given, the
+        profile is loaded from it, if possible.
+
+        Returns the profile or None, if the file could not be loaded."""
+        parser = make_parser()
+
+        handler = ProfileHandler(joystickType)
+        parser.setContentHandler(handler)
+
+        try:
+            profile = Profile._loadFile(joystickType, parser, handler,
+                                        path, cache)
+            profile.fileName = os.path.basename(path)[:-8]
+
+            return profile
+        except Exception as e:
+            print(e, file=sys.stderr)
+
+    @staticmethod
+    def _loadFile(joystickType, parser, handler, path, cache):
+        """Load the profile in the file with the given path using the given
+        parser and handler, and the given cache, if not None."""
+        if cache is None:
+            parser.parse(path)
+            return handler.profile
+        else:
+            return cache.parse(joystickType, parser, handler, path)
+
     @staticmethod
     def getTextXML(document, name, text):
         """Create a tag with the given name containing the given
@@ -2214,16 +3064,20 @@ class Profile(object):
     @staticmethod
     def getShiftLevelStateLuaFunctionName(levelIndex):
         """Get the name of the function to update the state of the shift level
-        with the given index."""
+        with the given index.
+
+        The function returns whether the state has changed."""
         return "_jsprog_shiftLevel%d_update" % (levelIndex,)
 
-    def __init__(self, joystickType, name, identity, autoLoad = False):
+    def __init__(self, joystickType, name, identity, autoLoad = False,
+                 valueRangeDispatch = VALUE_RANGE_DISPATCH_AUTO):
         """Construct an empty profile for the joystick with the given
         identity."""
         self.joystickType = joystickType
         self.name = name
         self.identity = identity
         self.autoLoad = autoLoad
+        self.valueRangeDispatch = valueRangeDispatch
         self.directoryType = None
         self.fileName = None
 
@@ -2276,6 +3130,11 @@ class Profile(object):
         for vc in self._virtualControls:
             yield vc
 
+    @property
+    def controlProfiles(self):
+        """Get an iterator over the control profiles."""
+        return iter(self._controlProfiles)
+
     @property
     def prologue(self):
         """Get the prologue code lines."""
@@ -2300,6 +3159,32 @@ class Profile(object):
         """Clone this profile by making a deep copy of itself."""
         return copy.deepcopy(self)
 
+    def updateFrom(self, other):
+        """Update this profile to be the same as the given other one, which
+        has been loaded from the same file.
+
+        The contents of the other profile are taken over, but the file name
+        and the directory type are kept."""
+        self.name = other.name
+        self.identity = other.identity
+        self.autoLoad = other.autoLoad
+        self.valueRangeDispatch = other.valueRangeDispatch
+
+        self._virtualControls = other._virtualControls
+        for virtualControl in self._virtualControls:
+            virtualControl._owner = self
+        self._nextVirtualControlCode = other._nextVirtualControlCode
+
+        self._shiftLevels = other._shiftLevels
+
+        self._controlProfiles = other._controlProfiles
+        self._controlProfileMap = other._controlProfileMap
+        for controlProfile in self._controlProfiles:
+            controlProfile._profile = self
+
+        self._prologue = other._prologue
+        self._epilogue = other._epilogue
+
     def match(self, identity):
         """Get the match level for the given joystick identity."""
         return self.identity.match(identity)
@@ -2617,6 +3502,9 @@ class Profile(object):
         topElement.setAttribute("name", self.name)
         topElement.setAttribute("autoLoad",
                                 "yes" if self.autoLoad else "no")
+        if self.valueRangeDispatch!=Profile.VALUE_RANGE_DISPATCH_AUTO:
+            topElement.setAttribute("valueRangeDispatch",
+                                    Profile.getValueRangeDispatchNameFor(self.valueRangeDispatch))
 
         identityElement = Profile.getIdentityXML(document, self.identity)
         topElement.appendChild(identityElement)
@@ -2660,70 +3548,76 @@ class Profile(object):
 
         return document
 
-    def getDaemonXMLDocument(self):
-        """Get the XML document to be downloaded to the daemon."""
+    def getDaemonXMLDocument(self, prune = True, profiling = False):
+        """Get the XML document to be downloaded to the daemon.
+
+        If prune is True, the parts of the profile not affecting the
+        operation of the joystick are left out of the code (see
+        DaemonCodePruner). If profiling is True, the code is instrumented
+        with counters of the invocations and the time spent in the
+        functions and the handlers (see DaemonCode.instrument())."""
+        return self.getDaemonCode(prune = prune,
+                                  profiling = profiling).getXMLDocument()
+
+    def getDaemonCode(self, prune = True, profiling = False):
+        """Get the code to be downloaded to the daemon broken up into its
+        parts (see DaemonCode).
+
+        If prune is True, the parts of the profile not affecting the
+        operation of the joystick are left out of the code (see
+        DaemonCodePruner). If profiling is True, the code is instrumented
+        with counters of the invocations and the time spent in the
+        functions and the handlers (see DaemonCode.instrument())."""
         Control.setProfile(self)
 
-        document = getDOMImplementation().createDocument(None,
-                                                         "jsprogProfile",
-                                                         None)
-        topElement = document.documentElement
+        pruner = DaemonCodePruner(self, prune = prune)
+
+        daemonCode = DaemonCode()
 
-        (prologueElement,
-         virtualControlControls, virtualControls,
-         shiftLevelControls, shiftControls) = self._getPrologueXML(document)
-        topElement.appendChild(prologueElement)
+        (virtualControlControls, virtualControls,
+         shiftLevelControls, shiftControls) = \
+            self._getPrologueLuaCode(daemonCode, pruner)
 
-        for control in (shiftControls | virtualControls):
+        orderedVirtualControls = \
+            self._getVirtualControlsInDependencyOrder(pruner.virtualControls)
+        profileControls = set([cp.control for cp in pruner.controlProfiles])
+
+        # The controls only referred to by some code need a handler to
+        # maintain their values
+        for control in (shiftControls | virtualControls |
+                        (pruner.controls - profileControls)):
             if control.isVirtual:
                 continue
 
-            element = document.createElement("key" if control.isKey else "axis")
-            element.setAttribute("name", control.name)
-
             lines = []
             lines.append("%s = value" % (control.luaValueName,))
-            isShiftControl = False
-            if control in virtualControlControls:
-                for virtualControl in virtualControlControls[control]:
-                    lines.append("%s()" % (virtualControl.stateLuaFunctionName,))
-
-            for (controls, levelIndex) in zip(shiftLevelControls,
-                                              list(range(0, len(shiftLevelControls)))):
-                if self._isControlIncludedIn(control, controls):
-                    lines.append("%s()" %
-                                 (Profile.getShiftLevelStateLuaFunctionName(levelIndex),))
-                    isShiftControl = True
-
-            if not isShiftControl and control in virtualControlControls:
-                for virtualControl in virtualControlControls[control]:
-                    if virtualControl.control in self._controlProfileMap:
-                        updateName = \
-                          ControlProfile.getUpdateLuaFunctionName(virtualControl.control)
-                        if not isShiftControl:
-                            lines.append("%s()" % (updateName,))
-
-            if isShiftControl:
-                lines.append("_jsprog_updaters_call()")
-
-            luaText = "\n" + linesToText(lines, indentation = "    ")
-
-            element.appendChild(document.createTextNode(luaText))
-            topElement.appendChild(element)
+            lines += self._getPropagationLuaCode(control, orderedVirtualControls,
+                                                 shiftLevelControls,
+                                                 profileControls)
 
-        for controlProfile in self._controlProfiles:
-            daemonXML = controlProfile.getDaemonXML(document, self)
-            if daemonXML is not None:
-                topElement.appendChild(daemonXML)
+            daemonCode.addHandler(control, lines)
 
-        epilogueElement = document.createElement("epilogue")
-        if self._epilogue:
-            text = "\n" + linesToText(self._epilogue, indentation = "    ")
-            epilogue = document.createTextNode(text)
-            epilogueElement.appendChild(epilogue)
-        topElement.appendChild(epilogueElement)
+        for controlProfile in pruner.controlProfiles:
+            # The handler of the control is generated above and it updates
+            # the control profile as well
+            if controlProfile.control in (shiftControls | virtualControls):
+                continue
+            if controlProfile.control.isVirtual:
+                continue
+            daemonCode.addHandler(controlProfile.control,
+                                  controlProfile.getLuaCode(self))
 
-        return document
+        daemonCode.epilogueLines = self._epilogue[:]
+
+        if profiling:
+            daemonCode.instrument()
+
+        return daemonCode
+
+    def getDaemonCodeReport(self):
+        """Get the report of the savings achieved by pruning the code sent
+        to the daemon (see DaemonCodeReport)."""
+        return DaemonCodeReport(self)
 
     def hasHardVirtualControlReference(self, control):
         """Determine if this profile has a hard reference to a certain
@@ -2791,33 +3685,196 @@ class Profile(object):
             if vc.name==name:
                 return vc
 
-    def _getPrologueXML(self, document):
-        """Get the XML code for the prologue."""
+    def _getSchedulerLuaCode(self):
+        """Get the Lua code of the scheduler repeating the actions.
+
+        The repeated actions of all controls are executed by a single
+        thread, which is started when the first action is registered and
+        exits when there are no more actions. The actions are registered
+        with a key identifying the control, the repeat delay and a function
+        to call, and they are kept in a timer wheel, i.e. in an array of
+        sets each containing the actions falling into a certain interval
+        modulo the length of the wheel. Thus registration and removal take
+        constant time, and the next action to run is found by checking the
+        sets from the current one.
+
+        The thread sleeps until the time of the next action in a cancellable
+        delay, which is cancelled if an action due earlier is registered.
+        The length of a delay is computed from the time the previous delay
+        ended, so that the repeats do not drift. After an elapsed delay the
+        actions are checked at the logical time of the wakeup at least, as
+        the thread may be resumed slightly earlier than that.
+
+        The actions are called in protected mode. An action raising an error
+        is reported and removed, so that it neither stops the repeating of
+        the other actions nor leaves the scheduler without a thread.
+
+        Returns an array of lines."""
+        slotLength = Profile.schedulerSlotLength
+        numSlots = Profile.schedulerNumSlots
 
         lines = []
+        lines.append("_jsprog_scheduler_slots = {}")
+        lines.append("for i = 1, %d do" % (numSlots,))
+        lines.append("  _jsprog_scheduler_slots[i] = {}")
+        lines.append("end")
+        lines.append("_jsprog_scheduler_entries = {}")
+        lines.append("_jsprog_scheduler_count = 0")
+        lines.append("_jsprog_scheduler_thread = nil")
+        lines.append("_jsprog_scheduler_wakeup = nil")
+        lines.append("")
+        lines.append("function _jsprog_scheduler_insert(entry)")
+        lines.append("  local slot = _jsprog_scheduler_slots[math.floor(entry.due / %d) %% %d + 1]" %
+                     (slotLength, numSlots))
+        lines.append("  slot[entry] = true")
+        lines.append("  entry.slot = slot")
+        lines.append("end")
+        lines.append("")
+        lines.append("function _jsprog_scheduler_remove(key)")
+        lines.append("  local entry = _jsprog_scheduler_entries[key]")
+        lines.append("  if entry ~= nil then")
+        lines.append("    entry.slot[entry] = nil")
+        lines.append("    _jsprog_scheduler_entries[key] = nil")
+        lines.append("    _jsprog_scheduler_count = _jsprog_scheduler_count - 1")
+        lines.append("  end")
+        lines.append("end")
+        lines.append("")
+        lines.append("function _jsprog_scheduler_add(key, period, fn)")
+        lines.append("  _jsprog_scheduler_remove(key)")
+        lines.append("  local entry = { key = key, fn = fn, period = period, due = jsprog_millis() + period }")
+        lines.append("  _jsprog_scheduler_insert(entry)")
+        lines.append("  _jsprog_scheduler_entries[key] = entry")
+        lines.append("  _jsprog_scheduler_count = _jsprog_scheduler_count + 1")
+        lines.append("  if _jsprog_scheduler_thread == nil then")
+        lines.append("    _jsprog_scheduler_thread = jsprog_startthread(_jsprog_scheduler_run)")
+        lines.append("  elseif _jsprog_scheduler_wakeup ~= nil and entry.due < _jsprog_scheduler_wakeup then")
+        lines.append("    jsprog_canceldelay(_jsprog_scheduler_thread)")
+        lines.append("  end")
+        lines.append("end")
+        lines.append("")
+        lines.append("function _jsprog_scheduler_run()")
+        lines.append("  local slots = _jsprog_scheduler_slots")
+        lines.append("  local due = {}")
+        lines.append("  local base = jsprog_millis()")
+        lines.append("  local cursor = math.floor(base / %d)" % (slotLength,))
+        lines.append("  while _jsprog_scheduler_count > 0 do")
+        lines.append("    local now = math.max(jsprog_millis(), base)")
+        lines.append("    local last = math.floor(now / %d)" % (slotLength,))
+        lines.append("    if last - cursor >= %d then" % (numSlots,))
+        lines.append("      cursor = last - %d" % (numSlots - 1,))
+        lines.append("    end")
+        lines.append("")
+        lines.append("    local numDue = 0")
+        lines.append("    for tick = cursor, last do")
+        lines.append("      for entry in pairs(slots[tick %% %d + 1]) do" %
+                     (numSlots,))
+        lines.append("        if entry.due <= now then")
+        lines.append("          numDue = numDue + 1")
+        lines.append("          due[numDue] = entry")
+        lines.append("        end")
+        lines.append("      end")
+        lines.append("    end")
+        lines.append("    cursor = last")
+        lines.append("")
+        lines.append("    for i = 1, numDue do")
+        lines.append("      local entry = due[i]")
+        lines.append("      due[i] = nil")
+        lines.append("      if entry.slot[entry] then")
+        lines.append("        entry.slot[entry] = nil")
+        lines.append("        entry.due = entry.due + entry.period")
+        lines.append("        if entry.due <= now then")
+        lines.append("          entry.due = now + entry.period")
+        lines.append("        end")
+        lines.append("        _jsprog_scheduler_insert(entry)")
+        lines.append("        local ok, message = pcall(entry.fn)")
+        lines.append("        if not ok then")
+        lines.append("          io.stderr:write(\"jsprog: repeated action failed: \" .. tostring(message) .. \"\\n\")")
+        lines.append("          if _jsprog_scheduler_entries[entry.key] == entry then")
+        lines.append("            _jsprog_scheduler_remove(entry.key)")
+        lines.append("          end")
+        lines.append("        end")
+        lines.append("      end")
+        lines.append("    end")
+        lines.append("")
+        lines.append("    if _jsprog_scheduler_count > 0 then")
+        lines.append("      local wakeup = nil")
+        lines.append("      for tick = cursor, cursor + %d do" % (numSlots - 1,))
+        lines.append("        for entry in pairs(slots[tick %% %d + 1]) do" %
+                     (numSlots,))
+        lines.append("          if math.floor(entry.due / %d) == tick and" %
+                     (slotLength,))
+        lines.append("             (wakeup == nil or entry.due < wakeup) then")
+        lines.append("            wakeup = entry.due")
+        lines.append("          end")
+        lines.append("        end")
+        lines.append("        if wakeup ~= nil then break end")
+        lines.append("      end")
+        lines.append("      if wakeup == nil then")
+        lines.append("        wakeup = (cursor + %d) * %d" % (numSlots, slotLength))
+        lines.append("      end")
+        lines.append("")
+        lines.append("      _jsprog_scheduler_wakeup = wakeup")
+        lines.append("      local elapsed = jsprog_delay(wakeup - base, true)")
+        lines.append("      _jsprog_scheduler_wakeup = nil")
+        lines.append("      base = elapsed and wakeup or jsprog_millis()")
+        lines.append("    end")
+        lines.append("  end")
+        lines.append("  _jsprog_scheduler_thread = nil")
+        lines.append("end")
+        lines.append("")
+
+        return lines
+
+    def _getPrologueLuaCode(self, daemonCode, pruner):
+        """Generate the Lua code of the prologue into the given daemon code
+        object.
+
+        Only the parts selected by the given pruner are included."""
+
+        lines = daemonCode.runtimeLines
         lines.append("require(\"table\")")
         lines.append("")
+        # The updaters are the update functions of the shift-active
+        # controls not in their neutral state. They are kept in an array
+        # with the number of them and a mapping of the functions to their
+        # indexes, so that they can be added and removed in constant time.
+        # The last updater is moved into the place of a removed one, and
+        # the updaters are called from the last one, so that an updater can
+        # remove itself while they are being called.
         lines.append("_jsprog_updaters = {}")
+        lines.append("_jsprog_updaters_slots = {}")
+        lines.append("_jsprog_updaters_count = 0")
         lines.append("")
         lines.append("function _jsprog_updaters_add(fn)")
-        lines.append("  table.insert(_jsprog_updaters, fn)")
+        lines.append("  if _jsprog_updaters_slots[fn] == nil then")
+        lines.append("    local count = _jsprog_updaters_count + 1")
+        lines.append("    _jsprog_updaters[count] = fn")
+        lines.append("    _jsprog_updaters_slots[fn] = count")
+        lines.append("    _jsprog_updaters_count = count")
+        lines.append("  end")
         lines.append("end")
         lines.append("")
         lines.append("function _jsprog_updaters_remove(fn)")
-        lines.append("  for i, updater in ipairs(_jsprog_updaters) do")
-        lines.append("    if fn == updater then")
-        lines.append("      table.remove(_jsprog_updaters, i)")
-        lines.append("      break")
-        lines.append("    end")
+        lines.append("  local slot = _jsprog_updaters_slots[fn]")
+        lines.append("  if slot ~= nil then")
+        lines.append("    local count = _jsprog_updaters_count")
+        lines.append("    local last = _jsprog_updaters[count]")
+        lines.append("    _jsprog_updaters[slot] = last")
+        lines.append("    _jsprog_updaters_slots[last] = slot")
+        lines.append("    _jsprog_updaters[count] = nil")
+        lines.append("    _jsprog_updaters_slots[fn] = nil")
+        lines.append("    _jsprog_updaters_count = count - 1")
         lines.append("  end")
         lines.append("end")
         lines.append("")
         lines.append("function _jsprog_updaters_call()")
-        lines.append("  for i, updater in ipairs(_jsprog_updaters) do")
-        lines.append("    updater()")
+        lines.append("  for i = _jsprog_updaters_count, 1, -1 do")
+        lines.append("    local updater = _jsprog_updaters[i]")
+        lines.append("    if updater then updater() end")
         lines.append("  end")
         lines.append("end")
         lines.append("")
+        lines += self._getSchedulerLuaCode()
 
         virtualControlControls = {}
         virtualControls = set()
@@ -2825,7 +3882,7 @@ class Profile(object):
         shiftLevelControls = []
         shiftControls = set()
 
-        for virtualControl in self.allVirtualControls:
+        for virtualControl in pruner.virtualControls:
             controls = virtualControl.getControls()
             for control in controls:
                 if control in virtualControlControls:
@@ -2835,72 +3892,203 @@ class Profile(object):
 
             virtualControls |= controls
 
-        for shiftLevel in self._shiftLevels:
-            controls = shiftLevel.getControls()
+        for (index, shiftLevel) in enumerate(self._shiftLevels):
+            controls = shiftLevel.getControls() \
+                if index in pruner.shiftLevels else set()
             shiftLevelControls.append(controls)
             shiftControls |= controls
 
-        allControls = virtualControls | shiftControls
+        allControls = virtualControls | shiftControls | \
+            (pruner.controls -
+             set([cp.control for cp in pruner.controlProfiles]))
 
-        for control in allControls:
-            lines.append("%s = 0" % (control.luaValueName,))
-        lines.append("")
+        daemonCode.valueNames += [control.luaValueName
+                                  for control in allControls]
 
-        for virtualControl in self.allVirtualControls:
+        lines = daemonCode.stateLines
+        for virtualControl in pruner.virtualControls:
             stateVariableName = virtualControl.stateLuaVariableName
 
             lines.append("%s = 0" % (stateVariableName,))
             lines.append("")
+            tableLines = virtualControl.getStateLuaTableCode(self)
+            if tableLines:
+                lines += tableLines
+                lines.append("")
             lines.append("function %s()" %
                          (virtualControl.stateLuaFunctionName,))
+            lines.append("  local oldState = %s" % (stateVariableName,))
             appendLinesIndented(lines, virtualControl.getStateLuaCode(self),
                                 "  ")
+            lines.append("  return %s ~= oldState" % (stateVariableName,))
             lines.append("end")
             lines.append("")
 
         for (shiftLevel, index) in zip(self._shiftLevels,
                                        list(range(0, len(self._shiftLevels)))):
+            if index not in pruner.shiftLevels:
+                continue
             lines.append("%s = 0" % (getShiftLevelStateName(index),))
             lines.append("")
+            tableLines = shiftLevel.getStateLuaTableCode(self, index)
+            if tableLines:
+                lines += tableLines
+                lines.append("")
             lines.append("function %s()" %
                          (Profile.getShiftLevelStateLuaFunctionName(index),))
+            lines.append("  local oldState = %s" %
+                         (getShiftLevelStateName(index),))
             appendLinesIndented(lines, shiftLevel.getStateLuaCode(self, index),
                                 "  ")
+            lines.append("  return %s ~= oldState" %
+                         (getShiftLevelStateName(index),))
             lines.append("end")
             lines.append("")
 
-        for controlProfile in self._controlProfiles:
-            controlLines = controlProfile.getPrologueLuaCode(self)
+        for controlProfile in pruner.controlProfiles:
+            controlLines = pruner.controlProfileLines[controlProfile]
             if controlLines:
-                lines += controlLines
-                lines.append("")
+                daemonCode.addControlLines(controlProfile.control,
+                                           controlLines)
 
-        lines += self._prologue
+        daemonCode.prologueLines = self._prologue[:]
 
-        if not lines[-1]: lines = lines[:-1]
+        return (virtualControlControls, virtualControls,
+                shiftLevelControls, shiftControls)
 
-        text = "\n" + linesToText(lines, indentation = "    ")
+    def _getVirtualControlsInDependencyOrder(self, allVirtualControls):
+        """Get a list of the given virtual controls in a topological order of
+        their dependencies.
 
-        prologue = document.createTextNode(text)
+        Each virtual control comes after the virtual controls its states
+        refer to."""
+        virtualControls = {}
+        for virtualControl in allVirtualControls:
+            virtualControls[virtualControl.control] = virtualControl
 
-        element = document.createElement("prologue")
-        element.appendChild(prologue)
+        orderedVirtualControls = []
+        visited = set()
 
-        return (element,
-                virtualControlControls, virtualControls,
-                shiftLevelControls, shiftControls)
+        def visit(virtualControl):
+            if virtualControl.control in visited:
+                return
+            visited.add(virtualControl.control)
 
-    def _isControlIncludedIn(self, control, controls):
-        """Determine if the given control is included in the given other set of
-        controls directly or indirectly."""
-        for c in controls:
-            if control==c:
-                return True
-            if c.isVirtual:
-                virtualControl = self.findVirtualControlByCode(c.code)
-                if self._isControlIncludedIn(control,
-                                             virtualControl.getControls()):
-                    return True
+            for control in sorted(virtualControl.getControls()):
+                if control in virtualControls:
+                    visit(virtualControls[control])
+
+            orderedVirtualControls.append(virtualControl)
+
+        for virtualControl in virtualControls.values():
+            visit(virtualControl)
+
+        return orderedVirtualControls
+
+    def _getPropagationLuaCode(self, control, orderedVirtualControls,
+                               shiftLevelControls, profileControls):
+        """Get the Lua code to propagate a change in the value of the given
+        (physical) control.
+
+        The controls form a dependency graph: the states of the virtual
+        controls depend on physical and other virtual controls, the states of
+        the shift levels depend on physical and virtual controls, and the
+        states of the control profiles depend on the shift levels and on
+        the values of their controls. The virtual controls and the shift
+        levels that depend on the given control are updated in the given
+        topological order, and the update of a node is skipped if none of its
+        inputs have changed. Then the profile of the control itself and the
+        profiles of the changed virtual controls are updated, and if a shift
+        level has changed, the active updaters are called. Only the controls
+        in profileControls have control profiles to update.
+
+        Returns an array of lines."""
+        # A mapping of the controls affected by the change to the names of
+        # the Lua variables indicating if they have really changed. The
+        # changed control itself is mapped to None, since it is considered
+        # to be changed in any case.
+        changedControls = { control: None }
+        usedFlags = set()
+
+        def getCondition(controls):
+            """Get the Lua expression telling if any of the given controls
+            have changed. If it is surely the case, an empty string is
+            returned, and if none of the controls is affected, None."""
+            flags = []
+            for c in sorted(controls):
+                if c in changedControls:
+                    flag = changedControls[c]
+                    if flag is None:
+                        return ""
+                    flags.append(flag)
+            usedFlags.update(flags)
+            return " or ".join(flags) if flags else None
+
+        # Tuples of the name of the flag, the condition and the name of the
+        # function to call for each node to update
+        updates = []
+
+        changedVirtualControls = []
+        for virtualControl in orderedVirtualControls:
+            condition = getCondition(virtualControl.getControls())
+            if condition is None:
+                continue
+
+            flag = "virtual%dChanged" % (len(changedVirtualControls),)
+            updates.append((flag, condition,
+                            virtualControl.stateLuaFunctionName))
+
+            changedControls[virtualControl.control] = flag
+            changedVirtualControls.append(virtualControl)
+
+        shiftLevelFlags = []
+        for (levelIndex, controls) in enumerate(shiftLevelControls):
+            condition = getCondition(controls)
+            if condition is None:
+                continue
+
+            flag = "shiftLevel%dChanged" % (levelIndex,)
+            updates.append((flag, condition,
+                            Profile.getShiftLevelStateLuaFunctionName(levelIndex)))
+
+            shiftLevelFlags.append(flag)
+
+        usedFlags.update(shiftLevelFlags)
+        profileUpdates = []
+        for virtualControl in changedVirtualControls:
+            if virtualControl.control in profileControls:
+                flag = changedControls[virtualControl.control]
+                usedFlags.add(flag)
+                profileUpdates.append((flag, virtualControl.control))
+
+        lines = []
+        for (flag, condition, functionName) in updates:
+            if flag not in usedFlags:
+                if condition:
+                    lines.append("if %s then %s() end" %
+                                 (condition, functionName))
+                else:
+                    lines.append("%s()" % (functionName,))
+            elif condition:
+                lines.append("local %s = (%s) and %s()" %
+                             (flag, condition, functionName))
+            else:
+                lines.append("local %s = %s()" % (flag, functionName))
+
+        if control in profileControls:
+            lines.append("%s()" %
+                         (ControlProfile.getUpdateLuaFunctionName(control),))
+
+        for (flag, virtualControl) in profileUpdates:
+            lines.append("if %s then %s() end" %
+                         (flag,
+                          ControlProfile.getUpdateLuaFunctionName(virtualControl)))
+
+        if shiftLevelFlags:
+            lines.append("if %s then _jsprog_updaters_call() end" %
+                         (" or ".join(shiftLevelFlags),))
+
+        return lines
 
     def _removeReferencesTo(self, control):
         """Remove the references to the given control.
@@ -2917,6 +4105,205 @@ class Profile(object):
 
 #------------------------------------------------------------------------------
 
+class ProfileIndexBucket(object):
+    """The profiles of a profile index having the same index key.
+
+    Besides the profiles themselves, secondary mappings are maintained from
+    the unique identifiers, the physical locations and the versions to the
+    profiles having them, so that the scoring of the profiles needs no
+    comparisons of the identities.
+
+    The profiles are also kept in a list sorted by their ordinals, into which
+    they are inserted in place, so that matching needs no sorting."""
+    def __init__(self):
+        """Construct the bucket."""
+        # A mapping of the profiles to their ordinals
+        self.profiles = {}
+
+        # The ordinals of the profiles in increasing order, and the profiles
+        # in the same order
+        self._ordinals = []
+        self._sortedProfiles = []
+
+        self.profilesByUniq = {}
+        self.profilesByPhys = {}
+        self.profilesByVersion = {}
+
+    def add(self, profile, ordinal):
+        """Add the given profile with the given ordinal."""
+        identity = profile.identity
+
+        self.profiles[profile] = ordinal
+        index = bisect.bisect_right(self._ordinals, ordinal)
+        self._ordinals.insert(index, ordinal)
+        self._sortedProfiles.insert(index, profile)
+        if identity.uniq is not None:
+            self.profilesByUniq.setdefault(identity.uniq, set()).add(profile)
+        self.profilesByPhys.setdefault(identity.phys, set()).add(profile)
+        if identity.inputID.version is not None:
+            self.profilesByVersion.setdefault(identity.inputID.version,
+                                              set()).add(profile)
+
+    def remove(self, profile, uniq, phys, version):
+        """Remove the given profile, which was added with the given unique
+        identifier, physical location and version."""
+        ordinal = self.profiles.pop(profile)
+        index = bisect.bisect_left(self._ordinals, ordinal)
+        while self._sortedProfiles[index] is not profile:
+            index += 1
+        del self._ordinals[index]
+        del self._sortedProfiles[index]
+        ProfileIndexBucket._discard(self.profilesByUniq, uniq, profile)
+        ProfileIndexBucket._discard(self.profilesByPhys, phys, profile)
+        ProfileIndexBucket._discard(self.profilesByVersion, version, profile)
+
+    def match(self, identity):
+        """Get a list of the profiles in the bucket with the scores they
+        match the given identity with.
+
+        The scores are the same as computed by JoystickIdentity.match(). The
+        list is sorted by the ordinals of the profiles."""
+        full = () if identity.uniq is None else \
+            self.profilesByUniq.get(identity.uniq, ())
+        samePhys = self.profilesByPhys.get(identity.phys, ())
+        sameVersion = () if identity.inputID.version is None else \
+            self.profilesByVersion.get(identity.inputID.version, ())
+
+        result = []
+        for profile in self._sortedProfiles:
+            if profile in full:
+                score = JoystickIdentity.MATCH_FULL
+            else:
+                score = 1
+                if profile in sameVersion:
+                    score += 1
+                if profile in samePhys:
+                    score += 1
+            result.append((profile, score))
+
+        return result
+
+    @staticmethod
+    def _discard(mapping, key, profile):
+        """Remove the given profile from the set in the given mapping
+        belonging to the given key."""
+        profiles = mapping.get(key)
+        if profiles is not None:
+            profiles.discard(profile)
+            if not profiles:
+                del mapping[key]
+
+#------------------------------------------------------------------------------
+
+class ProfileIndex(object):
+    """An index of profiles by their identities.
+
+    The profiles are put into buckets by the bus type, vendor and product of
+    the input IDs and the names of their identities (see
+    JoystickIdentity.indexKey), since these must be equal for a profile to
+    match an identity at all. Finding the profiles matching an identity is
+    thus a dictionary lookup followed by the scoring of the profiles in the
+    bucket, which needs only set membership tests.
+
+    The profiles are also given ordinals in the order they are added, and the
+    matching profiles are returned in this order, so that the selection of
+    the auto-load profile gives the same result as iterating over the
+    profiles of the joystick type in order."""
+    def __init__(self):
+        """Construct the index."""
+        self._buckets = {}
+
+        # A mapping of the profiles to tuples of the index key, the unique
+        # identifier, the physical location and the version they were
+        # indexed with, and their ordinals
+        self._entries = {}
+
+        self._nextOrdinal = 0
+
+    def add(self, profile):
+        """Add the given profile to the index."""
+        assert profile not in self._entries
+
+        ordinal = self._nextOrdinal
+        self._nextOrdinal += 1
+
+        self._addEntry(profile, ordinal)
+
+    def remove(self, profile):
+        """Remove the given profile from the index."""
+        entry = self._entries.pop(profile, None)
+        if entry is None:
+            return
+
+        (key, uniq, phys, version, _ordinal) = entry
+        bucket = self._buckets[key]
+        bucket.remove(profile, uniq, phys, version)
+        if not bucket.profiles:
+            del self._buckets[key]
+
+    def update(self, profile):
+        """Update the index after the identity of the given profile has
+        changed.
+
+        The profile keeps its ordinal."""
+        entry = self._entries.get(profile)
+        if entry is None:
+            return
+
+        self.remove(profile)
+        self._addEntry(profile, entry[4])
+
+    def clear(self):
+        """Remove all profiles from the index."""
+        self._buckets = {}
+        self._entries = {}
+
+    def match(self, identity):
+        """Get a list of the profiles matching the given identity.
+
+        The list contains tuples of the profiles and their scores. The scores
+        are the same as returned by Profile.match(), and the profiles with a
+        score of 0 (i.e. those not matching) are not included."""
+        bucket = self._buckets.get(identity.indexKey)
+        return [] if bucket is None else bucket.match(identity)
+
+    def findAutoLoadProfile(self, identity):
+        """Find the auto-load profile best matching the given identity.
+
+        If there are several such profiles with the same score, the one added
+        first is returned. If there is no matching auto-load profile, None is
+        returned."""
+        return ProfileIndex.selectAutoLoadProfile(self.match(identity))
+
+    @staticmethod
+    def selectAutoLoadProfile(matches):
+        """Select the auto-load profile with the highest score from the given
+        list of profiles and scores as returned by match()."""
+        autoLoadProfile = None
+        autoLoadCandidateScore = 0
+
+        for (profile, score) in matches:
+            if profile.autoLoad and score>autoLoadCandidateScore:
+                autoLoadProfile = profile
+                autoLoadCandidateScore = score
+
+        return autoLoadProfile
+
+    def _addEntry(self, profile, ordinal):
+        """Add the entry for the given profile with the given ordinal."""
+        identity = profile.identity
+        key = identity.indexKey
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = ProfileIndexBucket()
+        bucket.add(profile, ordinal)
+
+        self._entries[profile] = (key, identity.uniq, identity.phys,
+                                  identity.inputID.version, ordinal)
+
+#------------------------------------------------------------------------------
+
 if __name__ == "__main__":
     parser = make_parser()
 
@@ -2933,4 +4320,6 @@ if __name__ == "__main__":
     with open("profile.xml", "wt") as f:
         document.writexml(f, addindent = "  ", newl = "\n")
 
+    print(profile.getDaemonCodeReport(), file=sys.stderr)
+
 #------------------------------------------------------------------------------
@@ -0,0 +1,750 @@
+
+from .profile import Profile, ShiftLevel, ShiftHandler
+from .profile import ValueRangeHandler, KeyProfile, AxisProfile
+from .profile import VirtualControlProfile
+from .action import Action, SimpleAction, MouseMove, AdvancedAction
+from .action import ScriptAction, NOPAction, KeyPressCommand
+from .action import KeyReleaseCommand, DelayCommand, MouseMoveCommand
+from .parser import Control, ControlConstraint, VirtualState
+from .parser import SingleValueConstraint, ValueRangeConstraint
+from .device import DisplayVirtualState
+from .joystick import InputID, JoystickIdentity
+
+from array import array
+
+import hashlib
+import os
+import struct
+import sys
+
+#------------------------------------------------------------------------------
+
+## @package jsprog.profilecache
+#
+# Binary cache of parsed profiles
+#
+# Loading a profile from its XML document is dominated by the work of the
+# content handler: checking and converting the attributes, looking up key
+# names, and building the objects step by step. The cache stores the
+# already parsed profile in a flat, binary form: a table of the strings, an
+# array of integers and an array of floating point numbers. Loading a profile
+# from the cache means reading a single file and building the objects
+# directly, without any further checks, since only profiles that have been
+# parsed successfully are stored.
+#
+# Each cache file belongs to one profile file. It records the modification
+# time, the size and the SHA-1 hash of the profile file it was made from. If
+# the modification time or the size differ, the hash is checked, and if that
+# differs too, the cache is stale and the XML document is parsed (and the
+# cache is rewritten). If anything goes wrong with the cache, the XML
+# document is parsed as well.
+#
+# Since a profile refers to the controls of its joystick type, the cache
+# also records the version of the joystick type's descriptor file (see
+# ProfileCache.getTypeKey()), and a cache made with another version is
+# stale, too.
+
+#------------------------------------------------------------------------------
+
+class ProfileEncoder(object):
+    """Encoder of a profile into the flat form stored in the cache.
+
+    Virtual controls are referred to by their names, keys and axes by their
+    codes. Optional integers and floating point numbers are preceded by an
+    integer indicating if they are present. Optional strings are stored as
+    the index of the string plus one, 0 meaning no string."""
+    ## Handler tree node: shift handler
+    NODE_SHIFT = 1
+
+    ## Handler tree node: value range handler
+    NODE_VALUE_RANGE = 2
+
+    ## Handler tree node: action
+    NODE_ACTION = 3
+
+    def __init__(self):
+        """Construct the encoder."""
+        self._strings = []
+        self._stringIndexes = {}
+        self._ints = array("i")
+        self._floats = array("d")
+
+    @property
+    def strings(self):
+        """Get the list of strings."""
+        return self._strings
+
+    @property
+    def ints(self):
+        """Get the array of the integers."""
+        return self._ints
+
+    @property
+    def floats(self):
+        """Get the array of the floating point numbers."""
+        return self._floats
+
+    def encode(self, profile):
+        """Encode the given profile."""
+        self._putString(profile.name)
+        self._putBool(profile.autoLoad)
+        self._putInt(profile.valueRangeDispatch)
+
+        self._encodeIdentity(profile.identity)
+
+        virtualControls = list(profile.virtualControls)
+        self._putInt(len(virtualControls))
+        for virtualControl in virtualControls:
+            self._putString(virtualControl.name)
+            self._putString(virtualControl.displayName)
+            self._putInt(virtualControl.numStates)
+            for state in virtualControl.states:
+                self._putString(state.displayName)
+                self._encodeConstraints(profile, state)
+
+        self._putInt(profile.numShiftLevels)
+        for index in range(0, profile.numShiftLevels):
+            shiftLevel = profile.getShiftLevel(index)
+            self._putInt(shiftLevel.numStates)
+            for state in shiftLevel.states:
+                self._encodeConstraints(profile, state)
+
+        controlProfiles = list(profile.controlProfiles)
+        self._putInt(len(controlProfiles))
+        for controlProfile in controlProfiles:
+            self._encodeControl(profile, controlProfile.control)
+            self._putBool(controlProfile.shiftActive)
+            if controlProfile.control.isVirtual:
+                handlerTrees = sorted(controlProfile.handlerTrees,
+                                      key = lambda item: item[0])
+                self._putInt(len(handlerTrees))
+                for (state, handlerTree) in handlerTrees:
+                    self._putInt(state)
+                    self._encodeHandlerTree(handlerTree)
+            else:
+                self._encodeHandlerTree(controlProfile.handlerTree)
+
+        self._encodeLines(profile.prologue)
+        self._encodeLines(profile.epilogue)
+
+    def _encodeIdentity(self, identity):
+        """Encode the given joystick identity."""
+        inputID = identity.inputID
+        self._putInt(inputID.busType)
+        self._putInt(inputID.vendor)
+        self._putInt(inputID.product)
+        self._putOptionalInt(inputID.version)
+
+        self._putString(identity.name)
+        self._putOptionalString(identity.phys)
+        self._putOptionalString(identity.uniq)
+
+    def _encodeConstraints(self, profile, state):
+        """Encode the constraints of the given virtual state."""
+        constraints = list(state.constraints)
+        self._putInt(len(constraints))
+        for constraint in constraints:
+            self._putInt(constraint.type)
+            self._encodeControl(profile, constraint.control)
+            if constraint.type==ControlConstraint.TYPE_SINGLE_VALUE:
+                self._putInt(constraint.value)
+            else:
+                self._putInt(constraint.fromValue)
+                self._putInt(constraint.toValue)
+
+    def _encodeControl(self, profile, control):
+        """Encode the given control."""
+        self._putInt(control.type)
+        if control.isVirtual:
+            self._putString(profile.findVirtualControlByCode(control.code).name)
+        else:
+            self._putInt(control.code)
+
+    def _encodeHandlerTree(self, handlerTree):
+        """Encode the children of the given handler tree recursively."""
+        self._putInt(handlerTree.numChildren)
+        for child in handlerTree.children:
+            if isinstance(child, ShiftHandler):
+                self._putInt(ProfileEncoder.NODE_SHIFT)
+                self._putInt(child.fromState)
+                self._putInt(child.toState)
+                self._encodeHandlerTree(child)
+            elif isinstance(child, ValueRangeHandler):
+                self._putInt(ProfileEncoder.NODE_VALUE_RANGE)
+                self._putInt(child.fromValue)
+                self._putInt(child.toValue)
+                self._encodeHandlerTree(child)
+            else:
+                self._putInt(ProfileEncoder.NODE_ACTION)
+                self._encodeAction(child)
+
+    def _encodeAction(self, action):
+        """Encode the given action."""
+        type = action.type
+        self._putInt(type)
+        if type==Action.TYPE_NOP:
+            return
+
+        self._putOptionalString(action.displayName)
+
+        if type==Action.TYPE_SIMPLE:
+            self._putOptionalInt(action.repeatDelay)
+            keyCombinations = list(action.keyCombinations)
+            self._putInt(len(keyCombinations))
+            for keyCombination in keyCombinations:
+                self._putInt(keyCombination.code)
+                self._putInt((1 if keyCombination.leftShift else 0) |
+                             (2 if keyCombination.rightShift else 0) |
+                             (4 if keyCombination.leftControl else 0) |
+                             (8 if keyCombination.rightControl else 0) |
+                             (16 if keyCombination.leftAlt else 0) |
+                             (32 if keyCombination.rightAlt else 0) |
+                             (64 if keyCombination.leftSuper else 0) |
+                             (128 if keyCombination.rightSuper else 0))
+        elif type==Action.TYPE_MOUSE_MOVE:
+            self._putOptionalInt(action.repeatDelay)
+            self._encodeMouseMoveCommand(action.command)
+        elif type==Action.TYPE_ADVANCED:
+            self._putOptionalInt(action.repeatDelay)
+            self._encodeCommands(list(action.enterCommands))
+            self._putBool(action.isRepeatDifferent)
+            if action.isRepeatDifferent:
+                self._encodeCommands(list(action.repeatCommands))
+            self._encodeCommands(list(action.leaveCommands))
+        elif type==Action.TYPE_SCRIPT:
+            self._encodeLines(list(action.enterLines))
+            self._encodeLines(list(action.leaveLines))
+        else:
+            raise ValueError("unhandled action type %d" % (type,))
+
+    def _encodeCommands(self, commands):
+        """Encode the given list of commands of an advanced action."""
+        self._putInt(len(commands))
+        for command in commands:
+            if isinstance(command, KeyPressCommand):
+                self._putInt(ProfileDecoder.COMMAND_KEY_PRESS)
+                self._putInt(command.code)
+            elif isinstance(command, KeyReleaseCommand):
+                self._putInt(ProfileDecoder.COMMAND_KEY_RELEASE)
+                self._putInt(command.code)
+            elif isinstance(command, DelayCommand):
+                self._putInt(ProfileDecoder.COMMAND_DELAY)
+                self._putInt(command.length)
+            elif isinstance(command, MouseMoveCommand):
+                self._putInt(ProfileDecoder.COMMAND_MOUSE_MOVE)
+                self._encodeMouseMoveCommand(command)
+            else:
+                raise ValueError("unhandled command %r" % (command,))
+
+    def _encodeMouseMoveCommand(self, command):
+        """Encode the given mouse move command."""
+        self._putInt(command.direction)
+        self._putOptionalFloat(command.a)
+        self._putOptionalFloat(command.b)
+        self._putOptionalFloat(command.c)
+        self._putOptionalFloat(command.adjust)
+        self._putInt(command.curve)
+        self._putInt(len(command.points))
+        for (value, distance) in command.points:
+            self._floats.append(value)
+            self._floats.append(distance)
+        self._putBool(command.precompute)
+
+    def _encodeLines(self, lines):
+        """Encode the given list of lines."""
+        self._putInt(len(lines))
+        for line in lines:
+            self._putString(line)
+
+    def _putInt(self, value):
+        """Store the given integer."""
+        self._ints.append(value)
+
+    def _putBool(self, value):
+        """Store the given boolean."""
+        self._ints.append(1 if value else 0)
+
+    def _putOptionalInt(self, value):
+        """Store the given integer which may be None."""
+        if value is None:
+            self._ints.append(0)
+        else:
+            self._ints.append(1)
+            self._ints.append(value)
+
+    def _putOptionalFloat(self, value):
+        """Store the given floating point number which may be None."""
+        if value is None:
+            self._ints.append(0)
+        else:
+            self._ints.append(1)
+            self._floats.append(value)
+
+    def _putString(self, s):
+        """Store the given string."""
+        self._ints.append(self._getStringIndex(s))
+
+    def _putOptionalString(self, s):
+        """Store the given string which may be None."""
+        self._ints.append(0 if s is None else (self._getStringIndex(s) + 1))
+
+    def _getStringIndex(self, s):
+        """Get the index of the given string in the string table."""
+        index = self._stringIndexes.get(s)
+        if index is None:
+            index = self._stringIndexes[s] = len(self._strings)
+            self._strings.append(s)
+        return index
+
+#------------------------------------------------------------------------------
+
+class ProfileDecoder(object):
+    """Decoder of a profile from the flat form stored in the cache."""
+    ## Advanced action command: key press
+    COMMAND_KEY_PRESS = 1
+
+    ## Advanced action command: key release
+    COMMAND_KEY_RELEASE = 2
+
+    ## Advanced action command: delay
+    COMMAND_DELAY = 3
+
+    ## Advanced action command: mouse move
+    COMMAND_MOUSE_MOVE = 4
+
+    def __init__(self, joystickType, strings, ints, floats):
+        """Construct the decoder for the given joystick type and data."""
+        self._joystickType = joystickType
+        self._strings = strings
+        self._int = iter(ints.tolist()).__next__
+        self._float = iter(floats.tolist()).__next__
+        self._profile = None
+
+    def decode(self):
+        """Decode the profile."""
+        getInt = self._int
+        getString = self._getString
+
+        name = getString()
+        autoLoad = getInt()!=0
+        valueRangeDispatch = getInt()
+        identity = self._decodeIdentity()
+
+        profile = self._profile = Profile(self._joystickType, name, identity,
+                                          autoLoad = autoLoad,
+                                          valueRangeDispatch =
+                                          valueRangeDispatch)
+
+        for i in range(0, getInt()):
+            name = getString()
+            virtualControl = profile.addVirtualControl(getString(),
+                                                       name = name)
+            if virtualControl is None:
+                raise ValueError("duplicate virtual control " + name)
+            for j in range(0, getInt()):
+                state = DisplayVirtualState(getString())
+                self._decodeConstraints(state)
+                virtualControl.addState(state)
+
+        for i in range(0, getInt()):
+            shiftLevel = ShiftLevel()
+            for j in range(0, getInt()):
+                state = VirtualState()
+                self._decodeConstraints(state)
+                shiftLevel.addState(state)
+            profile.addShiftLevel(shiftLevel)
+
+        for i in range(0, getInt()):
+            control = self._decodeControl()
+            shiftActive = getInt()!=0
+            if control.isVirtual:
+                controlProfile = VirtualControlProfile(control.code,
+                                                       shiftActive = shiftActive)
+                for j in range(0, getInt()):
+                    self._decodeHandlerTree(controlProfile.getHandlerTree(getInt()))
+            else:
+                controlProfile = \
+                    KeyProfile(control.code, shiftActive = shiftActive) \
+                    if control.isKey else \
+                    AxisProfile(control.code, shiftActive = shiftActive)
+                self._decodeHandlerTree(controlProfile.handlerTree)
+            profile.addControlProfile(controlProfile)
+
+        profile.prologue = self._decodeLines()
+        profile.epilogue = self._decodeLines()
+
+        return profile
+
+    def _decodeIdentity(self):
+        """Decode a joystick identity."""
+        getInt = self._int
+
+        busType = getInt()
+        vendor = getInt()
+        product = getInt()
+        version = self._getOptionalInt()
+        inputID = InputID(busType, vendor, product, version)
+
+        name = self._getString()
+        phys = self._getOptionalString()
+        uniq = self._getOptionalString()
+
+        return JoystickIdentity(inputID, name, phys, uniq)
+
+    def _decodeConstraints(self, state):
+        """Decode the constraints of the given virtual state."""
+        getInt = self._int
+        for i in range(0, getInt()):
+            type = getInt()
+            control = self._decodeControl()
+            if type==ControlConstraint.TYPE_SINGLE_VALUE:
+                constraint = SingleValueConstraint(control, getInt())
+            else:
+                fromValue = getInt()
+                constraint = ValueRangeConstraint(control, fromValue, getInt())
+            state.addConstraint(constraint)
+
+    def _decodeControl(self):
+        """Decode a control."""
+        type = self._int()
+        if type==Control.TYPE_VIRTUAL:
+            name = self._getString()
+            code = self._profile.findVirtualControlCodeByName(name)
+            if code is None:
+                raise ValueError("unknown virtual control " + name)
+        else:
+            code = self._int()
+        return Control(type, code)
+
+    def _decodeHandlerTree(self, handlerTree):
+        """Decode the children of the given handler tree recursively."""
+        getInt = self._int
+        for i in range(0, getInt()):
+            node = getInt()
+            if node==ProfileEncoder.NODE_SHIFT:
+                fromState = getInt()
+                child = ShiftHandler(fromState, getInt())
+                self._decodeHandlerTree(child)
+            elif node==ProfileEncoder.NODE_VALUE_RANGE:
+                fromValue = getInt()
+                child = ValueRangeHandler(fromValue, getInt())
+                self._decodeHandlerTree(child)
+            elif node==ProfileEncoder.NODE_ACTION:
+                child = self._decodeAction()
+            else:
+                raise ValueError("invalid handler tree node %d" % (node,))
+            handlerTree.addChild(child)
+
+    def _decodeAction(self):
+        """Decode an action."""
+        getInt = self._int
+
+        type = getInt()
+        if type==Action.TYPE_NOP:
+            return NOPAction()
+
+        displayName = self._getOptionalString()
+
+        if type==Action.TYPE_SIMPLE:
+            action = SimpleAction(displayName = displayName,
+                                  repeatDelay = self._getOptionalInt())
+            for i in range(0, getInt()):
+                code = getInt()
+                modifiers = getInt()
+                action.addKeyCombination(code,
+                                         leftShift = (modifiers&1)!=0,
+                                         rightShift = (modifiers&2)!=0,
+                                         leftControl = (modifiers&4)!=0,
+                                         rightControl = (modifiers&8)!=0,
+                                         leftAlt = (modifiers&16)!=0,
+                                         rightAlt = (modifiers&32)!=0,
+                                         leftSuper = (modifiers&64)!=0,
+                                         rightSuper = (modifiers&128)!=0)
+        elif type==Action.TYPE_MOUSE_MOVE:
+            repeatDelay = self._getOptionalInt()
+            command = self._decodeMouseMoveCommand()
+            action = MouseMove(command.direction, a = command.a,
+                               b = command.b, c = command.c,
+                               adjust = command.adjust,
+                               displayName = displayName,
+                               repeatDelay = repeatDelay,
+                               curve = command.curve,
+                               points = command.points,
+                               precompute = command.precompute)
+        elif type==Action.TYPE_ADVANCED:
+            action = AdvancedAction(displayName = displayName,
+                                    repeatDelay = self._getOptionalInt())
+            self._decodeCommands(action, AdvancedAction.SECTION_ENTER)
+            if getInt()!=0:
+                self._decodeCommands(action, AdvancedAction.SECTION_REPEAT)
+            self._decodeCommands(action, AdvancedAction.SECTION_LEAVE)
+            action.clearSection()
+        elif type==Action.TYPE_SCRIPT:
+            action = ScriptAction(displayName = displayName)
+            action.setSection(ScriptAction.SECTION_ENTER)
+            for line in self._decodeLines():
+                action.appendLine(line)
+            action.setSection(ScriptAction.SECTION_LEAVE)
+            for line in self._decodeLines():
+                action.appendLine(line)
+            action.clearSection()
+        else:
+            raise ValueError("invalid action type %d" % (type,))
+
+        return action
+
+    def _decodeCommands(self, action, section):
+        """Decode the commands of the given section of the given advanced
+        action."""
+        getInt = self._int
+
+        action.setSection(section)
+        for i in range(0, getInt()):
+            command = getInt()
+            if command==ProfileDecoder.COMMAND_KEY_PRESS:
+                action.appendCommand(KeyPressCommand(getInt()))
+            elif command==ProfileDecoder.COMMAND_KEY_RELEASE:
+                action.appendCommand(KeyReleaseCommand(getInt()))
+            elif command==ProfileDecoder.COMMAND_DELAY:
+                action.appendCommand(DelayCommand(getInt()))
+            elif command==ProfileDecoder.COMMAND_MOUSE_MOVE:
+                action.appendCommand(self._decodeMouseMoveCommand())
+            else:
+                raise ValueError("invalid command %d" % (command,))
+
+    def _decodeMouseMoveCommand(self):
+        """Decode a mouse move command."""
+        direction = self._int()
+        a = self._getOptionalFloat()
+        b = self._getOptionalFloat()
+        c = self._getOptionalFloat()
+        adjust = self._getOptionalFloat()
+        curve = self._int()
+        points = [(self._float(), self._float())
+                  for i in range(0, self._int())]
+        precompute = self._int()!=0
+        return MouseMoveCommand(direction, a = a, b = b, c = c,
+                                adjust = adjust, curve = curve,
+                                points = points, precompute = precompute)
+
+    def _decodeLines(self):
+        """Decode a list of lines."""
+        getString = self._getString
+        return [getString() for i in range(0, self._int())]
+
+    def _getString(self):
+        """Get the next string."""
+        return self._strings[self._int()]
+
+    def _getOptionalString(self):
+        """Get the next string which may be None."""
+        index = self._int()
+        return None if index==0 else self._strings[index - 1]
+
+    def _getOptionalInt(self):
+        """Get the next integer which may be None."""
+        return self._int() if self._int()!=0 else None
+
+    def _getOptionalFloat(self):
+        """Get the next floating point number which may be None."""
+        return self._float() if self._int()!=0 else None
+
+#------------------------------------------------------------------------------
+
+class ProfileCache(object):
+    """A cache of the parsed profiles in a directory.
+
+    A cache file consists of:
+    - a header containing the magic bytes, the version of the format, the
+      modification time, size and hash of the profile file, the key of the
+      joystick type's descriptor as well as the length of the string table,
+      the number of integers and the number of floating point numbers,
+    - the string table, which is the UTF-8 encoded strings separated by NUL
+      characters (which cannot appear in an XML document),
+    - the integers as an array of little-endian 32-bit signed integers,
+    - the floating point numbers as an array of little-endian doubles.
+    """
+    ## The magic bytes at the beginning of a cache file
+    MAGIC = b"JSPC"
+
+    ## The version of the format
+    VERSION = 4
+
+    ## The suffix of the cache files
+    SUFFIX = ".pcache"
+
+    ## The format of the header
+    _headerFormat = "<4sHxxqQ20s20sIII"
+
+    ## The size of the header
+    _headerSize = struct.calcsize(_headerFormat)
+
+    @staticmethod
+    def getHash(data):
+        """Get the hash of the given contents of a profile file."""
+        return hashlib.sha1(data).digest()
+
+    @staticmethod
+    def getTypeKey(joystickType):
+        """Get the key identifying the version of the descriptor file of the
+        given joystick type.
+
+        It is the hash of the path, the modification time and the size of the
+        descriptor file, or of an empty string, if the joystick type has not
+        been loaded from a file."""
+        path = joystickType.descriptorPath
+        if path is None:
+            stamp = ""
+        else:
+            path = os.path.abspath(path)
+            try:
+                s = os.stat(path)
+                stamp = "%s\0%d\0%d" % (path, s.st_mtime_ns, s.st_size)
+            except OSError:
+                stamp = path
+        return hashlib.sha1(stamp.encode("utf-8")).digest()
+
+    def __init__(self, directory):
+        """Construct the cache storing its files in the given directory."""
+        self._directory = directory
+
+    @property
+    def directory(self):
+        """Get the directory of the cache."""
+        return self._directory
+
+    def getPathFor(self, profilePath):
+        """Get the path of the cache file for the profile file with the given
+        path."""
+        name = hashlib.sha1(os.path.abspath(profilePath).encode("utf-8")).hexdigest()
+        return os.path.join(self._directory, name + ProfileCache.SUFFIX)
+
+    def parse(self, joystickType, parser, handler, profilePath):
+        """Get the profile for the given joystick type in the file with the
+        given path.
+
+        If the cache of the profile is valid, the profile is loaded from
+        it. Otherwise the profile file is parsed by the given parser and the
+        resulting profile is stored in the cache.
+
+        The handler should be the profile handler of the parser.
+
+        Returns the profile."""
+        try:
+            profile = self.load(joystickType, profilePath)
+            if profile is not None:
+                return profile
+        except Exception as e:
+            print("Failed to load the cache of %s: %s" % (profilePath, e),
+                  file=sys.stderr)
+
+        parser.parse(profilePath)
+        profile = handler.profile
+
+        try:
+            self.store(profilePath, profile)
+        except Exception as e:
+            print("Failed to store the cache of %s: %s" % (profilePath, e),
+                  file=sys.stderr)
+
+        return profile
+
+    def load(self, joystickType, profilePath):
+        """Try to load the profile with the given path for the given joystick
+        type from the cache.
+
+        Returns the profile, or None if the cache is missing or stale."""
+        cachePath = self.getPathFor(profilePath)
+        if not os.path.isfile(cachePath):
+            return None
+
+        with open(cachePath, "rb") as f:
+            data = f.read()
+
+        if len(data)<ProfileCache._headerSize:
+            return None
+
+        (magic, version, mtime, size, hash, typeKey,
+         stringsLength, numInts, numFloats) = \
+            struct.unpack_from(ProfileCache._headerFormat, data)
+        if magic!=ProfileCache.MAGIC or version!=ProfileCache.VERSION or \
+           typeKey!=ProfileCache.getTypeKey(joystickType):
+            return None
+
+        s = os.stat(profilePath)
+        if s.st_mtime_ns!=mtime or s.st_size!=size:
+            with open(profilePath, "rb") as f:
+                if ProfileCache.getHash(f.read())!=hash:
+                    return None
+            self._updateHeader(cachePath, data, s)
+
+        offset = ProfileCache._headerSize
+        strings = data[offset:offset + stringsLength].decode("utf-8").split("\0")
+        offset += stringsLength
+
+        ints = array("i")
+        ints.frombytes(data[offset:offset + numInts*ints.itemsize])
+        offset += numInts*ints.itemsize
+
+        floats = array("d")
+        floats.frombytes(data[offset:offset + numFloats*floats.itemsize])
+
+        if len(ints)!=numInts or len(floats)!=numFloats:
+            return None
+
+        if sys.byteorder!="little":
+            ints.byteswap()
+            floats.byteswap()
+
+        return ProfileDecoder(joystickType, strings, ints, floats).decode()
+
+    def store(self, profilePath, profile):
+        """Store the given profile parsed from the file with the given
+        path."""
+        with open(profilePath, "rb") as f:
+            hash = ProfileCache.getHash(f.read())
+        s = os.stat(profilePath)
+
+        encoder = ProfileEncoder()
+        encoder.encode(profile)
+
+        stringData = "\0".join(encoder.strings).encode("utf-8")
+        ints = encoder.ints
+        floats = encoder.floats
+        if sys.byteorder!="little":
+            ints.byteswap()
+            floats.byteswap()
+
+        os.makedirs(self._directory, exist_ok = True)
+
+        cachePath = self.getPathFor(profilePath)
+        newPath = cachePath + ".new"
+        with open(newPath, "wb") as f:
+            f.write(struct.pack(ProfileCache._headerFormat,
+                                ProfileCache.MAGIC, ProfileCache.VERSION,
+                                s.st_mtime_ns, s.st_size, hash,
+                                ProfileCache.getTypeKey(profile.joystickType),
+                                len(stringData), len(ints), len(floats)))
+            f.write(stringData)
+            f.write(ints.tobytes())
+            f.write(floats.tobytes())
+        os.rename(newPath, cachePath)
+
+    def remove(self, profilePath):
+        """Remove the cache of the profile file with the given path, if it
+        exists."""
+        cachePath = self.getPathFor(profilePath)
+        if os.path.exists(cachePath):
+            os.unlink(cachePath)
+
+    def _updateHeader(self, cachePath, data, s):
+        """Update the modification time and size in the header of the given
+        cache file with the given contents to those in the given stat
+        result."""
+        header = struct.unpack_from(ProfileCache._headerFormat, data)
+        with open(cachePath, "r+b") as f:
+            f.write(struct.pack(ProfileCache._headerFormat,
+                                header[0], header[1], s.st_mtime_ns, s.st_size,
+                                *header[4:]))
+
+#------------------------------------------------------------------------------
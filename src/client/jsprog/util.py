@@ -1,7 +1,6 @@
+#-------------------------------------------------------------------------------
 
-from .const import dbusInterfaceName, dbusInterfacePath
-
-from dbus import Interface
+import math
 
 #-------------------------------------------------------------------------------
 
@@ -11,13 +10,6 @@ from dbus import Interface
 
 #------------------------------------------------------------------------------
 
-def getJSProg(connection):
-    """Get the JSProg object via the given connection."""
-    jsprog_proxy = connection.get_object(dbusInterfaceName, dbusInterfacePath)
-    return Interface(jsprog_proxy, dbusInterfaceName)
-
-#------------------------------------------------------------------------------
-
 def appendLinesIndented(dest, lines, indentation = "  "):
     """Append the given lines with the given indentation to dest."""
     dest += [(indentation + l) if l.strip() else "" for l in lines]
@@ -34,3 +26,20 @@ def linesToText(lines, indentation = ""):
     return text
 
 #-------------------------------------------------------------------------------
+
+def formatLuaNumber(value):
+    """Format the given number for the Lua code.
+
+    Integral values are formatted as integers, the others with as many digits
+    as needed to represent them exactly. Infinities are formatted as
+    math.huge, and NaN as 0/0, as Lua has no literals for them."""
+    if math.isnan(value):
+        return "(0/0)"
+    elif math.isinf(value):
+        return "math.huge" if value>0 else "(-math.huge)"
+    elif value==int(value):
+        return "%d" % (value,)
+    else:
+        return repr(float(value))
+
+#-------------------------------------------------------------------------------
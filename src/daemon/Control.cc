@@ -25,11 +25,18 @@
 //------------------------------------------------------------------------------
 
 void Control::setupLuaHandlerName(type_t type, int code)
+{
+    luaHandlerName = getLuaHandlerNameFor(type, code);
+}
+
+//------------------------------------------------------------------------------
+
+std::string Control::getLuaHandlerNameFor(type_t type, int code)
 {
     char buf[64];
     snprintf(buf, sizeof(buf), "_jsprog_event_%s_%04x",
              (type==KEY) ? "key" : "axis", code);
-    luaHandlerName = buf;
+    return buf;
 }
 
 //------------------------------------------------------------------------------
@@ -87,6 +87,12 @@ public:
      */
     void setupLuaHandlerName(type_t type, int code);
 
+    /**
+     * Get the name of the Lua handler function of the control with the
+     * given parameters.
+     */
+    static std::string getLuaHandlerNameFor(type_t type, int code);
+
     /**
      * Get the name of the Lua function call for this key.
      */
@@ -294,6 +294,22 @@ gboolean DBusAdaptor::handleGetJoystickState(jsprogHuVaradiistvanJSProg* object,
 
 //------------------------------------------------------------------------------
 
+gboolean DBusAdaptor::
+handleGetJoystickStates(jsprogHuVaradiistvanJSProg* object,
+                        GDBusMethodInvocation* invocation,
+                        GVariant* arg_ids,
+                        gpointer userData)
+{
+    auto adaptor = reinterpret_cast<DBusAdaptor*>(userData);
+
+    jsprog_hu_varadiistvan_jsprog_complete_get_joystick_states(
+        object, invocation, adaptor->getJoystickStates(arg_ids));
+
+    return true;
+}
+
+//------------------------------------------------------------------------------
+
 gboolean DBusAdaptor::handleLoadProfile(jsprogHuVaradiistvanJSProg* object,
                                         GDBusMethodInvocation* invocation,
                                         guint arg_id,
@@ -310,6 +326,73 @@ gboolean DBusAdaptor::handleLoadProfile(jsprogHuVaradiistvanJSProg* object,
 
 //------------------------------------------------------------------------------
 
+gboolean DBusAdaptor::handleUpdateProfile(jsprogHuVaradiistvanJSProg* object,
+                                          GDBusMethodInvocation* invocation,
+                                          guint arg_id,
+                                          const gchar* arg_profileXML,
+                                          gpointer userData)
+{
+    auto adaptor = reinterpret_cast<DBusAdaptor*>(userData);
+
+    jsprog_hu_varadiistvan_jsprog_complete_update_profile(
+        object, invocation, adaptor->updateProfile(arg_id, arg_profileXML));
+
+    return true;
+}
+
+//------------------------------------------------------------------------------
+
+gboolean DBusAdaptor::handlePreloadProfile(jsprogHuVaradiistvanJSProg* object,
+                                           GDBusMethodInvocation* invocation,
+                                           guint arg_id,
+                                           guint arg_slot,
+                                           const gchar* arg_profileXML,
+                                           gpointer userData)
+{
+    auto adaptor = reinterpret_cast<DBusAdaptor*>(userData);
+
+    jsprog_hu_varadiistvan_jsprog_complete_preload_profile(
+        object, invocation,
+        adaptor->preloadProfile(arg_id, arg_slot, arg_profileXML));
+
+    return true;
+}
+
+//------------------------------------------------------------------------------
+
+gboolean DBusAdaptor::handleSwitchProfile(jsprogHuVaradiistvanJSProg* object,
+                                          GDBusMethodInvocation* invocation,
+                                          guint arg_id,
+                                          guint arg_slot,
+                                          gpointer userData)
+{
+    auto adaptor = reinterpret_cast<DBusAdaptor*>(userData);
+
+    jsprog_hu_varadiistvan_jsprog_complete_switch_profile(
+        object, invocation, adaptor->switchProfile(arg_id, arg_slot));
+
+    return true;
+}
+
+//------------------------------------------------------------------------------
+
+gboolean DBusAdaptor::
+handleGetProfileStats(jsprogHuVaradiistvanJSProg* object,
+                      GDBusMethodInvocation* invocation,
+                      guint arg_id,
+                      gboolean arg_reset,
+                      gpointer userData)
+{
+    auto adaptor = reinterpret_cast<DBusAdaptor*>(userData);
+
+    jsprog_hu_varadiistvan_jsprog_complete_get_profile_stats(
+        object, invocation, adaptor->getProfileStats(arg_id, arg_reset));
+
+    return true;
+}
+
+//------------------------------------------------------------------------------
+
 gboolean DBusAdaptor::
 handleStartMonitor(jsprogHuVaradiistvanJSProg* object,
                    GDBusMethodInvocation* invocation,
@@ -348,6 +431,44 @@ handleStopMonitor(jsprogHuVaradiistvanJSProg* object,
 
 //------------------------------------------------------------------------------
 
+gboolean DBusAdaptor::
+handleStartMonitors(jsprogHuVaradiistvanJSProg* object,
+                    GDBusMethodInvocation* invocation,
+                    GVariant* arg_ids,
+                    const gchar* arg_sender,
+                    const gchar* arg_listener,
+                    gpointer userData)
+{
+    auto adaptor = reinterpret_cast<DBusAdaptor*>(userData);
+
+    jsprog_hu_varadiistvan_jsprog_complete_start_monitors(
+        object, invocation, adaptor->startMonitors(arg_ids, arg_sender,
+                                                   arg_listener));
+
+    return true;
+}
+
+//------------------------------------------------------------------------------
+
+gboolean DBusAdaptor::
+handleStopMonitors(jsprogHuVaradiistvanJSProg* object,
+                   GDBusMethodInvocation* invocation,
+                   GVariant* arg_ids,
+                   const gchar* arg_listener,
+                   gpointer userData)
+{
+    auto adaptor = reinterpret_cast<DBusAdaptor*>(userData);
+
+    adaptor->stopMonitors(arg_ids, arg_listener);
+
+    jsprog_hu_varadiistvan_jsprog_complete_stop_monitors(
+        object, invocation);
+
+    return true;
+}
+
+//------------------------------------------------------------------------------
+
 gboolean DBusAdaptor::handleExit(jsprogHuVaradiistvanJSProg* object,
                                  GDBusMethodInvocation* invocation,
                                  gpointer userData)
@@ -479,6 +600,26 @@ DBusAdaptor::removeListener(size_t joystickID, listeners_t* listeners,
 
 //------------------------------------------------------------------------------
 
+void DBusAdaptor::findJoysticks(GVariant* ids, vector<Joystick*>& joysticks)
+{
+    gsize numIDs = 0;
+    auto idArray = reinterpret_cast<const guint32*>(
+        g_variant_get_fixed_array(ids, &numIDs, sizeof(guint32)));
+
+    if (numIDs==0) {
+        for(auto& entry: Joystick::getAll()) {
+            joysticks.push_back(entry.second);
+        }
+    } else {
+        for(gsize i = 0; i<numIDs; ++i) {
+            Joystick* joystick = Joystick::find(idArray[i]);
+            if (joystick!=0) joysticks.push_back(joystick);
+        }
+    }
+}
+
+//------------------------------------------------------------------------------
+
 DBusAdaptor::DBusAdaptor(DBusHandler& dbusHandler) :
     dbusHandler(dbusHandler),
     interfaceSkeleton(jsprog_hu_varadiistvan_jsprog_skeleton_new())
@@ -487,12 +628,26 @@ DBusAdaptor::DBusAdaptor(DBusHandler& dbusHandler) :
                      G_CALLBACK(&handleGetJoysticks), this);
     g_signal_connect(interfaceSkeleton, "handle-get-joystick-state",
                      G_CALLBACK(&handleGetJoystickState), this);
+    g_signal_connect(interfaceSkeleton, "handle-get-joystick-states",
+                     G_CALLBACK(&handleGetJoystickStates), this);
     g_signal_connect(interfaceSkeleton, "handle-load-profile",
                      G_CALLBACK(&handleLoadProfile), this);
+    g_signal_connect(interfaceSkeleton, "handle-update-profile",
+                     G_CALLBACK(&handleUpdateProfile), this);
+    g_signal_connect(interfaceSkeleton, "handle-preload-profile",
+                     G_CALLBACK(&handlePreloadProfile), this);
+    g_signal_connect(interfaceSkeleton, "handle-switch-profile",
+                     G_CALLBACK(&handleSwitchProfile), this);
+    g_signal_connect(interfaceSkeleton, "handle-get-profile-stats",
+                     G_CALLBACK(&handleGetProfileStats), this);
     g_signal_connect(interfaceSkeleton, "handle-start-monitor",
                      G_CALLBACK(&handleStartMonitor), this);
     g_signal_connect(interfaceSkeleton, "handle-stop-monitor",
                      G_CALLBACK(&handleStopMonitor), this);
+    g_signal_connect(interfaceSkeleton, "handle-start-monitors",
+                     G_CALLBACK(&handleStartMonitors), this);
+    g_signal_connect(interfaceSkeleton, "handle-stop-monitors",
+                     G_CALLBACK(&handleStopMonitors), this);
     g_signal_connect(interfaceSkeleton, "handle-exit",
                      G_CALLBACK(&handleExit), this);
     instance = this;
@@ -592,6 +747,35 @@ GVariant* DBusAdaptor::getJoystickState(uint32_t id)
 
 //------------------------------------------------------------------------------
 
+GVariant* DBusAdaptor::getJoystickStates(GVariant* ids)
+{
+    static const GVariantType* elementType = G_VARIANT_TYPE("(ua(qi)a(qi))");
+
+    vector<Joystick*> joysticks;
+    findJoysticks(ids, joysticks);
+
+    Log::debug("DBusAdaptor::getJoystickStates: %zu joysticks\n",
+               joysticks.size());
+
+    auto numJoysticks = joysticks.size();
+    unique_ptr<GVariant*[]> stateVariants(new GVariant*[numJoysticks]);
+
+    size_t index = 0;
+    for(auto joystick: joysticks) {
+        GVariant* stateDataVariants[3];
+
+        stateDataVariants[0] = g_variant_new_uint32(joystick->getID());
+        stateDataVariants[1] = keys2DBus(*joystick);
+        stateDataVariants[2] = axes2DBus(*joystick, true);
+
+        stateVariants[index++] = g_variant_new_tuple(stateDataVariants, 3);
+    }
+
+    return g_variant_new_array(elementType, stateVariants.get(), index);
+}
+
+//------------------------------------------------------------------------------
+
 bool DBusAdaptor::loadProfile(uint32_t id, const string& profileXML)
 {
     Joystick* joystick = Joystick::find(id);
@@ -605,6 +789,70 @@ bool DBusAdaptor::loadProfile(uint32_t id, const string& profileXML)
 
 //------------------------------------------------------------------------------
 
+bool DBusAdaptor::updateProfile(uint32_t id, const string& profileXML)
+{
+    Joystick* joystick = Joystick::find(id);
+    if (joystick==0) return false;
+
+    Profile profile(profileXML.c_str(), false);
+    if (!profile) return false;
+
+    return joystick->updateProfile(profile);
+}
+
+//------------------------------------------------------------------------------
+
+bool DBusAdaptor::preloadProfile(uint32_t id, uint32_t slot,
+                                 const string& profileXML)
+{
+    Joystick* joystick = Joystick::find(id);
+    if (joystick==0) return false;
+
+    Profile profile(profileXML.c_str(), false);
+    if (!profile) return false;
+
+    return joystick->preloadProfile(slot, profile);
+}
+
+//------------------------------------------------------------------------------
+
+bool DBusAdaptor::switchProfile(uint32_t id, uint32_t slot)
+{
+    Joystick* joystick = Joystick::find(id);
+    if (joystick==0) return false;
+
+    return joystick->switchProfile(slot);
+}
+
+//------------------------------------------------------------------------------
+
+GVariant* DBusAdaptor::getProfileStats(uint32_t id, bool reset)
+{
+    static const GVariantType* elementType = G_VARIANT_TYPE("(stt)");
+
+    LuaState::profileStatistics_t statistics;
+
+    Joystick* joystick = Joystick::find(id);
+    if (joystick!=0) {
+        joystick->getLuaState().getProfileStatistics(statistics, reset);
+    }
+
+    auto numEntries = statistics.size();
+    unique_ptr<GVariant*[]> entryVariants(new GVariant*[numEntries]);
+
+    size_t index = 0;
+    for(auto& entry: statistics) {
+        entryVariants[index++] =
+            g_variant_new("(stt)", entry.name.c_str(),
+                          static_cast<guint64>(entry.numCalls),
+                          static_cast<guint64>(entry.time));
+    }
+
+    return g_variant_new_array(elementType, entryVariants.get(), index);
+}
+
+//------------------------------------------------------------------------------
+
 bool DBusAdaptor::startMonitor(const uint32_t id, const string& sender,
                                const string& listener)
 {
@@ -637,6 +885,41 @@ void DBusAdaptor::stopMonitor(const uint32_t id, const string& listener)
 
 //------------------------------------------------------------------------------
 
+GVariant* DBusAdaptor::startMonitors(GVariant* ids, const string& sender,
+                                     const string& listener)
+{
+    vector<Joystick*> joysticks;
+    findJoysticks(ids, joysticks);
+
+    Log::debug("DBusAdaptor::startMonitors: %zu joysticks to %s\n",
+               joysticks.size(), listener.c_str());
+
+    vector<guint32> startedIDs;
+    for(auto joystick: joysticks) {
+        listeners_t& listeners = getListeners(joystick->getID());
+        listeners.push_back(new JSProgListener(connection, listener, sender));
+        startedIDs.push_back(joystick->getID());
+    }
+
+    return g_variant_new_fixed_array(G_VARIANT_TYPE_UINT32,
+                                     startedIDs.data(), startedIDs.size(),
+                                     sizeof(guint32));
+}
+
+//------------------------------------------------------------------------------
+
+void DBusAdaptor::stopMonitors(GVariant* ids, const string& listener)
+{
+    vector<Joystick*> joysticks;
+    findJoysticks(ids, joysticks);
+
+    for(auto joystick: joysticks) {
+        stopMonitor(joystick->getID(), listener);
+    }
+}
+
+//------------------------------------------------------------------------------
+
 void DBusAdaptor::exit()
 {
     InputDeviceListener::get().stop();
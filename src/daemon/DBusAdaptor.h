@@ -76,6 +76,14 @@ private:
                                            GDBusMethodInvocation* invocation,
                                            guint arg_id, gpointer userData);
 
+    /**
+     * The callback for the getJoystickStates() call.
+     */
+    static gboolean handleGetJoystickStates(jsprogHuVaradiistvanJSProg* object,
+                                            GDBusMethodInvocation* invocation,
+                                            GVariant* arg_ids,
+                                            gpointer userData);
+
     /**
      * The callback for the loadProfile() call.
      */
@@ -85,6 +93,43 @@ private:
                                       const gchar* arg_profileXML,
                                       gpointer userData);
 
+    /**
+     * The callback for the updateProfile() call.
+     */
+    static gboolean handleUpdateProfile(jsprogHuVaradiistvanJSProg* object,
+                                        GDBusMethodInvocation* invocation,
+                                        guint arg_id,
+                                        const gchar* arg_profileXML,
+                                        gpointer userData);
+
+    /**
+     * The callback for the preloadProfile() call.
+     */
+    static gboolean handlePreloadProfile(jsprogHuVaradiistvanJSProg* object,
+                                         GDBusMethodInvocation* invocation,
+                                         guint arg_id,
+                                         guint arg_slot,
+                                         const gchar* arg_profileXML,
+                                         gpointer userData);
+
+    /**
+     * The callback for the switchProfile() call.
+     */
+    static gboolean handleSwitchProfile(jsprogHuVaradiistvanJSProg* object,
+                                        GDBusMethodInvocation* invocation,
+                                        guint arg_id,
+                                        guint arg_slot,
+                                        gpointer userData);
+
+    /**
+     * The callback for the getProfileStats() call.
+     */
+    static gboolean handleGetProfileStats(jsprogHuVaradiistvanJSProg* object,
+                                          GDBusMethodInvocation* invocation,
+                                          guint arg_id,
+                                          gboolean arg_reset,
+                                          gpointer userData);
+
     /**
      * The callback for the startMonitor() call.
      */
@@ -104,6 +149,25 @@ private:
                                       const gchar* arg_listener,
                                       gpointer userData);
 
+    /**
+     * The callback for the startMonitors() call.
+     */
+    static gboolean handleStartMonitors(jsprogHuVaradiistvanJSProg* object,
+                                        GDBusMethodInvocation* invocation,
+                                        GVariant* arg_ids,
+                                        const gchar* arg_sender,
+                                        const gchar* arg_listener,
+                                        gpointer userData);
+
+    /**
+     * The callback for the stopMonitors() call.
+     */
+    static gboolean handleStopMonitors(jsprogHuVaradiistvanJSProg* object,
+                                       GDBusMethodInvocation* invocation,
+                                       GVariant* arg_ids,
+                                       const gchar* arg_listener,
+                                       gpointer userData);
+
     /**
      * The callback for the exit() call.
      */
@@ -191,11 +255,42 @@ public:
      */
     GVariant* getJoystickState(uint32_t id);
 
+    /**
+     * The implementation of the getJoystickStates() call. It returns the
+     * ID and the state of each joystick with one of the given IDs, or of
+     * all joysticks, if no IDs are given. The unknown IDs are skipped.
+     */
+    GVariant* getJoystickStates(GVariant* ids);
+
     /**
      * The implementation of the loadProfile() call
      */
     bool loadProfile(uint32_t id, const std::string& profileXML);
 
+    /**
+     * The implementation of the updateProfile() call
+     */
+    bool updateProfile(uint32_t id, const std::string& profileXML);
+
+    /**
+     * The implementation of the preloadProfile() call
+     */
+    bool preloadProfile(uint32_t id, uint32_t slot,
+                        const std::string& profileXML);
+
+    /**
+     * The implementation of the switchProfile() call
+     */
+    bool switchProfile(uint32_t id, uint32_t slot);
+
+    /**
+     * The implementation of the getProfileStats() call. It returns the
+     * counters of the functions and the handlers of the profile loaded
+     * into the joystick with the given ID, if the profile has been
+     * instrumented. If reset is true, the counters are set to zero.
+     */
+    GVariant* getProfileStats(uint32_t id, bool reset);
+
     /**
      * Start monitoring the keys and axes of the joystick with the
      * given ID through the given listener.
@@ -209,6 +304,29 @@ public:
      */
     void stopMonitor(const uint32_t id, const std::string& listener);
 
+    /**
+     * Start monitoring the keys and axes of the joysticks with the given
+     * IDs, or of all joysticks, if no IDs are given, through the given
+     * listener.
+     *
+     * If no IDs are given, only the joysticks present at the time of the
+     * call are monitored. The joysticks added later are not, the caller
+     * should start monitoring them when it receives the joystickAdded
+     * signal.
+     *
+     * @return the array of the IDs of the joysticks for which the
+     * monitoring has been started
+     */
+    GVariant* startMonitors(GVariant* ids, const std::string& sender,
+                            const std::string& listener);
+
+    /**
+     * Stop monitoring the keys and axes of the joysticks with the given
+     * IDs, or of all joysticks, if no IDs are given, through the given
+     * listener.
+     */
+    void stopMonitors(GVariant* ids, const std::string& listener);
+
     /**
      * Exit the program.
      */
@@ -249,6 +367,13 @@ public:
     void sendJoystickRemoved(Joystick& joystick);
 
 private:
+    /**
+     * Collect the joysticks with the IDs in the given array of IDs, or
+     * all joysticks, if the array is empty. The unknown IDs are skipped.
+     */
+    static void findJoysticks(GVariant* ids,
+                              std::vector<Joystick*>& joysticks);
+
     /**
      * Find the listeners for the given joystick ID, if present.
      */
@@ -338,8 +338,22 @@ bool Joystick::setProfile(const Profile& profile)
 {
     deleteAllLuaThreads();
     releasePressedKeys();
-    clearLuaHandlerNames();
 
+    string profileCode;
+    handledControls_t controls;
+    getProfileCode(profile, profileCode, controls);
+
+    setupLuaHandlerNames(controls);
+
+    logProfileCode("setProfile", profileCode);
+
+    return luaState.loadProfile(profileCode);
+}
+
+//------------------------------------------------------------------------------
+
+bool Joystick::updateProfile(const Profile& profile)
+{
     string profileCode, luaCode;
 
     if (profile.getPrologue(luaCode)) {
@@ -347,14 +361,22 @@ bool Joystick::setProfile(const Profile& profile)
         profileCode.append("\n");
     }
 
+    vector<Control*> removedControls;
+
     profile.resetControls();
     Control::type_t type;
     int code;
-    while (profile.getNextControl(type, code, luaCode)) {
+    bool removed;
+    while (profile.getNextControl(type, code, luaCode, &removed)) {
         Control* control = findControl(type, code);
         if (control==0) {
-            Log::warning("Joystick::setProfile: joystick has no %s with code %d\n",
+            Log::warning("Joystick::updateProfile: joystick has no %s with code %d\n",
                          (type==Control::KEY) ? "key" : "axis", code);
+        } else if (removed) {
+            if (!control->getLuaHandlerName().empty()) {
+                profileCode.append(control->getLuaHandlerName() + " = nil\n");
+                removedControls.push_back(control);
+            }
         } else {
             control->setupLuaHandlerName(type, code);
             profileCode.append("function " + control->getLuaHandlerName() + "(type, code, value)\n");
@@ -363,27 +385,54 @@ bool Joystick::setProfile(const Profile& profile)
         }
     }
 
-    if (profile.getEpilogue(luaCode)) {
-        profileCode.append(luaCode);
+    logProfileCode("updateProfile", profileCode);
+
+    if (!luaState.updateProfile(profileCode)) return false;
+
+    for(vector<Control*>::iterator i = removedControls.begin();
+        i!=removedControls.end(); ++i)
+    {
+        (*i)->clearLuaHandlerName();
     }
 
-    Log::debug("Joystick::setProfile: the profile code:\n");
+    return true;
+}
 
-    size_t lineNumber = 1;
-    static const string delim("\n");
-    string::const_iterator lineStart = profileCode.begin();
-    string::const_iterator end = profileCode.end();
-    while (true) {
-        string::const_iterator lineEnd = std::search(lineStart, end,
-                                                     delim.begin(), delim.end());
-        string line(lineStart, lineEnd);
-        Log::debug("%zu: %s\n", lineNumber, line.c_str());
-        if (lineEnd==end) break;
-        lineStart = lineEnd + delim.size();
-        ++lineNumber;
+//------------------------------------------------------------------------------
+
+bool Joystick::preloadProfile(unsigned slot, const Profile& profile)
+{
+    string profileCode;
+    ProfileSlot profileSlot;
+    getProfileCode(profile, profileCode, profileSlot.controls);
+
+    logProfileCode("preloadProfile", profileCode);
+
+    if (!LuaState::compileProfile(profileCode, profileSlot.chunk)) {
+        return false;
     }
 
-    return luaState.loadProfile(profileCode);
+    profileSlots[slot] = profileSlot;
+    return true;
+}
+
+//------------------------------------------------------------------------------
+
+bool Joystick::switchProfile(unsigned slot)
+{
+    profileSlots_t::const_iterator i = profileSlots.find(slot);
+    if (i==profileSlots.end()) {
+        Log::warning("Joystick::switchProfile: no profile in slot %u\n", slot);
+        return false;
+    }
+
+    const ProfileSlot& profileSlot = i->second;
+
+    deleteAllLuaThreads();
+    releasePressedKeys();
+    setupLuaHandlerNames(profileSlot.controls);
+
+    return luaState.loadCompiledProfile(profileSlot.chunk);
 }
 
 //------------------------------------------------------------------------------
@@ -430,6 +479,76 @@ void Joystick::clearLuaHandlerNames()
 
 //------------------------------------------------------------------------------
 
+void Joystick::getProfileCode(const Profile& profile, string& profileCode,
+                              handledControls_t& controls) const
+{
+    string luaCode;
+
+    if (profile.getPrologue(luaCode)) {
+        profileCode.append(luaCode);
+        profileCode.append("\n");
+    }
+
+    profile.resetControls();
+    Control::type_t type;
+    int code;
+    while (profile.getNextControl(type, code, luaCode)) {
+        Control* control = findControl(type, code);
+        if (control==0) {
+            Log::warning("Joystick::getProfileCode: joystick has no %s with code %d\n",
+                         (type==Control::KEY) ? "key" : "axis", code);
+        } else {
+            controls.push_back(std::make_pair(type, code));
+            profileCode.append("function " +
+                               Control::getLuaHandlerNameFor(type, code) +
+                               "(type, code, value)\n");
+            profileCode.append(luaCode);
+            profileCode.append("\nend\n");
+        }
+    }
+
+    if (profile.getEpilogue(luaCode)) {
+        profileCode.append(luaCode);
+    }
+}
+
+//------------------------------------------------------------------------------
+
+void Joystick::setupLuaHandlerNames(const handledControls_t& controls)
+{
+    clearLuaHandlerNames();
+
+    for(handledControls_t::const_iterator i = controls.begin();
+        i!=controls.end(); ++i)
+    {
+        findControl(i->first, i->second)->setupLuaHandlerName(i->first,
+                                                              i->second);
+    }
+}
+
+//------------------------------------------------------------------------------
+
+void Joystick::logProfileCode(const char* function, const string& code)
+{
+    Log::debug("Joystick::%s: the profile code:\n", function);
+
+    size_t lineNumber = 1;
+    static const string delim("\n");
+    string::const_iterator lineStart = code.begin();
+    string::const_iterator end = code.end();
+    while (true) {
+        string::const_iterator lineEnd = std::search(lineStart, end,
+                                                     delim.begin(), delim.end());
+        string line(lineStart, lineEnd);
+        Log::debug("%zu: %s\n", lineNumber, line.c_str());
+        if (lineEnd==end) break;
+        lineStart = lineEnd + delim.size();
+        ++lineNumber;
+    }
+}
+
+//------------------------------------------------------------------------------
+
 // Local Variables:
 // mode: C++
 // c-basic-offset: 4
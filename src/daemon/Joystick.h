@@ -30,6 +30,7 @@
 #include <lwt/util.h>
 
 #include <vector>
+#include <map>
 #include <set>
 
 #include <linux/input.h>
@@ -64,6 +65,33 @@ public:
     typedef std::map<size_t, Joystick*> joysticks_t;
 
 private:
+    /**
+     * Type for the list of the types and codes of the controls having
+     * handlers in a profile.
+     */
+    typedef std::vector<std::pair<Control::type_t, int> > handledControls_t;
+
+    /**
+     * A profile preloaded into a slot.
+     */
+    struct ProfileSlot
+    {
+        /**
+         * The compiled code of the profile.
+         */
+        std::string chunk;
+
+        /**
+         * The controls having handlers in the profile.
+         */
+        handledControls_t controls;
+    };
+
+    /**
+     * Type for the mapping of slot numbers to the preloaded profiles.
+     */
+    typedef std::map<unsigned, ProfileSlot> profileSlots_t;
+
     /**
      * Timeout handler.
      */
@@ -184,6 +212,11 @@ private:
      */
     luaThreads_t luaThreads;
 
+    /**
+     * The profiles preloaded into slots.
+     */
+    profileSlots_t profileSlots;
+
     /**
      * Construct the joystick for the given file descriptor.
      */
@@ -235,6 +268,40 @@ public:
      */
     bool setProfile(const Profile& profile);
 
+    /**
+     * Update the current profile with the given partial one. Contrary to
+     * setProfile(), the internal state of the joystick is kept:
+     * - the threads and the pressed keys are left intact,
+     * - the code of the prologue is run in the current Lua state,
+     * - the handlers of the controls given in the profile are replaced
+     *   or, if their elements have the remove attribute set, removed,
+     *   while the other handlers are kept.
+     * The epilogue of the profile is ignored.
+     *
+     * @return whether the profile could be loaded.
+     */
+    bool updateProfile(const Profile& profile);
+
+    /**
+     * Preload the given profile into the slot with the given number. The
+     * code of the profile is compiled, but it is not loaded, i.e. the
+     * current profile remains active. A profile already in the slot is
+     * replaced.
+     *
+     * @return whether the profile could be compiled.
+     */
+    bool preloadProfile(unsigned slot, const Profile& profile);
+
+    /**
+     * Activate the profile preloaded into the slot with the given number.
+     * The internal state of the joystick is cleared the same way as by
+     * setProfile(), but the code need not be generated and parsed again.
+     *
+     * @return whether there is a profile in the slot and it could be
+     * loaded.
+     */
+    bool switchProfile(unsigned slot);
+
     /**
      * Get the Lua state.
      */
@@ -291,6 +358,27 @@ private:
      */
     void clearLuaHandlerNames();
 
+    /**
+     * Log the given profile code line by line for debugging.
+     */
+    static void logProfileCode(const char* function, const std::string& code);
+
+    /**
+     * Get the code of the given profile with the handlers of the controls
+     * of this joystick.
+     *
+     * @param profileCode will contain the Lua code of the profile
+     * @param controls will contain the controls having handlers
+     */
+    void getProfileCode(const Profile& profile, std::string& profileCode,
+                        handledControls_t& controls) const;
+
+    /**
+     * Setup the Lua handler names of the given controls after clearing
+     * all of them.
+     */
+    void setupLuaHandlerNames(const handledControls_t& controls);
+
     /**
      * Add a Lua thread to the control.
      */
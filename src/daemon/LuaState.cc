@@ -33,6 +33,8 @@ extern "C" {
 #include <lauxlib.h>
 }
 
+#include <ctime>
+
 //------------------------------------------------------------------------------
 
 using std::make_pair;
@@ -99,6 +101,12 @@ const char* const LuaState::GLOBAL_CANCELDELAY = "jsprog_canceldelay";
 
 const char* const LuaState::GLOBAL_JOINTHREAD = "jsprog_jointhread";
 
+const char* const LuaState::GLOBAL_MILLIS = "jsprog_millis";
+
+const char* const LuaState::GLOBAL_MICROS = "jsprog_micros";
+
+const char* const LuaState::GLOBAL_PROFILESTATS = "_jsprog_stats";
+
 //------------------------------------------------------------------------------
 
 LuaState& LuaState::get(lua_State* L)
@@ -382,6 +390,34 @@ int LuaState::jointhread(lua_State* L)
 
 //------------------------------------------------------------------------------
 
+int LuaState::millis(lua_State* L)
+{
+    lua_pushinteger(L, currentTimeMillis());
+    return 1;
+}
+
+//------------------------------------------------------------------------------
+
+int LuaState::micros(lua_State* L)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    lua_pushinteger(L, static_cast<lua_Integer>(ts.tv_sec) * 1000000 +
+                    ts.tv_nsec / 1000);
+    return 1;
+}
+
+//------------------------------------------------------------------------------
+
+int LuaState::writeChunk(lua_State* /*L*/, const void* p, size_t sz, void* ud)
+{
+    reinterpret_cast<std::string*>(ud)->append(reinterpret_cast<const char*>(p),
+                                               sz);
+    return 0;
+}
+
+//------------------------------------------------------------------------------
+
 LuaState::LuaState(Joystick& joystick) :
     joystick(joystick),
     L(luaL_newstate())
@@ -453,6 +489,104 @@ bool LuaState::loadProfile(const std::string& profileCode)
 
 //------------------------------------------------------------------------------
 
+bool LuaState::updateProfile(const std::string& profileCode)
+{
+    int result = luaL_dostring(L, profileCode.c_str());
+    if (result!=LUA_OK) {
+        Log::error("LuaState::updateProfile: failed to run script: %s\n",
+                   lua_tostring(L, -1));
+    }
+    lua_settop(L, 0);
+    return result==LUA_OK;
+}
+
+//------------------------------------------------------------------------------
+
+bool LuaState::compileProfile(const std::string& profileCode,
+                              std::string& chunk)
+{
+    lua_State* L = luaL_newstate();
+
+    int result = luaL_loadbuffer(L, profileCode.c_str(), profileCode.size(),
+                                 "profile");
+    if (result==LUA_OK) {
+        chunk.clear();
+#if LUA_VERSION_NUM>=503
+        result = lua_dump(L, &writeChunk, &chunk, 0);
+#else
+        result = lua_dump(L, &writeChunk, &chunk);
+#endif
+        if (result!=0) {
+            Log::error("LuaState::compileProfile: failed to dump the chunk: %d\n",
+                       result);
+        }
+    } else {
+        Log::error("LuaState::compileProfile: failed to compile script: %s\n",
+                   lua_tostring(L, -1));
+    }
+
+    lua_close(L);
+    return result==LUA_OK;
+}
+
+//------------------------------------------------------------------------------
+
+bool LuaState::loadCompiledProfile(const std::string& chunk)
+{
+    reset();
+
+    int result = luaL_loadbuffer(L, chunk.data(), chunk.size(), "profile");
+    if (result==LUA_OK) {
+        result = lua_pcall(L, 0, LUA_MULTRET, 0);
+    }
+    if (result!=LUA_OK) {
+        Log::error("LuaState::loadCompiledProfile: failed to run script: %s\n",
+                   lua_tostring(L, -1));
+    }
+    lua_settop(L, 0);
+    return result==LUA_OK;
+}
+
+//------------------------------------------------------------------------------
+
+void LuaState::getProfileStatistics(profileStatistics_t& statistics,
+                                    bool reset)
+{
+    statistics.clear();
+
+    lua_getglobal(L, GLOBAL_PROFILESTATS);
+    if (lua_istable(L, -1)) {
+        lua_pushnil(L);
+        while (lua_next(L, -2)!=0) {
+            if (lua_type(L, -2)==LUA_TSTRING && lua_istable(L, -1)) {
+                ProfileStatistics entry;
+                entry.name = lua_tostring(L, -2);
+
+                lua_rawgeti(L, -1, 1);
+                entry.numCalls = static_cast<uint64_t>(lua_tointeger(L, -1));
+                lua_pop(L, 1);
+
+                lua_rawgeti(L, -1, 2);
+                entry.time = static_cast<uint64_t>(lua_tointeger(L, -1));
+                lua_pop(L, 1);
+
+                statistics.push_back(entry);
+
+                if (reset) {
+                    lua_pushinteger(L, 0);
+                    lua_rawseti(L, -2, 1);
+                    lua_pushinteger(L, 0);
+                    lua_rawseti(L, -2, 2);
+                }
+            }
+            lua_pop(L, 1);
+        }
+    }
+    lua_settop(L, 0);
+}
+
+//------------------------------------------------------------------------------
+
 void LuaState::reset()
 {
     lua_close(L);
@@ -502,6 +636,12 @@ void LuaState::initialize()
     lua_pushcfunction(L, &jointhread);
     lua_setglobal(L, GLOBAL_JOINTHREAD);
 
+    lua_pushcfunction(L, &millis);
+    lua_setglobal(L, GLOBAL_MILLIS);
+
+    lua_pushcfunction(L, &micros);
+    lua_setglobal(L, GLOBAL_MICROS);
+
     lua_newtable(L);
     lua_setglobal(L, GLOBAL_THREADS);
 
@@ -22,6 +22,9 @@
 
 #include <string>
 #include <map>
+#include <vector>
+
+#include <cstdint>
 
 extern "C" {
 #include <lua.h>
@@ -41,6 +44,34 @@ class LuaThread;
  */
 class LuaState
 {
+public:
+    /**
+     * The counters of a function or handler of an instrumented profile.
+     */
+    struct ProfileStatistics
+    {
+        /**
+         * The name of the function or the handler.
+         */
+        std::string name;
+
+        /**
+         * The number of invocations.
+         */
+        uint64_t numCalls;
+
+        /**
+         * The cumulative time spent in the function or the handler in
+         * microseconds.
+         */
+        uint64_t time;
+    };
+
+    /**
+     * Type for the list of the counters of an instrumented profile.
+     */
+    typedef std::vector<ProfileStatistics> profileStatistics_t;
+
 private:
     /**
      * Type for a mapping of Lua thread states to our thread objects.
@@ -117,6 +148,22 @@ private:
      */
     static const char* const GLOBAL_JOINTHREAD;
 
+    /**
+     * Global name: millis
+     */
+    static const char* const GLOBAL_MILLIS;
+
+    /**
+     * Global name: micros
+     */
+    static const char* const GLOBAL_MICROS;
+
+    /**
+     * The global name for the table of the counters of an instrumented
+     * profile.
+     */
+    static const char* const GLOBAL_PROFILESTATS;
+
 public:
     /**
      * Get the LuaState object from the given state.
@@ -180,6 +227,25 @@ private:
      */
     static int jointhread(lua_State* L);
 
+    /**
+     * A function that returns the current time in milliseconds, on the
+     * same clock as the one the delays are measured on.
+     */
+    static int millis(lua_State* L);
+
+    /**
+     * A function that returns the current time in microseconds on a
+     * monotonic clock. It is used to measure the time spent in the
+     * functions of an instrumented profile.
+     */
+    static int micros(lua_State* L);
+
+    /**
+     * The writer function used when dumping a compiled chunk. It appends
+     * the data to the string pointed to by ud.
+     */
+    static int writeChunk(lua_State* L, const void* p, size_t sz, void* ud);
+
     /**
      * The joystick that this state belongs to.
      */
@@ -235,6 +301,47 @@ public:
      */
     bool loadProfile(const std::string& profileCode);
 
+    /**
+     * Run the given string as a partial update of the profile code. The
+     * state is not reset, so the global variables and the functions
+     * defined previously remain available.
+     *
+     * @return if the script could be run
+     */
+    bool updateProfile(const std::string& profileCode);
+
+    /**
+     * Compile the given profile code into a binary chunk, which can be
+     * loaded by loadCompiledProfile() later. The code is not run, so it
+     * need not be compiled with the Lua state of a joystick.
+     *
+     * @return if the code could be compiled
+     */
+    static bool compileProfile(const std::string& profileCode,
+                               std::string& chunk);
+
+    /**
+     * Load the given binary chunk produced by compileProfile() as the
+     * profile code. It resets the state and runs the chunk, i.e. it is
+     * equivalent to loadProfile() with the original code, but the code
+     * need not be parsed again.
+     *
+     * @return if the chunk could be run
+     */
+    bool loadCompiledProfile(const std::string& chunk);
+
+    /**
+     * Get the counters of the functions and the handlers of the current
+     * profile, if it has been instrumented by the client. The counters
+     * are kept by the profile code in a global table mapping the names to
+     * arrays of the number of invocations and the time spent.
+     *
+     * @param reset if true, the counters are set to zero after they are
+     * retrieved
+     */
+    void getProfileStatistics(profileStatistics_t& statistics,
+                              bool reset);
+
 private:
     /**
      * Reset the Lua state. The old one will be closed and a new one
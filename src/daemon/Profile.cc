@@ -310,7 +310,8 @@ void Profile::resetControls() const
 
 //------------------------------------------------------------------------------
 
-bool Profile::getNextControl(Control::type_t& type, int& code, string& luaCode) const
+bool Profile::getNextControl(Control::type_t& type, int& code, string& luaCode,
+                             bool* removed) const
 {
     while(true) {
         xmlNode* controlNode = findNode(nextControl, &isNodeControl, 0);
@@ -346,6 +347,15 @@ bool Profile::getNextControl(Control::type_t& type, int& code, string& luaCode)
             continue;
         }
 
+        if (extractAttr(value, controlNode, "remove") && value=="yes") {
+            if (removed==0) continue;
+            *removed = true;
+            luaCode.clear();
+            return true;
+        }
+
+        if (removed!=0) *removed = false;
+
         if (!extractText(luaCode, controlNode->children)) {
             Log::warning("Profile::getNextControl: control node of type %s on line %d has no valid Lua code, skipping\n",
                          (type==Control::KEY) ? "key" : "axis",
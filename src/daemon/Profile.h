@@ -142,8 +142,13 @@ public:
      * @param type will contain the control's type
      * @param code will contain the code of the control
      * @param luaCode will contain the Lua code for the control
+     * @param removed if not null, it will indicate if the control's
+     * element has the remove attribute set to yes, i.e. the handler of
+     * the control should be removed. Such an element need not have any
+     * Lua code. If it is null, such elements are skipped.
      */
-    bool getNextControl(Control::type_t& type, int& code, std::string& luaCode) const;
+    bool getNextControl(Control::type_t& type, int& code, std::string& luaCode,
+                        bool* removed = 0) const;
 
     /**
      * Get the contents of the epilogue.
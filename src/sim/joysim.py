@@ -1,9 +1,179 @@
 from evdev import uinput, ecodes
 
+import argparse
 import cmd
+import os
+import random
 import sys
 import time
 
+#------------------------------------------------------------------------------
+
+# The joystick simulator
+#
+# A simulated joystick is a uinput device with the given keys and axes. It
+# can be driven interactively from a command prompt, or non-interactively by
+# playing a scenario (see run()):
+# - replay: the events recorded in a trace file by 'jsprog monitorjs
+#   --record' are played back,
+# - sweep: axes are swept between their minimum and maximum values,
+# - storm: random buttons are pressed and released,
+# - chords: random combinations of buttons are pressed together, held and
+#   released.
+# A scenario is a sequence of frames, i.e. of events followed by a
+# synchronization. The frames are played at their original timing or as
+# fast as possible, and the achieved rate of the events is reported, so
+# that the daemon and the listeners can be load-tested reproducibly.
+#
+# If /dev/uinput is not available, the fake backend can be used, which
+# keeps the events in the process.
+
+#------------------------------------------------------------------------------
+
+class FakeUInput(object):
+    """An in-process replacement of uinput.UInput.
+
+    It accepts the same arguments and provides the same operations used by
+    the simulator, but it only counts the events and the synchronizations,
+    and keeps the last value of each control."""
+    def __init__(self, events = None, name = "py-evdev-uinput",
+                 vendor = 0x1, product = 0x1, version = 0x1, bustype = 0x3):
+        """Construct the fake device."""
+        self.name = name
+        self.numEvents = 0
+        self.numSyns = 0
+
+        # A mapping of tuples of the event types and codes to the last
+        # values written
+        self.values = {}
+
+    def write(self, type, code, value):
+        """Write the given event."""
+        self.values[(type, code)] = value
+        self.numEvents += 1
+
+    def syn(self):
+        """Write a synchronization event."""
+        self.numSyns += 1
+
+    def close(self):
+        """Close the device."""
+        pass
+
+#------------------------------------------------------------------------------
+
+## The backends of the simulated joystick
+backends = {
+    "uinput": lambda **kwargs: uinput.UInput(**kwargs),
+    "fake": FakeUInput
+}
+
+#------------------------------------------------------------------------------
+
+def generateAxisSweep(axes, hz, duration, period):
+    """Generate the frames of sweeping the given axes.
+
+    axes is a list of tuples of the code, the minimum and the maximum value
+    of the axes. Each axis moves from its minimum value to its maximum and
+    back within the given period (in seconds), the axes shifted evenly in
+    phase. The values are sampled with the given frequency for the given
+    duration (in seconds). Only the values that have changed are written,
+    since the kernel drops the others anyway.
+
+    Returns an iterator over tuples of the time of the frame in seconds and
+    the list of the type, code and value tuples of the events."""
+    lastValues = [None] * len(axes)
+    numSamples = int(duration * hz)
+    for i in range(0, numSamples):
+        t = i / hz
+        events = []
+        for (index, (code, minValue, maxValue)) in enumerate(axes):
+            phase = (t / period + index / len(axes)) % 1.0
+            position = 2.0 * phase if phase<0.5 else 2.0 - 2.0 * phase
+            value = minValue + round(position * (maxValue - minValue))
+            if value!=lastValues[index]:
+                events.append((ecodes.EV_ABS, code, value))
+                lastValues[index] = value
+        if events:
+            yield (t, events)
+
+def generateButtonStorm(buttons, hz, duration, seed):
+    """Generate the frames of a button storm.
+
+    In each frame a random one of the given buttons is toggled, i.e.
+    pressed if it is released, and released if it is pressed. The frames
+    follow each other with the given frequency for the given duration (in
+    seconds). At the end all buttons are released."""
+    rnd = random.Random(seed)
+    pressed = set()
+    numFrames = int(duration * hz)
+    for i in range(0, numFrames):
+        code = rnd.choice(buttons)
+        if code in pressed:
+            pressed.remove(code)
+            yield (i / hz, [(ecodes.EV_KEY, code, 0)])
+        else:
+            pressed.add(code)
+            yield (i / hz, [(ecodes.EV_KEY, code, 1)])
+
+    if pressed:
+        yield (numFrames / hz,
+               [(ecodes.EV_KEY, code, 0) for code in sorted(pressed)])
+
+def generateChords(buttons, size, holdTime, gap, duration, seed):
+    """Generate the frames of a sequence of chords.
+
+    A chord is a random combination of the given number of the given
+    buttons pressed in the same frame, held for the given time and released
+    in the same frame. The next chord is pressed after the given gap. The
+    hold time and the gap are in seconds. Chords are generated for the given
+    duration (in seconds)."""
+    rnd = random.Random(seed)
+    size = min(size, len(buttons))
+    t = 0.0
+    while t<duration:
+        codes = sorted(rnd.sample(buttons, size))
+        yield (t, [(ecodes.EV_KEY, code, 1) for code in codes])
+        yield (t + holdTime, [(ecodes.EV_KEY, code, 0) for code in codes])
+        t += holdTime + gap
+
+def readTrace(path, joystickID = None):
+    """Read the frames from the given trace file.
+
+    If a joystick ID is given, only the events of that joystick are read.
+    The events with the same timestamp make up a frame, and the times are
+    relative to the first event."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    "..", "client"))
+    from jsprog.eventtrace import EventTraceReader
+    from jsprog.parser import Control
+
+    eventTypes = { Control.TYPE_KEY: ecodes.EV_KEY,
+                   Control.TYPE_AXIS: ecodes.EV_ABS }
+
+    with EventTraceReader(path) as reader:
+        startTimestamp = None
+        frameTimestamp = None
+        events = []
+        for (timestamp, id, type, code, value) in reader:
+            if joystickID is not None and id!=joystickID:
+                continue
+            if type not in eventTypes:
+                continue
+            if timestamp!=frameTimestamp:
+                if events:
+                    yield ((frameTimestamp - startTimestamp) / 1e9, events)
+                    events = []
+                if startTimestamp is None:
+                    startTimestamp = timestamp
+                frameTimestamp = timestamp
+            events.append((eventTypes[type], code, value))
+
+        if events:
+            yield ((frameTimestamp - startTimestamp) / 1e9, events)
+
+#------------------------------------------------------------------------------
+
 class CLI(cmd.Cmd):
     """Command-line interface for a joystick simulator."""
     @staticmethod
@@ -45,8 +215,10 @@ class CLI(cmd.Cmd):
         return lambda self: self._helpAxis(axisName)
 
     def __init__(self, events, name, vendor, product, shortName = None,
-                 busType = 3, version = 0x0100):
-        """Construct the joystick simulator."""
+                 busType = 3, version = 0x0100, backend = "uinput"):
+        """Construct the joystick simulator.
+
+        backend is the name of the backend of the device (see backends)."""
         cmd.Cmd.__init__(self)
 
         self.use_rawinput = True
@@ -58,10 +230,12 @@ class CLI(cmd.Cmd):
 
         self.daemon = True
 
-        self._joystick = uinput.UInput(events = events, name = name,
-                                       vendor = vendor, product = product,
-                                       version = version,
-                                       bustype = busType)
+        self._joystick = backends[backend](events = events, name = name,
+                                           vendor = vendor, product = product,
+                                           version = version,
+                                           bustype = busType)
+
+        self._name2Axis = {}
 
         if ecodes.EV_ABS in events:
             for (axisCode, absInfo) in events[ecodes.EV_ABS]:
@@ -69,6 +243,7 @@ class CLI(cmd.Cmd):
                 maxValue = absInfo[2]
                 axisName = CLI.getName(CLI.getAxisName(axisCode))
                 axisName = axisName.lower()
+                self._name2Axis[axisName] = (axisCode, minValue, maxValue)
                 setattr(CLI, "do_" + axisName,
                         self.getHandleAxis(axisCode, minValue, maxValue))
                 setattr(CLI, "help_" + axisName, self.getHelpAxis(axisName))
@@ -85,6 +260,69 @@ class CLI(cmd.Cmd):
                 setattr(CLI, "do_" + btnName, self.getHandleButton(btnCode))
                 setattr(CLI, "help_" + btnName, self.getHelpButton(btnName))
 
+    @property
+    def axes(self):
+        """Get a list of tuples of the code, the minimum and the maximum
+        value of the axes."""
+        return list(self._name2Axis.values())
+
+    @property
+    def buttons(self):
+        """Get a list of the codes of the buttons."""
+        return list(self._name2Button.values())
+
+    def findAxis(self, axisName):
+        """Find the axis with the given name.
+
+        Returns a tuple of the code, the minimum and the maximum value of
+        the axis, or None if there is no such axis."""
+        return self._name2Axis.get(axisName)
+
+    def findButton(self, btnName):
+        """Find the code of the button with the given name, or return None
+        if there is no such button."""
+        return self._name2Button.get(btnName)
+
+    def play(self, frames, realTime = True):
+        """Play the given frames.
+
+        frames is an iterable of tuples of the time of the frame in seconds
+        and the list of the type, code and value tuples of the events (see
+        e.g. generateAxisSweep()). If realTime is True, each frame is
+        written at its time relative to the start, otherwise the frames are
+        written as fast as possible.
+
+        Returns a tuple of the number of events, the number of frames, the
+        elapsed time and the maximal lateness of a frame in seconds."""
+        joystick = self._joystick
+        write = joystick.write
+        syn = joystick.syn
+        clock = time.perf_counter
+
+        numEvents = 0
+        numFrames = 0
+        maxLateness = 0.0
+
+        start = clock()
+        for (frameTime, events) in frames:
+            if realTime:
+                delay = start + frameTime - clock()
+                if delay>0:
+                    time.sleep(delay)
+                else:
+                    maxLateness = max(maxLateness, -delay)
+
+            for (type, code, value) in events:
+                write(type, code, value)
+                if type==ecodes.EV_KEY:
+                    self._btnStatus[code] = value!=0
+            syn()
+
+            numEvents += len(events)
+            numFrames += 1
+
+        return (numEvents, numFrames, clock() - start, maxLateness)
+
     def default(self, line):
         """Handle unhandle commands."""
         if line=="EOF":
@@ -197,3 +435,134 @@ class CLI(cmd.Cmd):
 
     def _helpAxis(self, axisName):
         print(axisName + " <value> [<sleep time>]")
+
+#------------------------------------------------------------------------------
+
+def run(events, name, vendor, product, shortName = None,
+        busType = 3, version = 0x0100):
+    """Run the simulator of the joystick with the given properties.
+
+    The command line is processed, and if a scenario is given, it is
+    played, otherwise the command prompt is started."""
+    parser = argparse.ArgumentParser(description = "Simulate the joystick '%s'" % (name,))
+    parser.add_argument("-b", "--backend", dest = "backend",
+                        choices = sorted(backends.keys()), default = "uinput",
+                        help = "the backend of the simulated device")
+    parser.add_argument("-w", "--wait", dest = "wait", type = float,
+                        default = 1.0,
+                        help = "the time to wait in seconds after creating the device before playing the scenario, so that it can be noticed by the daemon")
+    parser.add_argument("-f", "--fast", dest = "fast", action = "store_true",
+                        help = "play the scenario as fast as possible instead of its original timing")
+    parser.add_argument("-r", "--repeat", dest = "repeat", type = int,
+                        default = 1,
+                        help = "the number of times the scenario is played")
+
+    scenarios = parser.add_subparsers(dest = "scenario", title = "scenarios",
+                                      description = "If no scenario is given, the command prompt is started.")
+
+    replayParser = scenarios.add_parser("replay",
+                                        help = "replay the events recorded in a trace file")
+    replayParser.add_argument(dest = "trace",
+                              help = "the trace file recorded by 'jsprog monitorjs --record'")
+    replayParser.add_argument("-j", "--joystick", dest = "joystickID",
+                              type = int, default = None,
+                              help = "replay only the events of the joystick with the given ID")
+
+    sweepParser = scenarios.add_parser("sweep", help = "sweep axes")
+    sweepParser.add_argument(dest = "axes", nargs = "*",
+                             help = "the names of the axes to sweep (default: all)")
+    sweepParser.add_argument("-z", "--hz", dest = "hz", type = float,
+                             default = 100.0,
+                             help = "the sampling frequency of the axes")
+    sweepParser.add_argument("-d", "--duration", dest = "duration",
+                             type = float, default = 10.0,
+                             help = "the duration of the sweep in seconds")
+    sweepParser.add_argument("-p", "--period", dest = "period", type = float,
+                             default = 2.0,
+                             help = "the time of a full sweep in seconds")
+
+    stormParser = scenarios.add_parser("storm",
+                                       help = "press and release random buttons")
+    stormParser.add_argument(dest = "buttons", nargs = "*",
+                             help = "the names of the buttons to use (default: all)")
+    stormParser.add_argument("-z", "--hz", dest = "hz", type = float,
+                             default = 1000.0,
+                             help = "the number of button changes per second")
+    stormParser.add_argument("-d", "--duration", dest = "duration",
+                             type = float, default = 10.0,
+                             help = "the duration of the storm in seconds")
+    stormParser.add_argument("-s", "--seed", dest = "seed", type = int,
+                             default = 42,
+                             help = "the seed of the random choices")
+
+    chordsParser = scenarios.add_parser("chords",
+                                        help = "press random combinations of buttons together")
+    chordsParser.add_argument(dest = "buttons", nargs = "*",
+                              help = "the names of the buttons to use (default: all)")
+    chordsParser.add_argument("-n", "--size", dest = "size", type = int,
+                              default = 3,
+                              help = "the number of buttons in a chord")
+    chordsParser.add_argument("-t", "--hold", dest = "holdTime",
+                              type = float, default = 0.1,
+                              help = "the time for which a chord is held in seconds")
+    chordsParser.add_argument("-g", "--gap", dest = "gap", type = float,
+                              default = 0.05,
+                              help = "the time between two chords in seconds")
+    chordsParser.add_argument("-d", "--duration", dest = "duration",
+                              type = float, default = 10.0,
+                              help = "the duration of the sequence in seconds")
+    chordsParser.add_argument("-s", "--seed", dest = "seed", type = int,
+                              default = 42,
+                              help = "the seed of the random choices")
+
+    args = parser.parse_args()
+
+    cli = CLI(events, name, vendor, product, shortName = shortName,
+              busType = busType, version = version, backend = args.backend)
+
+    if args.scenario is None:
+        cli.cmdloop()
+        return
+
+    def getControls(names, find, allControls, kind):
+        if not names:
+            return allControls
+        controls = []
+        for name in names:
+            control = find(name)
+            if control is None:
+                print("Unknown %s: %s" % (kind, name), file=sys.stderr)
+                sys.exit(1)
+            controls.append(control)
+        return controls
+
+    if args.scenario=="replay":
+        getFrames = lambda: readTrace(args.trace, args.joystickID)
+    elif args.scenario=="sweep":
+        axes = getControls(args.axes, cli.findAxis, cli.axes, "axis")
+        getFrames = lambda: generateAxisSweep(axes, args.hz, args.duration,
+                                              args.period)
+    else:
+        buttons = getControls(args.buttons, cli.findButton, cli.buttons,
+                              "button")
+        if args.scenario=="storm":
+            getFrames = lambda: generateButtonStorm(buttons, args.hz,
+                                                    args.duration, args.seed)
+        else:
+            getFrames = lambda: generateChords(buttons, args.size,
+                                               args.holdTime, args.gap,
+                                               args.duration, args.seed)
+
+    if args.wait>0:
+        time.sleep(args.wait)
+
+    for i in range(0, args.repeat):
+        (numEvents, numFrames, elapsed, maxLateness) = \
+            cli.play(getFrames(), realTime = not args.fast)
+        rate = numEvents / elapsed if elapsed>0 else 0.0
+        print("Played %d events in %d frames in %.3f s: %.0f events/s" %
+              (numEvents, numFrames, elapsed, rate), end = "")
+        if args.fast:
+            print()
+        else:
+            print(", maximal lateness: %.3f ms" % (maxLateness * 1000.0,))
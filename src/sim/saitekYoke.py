@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from joysim import CLI
+from joysim import run
 
 from evdev import ecodes
 
@@ -24,7 +24,5 @@ if __name__ == "__main__":
                         ecodes.BTN_TRIGGER_HAPPY20]
     }
 
-    cli = CLI(events, "Saitek Saitek Pro Flight Yoke", 0x06a3, 0x0bac,
-              version=0x0111, shortName = "SaitekYoke")
-
-    cli.cmdloop()
+    run(events, "Saitek Saitek Pro Flight Yoke", 0x06a3, 0x0bac,
+        version=0x0111, shortName = "SaitekYoke")
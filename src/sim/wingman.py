@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from joysim import CLI
+from joysim import run
 
 from evdev import ecodes
 
@@ -14,7 +14,5 @@ if __name__ == "__main__":
                         ecodes.BTN_THUMB2]
     }
 
-    cli = CLI(events, "Logitech Inc. WingMan Force 3D", 0x046d, 0x4283,
-              shortName = "WingMan")
-
-    cli.cmdloop()
+    run(events, "Logitech Inc. WingMan Force 3D", 0x046d, 0x4283,
+        shortName = "WingMan")